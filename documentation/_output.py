@@ -0,0 +1,167 @@
+#
+#   This file is part of m.css.
+#
+#   Copyright © 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025
+#             Vladimír Vondruš <mosra@centrum.cz>
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a
+#   copy of this software and associated documentation files (the "Software"),
+#   to deal in the Software without restriction, including without limitation
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,
+#   and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included
+#   in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#   THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#   DEALINGS IN THE SOFTWARE.
+#
+
+# Output file writer shared by doxygen.py and python.py
+
+import collections
+import filecmp
+import os
+import queue
+import shutil
+import threading
+
+class OutputWriter:
+    # If background is True, the files are written on a separate thread so
+    # rendering and disk I/O overlap. At most queue_size files are waiting to
+    # be written at any time, after that write() and copy() block. If
+    # link_static is True, copy() creates a hard link instead of a copy if
+    # possible.
+    def __init__(self, background: bool = True, link_static: bool = True, queue_size: int = 256):
+        self.link_static = link_static
+        # How many files were written, left untouched because they didn't
+        # change, copied and hard linked, for build statistics
+        self.stats = collections.Counter()
+        self._error = None
+        self._queue = None
+        self._queue_size = queue_size
+        self._paused = False
+        if background: self._start()
+
+    # Writes given data to a file, creating parent directories if needed. If
+    # the file exists and has the same contents, it's left untouched to
+    # preserve its modification time, otherwise it's replaced atomically.
+    def write(self, filename: str, data: bytes):
+        self._submit(self._write, filename, data)
+
+    # Copies a file to the output, with the same handling of unchanged files
+    # as write()
+    def copy(self, source: str, filename: str):
+        self._submit(self._copy, source, filename)
+
+    # Waits until all queued files are written and stops the background
+    # thread. Files submitted until resume() is called are written directly.
+    # Meant to be called before forking worker processes, as a fork copies
+    # only the calling thread and a lock held by the writer thread at that
+    # point would stay locked in the child forever.
+    def pause(self):
+        if self._queue:
+            self._stop()
+            self._paused = True
+        if self._error: raise self._error
+
+    # Restarts the background thread stopped by pause()
+    def resume(self):
+        if self._paused:
+            self._paused = False
+            self._start()
+
+    # Waits until all files are written. Errors from the background thread are
+    # propagated here at the latest. The writer can't be used after.
+    def finish(self):
+        if self._queue: self._stop()
+        self._paused = False
+        if self._error: raise self._error
+
+    def _start(self):
+        self._queue = queue.Queue(self._queue_size)
+        self._thread = threading.Thread(target=self._process, daemon=True)
+        self._thread.start()
+
+    def _stop(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._queue = None
+
+    def _submit(self, *job):
+        if self._error: raise self._error
+        if self._queue: self._queue.put(job)
+        else: job[0](*job[1:])
+
+    def _process(self):
+        while True:
+            job = self._queue.get()
+            if job is None: return
+            # After the first error, drain the queue so the producer doesn't
+            # block forever
+            if self._error: continue
+            try:
+                job[0](*job[1:])
+            except BaseException as e:
+                self._error = e
+
+    # Temporary file in the same directory, so the final rename is atomic.
+    # Both the PID and thread ID as doxygen.py may be writing from several
+    # worker processes at once.
+    @staticmethod
+    def _temporary(filename: str):
+        return '{}.{}-{}.tmp'.format(filename, os.getpid(), threading.get_ident())
+
+    @staticmethod
+    def _replace(filename: str, fill):
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        temporary = OutputWriter._temporary(filename)
+        try:
+            fill(temporary)
+            os.replace(temporary, filename)
+        except BaseException:
+            if os.path.exists(temporary): os.remove(temporary)
+            raise
+
+    def _write(self, filename: str, data: bytes):
+        try:
+            if os.path.getsize(filename) == len(data):
+                with open(filename, 'rb') as f:
+                    if f.read() == data:
+                        self.stats['unchanged'] += 1
+                        return
+        except FileNotFoundError:
+            pass
+
+        def fill(temporary):
+            with open(temporary, 'wb') as f:
+                f.write(data)
+        OutputWriter._replace(filename, fill)
+        self.stats['written'] += 1
+
+    def _copy(self, source: str, filename: str):
+        if os.path.exists(filename) and (os.path.samefile(source, filename) or filecmp.cmp(source, filename, shallow=False)):
+            self.stats['unchanged'] += 1
+            return
+
+        def fill(temporary):
+            # Hard links fail across filesystems or if not supported by the
+            # filesystem, fall back to a copy in that case. The output file is
+            # only ever replaced by a rename, never written to in place, so
+            # the source doesn't get modified through the link.
+            if self.link_static:
+                try:
+                    os.link(source, temporary)
+                    self.stats['linked'] += 1
+                    return
+                except OSError:
+                    pass
+            shutil.copy(source, temporary)
+            self.stats['copied'] += 1
+        OutputWriter._replace(filename, fill)
@@ -27,17 +27,31 @@
 # Can't be in __init__.py because I can't say `from . import Trie` in
 # doxygen.py. But `from _search import bla` works. Ugh.
 
+import argparse
+import array
 import base64
+import bisect
+import collections
 import enum
+import itertools
+import logging
+import mmap
+import os
+import re
 import struct
+import sys
+import time
 from types import SimpleNamespace as Empty
-from typing import List, Tuple, Union
+from typing import Dict, List, Tuple, Union
 
-# Version 0 was without the type map
-searchdata_format_version = 2
+# Version 0 was without the type map, version 2 had fixed-size trie nodes and
+# unpacked URLs
+searchdata_format_version = 3
 search_filename = f'search-v{searchdata_format_version}.js'
 searchdata_filename = f'{{search_filename_prefix}}-v{searchdata_format_version}.bin'
 searchdata_filename_b85 = f'{{search_filename_prefix}}-v{searchdata_format_version}.js'
+searchdata_shard_filename = f'{{search_filename_prefix}}-v{searchdata_format_version}-{{shard}}.bin'
+searchdata_shard_filename_b85 = f'{{search_filename_prefix}}-v{searchdata_format_version}-{{shard}}.js'
 
 # In order to be both space-efficient and flexible enough to accommodate for
 # larger projects, the bit counts for particular data types can vary in each
@@ -46,15 +60,17 @@ searchdata_filename_b85 = f'{{search_filename_prefix}}-v{searchdata_format_versi
 # - NAME_SIZE_BITS, how many bits is needed to store name lengths (such as
 #   prefix length). Can be either 8 or 16.
 # - RESULT_ID_BITS, how many bits is needed for IDs pointing into the result
-#   map. Can be either 16, 24 or 32.
-# - FILE_OFFSET_BITS, how many bits is needed to store general offsets into
-#   the file. Can be either 24 or 32.
+#   map from inside the result map. Can be either 16, 24 or 32.
+# - FILE_OFFSET_BITS, how many bits is needed to store offsets into the result
+#   map. Can be either 24 or 32.
+#
+# The trie uses variable-length integers instead.
 #
 # Whole file encoding
 # ===================
 #
 # magic | version | type | not  | symbol | result | type   | trie | result | type
-# 'MCS' | (0x02)  | data | used | count  |  map   |  map   | data |  map   | map
+# 'MCS' | (0x03)  | data | used | count  |  map   |  map   | data |  map   | map
 #       |         |      |      |        | offset | offset |      |  data  | data
 #  24b  |   8b    |  8b  | 24b  |  32b   |  32b   |  32b   |  …   |   …    |  …
 #
@@ -67,32 +83,72 @@ searchdata_filename_b85 = f'{{search_filename_prefix}}-v{searchdata_format_versi
 #      |                | 0b10 = 32b     |
 #  4b  |     1b         |       2b       |       1b
 #
+# Sharded search data
+# ===================
+#
+# For large projects the search data can be split into shards based on the
+# first one or two bytes of the lowercased search string, so only the shard
+# for what's being typed needs to be downloaded. Each shard is a standalone
+# file in the format above, containing the part of the trie starting with
+# given prefix and just the result map entries it references. Shard file names
+# have the prefix bytes appended in hex. What would be the search data file
+# then contains a manifest listing the available shards, with the fifth type
+# data bit set:
+#
+# magic | version | type | not  | symbol | shard  | shard |  max   | shard  | shard  |
+# 'MCS' | (0x03)  | data | used | count  | prefix | count | result |   1    |   2    | …
+#       |         |      |      |        | length |       | count  | prefix | prefix |
+#  24b  |   8b    |  8b  | 24b  |  32b   |  32b   |  32b  |  32b   |   …    |   …    |
+#
+# The shard prefixes are all (shard prefix length) bytes long, padded with
+# zero bytes at the end if shorter. Shards with a prefix shorter than the
+# shard prefix length are for search strings that are shorter than that, and
+# contain just the part of the trie needed to gather the first (max result
+# count) results. The search can't show more results than that for any search
+# string, otherwise it'd depend on the search string length.
+#
 # Trie encoding
 # =============
 #
+# Variable-length integers (varints) are stored in 7-bit groups, lowest group
+# first, with the highest bit set in all bytes except the last.
+#
 # Because child tries are serialized first, the trie containing the initial
-# characters is never the first, and instead the root offset points to it. If
-# result count < 128:
+# characters is never the first, and instead the root offset points to it. The
+# header has the result count in upper bits and the child count in lower four
+# bits. If the child count is 15 or more, the lower four bits are all set and
+# the rest of the count follows:
 #
-#  root  |   |         header       |      results     | children
-# offset | … | | result # | child # |         …        |  data
-#  32b   |   |0|    7b    |   8b    | n*RESULT_ID_BITS |    …
+#  root  |   |              header              |  child #  | children | results
+# offset | … | result # | shorter | child #     |  - 15     |   data   |  data
+#  32b   |   |  varint  | suffix  | 4b          | (varint)  |    …     |    …
+#        |   |          |   1b    |             |           |          |
 #
-# If result count > 127, it's instead this -- since entries with very large
-# number of results (such as python __init__()) are rather rare, it doesn't
-# make sense to have it globally configurable and then waste 8 bits in the
-# majority of cases. Note that the 15-bit value is stored as Big-Endian,
-# otherwise the leftmost bit couldn't be used to denote the size.
+# Children are always serialized before their parent, so instead of an
+# absolute offset each child stores the distance from the parent node offset,
+# with the lookahead barrier in the lowest bit:
 #
-#  root  |   |         header       |      results     | children
-# offset | … | | result # | child # |         …        |  data
-#  32b   |   |1| 15b (BE) |   8b    | n*RESULT_ID_BITS |    …
+# child 1 | child 2 |   |    child 1      |    child 2      |
+#  char   |  char   | … | distance + bar. | distance + bar. | …
+#   8b    |   8b    |   |     varint      |     varint      |
 #
-# Trie children data encoding, the barrier is stored in the topmost offset bit:
+# The result IDs are sorted and all except the first are stored as a
+# difference to the previous ID. The result map is ordered by relevance, so
+# this is also the order in which the results are shown:
 #
-# child 1 | child 2 |   |     child 1      |      child 2     |
-#  char   |  char   | … | barrier + offset | barrier + offset | …
-#   8b    |   8b    |   | FILE_OFFSET_BITS | FILE_OFFSET_BITS |
+#  result 1 | result 2 - result 1 | result 3 - result 2 |
+#   varint  |       varint        |       varint        | …
+#
+# Functions are added twice, the second time for searching with `()`
+# appended, which differs from the first only in the suffix length being two
+# characters shorter. Such entries aren't stored in the result map, the trie
+# references the original entry instead. If the "shorter suffix" bit is set in
+# the node header, each ID (difference) is shifted left by one and the lowest
+# bit is set if given result is shown with the suffix two characters shorter:
+#
+#       result 1       |  result 2 - result 1  |
+# ID | shorter suffix  | ID | shorter suffix   | …
+#       varint         |        varint         |
 #
 # Result map encoding
 # ===================
@@ -105,6 +161,13 @@ searchdata_filename_b85 = f'{{search_filename_prefix}}-v{searchdata_format_versi
 #      offsets       |       size       | flags |  data  |  data  | …
 # n*FILE_OFFSET_BITS | FILE_OFFSET_BITS | n*8b  |        |        |
 #
+# Runs of eight or more lowercase hexadecimal digits in URLs, which are
+# common in Doxygen anchors, are stored with two digits packed in a byte:
+#
+# \x01 | digit |   packed
+#      | count |   digits
+#  8b  |  8b   | count/2*8b
+#
 # Basic item data (flags & 0b11 == 0b00):
 #
 # name | \0 | URL
@@ -153,8 +216,10 @@ class Serializer:
     result_map_flag_bytes = 1
 
     header_struct = struct.Struct('<3sBBxxxIII')
+    manifest_max_results_struct = struct.Struct('<I')
     result_map_flags_struct = struct.Struct('<B')
     trie_root_offset_struct = struct.Struct('<I')
+    hex_run_re = re.compile(rb'[0-9a-f]{8,}')
     type_map_entry_struct = struct.Struct('<BB')
 
     def __init__(self, *, file_offset_bytes, result_id_bytes, name_size_bytes):
@@ -176,6 +241,18 @@ class Serializer:
             self.header_struct.size + trie_size,
             self.header_struct.size + trie_size + result_map_size)
 
+    def pack_manifest_header(self, symbol_count, shard_prefix_length, shard_count, max_results):
+        return self.header_struct.pack(b'MCS', searchdata_format_version,
+            (self.file_offset_bytes - 3) << 0 |
+            (self.result_id_bytes - 2) << 1 |
+            (self.name_size_bytes - 1) << 3 |
+            1 << 4,
+            symbol_count,
+            shard_prefix_length,
+            shard_count) + self.manifest_max_results_struct.pack(max_results)
+    def pack_manifest_shard_prefix(self, prefix: bytes, shard_prefix_length: int):
+        return prefix.ljust(shard_prefix_length, b'\0')
+
     def pack_result_map_flags(self, flags: int):
         return self.result_map_flags_struct.pack(flags)
     def pack_result_map_offset(self, offset: int):
@@ -193,6 +270,22 @@ class Serializer:
         if length >= 256**self.name_size_bytes:
             raise OverflowError("Result map suffix length too large to store in {} bits, set SEARCH_NAME_SIZE_BYTES = {} in your conf.py.".format(self.name_size_bytes*8, self.name_size_bytes + 1))
         return length.to_bytes(self.name_size_bytes, byteorder='little')
+    def pack_result_map_url(self, url: str):
+        assert '\x01' not in url
+
+        def pack_hex_run(match):
+            run = match.group(0)
+            out = bytearray()
+            # Odd digit count, the last one is stored unpacked. Each packed
+            # run can have at most 254 digits.
+            for i in range(0, len(run) & ~1, 254):
+                digits = run[i:i + min(254, (len(run) & ~1) - i)]
+                out += b'\x01' + bytes([len(digits)]) + bytes.fromhex(digits.decode('utf-8'))
+            if len(run) % 2:
+                out += run[-1:]
+            return bytes(out)
+
+        return self.hex_run_re.sub(pack_hex_run, url.encode('utf-8'))
     def pack_result_map_alias(self, id: int):
         if id >= 256**self.result_id_bytes:
             raise OverflowError("Result map alias ID too large to store in {} bits, set SEARCH_RESULT_ID_BYTES = {} in your conf.py.".format(self.result_id_bytes*8, self.result_id_bytes + 1))
@@ -200,28 +293,35 @@ class Serializer:
 
     def pack_trie_root_offset(self, offset: int):
         return self.trie_root_offset_struct.pack(offset)
-    def pack_trie_node(self, result_ids: List[int], child_chars_offsets_barriers: List[Tuple[int, int, bool]]):
+    def pack_varint(self, value: int):
+        assert value >= 0
         out = bytearray()
-        # If the result count fits into 7 bits, pack it into a single byte
-        if len(result_ids) < 128:
-            out += len(result_ids).to_bytes(1, byteorder='little')
-        # Otherwise use the leftmost bit to denote it's two-byte, and store the
-        # higher 8 bits in a second byte. Which is the same as storing the
-        # value as Big-Endian.
-        else:
-            assert len(result_ids) < 32768
-            out += (len(result_ids) | 0x8000).to_bytes(2, byteorder='big')
-        out += len(child_chars_offsets_barriers).to_bytes(1, byteorder='little')
-        for id in result_ids:
-            if id >= 256**self.result_id_bytes:
-                raise OverflowError("Trie result ID too large to store in {} bits, set SEARCH_RESULT_ID_BYTES = {} in your conf.py.".format(self.result_id_bytes*8, self.result_id_bytes + 1))
-            out += id.to_bytes(self.result_id_bytes, byteorder='little')
-        out += bytes([char for char, offset, barrier in child_chars_offsets_barriers])
-        child_barrier_mask = 1 << (self.file_offset_bytes*8 - 1)
-        for char, offset, barrier in child_chars_offsets_barriers:
-            if offset >= child_barrier_mask:
-                raise OverflowError("Trie child offset too large to store in {} bits, set SEARCH_FILE_OFFSET_BYTES = {} in your conf.py.".format(self.file_offset_bytes*8 - 1, self.file_offset_bytes + 1))
-            out += (offset | (barrier*child_barrier_mask)).to_bytes(self.file_offset_bytes, byteorder='little')
+        while value >= 0x80:
+            out.append(value & 0x7f | 0x80)
+            value >>= 7
+        out.append(value)
+        return out
+
+    # The node offset is needed to calculate distances to children. Result IDs
+    # are expected to be sorted. If shorter_suffix is not empty, it contains
+    # a flag for each result.
+    def pack_trie_node(self, offset: int, result_ids: List[int], child_chars_offsets_barriers: List[Tuple[int, int, bool]], shorter_suffix: List[bool] = []):
+        child_count = len(child_chars_offsets_barriers)
+        out = self.pack_varint(len(result_ids) << 5 | bool(shorter_suffix) << 4 | min(child_count, 15))
+        if child_count >= 15:
+            out += self.pack_varint(child_count - 15)
+        out += bytes([char for char, child_offset, barrier in child_chars_offsets_barriers])
+        for char, child_offset, barrier in child_chars_offsets_barriers:
+            assert child_offset < offset
+            out += self.pack_varint((offset - child_offset) << 1 | barrier)
+        previous = 0
+        for i, id in enumerate(result_ids):
+            assert id >= previous
+            if shorter_suffix:
+                out += self.pack_varint((id - previous) << 1 | shorter_suffix[i])
+            else:
+                out += self.pack_varint(id - previous)
+            previous = id
         return out
 
     def pack_type_map_entry(self, class_: int, offset: int):
@@ -248,10 +348,19 @@ class Deserializer:
             result_id_bytes=[2, 3, 4][(type_data & 0b0110) >> 1],
             name_size_bytes=[1, 2][(type_data & 0b1000) >> 3])
         out.symbol_count = symbol_count
+        # For a manifest the two offsets are shard prefix length and count
+        out.is_manifest = bool(type_data & 0b10000)
         out.map_offset = map_offset
         out.type_map_offset = type_map_offset
         return out
 
+    def unpack_manifest_max_results(self, serialized: bytes) -> int:
+        return Serializer.manifest_max_results_struct.unpack_from(serialized, Serializer.header_struct.size)[0]
+    def unpack_manifest_shard_prefixes(self, serialized: bytes) -> List[bytes]:
+        shard_prefix_length, shard_count = self.map_offset, self.type_map_offset
+        offset = Serializer.header_struct.size + Serializer.manifest_max_results_struct.size
+        return [serialized[offset + i*shard_prefix_length:offset + (i + 1)*shard_prefix_length].rstrip(b'\0') for i in range(shard_count)]
+
     # The last tuple item is number of bytes extracted
     def unpack_result_map_flags(self, serialized: bytes, offset: int) -> Tuple[int, int]:
         return Serializer.result_map_flags_struct.unpack_from(serialized, offset) + (Serializer.result_map_flags_struct.size, )
@@ -261,42 +370,75 @@ class Deserializer:
         return int.from_bytes(serialized[offset:offset + self.result_id_bytes], byteorder='little'), int.from_bytes(serialized[offset + self.result_id_bytes:offset + self.result_id_bytes + self.name_size_bytes], byteorder='little'), self.result_id_bytes + self.name_size_bytes
     def unpack_result_map_suffix_length(self, serialized: bytes, offset: int) -> Tuple[int, int]:
         return int.from_bytes(serialized[offset:offset + self.name_size_bytes], byteorder='little'), self.name_size_bytes
+    def unpack_result_map_url(self, packed: bytes) -> bytes:
+        out = bytearray()
+        i = 0
+        while i < len(packed):
+            if packed[i] == 0x01:
+                out += packed[i + 2:i + 2 + packed[i + 1]//2].hex().encode('utf-8')
+                i += 2 + packed[i + 1]//2
+            else:
+                out.append(packed[i])
+                i += 1
+        return bytes(out)
     def unpack_result_map_alias(self, serialized: bytes, offset: int) -> Tuple[int, int]:
         return int.from_bytes(serialized[offset:offset + self.result_id_bytes], byteorder='little'), self.result_id_bytes
 
     def unpack_trie_root_offset(self, serialized: bytes, offset: int) -> Tuple[int, int]:
         return Serializer.trie_root_offset_struct.unpack_from(serialized, offset) + (Serializer.trie_root_offset_struct.size, )
-    def unpack_trie_node(self, serialized: bytes, offset: int) -> Tuple[List[int], List[int], List[Tuple[int, int, bool]], int]:
+    def unpack_varint(self, serialized: bytes, offset: int) -> Tuple[int, int]:
+        value = 0
+        shift = 0
+        size = 0
+        while True:
+            byte = serialized[offset + size]
+            value |= (byte & 0x7f) << shift
+            size += 1
+            if not byte & 0x80: break
+            shift += 7
+        return value, size
+    # The second returned list is empty if the node has no results with a
+    # shorter suffix, otherwise it contains a flag for each result
+    def unpack_trie_node(self, serialized: bytes, offset: int) -> Tuple[List[int], List[bool], List[Tuple[int, int, bool]], int]:
         prev_offset = offset
-        # Result count, first try 8-bit, if it has the highest bit set, extract
-        # two bytes (as a BE) and then remove the highest bit
-        result_count = int.from_bytes(serialized[offset:offset + 1], byteorder='little')
-        if result_count & 0x80:
-            result_count = int.from_bytes(serialized[offset:offset + 2], byteorder='big') & ~0x8000
-            offset += 1
-        offset += 1
-        child_count = int.from_bytes(serialized[offset:offset + 1], byteorder='little')
-        offset += 1
-
-        # Unpack all result IDs
-        result_ids = []
-        for i in range(result_count):
-            result_ids += [int.from_bytes(serialized[offset:offset + self.result_id_bytes], byteorder='little')]
-            offset += self.result_id_bytes
+        # Result count, whether the results have a shorter suffix flag and
+        # child count, if there's 15 or more children the rest of the count
+        # follows
+        header, size = self.unpack_varint(serialized, offset)
+        offset += size
+        result_count = header >> 5
+        has_shorter_suffix = header & 0x10
+        child_count = header & 0x0f
+        if child_count == 15:
+            child_count_rest, size = self.unpack_varint(serialized, offset)
+            child_count += child_count_rest
+            offset += size
 
         # Unpack all child chars
         child_chars = list(serialized[offset:offset + child_count])
         offset += child_count
 
-        # Unpack all children offsets and lookahead barriers
+        # Unpack all children distances and lookahead barriers, convert the
+        # distances to absolute offsets
         child_chars_offsets_barriers = []
-        child_barrier_mask = 1 << (self.file_offset_bytes*8 - 1)
         for i in range(child_count):
-            child_offset_barrier = int.from_bytes(serialized[offset:offset + self.file_offset_bytes], byteorder='little')
-            child_chars_offsets_barriers += [(child_chars[i], child_offset_barrier & ~child_barrier_mask, bool(child_offset_barrier & child_barrier_mask))]
-            offset += self.file_offset_bytes
+            child_distance_barrier, size = self.unpack_varint(serialized, offset)
+            child_chars_offsets_barriers += [(child_chars[i], prev_offset - (child_distance_barrier >> 1), bool(child_distance_barrier & 1))]
+            offset += size
 
-        return result_ids, child_chars_offsets_barriers, offset - prev_offset
+        # Unpack all result IDs, all except the first are deltas, optionally
+        # with the shorter suffix flag in the lowest bit
+        result_ids = []
+        shorter_suffix = []
+        for i in range(result_count):
+            delta, size = self.unpack_varint(serialized, offset)
+            if has_shorter_suffix:
+                shorter_suffix += [bool(delta & 1)]
+                delta >>= 1
+            result_ids += [(result_ids[-1] if result_ids else 0) + delta]
+            offset += size
+
+        return result_ids, shorter_suffix, child_chars_offsets_barriers, offset - prev_offset
 
     def unpack_type_map_entry(self, serialized: bytes, offset: int) -> Tuple[int, int, int]:
         return Serializer.type_map_entry_struct.unpack_from(serialized, offset) + (Serializer.type_map_entry_struct.size, )
@@ -351,92 +493,166 @@ class ResultFlag(enum.Flag):
     _TYPE14 = 14 << 4
     _TYPE15 = 15 << 4
 
+# Finds an entry with the longest URL prefix shared with given URL among a
+# fixed set of result map entries, picking the one with the smallest index if
+# there's more. The URLs are sorted, so the longest shared prefix is always
+# with one of the neighbors of the queried URL, and entries sharing it then
+# form a contiguous range. Smallest index in it is looked up in a sparse table
+# of minimums of all power-of-two sized ranges.
+class _UrlPrefixLookup:
+    def __init__(self, entries, indices: List[int]):
+        self.keys = sorted((entries[i].url, i) for i in indices)
+        self.urls = [url for url, _ in self.keys]
+        self.min_indices = [[i for _, i in self.keys]]
+        size = 1
+        while 2*size <= len(self.keys):
+            self.min_indices += [list(map(min, self.min_indices[-1], self.min_indices[-1][size:]))]
+            size *= 2
+
+    def _min_index(self, begin, end):
+        level = (end - begin).bit_length() - 1
+        return min(self.min_indices[level][begin], self.min_indices[level][end - (1 << level)])
+
+    # Returns a (index, prefix length) tuple. If `index` is among the entries,
+    # it's skipped.
+    def find(self, url: str, index: int) -> Tuple[int, int]:
+        position = bisect.bisect_left(self.keys, (url, index))
+        if position < len(self.keys) and self.keys[position][1] == index:
+            skip = position
+            neighbors = [position - 1, position + 1]
+        else:
+            skip = None
+            neighbors = [position - 1, position]
+
+        prefix_length = -1
+        for neighbor in neighbors:
+            if neighbor < 0 or neighbor >= len(self.urls): continue
+            other = self.urls[neighbor]
+            length = 0
+            for a, b in zip(url, other):
+                if a != b: break
+                length += 1
+            prefix_length = max(prefix_length, length)
+
+        # Expect we found something
+        assert prefix_length != -1
+
+        # Range of all URLs starting with the prefix
+        prefix = url[:prefix_length]
+        begin = bisect.bisect_left(self.urls, prefix)
+        end_min = begin
+        end_max = len(self.urls)
+        while end_min < end_max:
+            middle = (end_min + end_max)//2
+            if self.urls[middle].startswith(prefix):
+                end_min = middle + 1
+            else:
+                end_max = middle
+        end = end_min
+
+        # Pick the smallest index in the range, except for the skipped entry
+        if skip is None:
+            return self._min_index(begin, end), prefix_length
+        candidates = []
+        if begin != skip: candidates += [self._min_index(begin, skip)]
+        if skip + 1 != end: candidates += [self._min_index(skip + 1, end)]
+        return min(candidates), prefix_length
+
+# A symbol collected by doxygen.py and python.py for the search data. There
+# can be hundreds of thousands of them in large projects, so these use
+# __slots__ instead of a SimpleNamespace to not have a __dict__ for each.
+# Attributes that are optional for given result type (keywords, params,
+# suffix) are not set at all, check with hasattr().
+class SearchResult:
+    __slots__ = ['flags', 'url', 'prefix', 'name', 'keywords', 'params', 'suffix']
+
+class _ResultMapEntry:
+    __slots__ = ['name', 'url', 'flags', 'alias', 'prefix', 'prefix_length', 'suffix_length']
+
+    def __init__(self, name, url, flags, alias, prefix, prefix_length, suffix_length):
+        self.name = name
+        self.url = url
+        self.flags = flags
+        self.alias = alias
+        self.prefix = prefix
+        self.prefix_length = prefix_length
+        self.suffix_length = suffix_length
+
 class ResultMap:
     def __init__(self):
-        self.entries = []
+        self.entries: List[_ResultMapEntry] = []
 
     def add(self, name, url, alias=None, suffix_length=0, flags=ResultFlag(0)) -> int:
         if suffix_length: flags |= ResultFlag.HAS_SUFFIX
         if alias is not None:
             assert flags & ResultFlag._TYPE == ResultFlag.ALIAS
 
-        entry = Empty()
-        entry.name = name
-        entry.url = url
-        entry.flags = flags
-        entry.alias = alias
-        entry.prefix = 0
-        entry.prefix_length = 0
-        entry.suffix_length = suffix_length
-
-        self.entries += [entry]
+        self.entries += [_ResultMapEntry(name, url, flags, alias, 0, 0, suffix_length)]
         return len(self.entries) - 1
 
     def serialize(self, serializer: Serializer, merge_prefixes=True) -> bytearray:
         if merge_prefixes:
-            # Put all entry names into a trie to discover common prefixes
+            # Put all entry names into a trie to discover common prefixes. For
+            # each node with results, remember the largest suffix length of
+            # them.
             trie = Trie()
+            nodes = []
+            max_suffix_length = {}
             for index, e in enumerate(self.entries):
-                trie.insert(e.name, index)
+                node = trie.insert(e.name, index)
+                nodes += [node]
+                max_suffix_length[node] = max(max_suffix_length.get(node, 0), e.suffix_length)
+
+            # For every node, the nearest ancestor that has some results,
+            # which is the longest name prefix that's fully contained in some
+            # other entry
+            nearest_with_results = trie.nearest_ancestors_with_results()
+
+            # Lookup of the longest URL prefix among results of given node,
+            # created on-demand
+            url_lookups = {}
 
             # Create a new list with merged prefixes
             merged = []
             for index, e in enumerate(self.entries):
-                # Search in the trie and get the longest shared name prefix
-                # that is already fully contained in some other entry
-                current = trie
-                longest_prefix = None
-                for c in e.name.encode('utf-8'):
-                    for candidate, child in current.children.items():
-                        if c == candidate:
-                            current = child[1]
-                            break
-                    else: assert False # pragma: no cover
-
-                    # Allow self-reference only when referenced result suffix
-                    # is longer (otherwise cycles happen). This is for
-                    # functions that should appear when searching for foo (so
-                    # they get ordered properly based on the name length) and
-                    # also when searching for foo() (so everything that's not
-                    # a function gets filtered out). Such entries are
-                    # completely the same except for a different suffix length.
-                    if index in current.results:
-                        for i in current.results:
-                            if self.entries[i].suffix_length > self.entries[index].suffix_length:
-                                longest_prefix = current
-                                break
-                    elif current.results:
-                        longest_prefix = current
+                # Get the longest shared name prefix that is already fully
+                # contained in some other entry. Allow self-reference only
+                # when referenced result suffix is longer (otherwise cycles
+                # happen). This is for functions that should appear when
+                # searching for foo (so they get ordered properly based on the
+                # name length) and also when searching for foo() (so
+                # everything that's not a function gets filtered out). Such
+                # entries are completely the same except for a different
+                # suffix length.
+                node = nodes[index]
+                if node == trie.root:
+                    longest_prefix = None
+                elif max_suffix_length[node] > e.suffix_length:
+                    longest_prefix = node
+                elif nearest_with_results[node] != -1:
+                    longest_prefix = nearest_with_results[node]
+                else:
+                    longest_prefix = None
 
                 # Name prefix found, for all possible URLs find the one that
                 # shares the longest prefix
-                if longest_prefix:
-                    max_prefix = (0, -1)
-                    for longest_index in longest_prefix.results:
-                        # Ignore self (function self-reference, see above)
-                        if longest_index == index: continue
-
-                        prefix_length = 0
-                        for i in range(min(len(e.url), len(self.entries[longest_index].url))):
-                            if e.url[i] != self.entries[longest_index].url[i]: break
-                            prefix_length += 1
-                        if max_prefix[1] < prefix_length:
-                            max_prefix = (longest_index, prefix_length)
-
-                    # Expect we found something
-                    assert max_prefix[1] != -1
+                if longest_prefix is not None:
+                    if longest_prefix not in url_lookups:
+                        url_lookups[longest_prefix] = _UrlPrefixLookup(self.entries, trie.results(longest_prefix))
+                    # Ignore self (function self-reference, see above)
+                    max_prefix = url_lookups[longest_prefix].find(e.url, index)
 
                     # Save the entry with reference to the prefix
-                    entry = Empty()
-                    assert e.name.startswith(self.entries[longest_prefix.results[0]].name)
-                    entry.name = e.name[len(self.entries[longest_prefix.results[0]].name):]
-                    entry.url = e.url[max_prefix[1]:]
-                    entry.flags = e.flags|ResultFlag.HAS_PREFIX
-                    entry.alias = e.alias
-                    entry.prefix = max_prefix[0]
-                    entry.prefix_length = max_prefix[1]
-                    entry.suffix_length = e.suffix_length
-                    merged += [entry]
+                    prefix_name = self.entries[trie.results(longest_prefix)[0]].name
+                    assert e.name.startswith(prefix_name)
+                    merged += [_ResultMapEntry(
+                        e.name[len(prefix_name):],
+                        e.url[max_prefix[1]:],
+                        e.flags|ResultFlag.HAS_PREFIX,
+                        e.alias,
+                        max_prefix[0],
+                        max_prefix[1],
+                        e.suffix_length)]
 
                 # No prefix found, copy the entry verbatim
                 else: merged += [e]
@@ -448,7 +664,8 @@ class ResultMap:
         # (aligned) flag array and (aligned) offset + file size array.
         output = bytearray()
         offset = len(self.entries)*serializer.result_map_flag_bytes + (len(self.entries) + 1)*serializer.file_offset_bytes
-        for e in self.entries:
+        urls = [serializer.pack_result_map_url(e.url) for e in self.entries]
+        for e, url in zip(self.entries, urls):
             output += serializer.pack_result_map_offset(offset)
 
             # The entry is an alias, extra field for alias index
@@ -469,7 +686,7 @@ class ResultMap:
             # Length of the URL and 0-delimiter. If URL is empty, it's not
             # added at all, then the 0-delimiter is also not needed.
             if e.name and e.url:
-                 offset += len(e.url.encode('utf-8')) + 1
+                 offset += len(url) + 1
 
         # Write file size
         output += serializer.pack_result_map_offset(offset)
@@ -479,7 +696,7 @@ class ResultMap:
             output += serializer.pack_result_map_flags(e.flags.value)
 
         # Write the entries themselves
-        for e in self.entries:
+        for e, url in zip(self.entries, urls):
             if e.flags & ResultFlag._TYPE == ResultFlag.ALIAS:
                 assert not e.alias is None
                 assert not e.url
@@ -491,95 +708,187 @@ class ResultMap:
             output += e.name.encode('utf-8')
             if e.url:
                 output += b'\0'
-                output += e.url.encode('utf-8')
+                output += url
 
         assert len(output) == offset
         return output
 
+# The trie is stored in flat arrays indexed by node ID instead of having a
+# Python object (plus a dict of children, plus a tuple for each child) for
+# every node, as with all suffixes of all symbols inserted it has several
+# millions of nodes for larger projects. Node 0 is the root, a lookup of a
+# child for given character is done through a single dict keyed by parent ID
+# and the character. Children are always created after their parents and
+# after their earlier siblings, so ordering nodes by ID gives the order in
+# which they were added, which is also the order in which they get serialized.
 class Trie:
+    root = 0
+
     def __init__(self):
-        self.results = []
-        self.children = {}
-
-    def _insert(self, path: bytes, result: Union[int, List[int]], lookahead_barriers):
-        if not path:
-            # Inserting a list is mainly used by the
-            # TrieSerialization.test_23bit_file_offset_too_small() test, as
-            # otherwise it'd be WAY too slow.
-            # TODO this whole thing needs optimizing with less recursion
-            if type(result) is list:
-                self.results += result
-            else:
-                self.results += [result]
-            return
-
-        char = path[0]
-        if not char in self.children:
-            self.children[char] = (False, Trie())
-        if lookahead_barriers and lookahead_barriers[0] == 0:
-            lookahead_barriers = lookahead_barriers[1:]
-            self.children[char] = (True, self.children[char][1])
-        self.children[char][1]._insert(path[1:], result, [b - 1 for b in lookahead_barriers])
-
-    def insert(self, path: str, result: Union[int, List[int]], lookahead_barriers=[]):
-        self._insert(path.encode('utf-8'), result, lookahead_barriers)
-
-    def _sort(self, key):
-        self.results.sort(key=key)
-        for _, child in self.children.items():
-            child[1]._sort(key)
-
-    def sort(self, result_map: ResultMap):
-        # What the shit, why can't I just take two elements and say which one
-        # is in front of which, this is awful
-        def key(item: int):
-            entry = result_map.entries[item]
-            return [
-                # First order based on deprecation/deletion status, deprecated
-                # always last, deleted in front of them, usable stuff on top
-                2 if entry.flags & ResultFlag.DEPRECATED else 1 if entry.flags & ResultFlag.DELETED else 0,
-
-                # Second order based on type (pages, then namespaces/classes,
-                # later functions, values last)
-                (entry.flags & ResultFlag._TYPE).value,
-
-                # Third on suffix length (shortest first)
-                entry.suffix_length,
-
-                # Lastly on full name length (or prefix length, also shortest
-                # first)
-                len(entry.name)
-            ]
-
-        self._sort(key)
-
-    # Returns offset of the serialized thing in `output`
-    def _serialize(self, serializer: Serializer, hashtable, output: bytearray, merge_subtrees) -> int:
-        # Serialize all children first
-        child_chars_offsets_barriers = []
-        for char, child in self.children.items():
-            offset = child[1]._serialize(serializer, hashtable, output, merge_subtrees=merge_subtrees)
-            child_chars_offsets_barriers += [(char, offset, child[0])]
-
-        # Serialize this node
-        serialized = serializer.pack_trie_node(self.results, child_chars_offsets_barriers)
-
-        # Subtree merging: if this exact tree is already in the table, return
-        # its offset. Otherwise add it and return the new offset.
-        # TODO: why hashable = bytes(output[base_offset:] + serialized) didn't work?
-        hashable = bytes(serialized)
-        if merge_subtrees and hashable in hashtable:
-            return hashtable[hashable]
+        # Parent of given node, character on the edge leading to it and
+        # whether there's a lookahead barrier on that edge
+        self._parents = array.array('l', [-1])
+        self._chars = bytearray(1)
+        self._barriers = bytearray(1)
+        # (parent << 8)|char -> child
+        self._edges = {}
+        # Result lists, only for nodes that have some
+        self._results = {}
+
+    def _add_child(self, node: int, char: int) -> int:
+        child = len(self._parents)
+        self._parents.append(node)
+        self._chars.append(char)
+        self._barriers.append(0)
+        self._edges[node << 8|char] = child
+        return child
+
+    # Lookahead barriers are byte positions in the path, the edge for given
+    # character gets marked with a barrier. The positions are expected to be
+    # sorted. Returns ID of the node the result got inserted to.
+    def insert(self, path: str, result: Union[int, List[int]], lookahead_barriers=[]) -> int:
+        edges = self._edges
+        node = self.root
+        next_barrier = 0
+        for i, char in enumerate(path.encode('utf-8')):
+            child = edges.get(node << 8|char)
+            if child is None:
+                child = self._add_child(node, char)
+            if next_barrier < len(lookahead_barriers) and lookahead_barriers[next_barrier] == i:
+                self._barriers[child] = 1
+                next_barrier += 1
+            node = child
+
+        results = self._results.setdefault(node, [])
+        # Inserting a list is mainly used by tests that need a lot of results
+        # in a single node, as otherwise it'd be WAY too slow.
+        if type(result) is list:
+            results += result
         else:
-            offset = len(output)
-            output += serialized
-            if merge_subtrees: hashtable[hashable] = offset
-            return offset
+            results += [result]
+        return node
+
+    # Child of given node for given character, None if there's no such child
+    def child(self, node: int, char: int) -> int:
+        return self._edges.get(node << 8|char)
+
+    def results(self, node: int) -> List[int]:
+        return self._results.get(node, [])
+
+    # For every node returns the nearest ancestor other than the root that has
+    # some results, or -1 if there's no such ancestor
+    def nearest_ancestors_with_results(self) -> List[int]:
+        nearest = [-1]*len(self._parents)
+        for node in range(1, len(self._parents)):
+            parent = self._parents[node]
+            nearest[node] = parent if parent != self.root and parent in self._results else nearest[parent]
+        return nearest
+
+    # Gathers children of all nodes into a single array, ordered by parent and
+    # then by ID. Children of node i are then in
+    # children[children_begin[i]:children_begin[i + 1]].
+    def _children(self) -> Tuple[List[int], List[int]]:
+        parents = self._parents
+        children = sorted(range(1, len(parents)), key=parents.__getitem__)
+        children_count = collections.Counter(itertools.islice(parents, 1, None))
+        children_begin = [0] + list(itertools.accumulate(map(children_count.__getitem__, range(len(parents)))))
+        return children, children_begin
+
+    # Creates a new trie containing the path to given node and the whole
+    # subtree under it. If max_results is set, only nodes that a breadth-first
+    # result gathering starting at given node would go through before
+    # collecting max_results results are included with their results and
+    # children, their other children are included without any. The results are
+    # kept as-is.
+    def extract(self, node: int, max_results=None, children=None) -> 'Trie':
+        if children is None: children = self._children()
+        children, children_begin = children
+        chars = self._chars
+        barriers = self._barriers
+        out = Trie()
+
+        # The path to the node first
+        path = []
+        parent = node
+        while parent != self.root:
+            path += [parent]
+            parent = self._parents[parent]
+        new_node = out.root
+        for parent in reversed(path):
+            new_node = out._add_child(new_node, chars[parent])
+            out._barriers[new_node] = barriers[parent]
+
+        # Then the subtree, in the same order as in search.js, so the children
+        # get the same relative order as in the original. Nodes that are
+        # queued but never reached when max_results is set are kept as leaves.
+        result_count = 0
+        queue = collections.deque([(node, new_node)])
+        while queue:
+            node, new_node = queue.popleft()
+            if node in self._results:
+                out._results[new_node] = list(self._results[node])
+                result_count += len(self._results[node])
+            for child in children[children_begin[node]:children_begin[node + 1]]:
+                new_child = out._add_child(new_node, chars[child])
+                out._barriers[new_child] = barriers[child]
+                if max_results is None or (result_count < max_results and not barriers[child]):
+                    queue.append((child, new_child))
+            if max_results is not None and result_count >= max_results:
+                break
+
+        return out
 
-    def serialize(self, serializer: Serializer, merge_subtrees=True) -> bytearray:
+    # If result_ids is set, results are remapped through it. Results in each
+    # node are stored sorted by ID.
+    # Results that are in shorter_suffix_variants are serialized as references
+    # to results they're variants of, see the format description above for
+    # details.
+    def serialize(self, serializer: Serializer, merge_subtrees=True, result_ids: List[int] = None, shorter_suffix_variants: Dict[int, int] = {}) -> bytearray:
         output = bytearray(b'\x00\x00\x00\x00')
         hashtable = {}
-        output[0:4] = serializer.pack_trie_root_offset(self._serialize(serializer, hashtable, output, merge_subtrees=merge_subtrees))
+        offsets = [0]*len(self._parents)
+
+        children, children_begin = self._children()
+
+        # Children are serialized first, in order, then the node itself. The
+        # trie can be deeper than the recursion limit, so instead of a
+        # recursive traversal this makes a pre-order with children visited
+        # in reverse, which reversed is the desired post-order.
+        order = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            order += [node]
+            stack += children[children_begin[node]:children_begin[node + 1]]
+        order.reverse()
+
+        chars = self._chars
+        barriers = self._barriers
+        results = self._results
+        for node in order:
+            node_results = sorted((shorter_suffix_variants.get(result, result), result in shorter_suffix_variants) for result in results.get(node, []))
+            if result_ids is not None:
+                node_results = sorted((result_ids[result], shorter_suffix) for result, shorter_suffix in node_results)
+            shorter_suffix = [shorter_suffix for _, shorter_suffix in node_results] if any(shorter_suffix for _, shorter_suffix in node_results) else []
+            node_results = [result for result, _ in node_results]
+            node_children = [(chars[child], offsets[child], barriers[child]) for child in children[children_begin[node]:children_begin[node + 1]]]
+
+            # Subtree merging: if this exact tree is already in the table, use
+            # its offset. Otherwise add it and remember the new offset. The
+            # serialized node depends on its own offset, so the table is keyed
+            # by the node contents instead.
+            if merge_subtrees:
+                key = (tuple(node_results), tuple(shorter_suffix), tuple(node_children))
+                offset = hashtable.get(key)
+                if offset is None:
+                    offset = hashtable[key] = len(output)
+                    output += serializer.pack_trie_node(offset, node_results, node_children, shorter_suffix)
+            else:
+                offset = len(output)
+                output += serializer.pack_trie_node(offset, node_results, node_children, shorter_suffix)
+            offsets[node] = offset
+
+        output[0:4] = serializer.pack_trie_root_offset(offsets[self.root])
         return output
 
 def serialize_type_map(serializer: Serializer, map: List[Tuple[CssClass, str]]) -> bytearray:
@@ -603,18 +912,436 @@ def serialize_type_map(serializer: Serializer, map: List[Tuple[CssClass, str]])
 
     return serialized + names
 
+# The order in which results for a single trie node are shown
+def _result_sort_key(entry):
+    return [
+        # First order based on deprecation/deletion status, deprecated always
+        # last, deleted in front of them, usable stuff on top
+        2 if entry.flags & ResultFlag.DEPRECATED else 1 if entry.flags & ResultFlag.DELETED else 0,
+
+        # Second order based on type (pages, then namespaces/classes, later
+        # functions, values last)
+        (entry.flags & ResultFlag._TYPE).value,
+
+        # Third on suffix length (shortest first)
+        entry.suffix_length,
+
+        # Lastly on full name length (or prefix length, also shortest first)
+        len(entry.name)
+    ]
+
+# Entries that are the same as some other entry except for the suffix length
+# being two chars shorter, such as functions added for searching with () at
+# the end, mapped to that other entry. Entries that are such a variant
+# themselves aren't considered, as the variants aren't stored.
+def _shorter_suffix_variants(entries: List[_ResultMapEntry]) -> Dict[int, int]:
+    def key(e: _ResultMapEntry, suffix_length):
+        return e.name, e.url, e.flags & ~ResultFlag.HAS_SUFFIX, e.alias, suffix_length
+
+    entries_by_key = {}
+    for index, e in enumerate(entries):
+        entries_by_key.setdefault(key(e, e.suffix_length), index)
+
+    variants = {}
+    for index, e in enumerate(entries):
+        original = entries_by_key.get(key(e, e.suffix_length + 2))
+        if original is not None:
+            variants[index] = original
+    return {index: original for index, original in variants.items() if original not in variants}
+
 def serialize_search_data(serializer: Serializer, trie: Trie, map: ResultMap, type_map: List[Tuple[CssClass, str]], symbol_count, *, merge_subtrees=True, merge_prefixes=True) -> bytearray:
-    serialized_trie = trie.serialize(serializer, merge_subtrees=merge_subtrees)
-    serialized_map = map.serialize(serializer, merge_prefixes=merge_prefixes)
+    # Trie nodes reference shorter suffix variants of other results through
+    # those, so the variants need to be kept in the map only if aliased
+    variants = _shorter_suffix_variants(map.entries)
+    aliased = set(e.alias for e in map.entries if e.alias is not None)
+
+    # Results in trie nodes are stored sorted by ID, so renumber the result map
+    # to have them ordered by relevance. Entries that compare equal stay in
+    # the original order. Shorter suffix variants are thus ordered as the
+    # entries they reference.
+    order = sorted((index for index in range(len(map.entries)) if index not in variants or index in aliased), key=lambda index: _result_sort_key(map.entries[index]))
+    result_ids = [None]*len(map.entries)
+    for i, index in enumerate(order):
+        result_ids[index] = i
+    sorted_map = ResultMap()
+    for index in order:
+        entry = map.entries[index]
+        sorted_map.add(entry.name, entry.url, alias=None if entry.alias is None else result_ids[entry.alias], suffix_length=entry.suffix_length, flags=entry.flags)
+
+    serialized_trie = trie.serialize(serializer, merge_subtrees=merge_subtrees, result_ids=result_ids, shorter_suffix_variants=variants)
+    serialized_map = sorted_map.serialize(serializer, merge_prefixes=merge_prefixes)
     serialized_type_map = serialize_type_map(serializer, type_map)
 
     preamble = serializer.pack_header(symbol_count, len(serialized_trie), len(serialized_map))
     return preamble + serialized_trie + serialized_map + serialized_type_map
 
-def base85encode_search_data(data: bytearray) -> bytearray:
+# Splits the search data into shards based on the first shard_prefix_length
+# bytes of the search string, returns the manifest and a list of shard prefixes
+# and corresponding shard data. Each shard contains only the result map entries
+# referenced from its trie, renumbered. For search strings shorter than
+# shard_prefix_length there are additional shards containing only what's
+# needed to gather the first short_query_max_results results. The limit is
+# recorded in the manifest and search.js doesn't show more results than that
+# for sharded data.
+def serialize_search_data_sharded(serializer: Serializer, trie: Trie, map: ResultMap, type_map: List[Tuple[CssClass, str]], symbol_count, *, shard_prefix_length, short_query_max_results=100, merge_subtrees=True, merge_prefixes=True) -> Tuple[bytearray, List[Tuple[bytes, bytearray]]]:
+    assert shard_prefix_length in [1, 2]
+
+    children = trie._children()
+
+    # Find all nodes up to shard prefix length deep, together with their paths
+    shard_roots = []
+    nodes = [(trie.root, b'')]
+    for depth in range(shard_prefix_length):
+        next_nodes = []
+        for node, prefix in nodes:
+            for child in children[0][children[1][node]:children[1][node + 1]]:
+                next_nodes += [(child, prefix + bytes([trie._chars[child]]))]
+        nodes = next_nodes
+        shard_roots += nodes
+
+    shards = []
+    for node, prefix in sorted(shard_roots, key=lambda shard: shard[1]):
+        shard_trie = trie.extract(node, max_results=None if len(prefix) == shard_prefix_length else short_query_max_results, children=children)
+
+        # Gather all referenced results and what they alias, renumber them in
+        # the original order
+        used = set()
+        for results in shard_trie._results.values():
+            used.update(results)
+        for index in list(used):
+            while map.entries[index].alias is not None:
+                index = map.entries[index].alias
+                used.add(index)
+        indices = sorted(used)
+        remap = {index: i for i, index in enumerate(indices)}
+
+        shard_map = ResultMap()
+        for index in indices:
+            entry = map.entries[index]
+            shard_map.add(entry.name, entry.url, alias=None if entry.alias is None else remap[entry.alias], suffix_length=entry.suffix_length, flags=entry.flags)
+        for results in shard_trie._results.values():
+            results[:] = [remap[index] for index in results]
+
+        shards += [(prefix, serialize_search_data(serializer, shard_trie, shard_map, type_map, len(indices), merge_subtrees=merge_subtrees, merge_prefixes=merge_prefixes))]
+
+    manifest = serializer.pack_manifest_header(symbol_count, shard_prefix_length, len(shards), short_query_max_results)
+    for prefix, _ in shards:
+        manifest += serializer.pack_manifest_shard_prefix(prefix, shard_prefix_length)
+    return manifest, shards
+
+# If shard is set, the data are a shard with given (hex) prefix
+def base85encode_search_data(data: bytearray, shard: str = None) -> bytearray:
+    if shard is not None:
+        return (b"/* Generated by https://mcss.mosra.cz/documentation/doxygen/. Do not edit. */\n" +
+                b"Search.loadShard('" + shard.encode('utf-8') + b"', '" + base64.b85encode(data, True) + b"');\n")
     return (b"/* Generated by https://mcss.mosra.cz/documentation/doxygen/. Do not edit. */\n" +
             b"Search.load('" + base64.b85encode(data, True) + b"');\n")
 
+# Queries serialized search data the same way as Search.search() in search.js
+# does, including lookahead barriers, alias resolution and result ordering.
+# Binary files are memory-mapped and accessed without copying, base85-encoded
+# files get decoded into memory. For a sharded manifest, shards are loaded on
+# demand from files next to it. Alternatively it can be constructed directly
+# from the data, with shards passed as a hex prefix -> data dict.
+class SearchIndex:
+    base85_re = re.compile(r"Search\.load(?:Shard)?\((?:'([0-9a-f]*)', )?'([^']*)'\);")
+
+    def __init__(self, path_or_data: Union[str, bytes], *, shards=None, max_results=None):
+        self.max_results = max_results or 100
+        self._path = None
+        self._mmaps = []
+        if isinstance(path_or_data, (bytes, bytearray, memoryview)):
+            data = memoryview(path_or_data)
+        else:
+            self._path = path_or_data
+            data = self._open(path_or_data)
+
+        deserializer = self._deserializer(data)
+        self.symbol_count = deserializer.symbol_count
+        self.data_size = len(data)
+        if deserializer.is_manifest:
+            # Shards for short search strings have only as many results as
+            # the data were generated with, don't show more for longer ones
+            # either. Same as in search.js, that's also the default.
+            manifest_max_results = deserializer.unpack_manifest_max_results(data)
+            if not max_results:
+                self.max_results = manifest_max_results
+            elif max_results > manifest_max_results:
+                logging.warning("sharded search data have at most %s results, limiting to that", manifest_max_results)
+                self.max_results = manifest_max_results
+            self.shard_prefix_length = deserializer.map_offset
+            self._shards = {prefix.hex(): None for prefix in deserializer.unpack_manifest_shard_prefixes(bytes(data))}
+            for prefix, shard in (shards or {}).items():
+                self._shards[prefix] = self._parse(memoryview(shard))
+            self._data = None
+        else:
+            self.shard_prefix_length = 0
+            self._shards = None
+            self._data = self._parse(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        # Views into the mapped memory have to be released first
+        self._data = None
+        self._shards = None
+        for mm in self._mmaps:
+            mm.close()
+        self._mmaps = []
+
+    def _open(self, path) -> memoryview:
+        if path.endswith('.js'):
+            with open(path, 'r', encoding='utf-8') as f:
+                match = self.base85_re.search(f.read())
+            if not match:
+                raise ValueError("{} doesn't contain base85-encoded search data".format(path))
+            data = memoryview(base64.b85decode(match.group(2)))
+            self._check(path, data)
+            return data
+
+        # Plain base85 without the JS wrapper, used by tests
+        if path.endswith('.b85'):
+            with open(path, 'rb') as f:
+                data = memoryview(base64.b85decode(f.read()))
+            self._check(path, data)
+            return data
+
+        with open(path, 'rb') as f:
+            # Check the header before mapping the file, mmap() fails with a
+            # rather cryptic error for empty files and a truncated file would
+            # only fail later when accessing the data
+            self._check(path, memoryview(f.read(Serializer.header_struct.size)), os.fstat(f.fileno()).st_size)
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mmaps += [mm]
+        return memoryview(mm)
+
+    # Same as _deserializer(), but with the file path in the error message
+    def _check(self, path, data: memoryview, size: int = None):
+        try:
+            self._deserializer(data, size)
+        except ValueError as e:
+            raise ValueError("{}: {}".format(path, e)) from None
+
+    # The size is passed separately when only the header is read from a file
+    def _deserializer(self, data: memoryview, size: int = None) -> Deserializer:
+        if size is None: size = len(data)
+        if size < Serializer.header_struct.size:
+            raise ValueError("search data too short, expected at least {} bytes but got {}".format(Serializer.header_struct.size, size))
+        if bytes(data[0:3]) != b'MCS':
+            raise ValueError("invalid search data signature")
+        if data[3] != searchdata_format_version:
+            raise ValueError("unsupported search data version {}, expected {}".format(data[3], searchdata_format_version))
+        deserializer = Deserializer.from_serialized(data)
+        # For a manifest the offsets are shard prefix length and count
+        if deserializer.is_manifest:
+            expected_size = Serializer.header_struct.size + Serializer.manifest_max_results_struct.size + deserializer.map_offset*deserializer.type_map_offset
+        else:
+            expected_size = max(deserializer.map_offset, deserializer.type_map_offset)
+        if size < expected_size:
+            raise ValueError("truncated search data, expected at least {} bytes but got {}".format(expected_size, size))
+        return deserializer
+
+    def _parse(self, data: memoryview):
+        out = Empty()
+        out.deserializer = self._deserializer(data)
+        out.trie = data[Serializer.header_struct.size:out.deserializer.map_offset]
+        out.map = data[out.deserializer.map_offset:out.deserializer.type_map_offset]
+        out.type_map = data[out.deserializer.type_map_offset:]
+        out.root = out.deserializer.unpack_trie_root_offset(out.trie, 0)[0]
+        # Offset of the first result map item is after N + 1 offsets and N
+        # flags, calculate flag offset from that
+        file_offset_bytes = out.deserializer.file_offset_bytes
+        out.map_flags_offset = file_offset_bytes*((out.deserializer.unpack_result_map_offset(out.map, 0)[0] - file_offset_bytes)//(file_offset_bytes + Serializer.result_map_flag_bytes) + 1)
+        return out
+
+    # Returns data for a shard matching given UTF-8 search string, loading
+    # it if needed, or None if there's no such shard
+    def _shard(self, search: bytes):
+        for prefix in [search[:self.shard_prefix_length], search.rstrip()[:self.shard_prefix_length]]:
+            prefix = prefix.hex()
+            if not prefix or prefix not in self._shards: continue
+            if self._shards[prefix] is None:
+                if self._path is None:
+                    raise KeyError("search data shard {} not available".format(prefix))
+                # Shard filenames have the prefix appended before the
+                # extension
+                base, _, extension = self._path.rpartition('.')
+                self._shards[prefix] = self._parse(self._open('{}-{}.{}'.format(base, prefix, extension)))
+            return self._shards[prefix]
+        return None
+
+    # Returns result count, whether the results have a shorter suffix flag,
+    # child count and offset of the child chars for a trie node
+    def _children(self, data, offset: int) -> Tuple[int, bool, int, int]:
+        deserializer = data.deserializer
+        header, size = deserializer.unpack_varint(data.trie, offset)
+        child_count = header & 0x0f
+        child_offset = offset + size
+        if child_count == 15:
+            child_count_rest, size = deserializer.unpack_varint(data.trie, child_offset)
+            child_count += child_count_rest
+            child_offset += size
+        return header >> 5, header & 0x10, child_count, child_offset
+
+    def _gather_result(self, data, index: int, suffix_length: int, max_url_prefix=None):
+        deserializer = data.deserializer
+        map = data.map
+        flags = map[data.map_flags_offset + index]
+        offset = deserializer.unpack_result_map_offset(map, index*deserializer.file_offset_bytes)[0]
+        next_offset = deserializer.unpack_result_map_offset(map, (index + 1)*deserializer.file_offset_bytes)[0]
+
+        # The result is an alias, parse the aliased prefix
+        aliased_index = None
+        if not flags & ResultFlag._TYPE.value:
+            aliased_index, size = deserializer.unpack_result_map_alias(map, offset)
+            offset += size
+
+        # The result has a prefix, parse that first, recursively
+        name = b''
+        url = b''
+        if flags & ResultFlag.HAS_PREFIX.value:
+            prefix_index, prefix_url_prefix_length, size = deserializer.unpack_result_map_prefix(map, offset)
+            prefix = self._gather_result(data, prefix_index, 0, prefix_url_prefix_length if max_url_prefix is None else min(prefix_url_prefix_length, max_url_prefix))
+            name = prefix.name
+            url = prefix.url
+            offset += size
+
+        # The result has a suffix, extract its length
+        result_suffix_length = 0
+        if flags & ResultFlag.HAS_SUFFIX.value:
+            result_suffix_length, size = deserializer.unpack_result_map_suffix_length(map, offset)
+            offset += size
+
+        entry_name, _, entry_url = bytes(map[offset:next_offset]).partition(b'\0')
+        name += entry_name
+
+        # The result is an alias and we're not resolving a prefix, extract
+        # the aliased name and URL
+        if aliased_index is not None and max_url_prefix is None:
+            alias = self._gather_result(data, aliased_index, 0)
+            alias.alias = alias.name
+            alias.name = name
+            alias.suffix_length = suffix_length + result_suffix_length
+            return alias
+
+        url = (url + deserializer.unpack_result_map_url(entry_url))[:max_url_prefix]
+
+        out = Empty()
+        out.name = name
+        out.alias = None
+        out.url = url
+        out.flags = ResultFlag(flags & 0x0f)
+        out.css_class = None
+        out.type_name = None
+        out.suffix_length = suffix_length + result_suffix_length
+
+        # Get CSS class and type name for the result label, unless this is
+        # an alias which gets those from the final target type
+        if flags >> 4:
+            type_map_index = (flags >> 4) - 1
+            class_, name_offset, size = deserializer.unpack_type_map_entry(data.type_map, type_map_index*Serializer.type_map_entry_struct.size)
+            next_name_offset = deserializer.unpack_type_map_entry(data.type_map, (type_map_index + 1)*Serializer.type_map_entry_struct.size)[1]
+            out.css_class = 'm-' + CssClass(class_).name.lower()
+            out.type_name = bytes(data.type_map[name_offset:next_name_offset]).decode('utf-8')
+        return out
+
+    # Returns a list of results and a string that a Tab autocompletion would
+    # add. Names and URLs in the results are decoded, the suffix length is in
+    # UTF-8 bytes like in search.js.
+    def search(self, search_string: str) -> Tuple[List[Empty], str]:
+        # Normalize the search string first, convert to UTF-8 and trim spaces
+        # from the left. From the right they're trimmed only if nothing is
+        # found, see below.
+        search = search_string.lower().lstrip().encode('utf-8')
+
+        data = self._data
+        if self._shards is not None:
+            data = self._shard(search)
+            if data is None: return [], ''
+
+        # Find the node for the search string
+        offset = data.root
+        for found_prefix, char in enumerate(search):
+            _, _, child_count, child_offset = self._children(data, offset)
+            try:
+                j = data.trie[child_offset:child_offset + child_count].tobytes().index(char)
+            except ValueError:
+                # If we found everything except spaces at the end, pretend the
+                # spaces aren't there
+                if not search[found_prefix:].strip(): break
+                return [], ''
+
+            # The child offsets are variable-length, so all before the found
+            # one have to be skipped
+            child_offset += child_count
+            for k in range(j + 1):
+                distance_barrier, size = data.deserializer.unpack_varint(data.trie, child_offset)
+                child_offset += size
+            offset -= distance_barrier >> 1
+
+        # Gather the results, breadth-first
+        suggested_tab_autocompletion_chars = bytearray()
+        results = []
+        leaves = collections.deque([(offset, 0)])
+        while leaves:
+            offset, suffix_length = leaves.popleft()
+            result_count, has_shorter_suffix, child_count, child_offset = self._children(data, offset)
+
+            # Children are first, then results
+            children = []
+            varint_offset = child_offset + child_count
+            for j in range(child_count):
+                distance_barrier, size = data.deserializer.unpack_varint(data.trie, varint_offset)
+                children += [distance_barrier]
+                varint_offset += size
+
+            # The IDs are sorted, each except the first is stored as a
+            # difference to the previous. Results that were added with () at
+            # the end reference the entry without, with the suffix two chars
+            # shorter.
+            index = 0
+            for i in range(result_count):
+                delta, size = data.deserializer.unpack_varint(data.trie, varint_offset)
+                varint_offset += size
+                if has_shorter_suffix and delta & 1:
+                    index += delta >> 1
+                    results += [self._gather_result(data, index, suffix_length - 2)]
+                else:
+                    index += delta >> 1 if has_shorter_suffix else delta
+                    results += [self._gather_result(data, index, suffix_length)]
+
+                if len(results) >= self.max_results:
+                    return self._decode(results), self._decode_autocompletion(suggested_tab_autocompletion_chars)
+
+            # Dig deeper, unless there's a lookahead barrier
+            for j, distance_barrier in enumerate(children):
+                if distance_barrier & 1: continue
+
+                leaves.append((offset - (distance_barrier >> 1), suffix_length + 1))
+
+                # We don't have anything yet and this is the only path forward,
+                # add the char to suggested Tab autocompletion
+                if not results and len(leaves) == 1 and child_count == 1:
+                    suggested_tab_autocompletion_chars.append(data.trie[child_offset + j])
+
+        return self._decode(results), self._decode_autocompletion(suggested_tab_autocompletion_chars)
+
+    def _decode(self, results: List[Empty]) -> List[Empty]:
+        for result in results:
+            result.name = result.name.decode('utf-8')
+            result.url = result.url.decode('utf-8')
+            if result.alias is not None:
+                result.alias = result.alias.decode('utf-8')
+        return results
+
+    def _decode_autocompletion(self, chars: bytearray) -> str:
+        # Strip incomplete UTF-8 chars from the end
+        return chars.decode('utf-8', errors='ignore')
+
 def _pretty_print_trie(deserializer: Deserializer, serialized: bytearray, hashtable, stats, base_offset, indent, *, show_merged, show_lookahead_barriers, color_map) -> str:
     # Visualize where the trees were merged
     if show_merged and base_offset in hashtable:
@@ -623,7 +1350,7 @@ def _pretty_print_trie(deserializer: Deserializer, serialized: bytearray, hashta
     stats.node_count += 1
 
     out = ''
-    result_ids, child_chars_offsets_barriers, offset = deserializer.unpack_trie_node(serialized, base_offset)
+    result_ids, shorter_suffix, child_chars_offsets_barriers, offset = deserializer.unpack_trie_node(serialized, base_offset)
 
     stats.max_node_results = max(len(result_ids), stats.max_node_results)
     stats.max_node_children = max(len(child_chars_offsets_barriers), stats.max_node_children)
@@ -635,6 +1362,8 @@ def _pretty_print_trie(deserializer: Deserializer, serialized: bytearray, hashta
             if i: out += color_map['blue']+', '
             stats.max_node_result_index = max(result, stats.max_node_result_index)
             out += color_map['cyan'] + str(result)
+            if shorter_suffix and shorter_suffix[i]:
+                out += color_map['yellow'] + '()'
         out += color_map['blue'] + ']'
 
     # print children, if any
@@ -728,6 +1457,7 @@ def pretty_print_map(deserializer: Deserializer, serialized: bytes, *, entryType
             extra += ['type={}'.format(entryTypeClass(flags.type).name)]
         next_offset = deserializer.unpack_result_map_offset(serialized, (i + 1)*offset_size)[0]
         name, _, url = serialized[offset:next_offset].partition(b'\0')
+        url = deserializer.unpack_result_map_url(url)
         out += color_map['cyan'] + str(i) + color_map['blue'] + ': ' + color_map['white'] + name.decode('utf-8') + color_map['blue'] + ' [' + color_map['yellow'] + (color_map['blue'] + ', ' + color_map['yellow']).join(extra) + color_map['blue'] + '] ->' + (' ' + color_map['reset'] + url.decode('utf-8') if url else '')
         offset = next_offset
     return out
@@ -747,8 +1477,38 @@ def pretty_print_type_map(deserializer: Deserializer, serialized: bytes, *, entr
 
 def pretty_print(serialized: bytes, *, entryTypeClass, show_merged=False, show_lookahead_barriers=True, colors=False):
     deserializer = Deserializer.from_serialized(serialized)
+    if deserializer.is_manifest:
+        return '{} symbols, max {} results\n'.format(deserializer.symbol_count, deserializer.unpack_manifest_max_results(serialized)) + '\n'.join(repr(prefix) for prefix in deserializer.unpack_manifest_shard_prefixes(serialized)), None
 
     pretty_trie, stats = pretty_print_trie(deserializer, serialized[Serializer.header_struct.size:deserializer.map_offset], show_merged=show_merged, show_lookahead_barriers=show_lookahead_barriers, colors=colors)
     pretty_map = pretty_print_map(deserializer, serialized[deserializer.map_offset:deserializer.type_map_offset], entryTypeClass=entryTypeClass, colors=colors)
     pretty_type_map = pretty_print_type_map(deserializer, serialized[deserializer.type_map_offset:], entryTypeClass=entryTypeClass)
     return '{} symbols\n'.format(deserializer.symbol_count) + pretty_trie + '\n' + pretty_map + '\n' + pretty_type_map, stats
+
+if __name__ == '__main__': # pragma: no cover
+    parser = argparse.ArgumentParser(description="query m.css search data")
+    parser.add_argument('file', help="search data file, either binary or base85-encoded")
+    parser.add_argument('queries', nargs='+', help="search strings")
+    parser.add_argument('--limit', type=int, help="max result count, 100 or what sharded data were generated with by default")
+    parser.add_argument('--repeat', type=int, default=0, help="measure search latency over given count of repeats")
+    args = parser.parse_args()
+
+    # Shards are opened lazily, so errors can happen during a search as well
+    try:
+        with SearchIndex(args.file, max_results=args.limit) as index:
+            for query in args.queries:
+                results, autocompletion = index.search(query)
+                print("{}{}: {} results".format(query, '[{}]'.format(autocompletion) if autocompletion else '', len(results)))
+                for result in results:
+                    print("  {}{} [{}] -> {}".format(result.name, ' ({})'.format(result.alias) if result.alias else '', result.type_name, result.url))
+
+                if args.repeat:
+                    times = []
+                    for i in range(args.repeat):
+                        begin = time.perf_counter()
+                        index.search(query)
+                        times += [time.perf_counter() - begin]
+                    print("  {:.1f} µs mean, {:.1f} µs min over {} runs".format(sum(times)/len(times)*1e6, min(times)*1e6, args.repeat))
+    except (OSError, ValueError) as e:
+        logging.fatal("%s", e)
+        sys.exit(1)
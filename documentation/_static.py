@@ -0,0 +1,763 @@
+#
+#   This file is part of m.css.
+#
+#   Copyright © 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025
+#             Vladimír Vondruš <mosra@centrum.cz>
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a
+#   copy of this software and associated documentation files (the "Software"),
+#   to deal in the Software without restriction, including without limitation
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,
+#   and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included
+#   in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#   THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#   DEALINGS IN THE SOFTWARE.
+#
+
+# Static import of Python packages for python.py. Instead of executing them,
+# .py sources (or .pyi stubs for modules that have no source) are parsed with
+# ast and turned into module, class and function objects without any
+# behavior, but looking the same to inspect as the real ones would. Only
+# the top-level statements and class bodies are looked at, function bodies
+# never, and nothing from the parsed code gets evaluated except for constant
+# expressions and names. Things from the standard library are imported for real, anything
+# else that isn't imported statically is represented with placeholder classes
+# that carry just the name.
+
+import ast
+import builtins
+import collections
+import enum
+import functools
+import importlib
+import importlib.machinery
+import inspect
+import logging
+import operator
+import os
+import sys
+import types
+import typing
+
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+# Value that can't be evaluated statically, such as a function call. Shows
+# up as its source code.
+class Expression:
+    __slots__ = ['source']
+
+    def __init__(self, source: str):
+        self.source = source
+
+    def __repr__(self):
+        return self.source
+
+    # python.py skips data whose __module__ is different from the module
+    # they're in, as those are instances of classes from elsewhere.
+    # Expressions are defined in the module they're in, so pretend they don't
+    # have any.
+    @property
+    def __module__(self):
+        raise AttributeError('__module__')
+
+# Name imported from a module that isn't imported statically nor is a part
+# of the standard library
+class _Reference:
+    __slots__ = ['module', 'path']
+
+    def __init__(self, module: str, path: List[str]):
+        self.module = module
+        self.path = path
+
+# Returned from name lookup if the name isn't known
+_unresolved = object()
+
+# Operators for evaluating constant expressions such as enum values
+# composed of bit flags
+_binary_operators = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.LShift: operator.lshift,
+    ast.RShift: operator.rshift,
+    ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor,
+    ast.BitAnd: operator.and_
+}
+_unary_operators = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+    ast.Invert: operator.invert,
+    ast.Not: operator.not_
+}
+
+
+_compare_operators = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge
+}
+
+# Namespace of a module or a class body being executed. Same as in Python,
+# names not found in a class body are looked up in the module, not in
+# enclosing classes.
+class _Scope:
+    def __init__(self, module: types.ModuleType, namespace: Dict[str, Any], source: str, qualname: str = '', module_scope: '_Scope' = None):
+        self.module = module
+        self.namespace = namespace
+        # Names that are references to things not imported statically. Kept
+        # separately so they don't appear among the module or class members.
+        self.references: Dict[str, _Reference] = {}
+        self.source = source
+        self.qualname = qualname
+        self.module_scope = module_scope or self
+        # Docstrings of data, i.e. string literals right after an assignment
+        self.docstrings: Dict[str, str] = {}
+
+    def bind(self, name: str, value):
+        if isinstance(value, _Reference):
+            self.namespace.pop(name, None)
+            self.references[name] = value
+        else:
+            self.references.pop(name, None)
+            self.namespace[name] = value
+
+class StaticImporter:
+    def __init__(self, packages: List[str]):
+        # Top-level packages that get imported statically
+        self.packages = set(packages)
+        # Statically imported modules, similarly to sys.modules
+        self.modules: Dict[str, types.ModuleType] = {}
+        # Docstrings of data, keyed by the module or class and the name
+        self.docstrings: Dict[Tuple[Any, str], str] = {}
+        # Scopes of all imported modules, for references and star imports
+        self._scopes: Dict[str, _Scope] = {}
+        self._placeholders: Dict[str, type] = {}
+        # Classes and functions created from the parsed sources
+        self._classes: Set[type] = set()
+        self._functions: Set[types.FunctionType] = set()
+        # Modules where annotations are kept as strings, i.e. stubs and
+        # modules with `from __future__ import annotations`
+        self._postponed: Set[str] = set()
+        # Modules that are being executed and names imported from them that
+        # weren't defined yet because of a circular import, bound once the
+        # module is done
+        self._executing: Set[str] = set()
+        self._deferred: Dict[str, List[Tuple[_Scope, str, str]]] = {}
+
+    def import_module(self, name: str) -> types.ModuleType:
+        if name in self.modules: return self.modules[name]
+
+        parent = self.import_module(name.rpartition('.')[0]) if '.' in name else None
+        file, locations = self._find(name, parent)
+
+        module = types.ModuleType(name)
+        module.__file__ = file
+        if locations is not None:
+            module.__path__ = locations
+            module.__package__ = name
+        else:
+            module.__package__ = name.rpartition('.')[0]
+        # Added before executing so circular imports work
+        self.modules[name] = module
+
+        if file:
+            logging.debug("statically importing %s from %s", name, file)
+            with open(file, 'rb') as f:
+                source = f.read().decode('utf-8')
+            scope = _Scope(module, module.__dict__, source)
+            self._scopes[name] = scope
+            if file.endswith('.pyi'): self._postponed.add(name)
+            self._executing.add(name)
+            self._execute(scope, ast.parse(source, file).body)
+            self._executing.discard(name)
+            for other, bound, attribute in self._deferred.pop(name, []):
+                value = self._attribute(module, attribute)
+                if value is _unresolved:
+                    logging.warning("can't statically import %s from %s", attribute, name)
+                # Unless the importing module defined the name on its own
+                # after the import
+                elif bound not in other.namespace and bound not in other.references:
+                    other.bind(bound, value)
+            for data, docstring in scope.docstrings.items():
+                self.docstrings[(module, data)] = docstring
+            self._check_all(module)
+        else:
+            self._scopes[name] = _Scope(module, module.__dict__, '')
+
+        # Same as with a real import, the module is accessible from its parent
+        if parent: setattr(parent, name.rpartition('.')[2], module)
+        return module
+
+    # Equivalent of typing.get_type_hints() that doesn't evaluate any code.
+    # String annotations are resolved in the same scope as typing would do
+    # it, if that fails, NameError or AttributeError is raised, also same as
+    # with typing. Objects that weren't created here are passed to typing.
+    def type_hints(self, object) -> Dict[str, Any]:
+        if isinstance(object, types.ModuleType) and self.modules.get(object.__name__) is object:
+            scope = self._scopes[object.__name__]
+            return {name: self._hint(scope, value) for name, value in object.__dict__.get('__annotations__', {}).items()}
+
+        if object in self._functions:
+            scope = self._scopes[object.__module__]
+            return {name: self._hint(scope, value) for name, value in object.__annotations__.items()}
+
+        if isinstance(object, type) and object in self._classes:
+            hints = {}
+            for base in reversed(object.__mro__):
+                annotations = base.__dict__.get('__annotations__', {})
+                if base in self._classes:
+                    # Module globals take precedence over class members here,
+                    # which is what typing does for backwards compatibility
+                    module_scope = self._scopes[base.__module__]
+                    scope = _Scope(module_scope.module, collections.ChainMap(module_scope.namespace, base.__dict__), '', module_scope=module_scope)
+                    hints.update({name: self._hint(scope, value) for name, value in annotations.items()})
+                elif annotations:
+                    hints.update({name: value for name, value in typing.get_type_hints(base).items() if name in annotations})
+            return hints
+
+        return typing.get_type_hints(object)
+
+    # Returns a source file of given module, or a stub if there's no source,
+    # together with the package search locations if it's a package. The
+    # file is None for namespace packages.
+    def _find(self, name: str, parent: Optional[types.ModuleType]) -> Tuple[Optional[str], Optional[List[str]]]:
+        path = parent.__path__ if parent else None
+        spec = importlib.machinery.PathFinder.find_spec(name, path)
+        if spec and spec.origin and spec.origin.endswith('.py'):
+            return spec.origin, spec.submodule_search_locations
+
+        # Extension modules and stub-only modules, the latter of which the
+        # import system doesn't know about
+        for directory in path if path is not None else sys.path:
+            directory = os.path.join(directory or os.curdir, name.rpartition('.')[2])
+            if os.path.isfile(os.path.join(directory, '__init__.pyi')):
+                return os.path.join(directory, '__init__.pyi'), [directory]
+            if os.path.isfile(directory + '.pyi'):
+                return directory + '.pyi', None
+
+        if spec and spec.origin is None and spec.submodule_search_locations:
+            return None, list(spec.submodule_search_locations)
+        if spec:
+            raise ImportError("no source or stub for module {} in {}".format(name, spec.origin), name=name)
+        raise ModuleNotFoundError("no module named {}".format(name), name=name)
+
+    # Names in __all__ have to exist in the module, which isn't the case for
+    # references to things not imported statically
+    def _check_all(self, module: types.ModuleType):
+        if '__all__' not in module.__dict__: return
+        if not isinstance(module.__all__, (list, tuple)):
+            logging.warning("%s.__all__ can't be evaluated statically, ignoring", module.__name__)
+            del module.__all__
+            return
+        names = []
+        for name in module.__all__:
+            if isinstance(self._attribute(module, name), _Reference) or name not in module.__dict__:
+                logging.warning("%s.%s listed in __all__ can't be imported statically, ignoring", module.__name__, name)
+            else:
+                names += [name]
+        module.__all__ = names
+
+    # Module, or a reference for modules not imported statically. Standard
+    # library modules and modules that are imported already are imported for
+    # real, as long as they aren't what's being documented.
+    def _import_reference(self, name: str):
+        package = name.partition('.')[0]
+        if package in self.packages:
+            try:
+                return self.import_module(name)
+            except (ImportError, SyntaxError) as e:
+                logging.warning("can't statically import %s: %s", name, e)
+        elif name in sys.modules or package in sys.builtin_module_names or package in getattr(sys, 'stdlib_module_names', []):
+            try:
+                return importlib.import_module(name)
+            except ImportError:
+                pass
+        return _Reference(name, [])
+
+    def _relative_module(self, scope: _Scope, module: Optional[str], level: int) -> str:
+        if not level: return module
+        package = scope.module.__package__.split('.')
+        base = '.'.join(package[:len(package) - level + 1])
+        return base + '.' + module if module else base
+
+    def _lookup(self, scope: _Scope, name: str):
+        for scope in [scope, scope.module_scope]:
+            if name in scope.namespace: return scope.namespace[name]
+            if name in scope.references: return scope.references[name]
+        return getattr(builtins, name, _unresolved)
+
+    def _attribute(self, value, name: str):
+        if value is _unresolved:
+            return _unresolved
+        if isinstance(value, _Reference):
+            return _Reference(value.module, value.path + [name])
+        # Statically imported module, it could also be a submodule that's
+        # not imported yet
+        if isinstance(value, types.ModuleType) and self.modules.get(value.__name__) is value:
+            if name in value.__dict__: return value.__dict__[name]
+            scope = self._scopes[value.__name__]
+            if name in scope.references: return scope.references[name]
+            if hasattr(value, '__path__'):
+                module = self._import_reference(value.__name__ + '.' + name)
+                if not isinstance(module, _Reference): return module
+            return _unresolved
+        if inspect.ismodule(value) and not hasattr(value, name) and hasattr(value, '__path__'):
+            module = self._import_reference(value.__name__ + '.' + name)
+            if not isinstance(module, _Reference): return module
+        return getattr(value, name, _unresolved)
+
+    def _resolve(self, scope: _Scope, node: ast.expr):
+        if isinstance(node, ast.Name):
+            return self._lookup(scope, node.id)
+        if isinstance(node, ast.Attribute):
+            return self._attribute(self._resolve(scope, node.value), node.attr)
+        return _unresolved
+
+    # Functions, descriptors, instances and expressions created here. Python
+    # would take them in an annotation but python.py can't do anything
+    # sensible with those.
+    def _stub(self, value) -> bool:
+        return (isinstance(value, (Expression, property, staticmethod, classmethod, functools.cached_property)) or
+                isinstance(value, types.FunctionType) and value in self._functions or
+                not isinstance(value, type) and type(value) in self._classes)
+
+    def _special_stubs(self, class_: type) -> bool:
+        for name in dir(class_):
+            if not name.startswith('__') or name in ['__init__', '__new__', '__init_subclass__']: continue
+            value = getattr(class_, name)
+            if isinstance(value, types.FunctionType) and value in self._functions: return True
+        return False
+
+    # Placeholder class for a reference, so it can be used as a base class
+    # or in an annotation, where it shows up with its full name
+    def _placeholder(self, reference: _Reference) -> type:
+        if reference.path:
+            module, path = reference.module, reference.path
+        else:
+            module, _, name = reference.module.rpartition('.')
+            path = [name]
+        key = module + ':' + '.'.join(path)
+        if key not in self._placeholders:
+            self._placeholders[key] = type(path[-1], (), {'__module__': module, '__qualname__': '.'.join(path), '__doc__': None})
+        return self._placeholders[key]
+
+    def _source(self, scope: _Scope, node: ast.AST, source: str = None) -> str:
+        return ast.get_source_segment(scope.source if source is None else source, node) or '...'
+
+    def _constant(self, scope: _Scope, node: ast.expr):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+            values = [self._constant(scope, i) for i in node.elts]
+            if _unresolved in values: return _unresolved
+            return tuple(values) if isinstance(node, ast.Tuple) else values if isinstance(node, ast.List) else set(values)
+        if isinstance(node, ast.Dict):
+            keys = [self._constant(scope, i) if i else _unresolved for i in node.keys]
+            values = [self._constant(scope, i) for i in node.values]
+            if _unresolved in keys or _unresolved in values: return _unresolved
+            return dict(zip(keys, values))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _unary_operators:
+            operand = self._constant(scope, node.operand)
+            if operand is _unresolved: return _unresolved
+            try:
+                return _unary_operators[type(node.op)](operand)
+            except Exception:
+                return _unresolved
+        if isinstance(node, ast.BinOp) and type(node.op) in _binary_operators:
+            left = self._constant(scope, node.left)
+            right = self._constant(scope, node.right)
+            if left is _unresolved or right is _unresolved: return _unresolved
+            # Don't let a shift or a repeated sequence blow up the memory
+            if isinstance(node.op, ast.LShift) and (not isinstance(right, int) or right > 1024):
+                return _unresolved
+            if isinstance(node.op, ast.Mult) and isinstance(left, int) != isinstance(right, int) and len(right if isinstance(left, int) else left)*(left if isinstance(left, int) else right) > 4096:
+                return _unresolved
+            try:
+                return _binary_operators[type(node.op)](left, right)
+            except Exception:
+                return _unresolved
+        # Names referring to other constants, such as previous enum values
+        if isinstance(node, ast.Name):
+            value = self._lookup(scope, node.id)
+            if type(value) in [int, float, complex, str, bytes, bool, type(None)]:
+                return value
+        return _unresolved
+
+    # Value of data or of a default argument
+    def _value(self, scope: _Scope, node: ast.expr):
+        value = self._constant(scope, node)
+        if value is not _unresolved:
+            return value
+
+        # Names of known things, such as enum values or aliases
+        value = self._resolve(scope, node)
+        if value is not _unresolved and not isinstance(value, _Reference):
+            return value
+
+        # The few calls that matter for documentation
+        if isinstance(node, ast.Call):
+            function = self._resolve(scope, node.func)
+            if function is enum.auto and not node.args:
+                return enum.auto()
+            if function is typing.TypeVar and node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str):
+                return typing.TypeVar(node.args[0].value)
+            # property(getter, setter) used directly instead of a decorator
+            if function is property and not node.keywords:
+                args = [self._value(scope, i) for i in node.args]
+                if all(i is None or isinstance(i, types.FunctionType) for i in args):
+                    return property(*args)
+            # Instances of classes created here, without calling the
+            # constructor, as that has no body anyway. Not if the class
+            # overrides special methods other than the constructor, as those
+            # would then give back None instead of a repr, hash or length.
+            if type(function) is type and function in self._classes and not self._special_stubs(function):
+                try:
+                    return object.__new__(function)
+                except TypeError:
+                    pass
+
+        # Containers of things that aren't constants
+        if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+            values = [self._value(scope, i) for i in node.elts]
+            return tuple(values) if isinstance(node, ast.Tuple) else values if isinstance(node, ast.List) else set(values)
+
+        # Lambdas are functions like any other, the name is what differs
+        if isinstance(node, ast.Lambda):
+            return self._function(scope, node, '<lambda>')
+
+        return Expression(self._source(scope, node))
+
+    # Annotation as Python would evaluate it when defining the function,
+    # class or data -- typing objects, classes and placeholders, with string
+    # annotations kept as strings. Whatever can't be evaluated is turned into
+    # a string as well. With `strict`, used for evaluating string annotations
+    # later, NameError is raised instead.
+    def _annotation(self, scope: _Scope, node: ast.expr, source: str = None, strict: bool = False):
+        if isinstance(node, ast.Constant):
+            if strict and isinstance(node.value, str):
+                return self._hint(scope, node.value)
+            return node.value
+
+        if isinstance(node, (ast.Name, ast.Attribute)):
+            value = self._resolve(scope, node)
+            if isinstance(value, _Reference): return self._placeholder(value)
+            if value is not _unresolved and not self._stub(value): return value
+
+        elif isinstance(node, ast.Subscript):
+            value = self._annotation(scope, node.value, source, strict)
+            slice = node.slice.value if sys.version_info < (3, 9) else node.slice
+            if value is typing.Literal:
+                args = self._constant(scope, slice)
+            elif isinstance(slice, ast.Tuple):
+                args = tuple(self._annotation(scope, i, source, strict) for i in slice.elts)
+            else:
+                args = self._annotation(scope, slice, source, strict)
+            if not isinstance(value, str) and args is not _unresolved:
+                try:
+                    return value[args]
+                except Exception:
+                    pass
+
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+            try:
+                return self._annotation(scope, node.left, source, strict) | self._annotation(scope, node.right, source, strict)
+            except TypeError:
+                pass
+
+        elif isinstance(node, ast.List):
+            return [self._annotation(scope, i, source, strict) for i in node.elts]
+
+        # Not a valid annotation, but Python allows it
+        elif isinstance(node, ast.Tuple):
+            return tuple(self._annotation(scope, i, source, strict) for i in node.elts)
+
+        # Annotating with type(None) is the same as None
+        elif isinstance(node, ast.Call) and self._resolve(scope, node.func) is type and len(node.args) == 1 and isinstance(node.args[0], ast.Constant) and node.args[0].value is None:
+            return type(None)
+
+        if strict:
+            raise (AttributeError if isinstance(node, ast.Attribute) else NameError)("can't evaluate {} statically".format(self._source(scope, node, source)))
+        return self._source(scope, node, source)
+
+    # Annotation of a function argument, class or module data
+    def _definition_annotation(self, scope: _Scope, node: ast.expr):
+        if scope.module.__name__ in self._postponed:
+            return self._source(scope, node)
+        return self._annotation(scope, node)
+
+    # Annotation with strings and forward references resolved, what
+    # typing.get_type_hints() returns
+    def _hint(self, scope: _Scope, value):
+        if value is None:
+            return type(None)
+        if isinstance(value, (str, typing.ForwardRef)):
+            if isinstance(value, typing.ForwardRef): value = value.__forward_arg__
+            try:
+                node = ast.parse(value.strip(), mode='eval').body
+            except SyntaxError:
+                raise NameError("can't parse {}".format(value))
+            return self._hint(scope, self._annotation(scope, node, value.strip(), strict=True))
+        args = getattr(value, '__args__', None)
+        if isinstance(args, tuple) and typing.get_origin(value) is not typing.Literal:
+            resolved = tuple(self._hint(scope, i) for i in args)
+            if any(a is not b for a, b in zip(args, resolved)):
+                if isinstance(value, types.GenericAlias):
+                    return types.GenericAlias(typing.get_origin(value), resolved)
+                if hasattr(value, 'copy_with'):
+                    return value.copy_with(resolved)
+        return value
+
+    def _signature(self, scope: _Scope, node: Union[ast.FunctionDef, ast.Lambda]) -> inspect.Signature:
+        # Defaults are evaluated right away, same as in Python
+        defaults = {}
+        positional = getattr(node.args, 'posonlyargs', []) + node.args.args
+        for arg, default in zip(positional[len(positional) - len(node.args.defaults):], node.args.defaults):
+            defaults[arg.arg] = self._value(scope, default)
+        for arg, default in zip(node.args.kwonlyargs, node.args.kw_defaults):
+            if default: defaults[arg.arg] = self._value(scope, default)
+
+        def annotation(node):
+            return inspect.Parameter.empty if node is None else self._definition_annotation(scope, node)
+
+        parameters = []
+        for kind, args in [(inspect.Parameter.POSITIONAL_ONLY, getattr(node.args, 'posonlyargs', [])),
+                           (inspect.Parameter.POSITIONAL_OR_KEYWORD, node.args.args),
+                           (inspect.Parameter.VAR_POSITIONAL, [node.args.vararg] if node.args.vararg else []),
+                           (inspect.Parameter.KEYWORD_ONLY, node.args.kwonlyargs),
+                           (inspect.Parameter.VAR_KEYWORD, [node.args.kwarg] if node.args.kwarg else [])]:
+            for arg in args:
+                parameters += [inspect.Parameter(arg.arg, kind, default=defaults.get(arg.arg, inspect.Parameter.empty), annotation=annotation(getattr(arg, 'annotation', None)))]
+        return inspect.Signature(parameters, return_annotation=annotation(getattr(node, 'returns', None)))
+
+    # Function that does nothing but has the signature, annotations and
+    # docstring of the parsed one
+    def _function(self, scope: _Scope, node: Union[ast.FunctionDef, ast.Lambda], name: str) -> types.FunctionType:
+        def function(*args, **kwargs): pass # pragma: no cover
+        function.__name__ = name
+        function.__qualname__ = scope.qualname + name
+        function.__module__ = scope.module.__name__
+        function.__doc__ = None if isinstance(node, ast.Lambda) else ast.get_docstring(node, clean=False)
+        function.__signature__ = self._signature(scope, node)
+        function.__annotations__ = {parameter.name: parameter.annotation for parameter in function.__signature__.parameters.values() if parameter.annotation is not inspect.Parameter.empty}
+        if function.__signature__.return_annotation is not inspect.Signature.empty:
+            function.__annotations__['return'] = function.__signature__.return_annotation
+        self._functions.add(function)
+        return function
+
+    def _decorated_function(self, scope: _Scope, node: ast.FunctionDef):
+        # Apply decorators that affect what kind of a member it is, ignore
+        # the rest
+        value = self._function(scope, node, node.name)
+        for decorator in reversed(node.decorator_list):
+            resolved = self._resolve(scope, decorator)
+            if resolved in [property, staticmethod, classmethod, functools.cached_property]:
+                value = resolved(value)
+            elif isinstance(decorator, ast.Attribute) and decorator.attr in ['getter', 'setter', 'deleter'] and isinstance(self._resolve(scope, decorator.value), property):
+                value = getattr(self._resolve(scope, decorator.value), decorator.attr)(value)
+        return value
+
+    def _class(self, scope: _Scope, node: ast.ClassDef):
+        bases = []
+        for base in node.bases:
+            base = self._annotation(scope, base)
+            if not isinstance(base, str): bases += [base]
+
+        namespace = {'__module__': scope.module.__name__,
+                     '__qualname__': scope.qualname + node.name,
+                     '__doc__': ast.get_docstring(node, clean=False)}
+        class_scope = _Scope(scope.module, namespace, scope.source, scope.qualname + node.name + '.', scope.module_scope)
+        self._execute(class_scope, node.body)
+
+        # Enum metaclass looks at each member as it's added, so it can't be
+        # just update()
+        def body(ns):
+            for name, value in namespace.items(): ns[name] = value
+
+        # If the class can't be created with given bases (an enum with
+        # values that don't fit the enum type, conflicting slots, a
+        # metaclass that wants something the placeholders don't have, ...),
+        # create at least a class with the docstring
+        try:
+            class_ = types.new_class(node.name, tuple(bases), exec_body=body)
+        except Exception as e:
+            logging.warning("can't statically create class %s.%s: %s", scope.module.__name__, namespace['__qualname__'], e)
+            class_ = type(node.name, (), {key: namespace[key] for key in ['__module__', '__qualname__', '__doc__']})
+        self._classes.add(class_)
+
+        for name, docstring in class_scope.docstrings.items():
+            # Enum value docs are picked up from the values themselves
+            if isinstance(class_, enum.EnumMeta) and name in class_.__members__:
+                getattr(class_, name).__doc__ = docstring
+            else:
+                self.docstrings[(class_, name)] = docstring
+        return class_
+
+    # Evaluates comparisons of constants, mainly sys.version_info and
+    # sys.platform checks. TYPE_CHECKING is treated as true, as the imports
+    # there are useful for annotations, `__name__ == '__main__'` is not a
+    # part of the API. Returns None if the condition can't be evaluated.
+    def _condition(self, scope: _Scope, node: ast.expr) -> Optional[bool]:
+        if self._resolve(scope, node) is typing.TYPE_CHECKING:
+            return True
+        if isinstance(node, ast.Compare) and isinstance(node.left, ast.Name) and node.left.id == '__name__':
+            return False
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _compare_operators:
+            left = self._value(scope, node.left)
+            right = self._value(scope, node.comparators[0])
+            def is_constant(value):
+                return type(value) in [int, float, str, bool] or isinstance(value, tuple) and all(is_constant(i) for i in value)
+            if is_constant(left) and is_constant(right):
+                try:
+                    return bool(_compare_operators[type(node.ops[0])](left, right))
+                except TypeError:
+                    pass
+        return None
+
+    def _assign(self, scope: _Scope, target: ast.expr, value) -> Optional[str]:
+        if isinstance(target, ast.Name):
+            scope.bind(target.id, value)
+            return target.id
+        return None
+
+    def _execute(self, scope: _Scope, body: List[ast.stmt]):
+        # Name of data assigned by the previous statement, for picking up
+        # their docstrings
+        previous = None
+        for node in body:
+            assigned = None
+
+            if isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+                if previous: scope.docstrings[previous] = node.value.value
+                elif scope.module_scope is scope and node is body[0] and scope.module.__doc__ is None:
+                    scope.module.__doc__ = node.value.value
+
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    module = self._import_reference(alias.name)
+                    if alias.asname:
+                        scope.bind(alias.asname, module)
+                    # Importing a.b.c makes `a` accessible
+                    else:
+                        top = alias.name.partition('.')[0]
+                        scope.bind(top, module if top == alias.name else self._import_reference(top))
+
+            elif isinstance(node, ast.ImportFrom):
+                name = self._relative_module(scope, node.module, node.level)
+                if name == '__future__' and 'annotations' in [alias.name for alias in node.names]:
+                    self._postponed.add(scope.module.__name__)
+                module = self._import_reference(name)
+                for alias in node.names:
+                    if alias.name != '*':
+                        value = self._attribute(module, alias.name)
+                        if value is not _unresolved:
+                            scope.bind(alias.asname or alias.name, value)
+                        # A circular import, usually under TYPE_CHECKING,
+                        # of a name the module didn't get to yet
+                        elif name in self._executing and scope.module_scope is scope:
+                            self._deferred.setdefault(name, []).append((scope, alias.asname or alias.name, alias.name))
+                        else:
+                            logging.warning("can't statically import %s from %s", alias.name, name)
+                    elif isinstance(module, types.ModuleType):
+                        names = getattr(module, '__all__', None)
+                        if names is None:
+                            names = [i for i in list(module.__dict__) + list(self._scopes[name].references if name in self._scopes else []) if not i.startswith('_')]
+                        for i in names:
+                            value = self._attribute(module, i)
+                            if value is not _unresolved: scope.bind(i, value)
+
+            elif isinstance(node, ast.ClassDef):
+                scope.bind(node.name, self._class(scope, node))
+
+            # Module __getattr__ and __dir__ would make every attribute
+            # lookup on the module succeed with None, skip them
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and scope.module_scope is scope and node.name in ['__getattr__', '__dir__']:
+                pass
+
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                scope.bind(node.name, self._decorated_function(scope, node))
+
+            # Foo.VALUE.__doc__ = "..." for documenting enum values
+            elif isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Attribute) and node.targets[0].attr == '__doc__' and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+                value = self._resolve(scope, node.targets[0].value)
+                if value is not _unresolved and not isinstance(value, _Reference):
+                    try:
+                        value.__doc__ = node.value.value
+                    except (AttributeError, TypeError):
+                        pass
+
+            elif isinstance(node, ast.Assign):
+                # a, b = 1, 2 is done elementwise, other unpacking ignored
+                if len(node.targets) == 1 and isinstance(node.targets[0], ast.Tuple) and isinstance(node.value, ast.Tuple) and len(node.targets[0].elts) == len(node.value.elts):
+                    for target, value in zip(node.targets[0].elts, node.value.elts):
+                        self._assign(scope, target, self._value(scope, value))
+                else:
+                    value = self._value(scope, node.value)
+                    for target in node.targets:
+                        assigned = self._assign(scope, target, value)
+                    if len(node.targets) != 1: assigned = None
+
+            elif isinstance(node, ast.AnnAssign):
+                if isinstance(node.target, ast.Name):
+                    scope.namespace.setdefault('__annotations__', {})[node.target.id] = self._definition_annotation(scope, node.annotation)
+                    if node.value:
+                        assigned = self._assign(scope, node.target, self._value(scope, node.value))
+                    # Stubs list module-level data without values
+                    elif scope.module_scope is scope and scope.module.__file__.endswith('.pyi'):
+                        assigned = self._assign(scope, node.target, Expression('...'))
+
+            elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name) and isinstance(node.op, ast.Add):
+                current = self._lookup(scope, node.target.id)
+                value = self._value(scope, node.value)
+                if isinstance(current, list) and isinstance(value, (list, tuple)):
+                    scope.bind(node.target.id, current + list(value))
+
+            # __all__.extend([...]) and __all__.append('...')
+            elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) and isinstance(node.value.func, ast.Attribute) and node.value.func.attr in ['append', 'extend'] and len(node.value.args) == 1:
+                current = self._resolve(scope, node.value.func.value)
+                value = self._value(scope, node.value.args[0])
+                if isinstance(current, list):
+                    if node.value.func.attr == 'append': current.append(value)
+                    elif isinstance(value, (list, tuple)): current.extend(value)
+
+            elif isinstance(node, ast.Delete):
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        scope.namespace.pop(target.id, None)
+                        scope.references.pop(target.id, None)
+
+            # Conditions that can't be evaluated take both branches in
+            # order, which means the last definition wins
+            elif isinstance(node, ast.If):
+                condition = self._condition(scope, node.test)
+                if condition is not False:
+                    self._execute(scope, node.body)
+                if condition is not True:
+                    self._execute(scope, node.orelse)
+
+            # Exception handlers are usually fallbacks for when an import
+            # fails, take just what's expected to succeed
+            elif isinstance(node, ast.Try):
+                self._execute(scope, node.body)
+                self._execute(scope, node.orelse)
+                self._execute(scope, node.finalbody)
+
+            elif isinstance(node, ast.With):
+                self._execute(scope, node.body)
+
+            previous = assigned
@@ -0,0 +1,140 @@
+#
+#   This file is part of m.css.
+#
+#   Copyright © 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025
+#             Vladimír Vondruš <mosra@centrum.cz>
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a
+#   copy of this software and associated documentation files (the "Software"),
+#   to deal in the Software without restriction, including without limitation
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,
+#   and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included
+#   in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#   THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#   DEALINGS IN THE SOFTWARE.
+#
+
+
+# Build statistics for doxygen.py and python.py, enabled with --profile
+
+import collections
+import contextlib
+import json
+import sys
+import time
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError: # pragma: no cover
+    # Not available on Windows, peak memory use is not reported there
+    resource = None
+
+def peak_memory() -> int:
+    if not resource: return 0 # pragma: no cover
+    # Kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*(1 if sys.platform == 'darwin' else 1024)
+
+class Telemetry:
+    # The counters are a dict of name -> collections.Counter that get included
+    # in the report, such as per-module invocation counts of external tools,
+    # more can be added later with track()
+    def __init__(self, counters: Dict[str, collections.Counter] = {}):
+        self.begin = time.perf_counter()
+        self.counters = {}
+        self.counters_begin = {}
+        self.counters_merged = collections.Counter()
+        for name, counter in counters.items():
+            self.track(name, counter)
+        # Phase name -> [total time, count, peak memory]. Dicts preserve
+        # insertion order, so phases are reported in the order they were
+        # first entered.
+        self.phases: Dict[str, List] = {}
+        # (time, kind, name) for all processed items such as compounds
+        self.items = []
+
+    # The time is accumulated over all times the phase was entered. Phases can
+    # be nested, in which case the outer phase includes the time of the inner.
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - begin, 1, peak_memory())
+
+    # Only changes since the counter started to be tracked are reported
+    def track(self, name: str, counter: collections.Counter):
+        self.counters[name] = counter
+        self.counters_begin[name] = collections.Counter(counter)
+
+    def add_phase(self, name: str, duration: float, count: int, memory: int):
+        phase = self.phases.setdefault(name, [0.0, 0, 0])
+        phase[0] += duration
+        phase[1] += count
+        phase[2] = max(phase[2], memory)
+
+    def item(self, kind: str, name: str, duration: float):
+        self.items += [(duration, kind, name)]
+
+    def counts(self) -> Dict[str, int]:
+        counts = collections.Counter(self.counters_merged)
+        for name, counter in self.counters.items():
+            for key, value in (counter - self.counters_begin[name]).items():
+                counts['{} {}'.format(name, key)] += value
+        return dict(sorted(counts.items()))
+
+    # Picklable snapshot of everything recorded, to be merged into telemetry
+    # of another process with merge()
+    def snapshot(self):
+        return self.phases, self.items, self.counts()
+
+    def merge(self, snapshot):
+        phases, items, counts = snapshot
+        for name, (duration, count, memory) in phases.items():
+            self.add_phase(name, duration, count, memory)
+        self.items += items
+        self.counters_merged.update(counts)
+
+    def report(self, slowest: int = 10) -> Dict:
+        return {
+            'time': time.perf_counter() - self.begin,
+            'peak_memory': peak_memory(),
+            'phases': [{'name': name, 'time': duration, 'count': count, 'peak_memory': memory} for name, (duration, count, memory) in self.phases.items()],
+            'slowest': [{'kind': kind, 'name': name, 'time': duration} for duration, kind, name in sorted(self.items, key=lambda item: item[0], reverse=True)[:slowest]],
+            'counts': self.counts()
+        }
+
+    # Saves the report as JSON to given file and returns a human-readable
+    # summary
+    def save(self, filename: str, slowest: int = 10) -> str:
+        report = self.report(slowest)
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        out = "total {:.3f} s, peak memory {:.1f} MB\n".format(report['time'], report['peak_memory']/1024/1024)
+        for phase in report['phases']:
+            out += "  {:<24} {:>10.3f} s {:>8}x {:>8.1f} MB\n".format(phase['name'], phase['time'], phase['count'], phase['peak_memory']/1024/1024)
+        if report['slowest']:
+            out += "slowest:\n"
+            for item in report['slowest']:
+                out += "  {:>10.3f} s {} {}\n".format(item['time'], item['kind'], item['name'])
+        if report['counts']:
+            out += "counts:\n"
+            for name, count in report['counts'].items():
+                out += "  {:<32} {:>8}\n".format(name, count)
+        return out.rstrip()
+
+# Convenience wrapper for optional telemetry
+def phase(telemetry: Telemetry, name: str):
+    if telemetry is None: return contextlib.nullcontext()
+    return telemetry.phase(name)
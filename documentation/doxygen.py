@@ -47,10 +47,13 @@ import re
 import html
 import inspect
 import os
+import pickle
 import glob
+import hashlib
 import mimetypes
-import shutil
+import multiprocessing
 import subprocess
+import time
 import urllib.parse
 import logging
 from types import SimpleNamespace as Empty
@@ -58,17 +61,20 @@ from typing import Tuple, Dict, Any, List
 
 from importlib.machinery import SourceFileLoader
 from jinja2 import Environment, FileSystemLoader
-from pygments import highlight
+import pygments
 from pygments.formatters import HtmlFormatter
-from pygments.lexers import TextLexer, BashSessionLexer, get_lexer_by_name, find_lexer_class_for_filename
+from pygments.lexers import BashSessionLexer
 
-from _search import CssClass, ResultFlag, ResultMap, Trie, Serializer, serialize_search_data, base85encode_search_data, search_filename, searchdata_filename, searchdata_filename_b85, searchdata_format_version
+from _output import OutputWriter
+from _telemetry import Telemetry, phase
+from _search import CssClass, ResultFlag, ResultMap, SearchResult, Trie, Serializer, serialize_search_data, serialize_search_data_sharded, base85encode_search_data, search_filename, searchdata_filename, searchdata_filename_b85, searchdata_shard_filename, searchdata_shard_filename_b85, searchdata_format_version
 
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../plugins'))
 import dot2svg
 import latex2svg
 import latex2svgextra
 import ansilexer
+import pygmentsextra
 
 class EntryType(enum.Enum):
     # Order must match the search_type_map below; first value is reserved for
@@ -134,8 +140,11 @@ default_config = {
 
     'M_MATH_CACHE_FILE': 'm.math.cache',
     'M_MATH_RENDER_AS_CODE': False,
+    'M_MATH_PRECOMPILE_PREAMBLE': False,
+    'M_DOT_CACHE_FILE': None,
     'M_CODE_FILTERS_PRE': {},
     'M_CODE_FILTERS_POST': {},
+    'M_CODE_CACHE_FILE': None,
 
     'SEARCH_DISABLED': False,
     'SEARCH_DOWNLOAD_BINARY': False,
@@ -143,6 +152,8 @@ default_config = {
     'SEARCH_RESULT_ID_BYTES': 2,
     'SEARCH_FILE_OFFSET_BYTES': 3,
     'SEARCH_NAME_SIZE_BYTES': 1,
+    'SEARCH_SHARD_PREFIX_LENGTH': 0,
+    'SEARCH_SHARD_MAX_RESULTS': 100,
     'SEARCH_HELP':
 """<p class="m-noindent">Search for symbols, directories, files, pages or
 modules. You can omit any prefix from the symbol or file path; adding a
@@ -167,7 +178,13 @@ xref_id_rx = re.compile(r"""(.*)_1(_[a-z-0-9]+|@)$""")
 slugify_nonalnum_rx = re.compile(r"""[^\w\s-]""")
 slugify_hyphens_rx = re.compile(r"""[-\s]+""")
 
+# There's one for every compound and they're kept for the whole run, so
+# __slots__ instead of a __dict__. The is_inline, templates and leaf_name
+# attributes are set only for some compound kinds, see extract_metadata() and
+# postprocess_state().
 class StateCompound:
+    __slots__ = ['id', 'kind', 'name', 'url', 'brief', 'has_details', 'deprecated', 'since', 'is_final', 'children', 'parent', 'is_inline', 'templates', 'leaf_name']
+
     def __init__(self):
         self.id: str
         self.kind: str
@@ -180,16 +197,31 @@ class StateCompound:
         self.children: List[str]
         self.parent: str = None
 
+    # Attributes that are set, used for saving the compound into the
+    # incremental build manifest and for its signature
+    def attributes(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
 class State:
     def __init__(self, config):
         self.basedir = ''
         self.compounds: Dict[str, StateCompound] = {}
         self.includes: Dict[str, str] = {}
-        self.search: List[Any] = []
+        self.search: List[SearchResult] = []
         self.examples: List[Any] = []
         self.doxyfile: Dict[str, Any] = {}
         self.config: Dict[str, Any] = config
         self.images: List[str] = []
+        # Trees parsed in extract_metadata() that get reused by parse_xml() and
+        # parse_index_xml() instead of parsing the same file again
+        self.parsed_xml: Dict[str, ET.ElementTree] = {}
+        # XML files larger than this many bytes are parsed in a streaming
+        # fashion, see _parse_xml_skeleton(). None means never.
+        self.xml_stream_threshold: int = None
+        # Build statistics, if enabled
+        self.telemetry: Telemetry = None
+        # Writer for all generated and copied output files, set up in run()
+        self.writer: OutputWriter = None
         self.current = '' # current file being processed (for logging)
         # Current kind of compound being processed. Affects current_include
         # below (i.e., per-entry includes are parsed only for namespaces or
@@ -390,6 +422,14 @@ def parse_type(state: State, type: ET.Element) -> str:
     # Remove spacing inside <> and before & and *
     return fix_type_spacing(out)
 
+def read_dotfile(state: State, element: ET.Element) -> str:
+    # Since 1.9.3, the file is copied to the XML output directory and name
+    # contains its relative path. Before that, the name was absolute,
+    # os.path.join() should do the right thing in both cases.
+    path = os.path.join(state.basedir, state.doxyfile['OUTPUT_DIRECTORY'], state.doxyfile['XML_OUTPUT'], element.attrib['name'])
+    with open(path, 'r') as f:
+        return f.read()
+
 def parse_desc_internal(state: State, element: ET.Element, immediate_parent: ET.Element = None, trim = True, add_css_class = None):
     out = Empty()
     out.section = None
@@ -1153,13 +1193,7 @@ def parse_desc_internal(state: State, element: ET.Element, immediate_parent: ET.
             caption = None
             if i.tag == 'dotfile':
                 if 'name' in i.attrib:
-                    # Since 1.9.3, the file is copied to the XML output
-                    # directory and name contains its relative path. Before
-                    # that, the name was absolute, os.path.join() should do the
-                    # right thing in both cases.
-                    path = os.path.join(state.basedir, state.doxyfile['OUTPUT_DIRECTORY'], state.doxyfile['XML_OUTPUT'], i.attrib['name'])
-                    with open(path, 'r') as f:
-                        source = f.read()
+                    source = read_dotfile(state, i)
                 # Since 1.8.16 the whole <dotfile> tag is dropped if the file
                 # doesn't exist. Such a great solution that it's unfathomable.
                 # FFS.
@@ -1332,34 +1366,12 @@ def parse_desc_internal(state: State, element: ET.Element, immediate_parent: ET.
             if not filename.startswith('.') and not code.strip():
                 logging.warning("{}: @include / @snippet / @skip[line] produced an empty code block, probably a wrong match expression?".format(state.current))
 
-            # Custom mapping of filenames to languages
-            mapping = [('.h', 'c++'),
-                       ('.h.cmake', 'c++'),
-                       # Pygments knows only .vert, .frag, .geo
-                       ('.glsl', 'glsl'),
-                       ('.conf', 'ini'),
-                       ('.xml-jinja', 'xml+jinja'),
-                       ('.html-jinja', 'html+jinja'),
-                       ('.jinja', 'jinja'),
-                       ('.ansi', ansilexer.AnsiLexer)]
-            for key, v in mapping:
-                if not filename.endswith(key): continue
-
-                if isinstance(v, str):
-                    lexer = get_lexer_by_name(v)
-                else:
-                    lexer = v()
-                break
-
-            # Otherwise try to find lexer by filename
-            else:
-                # Put some bogus prefix to the filename in case it is just
-                # `.ext`
-                lexer = find_lexer_class_for_filename("code" + filename)
-                if not lexer:
-                    logging.warning("{}: unrecognized language of {} in <programlisting>, highlighting disabled".format(state.current, filename))
-                    lexer = TextLexer()
-                else: lexer = lexer()
+            # Find a lexer by filename, with a custom mapping for some
+            # extensions in pygmentsextra.filename_mapping
+            lexer = pygmentsextra.lexer_for_filename(filename)
+            if not lexer:
+                logging.warning("{}: unrecognized language of {} in <programlisting>, highlighting disabled".format(state.current, filename))
+                lexer = pygmentsextra.lexer_by_name('text')
 
             # Style console sessions differently
             if (isinstance(lexer, BashSessionLexer) or
@@ -1369,15 +1381,15 @@ def parse_desc_internal(state: State, element: ET.Element, immediate_parent: ET.
                 class_ = 'm-code'
 
             if isinstance(lexer, ansilexer.AnsiLexer):
-                formatter = ansilexer.HtmlAnsiFormatter(nowrap=True)
+                formatter = pygmentsextra.formatter(ansilexer.HtmlAnsiFormatter, nowrap=True)
             else:
-                formatter = HtmlFormatter(nowrap=True)
+                formatter = pygmentsextra.formatter(HtmlFormatter, nowrap=True)
 
             # Apply a global pre filter, if any
             filter = state.config['M_CODE_FILTERS_PRE'].get(lexer.name)
             if filter: code = filter(code)
 
-            highlighted = highlight(code, lexer, formatter).rstrip()
+            highlighted = pygmentsextra.highlight(code, lexer, formatter).rstrip()
             # Pygments < 2.14 leave useless empty spans in the output. Filter
             # them out to have the markup consistent across versions for easier
             # testing.
@@ -1984,7 +1996,7 @@ def parse_enum(state: State, element: ET.Element):
         value.description, value_search_keywords, value.deprecated, value.since = parse_enum_value_desc(state, enumvalue)
         if value.brief or value.description:
             if enum.base_url == state.current_compound_url and not state.config['SEARCH_DISABLED']:
-                result = Empty()
+                result = SearchResult()
                 result.flags = ResultFlag.from_type(ResultFlag.DEPRECATED if value.deprecated else ResultFlag(0), EntryType.ENUM_VALUE)
                 result.url = enum.base_url + '#' + value.id
                 result.prefix = state.current_prefix + [enum.name]
@@ -2008,7 +2020,7 @@ def parse_enum(state: State, element: ET.Element):
         enum.has_details = True # has_details might already be True from above
     if enum.brief or enum.has_details or enum.has_value_details:
         if enum.base_url == state.current_compound_url and not state.config['SEARCH_DISABLED']:
-            result = Empty()
+            result = SearchResult()
             result.flags = ResultFlag.from_type(ResultFlag.DEPRECATED if enum.deprecated else ResultFlag(0), EntryType.ENUM)
             result.url = enum.base_url + '#' + enum.id
             result.prefix = state.current_prefix
@@ -2084,7 +2096,7 @@ def parse_typedef(state: State, element: ET.Element):
     if typedef.brief or typedef.has_details:
         # Avoid duplicates in search
         if typedef.base_url == state.current_compound_url and not state.config['SEARCH_DISABLED']:
-            result = Empty()
+            result = SearchResult()
             result.flags = ResultFlag.from_type(ResultFlag.DEPRECATED if typedef.deprecated else ResultFlag(0), EntryType.TYPEDEF)
             result.url = typedef.base_url + '#' + typedef.id
             result.prefix = state.current_prefix
@@ -2293,7 +2305,7 @@ def parse_func(state: State, element: ET.Element):
         # search. Again, the compound URL check means the search entry is not
         # duplicated for functions referenced from file docs.
         if (func.brief or func.has_details) and not state.config['SEARCH_DISABLED']:
-            result = Empty()
+            result = SearchResult()
             result.flags = ResultFlag.from_type((ResultFlag.DEPRECATED if func.deprecated else ResultFlag(0))|(ResultFlag.DELETED if func.is_deleted else ResultFlag(0)), EntryType.FUNC)
             result.url = func.base_url + '#' + func.id
             result.prefix = state.current_prefix
@@ -2343,7 +2355,7 @@ def parse_var(state: State, element: ET.Element):
     if var.brief or var.has_details:
         # Avoid duplicates in search
         if var.base_url == state.current_compound_url and not state.config['SEARCH_DISABLED']:
-            result = Empty()
+            result = SearchResult()
             result.flags = ResultFlag.from_type(ResultFlag.DEPRECATED if var.deprecated else ResultFlag(0), EntryType.VAR)
             result.url = var.base_url + '#' + var.id
             result.prefix = state.current_prefix
@@ -2383,7 +2395,7 @@ def parse_define(state: State, element: ET.Element):
     if define.brief or define.has_details:
         # Avoid duplicates in search
         if define.base_url == state.current_compound_url and not state.config['SEARCH_DISABLED']:
-            result = Empty()
+            result = SearchResult()
             result.flags = ResultFlag.from_type(ResultFlag.DEPRECATED if define.deprecated else ResultFlag(0), EntryType.DEFINE)
             result.url = define.base_url + '#' + define.id
             result.prefix = []
@@ -2424,7 +2436,104 @@ def is_a_stupid_empty_markdown_page(compounddef: ET.Element):
     # pages with custom titles.
     return compounddef.find('compoundname').text.startswith('md_') and compounddef.find('compoundname').text.endswith(compounddef.find('title').text) and not compounddef.find('briefdescription') and not compounddef.find('detaileddescription')
 
-def extract_metadata(state: State, xml):
+# Attribute marking <sectiondef> elements of which the <memberdef> children
+# got dropped by _parse_xml_skeleton(), containing index of the section in the
+# file. Using our own namespace so it can't clash with anything Doxygen puts
+# there.
+_streamed_sectiondef_attrib = '{http://mcss.mosra.cz/doxygen/}streamed'
+
+# For heavily templated code Doxygen can produce XML files with hundreds of
+# megabytes, and the in-memory tree is several times larger than that. Such
+# files are thus parsed in two passes instead. The first pass, done here,
+# builds the whole tree except for <memberdef> elements, which are dropped
+# right after being parsed, so the peak memory use is bounded by the largest
+# member and not by the whole file. The sections get marked with
+# _streamed_sectiondef_attrib and the members are then fed to parse_xml() one
+# by one using _MemberdefStream. Math formulas and graphs in the dropped
+# members are kept in the streamed_prefetch attribute of the returned tree so
+# parse_xml() can render them upfront together with the rest.
+def _parse_xml_skeleton(xml: str) -> ET.ElementTree:
+    events = ET.iterparse(xml, events=('start', 'end'))
+    stack = []
+    sectiondef_index = 0
+    prefetch = []
+    for event, element in events:
+        if event == 'start':
+            # Only sections directly in <doxygen><compounddef>
+            if element.tag == 'sectiondef' and len(stack) == 2:
+                element.set(_streamed_sectiondef_attrib, str(sectiondef_index))
+                sectiondef_index += 1
+            stack += [element]
+        else:
+            stack.pop()
+            if element.tag == 'memberdef' and len(stack) == 3 and stack[-1].tag == 'sectiondef':
+                prefetch += [i for i in element.iter() if i.tag in ['formula', 'dot', 'dotfile']]
+                stack[-1].remove(element)
+    tree = ET.ElementTree(events.root)
+    tree.streamed_prefetch = prefetch
+    return tree
+
+def _parse_xml(state: State, xml: str) -> ET.ElementTree:
+    if state.xml_stream_threshold is not None and os.path.getsize(xml) > state.xml_stream_threshold:
+        logging.debug("{}: parsing in a streaming fashion".format(state.current))
+        return _parse_xml_skeleton(xml)
+    return ET.parse(xml)
+
+# Second pass of the streaming parse. Goes through the file again and yields
+# <memberdef> elements of given section as they're parsed, discarding them
+# once they're processed. The sections are expected to be requested in the
+# order in which they are in the file, members of skipped sections are thrown
+# away. The file is opened only once members of a streamed section are
+# requested, for sections that were parsed whole this just iterates the
+# element.
+class _MemberdefStream:
+    def __init__(self, xml: str, document_all_stuff: bool):
+        self.xml = xml
+        self.document_all_stuff = document_all_stuff
+        self.events = None
+        self.stack = []
+        self.sectiondef_index = -1
+
+    def memberdefs(self, sectiondef: ET.Element):
+        if _streamed_sectiondef_attrib not in sectiondef.attrib:
+            yield from sectiondef
+            return
+
+        index = int(sectiondef.attrib[_streamed_sectiondef_attrib])
+        assert index > self.sectiondef_index, "sections have to be streamed in order"
+        if self.events is None:
+            self.events = ET.iterparse(self.xml, events=('start', 'end'))
+
+        for event, element in self.events:
+            if event == 'start':
+                if element.tag == 'sectiondef' and len(self.stack) == 2:
+                    self.sectiondef_index += 1
+                self.stack += [element]
+                continue
+
+            self.stack.pop()
+
+            # A member, yield it if it's from the requested section. Either
+            # way it's not needed anymore afterwards, so remove it from the
+            # tree to free the memory.
+            if element.tag == 'memberdef' and len(self.stack) == 3 and self.stack[-1].tag == 'sectiondef':
+                if self.sectiondef_index == index:
+                    # Same as done for the whole file in parse_xml()
+                    if self.document_all_stuff:
+                        _document_all_stuff(element)
+                    yield element
+                self.stack[-1].remove(element)
+
+            # Other <compounddef> children are taken from the skeleton, so
+            # drop these as well. If it's the requested section, we're done.
+            elif len(self.stack) == 2:
+                self.stack[-1].remove(element)
+                if element.tag == 'sectiondef' and self.sectiondef_index == index:
+                    return
+
+# Returns the parsed tree so it can be reused by parse_xml() or
+# parse_index_xml() later, or None if the file couldn't be parsed
+def extract_metadata(state: State, xml) -> ET.ElementTree:
     # parse_desc() / parse_inline_desc() is called from here, be sure to set
     # current filename so it's reflected in possible warnings
     state.current = os.path.basename(xml)
@@ -2437,7 +2546,7 @@ def extract_metadata(state: State, xml):
     logging.debug("Extracting metadata from {}".format(state.current))
 
     try:
-        tree = ET.parse(xml)
+        tree = _parse_xml(state, xml)
     except ET.ParseError as e:
         logging.error("{}: XML parse error, skipping whole file: {}".format(state.current, e))
         return
@@ -2454,27 +2563,27 @@ def extract_metadata(state: State, xml):
                 compound.url = compound.id + '.html'
                 compound.name = i.find('name').text
                 state.examples += [compound]
-        return
+        return tree
 
     # From other files we expect <doxygen><compounddef>
     if root.tag != 'doxygen':
         logging.warning("{}: root element expected to be <doxygen> but is <{}>, skipping whole file".format(state.current, root.tag))
-        return
+        return tree
     compounddef: ET.Element = root[0]
     if compounddef.tag != 'compounddef':
         logging.warning("{}: first child element expected to be <compounddef> but is <{}>, skipping whole file".format(state.current, compounddef.tag))
-        return
+        return tree
     # Using `in []` to prepare for potential future additions like 'C', but so
     # far Doxygen treats even *.c files as language="C++". Reproduced in the
     # test_ignored.Languages test case.
     if compounddef.attrib.get('language', 'C++') not in ['C++']:
         logging.warning("{}: unsupported language {}, skipping whole file".format(state.current, compounddef.attrib['language']))
-        return
+        return tree
     assert len([i for i in root]) == 1
 
     if compounddef.attrib['kind'] not in ['namespace', 'group', 'class', 'struct', 'union', 'dir', 'file', 'page']:
         logging.debug("No useful info in {}, skipping".format(state.current))
-        return
+        return tree
 
     # In order to show also undocumented members, go through all empty
     # <briefdescription>s and fill them with a generic text.
@@ -2573,6 +2682,7 @@ def extract_metadata(state: State, xml):
             compound.children += [i.attrib['refid']]
 
     state.compounds[compound.id] = compound
+    return tree
 
 def postprocess_state(state: State):
     # Save parent for each child
@@ -2750,11 +2860,14 @@ def build_search_data(state: State, merge_subtrees=True, add_lookahead_barriers=
         # Add this symbol and all its aliases to total symbol count
         symbol_count += len(result.keywords) + 1
 
-    # For each node in the trie sort the results so the found items have sane
-    # order by default
-    trie.sort(map)
+    serializer = Serializer(file_offset_bytes=state.config['SEARCH_FILE_OFFSET_BYTES'], result_id_bytes=state.config['SEARCH_RESULT_ID_BYTES'], name_size_bytes=state.config['SEARCH_NAME_SIZE_BYTES'])
 
-    return serialize_search_data(Serializer(file_offset_bytes=state.config['SEARCH_FILE_OFFSET_BYTES'], result_id_bytes=state.config['SEARCH_RESULT_ID_BYTES'], name_size_bytes=state.config['SEARCH_NAME_SIZE_BYTES']), trie, map, search_type_map, symbol_count, merge_subtrees=merge_subtrees, merge_prefixes=merge_prefixes)
+    # If sharding is enabled, a manifest and a list of shards is returned
+    # instead
+    if state.config['SEARCH_SHARD_PREFIX_LENGTH']:
+        return serialize_search_data_sharded(serializer, trie, map, search_type_map, symbol_count, shard_prefix_length=state.config['SEARCH_SHARD_PREFIX_LENGTH'], short_query_max_results=state.config['SEARCH_SHARD_MAX_RESULTS'], merge_subtrees=merge_subtrees, merge_prefixes=merge_prefixes)
+
+    return serialize_search_data(serializer, trie, map, search_type_map, symbol_count, merge_subtrees=merge_subtrees, merge_prefixes=merge_prefixes)
 
 def parse_xml(state: State, xml: str):
     # Reset counter for unique math formulas
@@ -2769,10 +2882,14 @@ def parse_xml(state: State, xml: str):
 
     logging.debug("Parsing {}".format(state.current))
 
-    try:
-        tree = ET.parse(xml)
-    except ET.ParseError as e:
-        return
+    # Reuse the tree parsed in extract_metadata(), if it was kept
+    if xml in state.parsed_xml:
+        tree = state.parsed_xml.pop(xml)
+    else:
+        try:
+            tree = _parse_xml(state, xml)
+        except ET.ParseError as e:
+            return
     root = tree.getroot()
     if root.tag != 'doxygen':
         return
@@ -2796,11 +2913,34 @@ def parse_xml(state: State, xml: str):
         logging.debug("{}: only private things, skipping".format(state.current))
         return None
 
+    # Render all math formulas in the file in batches upfront, parse_desc()
+    # then only fetches them from the cache. Similarly render all graphs in
+    # parallel upfront. Files passed to @dotfile that weren't found get
+    # reported in parse_desc(). If the file is parsed in a streaming fashion,
+    # the members aren't in the tree, their formulas and graphs were collected
+    # by _parse_xml_skeleton() instead.
+    formulas = []
+    dot_sources = []
+    for i in [*compounddef.iter(), *getattr(tree, 'streamed_prefetch', [])]:
+        if i.tag == 'formula':
+            if i.text: formulas += [i.text]
+        elif i.tag == 'dot':
+            if i.text: dot_sources += [i.text]
+        elif i.tag == 'dotfile':
+            if 'name' in i.attrib: dot_sources += [read_dotfile(state, i)]
+    if not state.config['M_MATH_RENDER_AS_CODE']:
+        latex2svgextra.prefetch(formulas)
+    dot2svg.prefetch(dot_sources)
+
     # In order to show also undocumented members, go through all empty
     # <briefdescription>s and fill them with a generic text.
     if state.config['SHOW_UNDOCUMENTED']:
         _document_all_stuff(compounddef)
 
+    # If the file was too large and got parsed in a streaming fashion, section
+    # members are read from it only once the sections get processed below
+    members = _MemberdefStream(xml, state.config['SHOW_UNDOCUMENTED'])
+
     # Ignoring compounds w/o any description, except for groups,
     # which are created explicitly. Pages are treated as having something
     # unless they're stupid. See the function for details.
@@ -3193,43 +3333,45 @@ def parse_xml(state: State, xml: str):
             if is_stupid:
                 continue
 
+            memberdefs = members.memberdefs(compounddef_child)
+
             if compounddef_child.attrib['kind'] == 'enum':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     enum = parse_enum(state, memberdef)
                     if enum:
                         compound.enums += [enum]
                         if enum.has_details: compound.has_enum_details = True
 
             elif compounddef_child.attrib['kind'] == 'typedef':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     typedef = parse_typedef(state, memberdef)
                     if typedef:
                         compound.typedefs += [typedef]
                         if typedef.has_details: compound.has_typedef_details = True
 
             elif compounddef_child.attrib['kind'] == 'func':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     func = parse_func(state, memberdef)
                     if func:
                         compound.funcs += [func]
                         if func.has_details: compound.has_func_details = True
 
             elif compounddef_child.attrib['kind'] == 'var':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     var = parse_var(state, memberdef)
                     if var:
                         compound.vars += [var]
                         if var.has_details: compound.has_var_details = True
 
             elif compounddef_child.attrib['kind'] == 'define':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     define = parse_define(state, memberdef)
                     if define:
                         compound.defines += [define]
                         if define.has_details: compound.has_define_details = True
 
             elif compounddef_child.attrib['kind'] == 'public-type':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     if memberdef.attrib['kind'] == 'enum':
                         member = parse_enum(state, memberdef)
                         if member and member.has_details: compound.has_enum_details = True
@@ -3241,14 +3383,14 @@ def parse_xml(state: State, xml: str):
                     if member: compound.public_types += [(memberdef.attrib['kind'], member)]
 
             elif compounddef_child.attrib['kind'] == 'public-static-func':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     func = parse_func(state, memberdef)
                     if func:
                         compound.public_static_funcs += [func]
                         if func.has_details: compound.has_func_details = True
 
             elif compounddef_child.attrib['kind'] == 'public-func':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     func = parse_func(state, memberdef)
                     if func:
                         if func.type:
@@ -3258,35 +3400,35 @@ def parse_xml(state: State, xml: str):
                         if func.has_details: compound.has_func_details = True
 
             elif compounddef_child.attrib['kind'] == 'signal':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     func = parse_func(state, memberdef)
                     if func:
                         compound.signals += [func]
                         if func.has_details: compound.has_func_details = True
 
             elif compounddef_child.attrib['kind'] == 'public-slot':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     func = parse_func(state, memberdef)
                     if func:
                         compound.public_slots += [func]
                         if func.has_details: compound.has_func_details = True
 
             elif compounddef_child.attrib['kind'] == 'public-static-attrib':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     var = parse_var(state, memberdef)
                     if var:
                         compound.public_static_vars += [var]
                         if var.has_details: compound.has_var_details = True
 
             elif compounddef_child.attrib['kind'] == 'public-attrib':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     var = parse_var(state, memberdef)
                     if var:
                         compound.public_vars += [var]
                         if var.has_details: compound.has_var_details = True
 
             elif compounddef_child.attrib['kind'] == 'protected-type':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     if memberdef.attrib['kind'] == 'enum':
                         member = parse_enum(state, memberdef)
                         if member and member.has_details: compound.has_enum_details = True
@@ -3298,14 +3440,14 @@ def parse_xml(state: State, xml: str):
                     if member: compound.protected_types += [(memberdef.attrib['kind'], member)]
 
             elif compounddef_child.attrib['kind'] == 'protected-static-func':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     func = parse_func(state, memberdef)
                     if func:
                         compound.protected_static_funcs += [func]
                         if func.has_details: compound.has_func_details = True
 
             elif compounddef_child.attrib['kind'] == 'protected-func':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     func = parse_func(state, memberdef)
                     if func:
                         if func.type:
@@ -3315,21 +3457,21 @@ def parse_xml(state: State, xml: str):
                         if func.has_details: compound.has_func_details = True
 
             elif compounddef_child.attrib['kind'] == 'protected-slot':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     func = parse_func(state, memberdef)
                     if func:
                         compound.protected_slots += [func]
                         if func.has_details: compound.has_func_details = True
 
             elif compounddef_child.attrib['kind'] == 'protected-static-attrib':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     var = parse_var(state, memberdef)
                     if var:
                         compound.protected_static_vars += [var]
                         if var.has_details: compound.has_var_details = True
 
             elif compounddef_child.attrib['kind'] == 'protected-attrib':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     var = parse_var(state, memberdef)
                     if var:
                         compound.protected_vars += [var]
@@ -3338,7 +3480,7 @@ def parse_xml(state: State, xml: str):
             elif compounddef_child.attrib['kind'] in ['private-func', 'private-slot']:
                 # Gather only private functions that are virtual and
                 # documented
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     if memberdef.attrib['virt'] == 'non-virtual' or (not memberdef.find('briefdescription').text and not memberdef.find('detaileddescription').text):
                         assert True # coverage.py can't handle continue
                         continue # pragma: no cover
@@ -3352,7 +3494,7 @@ def parse_xml(state: State, xml: str):
                         if func.has_details: compound.has_func_details = True
 
             elif compounddef_child.attrib['kind'] == 'related':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     if memberdef.attrib['kind'] == 'enum':
                         enum = parse_enum(state, memberdef)
                         if enum:
@@ -3382,7 +3524,7 @@ def parse_xml(state: State, xml: str):
                         logging.warning("{}: unknown related <memberdef> kind {}".format(state.current, memberdef.attrib['kind']))
 
             elif compounddef_child.attrib['kind'] == 'friend':
-                for memberdef in compounddef_child:
+                for memberdef in memberdefs:
                     # Ignore friend classes. This does not ignore friend
                     # classes written as `friend Foo;`, those are parsed as
                     # variables (ugh). Since Doxygen 1.9 the `friend ` prefix
@@ -3402,7 +3544,8 @@ def parse_xml(state: State, xml: str):
                 list = []
 
                 memberdef: ET.Element
-                for memberdef in compounddef_child.findall('memberdef'):
+                for memberdef in memberdefs:
+                    if memberdef.tag != 'memberdef': continue
                     if memberdef.attrib['kind'] == 'enum':
                         enum = parse_enum(state, memberdef)
                         if enum:
@@ -3633,7 +3776,7 @@ def parse_xml(state: State, xml: str):
             kind = EntryType.GROUP
         else: assert False # pragma: no cover
 
-        result = Empty()
+        result = SearchResult()
         result.flags = ResultFlag.from_type(ResultFlag.DEPRECATED if compound.deprecated else ResultFlag(0), kind)
         result.url = compound.url
         result.prefix = state.current_prefix[:-1]
@@ -3649,7 +3792,11 @@ def parse_xml(state: State, xml: str):
 def parse_index_xml(state: State, xml):
     logging.debug("Parsing {}".format(os.path.basename(xml)))
 
-    tree = ET.parse(xml)
+    # Reuse the tree parsed in extract_metadata(), if it was kept
+    if xml in state.parsed_xml:
+        tree = state.parsed_xml.pop(xml)
+    else:
+        tree = ET.parse(xml)
     root = tree.getroot()
     assert root.tag == 'doxygenindex'
 
@@ -3938,6 +4085,8 @@ def parse_doxyfile(state: State, doxyfile, values = None):
         ('M_SEARCH_RESULT_ID_BYTES', 'SEARCH_RESULT_ID_BYTES', int),
         ('M_SEARCH_FILE_OFFSET_BYTES', 'SEARCH_FILE_OFFSET_BYTES', int),
         ('M_SEARCH_NAME_SIZE_BYTES', 'SEARCH_NAME_SIZE_BYTES', int),
+        ('M_SEARCH_SHARD_PREFIX_LENGTH', 'SEARCH_SHARD_PREFIX_LENGTH', int),
+        ('M_SEARCH_SHARD_MAX_RESULTS', 'SEARCH_SHARD_MAX_RESULTS', int),
         ('M_SEARCH_HELP', 'SEARCH_HELP', str),
         ('M_SEARCH_BASE_URL', 'SEARCH_BASE_URL', str),
         ('M_SEARCH_EXTERNAL_URL', 'SEARCH_EXTERNAL_URL', str),
@@ -3947,6 +4096,9 @@ def parse_doxyfile(state: State, doxyfile, values = None):
 
         ('M_MATH_CACHE_FILE', 'M_MATH_CACHE_FILE', str),
         ('M_MATH_RENDER_AS_CODE', 'M_MATH_RENDER_AS_CODE', bool),
+        ('M_MATH_PRECOMPILE_PREAMBLE', 'M_MATH_PRECOMPILE_PREAMBLE', bool),
+        ('M_DOT_CACHE_FILE', 'M_DOT_CACHE_FILE', str),
+        ('M_CODE_CACHE_FILE', 'M_CODE_CACHE_FILE', str),
     ]:
         if key not in values: continue
 
@@ -4082,9 +4234,168 @@ def parse_doxyfile(state: State, doxyfile, values = None):
 
 default_index_pages = ['pages', 'files', 'namespaces', 'modules', 'annotated']
 default_wildcard = '*.xml'
+default_xml_cache_size = 128*1024*1024
+default_xml_stream_threshold = 64*1024*1024
 default_templates = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'templates/doxygen/')
 
-def run(state: State, *, templates=default_templates, wildcard=default_wildcard, index_pages=default_index_pages, search_add_lookahead_barriers=True, search_merge_subtrees=True, search_merge_prefixes=True, sort_globbed_files=False):
+# Returns the compound URL or None if nothing was rendered
+def render_compound(state: State, env: Environment, html_output: str, xml: str) -> str:
+    begin = time.perf_counter()
+
+    with phase(state.telemetry, 'parse'):
+        parsed = parse_xml(state, xml)
+    if not parsed: return None
+
+    with phase(state.telemetry, 'template render'):
+        template = env.get_template('{}.html'.format(parsed.compound.kind))
+        rendered = template.render(compound=parsed.compound,
+            DOXYGEN_VERSION=parsed.version,
+            FILENAME=parsed.compound.url,
+            SEARCHDATA_FORMAT_VERSION=searchdata_format_version,
+            # TODO: whitelist only what matters from doxyfile
+            **state.doxyfile, **state.config)
+
+    with phase(state.telemetry, 'file write'):
+        output = os.path.join(html_output, parsed.compound.url)
+        # Add back a trailing newline so we don't need to bother with patching
+        # test files to include a trailing newline to make Git happy. Can't
+        # use keep_trailing_newline because that'd add it also for nested
+        # templates :( The rendered file should never contain a trailing
+        # newline on its own.
+        assert not rendered.endswith('\n')
+        state.writer.write(output, rendered.encode('utf-8') + b'\n')
+
+    if state.telemetry:
+        state.telemetry.item(parsed.compound.kind, parsed.compound.url, time.perf_counter() - begin)
+
+    return parsed.compound.url
+
+# Stands in for State.compounds and records IDs of all compounds that were
+# looked up, including ones that don't exist
+class _CompoundLookupRecorder:
+    def __init__(self, compounds: Dict[str, StateCompound]):
+        self.compounds = compounds
+        self.ids = set()
+
+    def __getitem__(self, id: str) -> StateCompound:
+        self.ids.add(id)
+        return self.compounds[id]
+
+    def __contains__(self, id: str) -> bool:
+        self.ids.add(id)
+        return id in self.compounds
+
+# Helper modules with a persistent cache. Updates to their caches done when
+# rendering a compound are recorded by render_compound_recorded(), to
+# propagate them from worker processes back to the parent process and to
+# keep them marked as used in incremental builds.
+_cached_renderers = [latex2svgextra, dot2svg, pygmentsextra]
+
+# Counters of external tool invocations and cache hits included in build
+# statistics
+_telemetry_counters = {
+    'latex2svg': latex2svg.stats,
+    'latex2svgextra': latex2svgextra.stats,
+    'dot2svg': dot2svg.stats,
+    'pygmentsextra': pygmentsextra.stats
+}
+
+def merge_cache_updates(cache_updates: List[Dict]):
+    for renderer, updates in zip(_cached_renderers, cache_updates):
+        if updates: renderer.merge_cache_updates(updates)
+
+# Like render_compound(), but additionally returns everything the compound
+# added to the state together with IDs of all compounds it depends on. Used to
+# merge the results back from worker processes and for incremental builds.
+def render_compound_recorded(state: State, env: Environment, html_output: str, xml: str):
+    search_begin = len(state.search)
+    images_begin = len(state.images)
+    compounds = state.compounds
+    state.compounds = _CompoundLookupRecorder(compounds)
+    for renderer in _cached_renderers: renderer.cache_updates = {}
+    try:
+        out = Empty()
+        out.url = render_compound(state, env, html_output, xml)
+        out.dependencies = state.compounds.ids
+        out.search = state.search[search_begin:]
+        out.images = state.images[images_begin:]
+        out.cache_updates = [renderer.cache_updates for renderer in _cached_renderers]
+        return out
+    finally:
+        state.compounds = compounds
+        for renderer in _cached_renderers: renderer.cache_updates = None
+
+# State, Jinja environment and output directory inherited by worker processes
+# when rendering with more than one job. See run() for details.
+_parallel_context = None
+
+def _render_compound_in_worker(xml: str):
+    state, env, html_output = _parallel_context
+
+    # Each worker has its own copy of the state, reset what got added for
+    # previously processed files as the parent process has it already
+    state.search = []
+    state.images = []
+
+    # The background thread of the parent writer doesn't exist in the forked
+    # worker, write synchronously instead. The workers run in parallel anyway.
+    state.writer = OutputWriter(background=False)
+
+    # Same for build statistics, the parent merges them
+    if state.telemetry:
+        state.telemetry = Telemetry(_telemetry_counters)
+        state.telemetry.track('output', state.writer.stats)
+        recorded = render_compound_recorded(state, env, html_output, xml)
+        recorded.telemetry = state.telemetry.snapshot()
+        return recorded
+
+    return render_compound_recorded(state, env, html_output, xml)
+
+# Version of the incremental build manifest. Bump when its structure or
+# anything that affects the rendered output without being in the signature
+# calculated by _build_signature() changes.
+_manifest_version = 3
+
+def _file_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+# Strip memory addresses from reprs of functions and other objects in config
+# values so the signature is stable across runs
+_repr_address_rx = re.compile(' at 0x[0-9a-fA-F]+')
+
+def _compound_signature(compound: StateCompound) -> str:
+    return hashlib.sha1(_repr_address_rx.sub('', repr(sorted(compound.attributes().items()))).encode('utf-8')).hexdigest()
+
+# Signature of everything that affects both the extracted metadata and all
+# rendered compounds -- code of this script and its helpers, templates and
+# configuration
+def _config_signature(state: State, template_paths: List[str]) -> str:
+    signature = hashlib.sha1()
+    for file in [__file__, dot2svg.__file__, latex2svg.__file__, latex2svgextra.__file__, ansilexer.__file__, pygmentsextra.__file__]:
+        signature.update(_file_hash(file).encode('utf-8'))
+    for path in template_paths:
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for file in sorted(filenames):
+                signature.update(file.encode('utf-8'))
+                signature.update(_file_hash(os.path.join(dirpath, file)).encode('utf-8'))
+    signature.update(_repr_address_rx.sub('', repr((pygments.__version__, state.doxyfile, state.config))).encode('utf-8'))
+    return signature.hexdigest()
+
+# Signature of everything that affects all rendered compounds -- the above
+# plus global state that's not tracked per compound
+def _build_signature(state: State, config_signature: str) -> str:
+    signature = hashlib.sha1(config_signature.encode('utf-8'))
+    signature.update(_repr_address_rx.sub('', repr((state.includes, state.examples))).encode('utf-8'))
+    return signature.hexdigest()
+
+def run(state: State, *, templates=default_templates, wildcard=default_wildcard, index_pages=default_index_pages, search_add_lookahead_barriers=True, search_merge_subtrees=True, search_merge_prefixes=True, sort_globbed_files=False, jobs=1, xml_cache_size=default_xml_cache_size, xml_stream_threshold=default_xml_stream_threshold, incremental=False, telemetry: Telemetry = None):
+    state.telemetry = telemetry
+    state.writer = OutputWriter()
+    if state.telemetry:
+        state.telemetry.track('output', state.writer.stats)
+
     xml_input = os.path.join(state.basedir, state.doxyfile['OUTPUT_DIRECTORY'], state.doxyfile['XML_OUTPUT'])
     xml_files_metadata = [os.path.join(xml_input, f) for f in glob.glob(os.path.join(xml_input, "*.xml"))]
     xml_files = [os.path.join(xml_input, f) for f in glob.glob(os.path.join(xml_input, wildcard))]
@@ -4093,14 +4404,19 @@ def run(state: State, *, templates=default_templates, wildcard=default_wildcard,
     # If math rendering cache is not disabled, load the previous version. If
     # there is no cache, reset the cache to an empty state to avoid
     # order-dependent issues when testing
-    math_cache_file = os.path.join(state.basedir, state.doxyfile['OUTPUT_DIRECTORY'], state.config['M_MATH_CACHE_FILE'])
-    if state.config['M_MATH_CACHE_FILE'] and os.path.exists(math_cache_file):
-        latex2svgextra.unpickle_cache(math_cache_file)
-    else:
-        latex2svgextra.unpickle_cache(None)
+    latex2svgextra.load_cache(os.path.join(state.basedir, state.doxyfile['OUTPUT_DIRECTORY'], state.config['M_MATH_CACHE_FILE']) if state.config['M_MATH_CACHE_FILE'] else None)
+
+    # If enabled, the precompiled math preamble is put into the output
+    # directory next to the cache
+    latex2svgextra.params['format_dir'] = os.path.join(state.basedir, state.doxyfile['OUTPUT_DIRECTORY']) if state.config['M_MATH_PRECOMPILE_PREAMBLE'] else None
 
-    # Configure graphviz/dot
+    # Configure graphviz/dot and load the graph cache the same way as the math
+    # cache above
     dot2svg.configure(state.doxyfile['DOT_FONTNAME'], state.doxyfile['DOT_FONTSIZE'])
+    dot2svg.load_cache(os.path.join(state.basedir, state.doxyfile['OUTPUT_DIRECTORY'], state.config['M_DOT_CACHE_FILE']) if state.config['M_DOT_CACHE_FILE'] else None)
+
+    # Code highlighting cache is disabled by default
+    pygmentsextra.load_cache(os.path.join(state.basedir, state.doxyfile['OUTPUT_DIRECTORY'], state.config['M_CODE_CACHE_FILE']) if state.config['M_CODE_CACHE_FILE'] else None)
 
     if sort_globbed_files:
         xml_files_metadata.sort()
@@ -4132,59 +4448,230 @@ def run(state: State, *, templates=default_templates, wildcard=default_wildcard,
     #   linking pages
     # - get URLs of namespace, class, file docs and pages so we can link to
     #   them from breadcrumb navigation
+    #
+    # The parsed trees of files that get processed again below are kept so
+    # each file is parsed just once. As the in-memory representation is
+    # several times larger than the XML itself, at most xml_cache_size bytes
+    # worth of XML files is kept, the rest gets parsed again.
+    xml_files_to_keep = set(xml_files)
+    xml_cache_remaining = xml_cache_size
+
+    # Files larger than this are parsed without keeping members of all
+    # sections in memory at once, see _parse_xml_skeleton() for details
+    state.xml_stream_threshold = xml_stream_threshold
+
+    # For incremental builds, load the manifest from the previous run. For
+    # every XML file it contains its hash, metadata extracted from it, and
+    # if it was rendered, IDs of all compounds the output depends on together
+    # with their signatures and everything the compound added to the state.
+    # If there's no usable manifest, everything is processed from scratch.
+    if incremental:
+        manifest_file = os.path.join(state.basedir, state.doxyfile['OUTPUT_DIRECTORY'], 'm.doxygen.manifest')
+        previous_manifest = None
+        if os.path.exists(manifest_file):
+            with open(manifest_file, 'rb') as f:
+                previous_manifest = pickle.load(f)
+            if previous_manifest['version'] != _manifest_version:
+                previous_manifest = None
+        # If the code, templates or configuration changed, the metadata
+        # extracted last time can't be reused either, as they depend on it
+        config_signature = _config_signature(state, template_paths)
+        if not previous_manifest or previous_manifest['config_signature'] != config_signature:
+            previous_manifest = {'version': _manifest_version,
+                                 'config_signature': None,
+                                 'signature': None,
+                                 'files': {}}
+        manifest = {'version': _manifest_version,
+                    'config_signature': config_signature,
+                    'signature': None,
+                    'files': {}}
+
     file: str
-    for file in xml_files_metadata:
-        extract_metadata(state, file)
-
-    postprocess_state(state)
-
-    for file in xml_files:
-        if os.path.basename(file) == 'index.xml':
-            parsed = parse_index_xml(state, file)
-
-            for i in index_pages:
-                file = '{}.html'.format(i)
-
-                template = env.get_template(file)
-                rendered = template.render(index=parsed.index,
-                    DOXYGEN_VERSION=parsed.version,
-                    FILENAME=file,
-                    SEARCHDATA_FORMAT_VERSION=searchdata_format_version,
-                    # TODO: whitelist only what matters from doxyfile
-                    **state.doxyfile, **state.config)
-
-                output = os.path.join(html_output, file)
-                with open(output, 'wb') as f:
-                    f.write(rendered.encode('utf-8'))
-                    # Add back a trailing newline so we don't need to bother
-                    # with patching test files to include a trailing newline to
-                    # make Git happy. Can't use keep_trailing_newline because
-                    # that'd add it also for nested templates :( The rendered
-                    # file should never contain a trailing newline on its own.
-                    assert not rendered.endswith('\n')
-                    f.write(b'\n')
+    with phase(state.telemetry, 'metadata'):
+        for file in xml_files_metadata:
+            if incremental:
+                name = os.path.basename(file)
+                entry = Empty()
+                entry.hash = _file_hash(file)
+                manifest['files'][name] = entry
+
+                # If the file didn't change, reuse the metadata extracted last
+                # time. The index is always parsed again as it's needed for the
+                # index pages anyway.
+                previous = previous_manifest['files'].get(name)
+                if previous and previous.hash == entry.hash and name != 'index.xml':
+                    entry.compound = previous.compound
+                    entry.metadata_images = previous.metadata_images
+                    if entry.compound:
+                        compound = StateCompound()
+                        for key, value in entry.compound.items():
+                            setattr(compound, key, value)
+                        state.compounds[compound.id] = compound
+                    state.images += entry.metadata_images
+                    continue
+
+                compound_count = len(state.compounds)
+                images_begin = len(state.images)
+
+            tree = extract_metadata(state, file)
+
+            if incremental:
+                # Save a copy of the compound attributes before they get modified
+                # by postprocess_state()
+                entry.compound = state.compounds[tree.getroot()[0].attrib['id']].attributes() if len(state.compounds) != compound_count else None
+                entry.metadata_images = state.images[images_begin:]
+
+            if tree is None or file not in xml_files_to_keep: continue
+
+            size = os.path.getsize(file)
+            if size <= xml_cache_remaining:
+                state.parsed_xml[file] = tree
+                xml_cache_remaining -= size
+
+        postprocess_state(state)
+
+    # Decide which compounds need to be rendered again. That's the case if
+    # anything global changed, if the XML file changed or if any compound the
+    # output depends on changed. Metadata of the compounds are compared after
+    # postprocessing, as for example a namespace name may change due to its
+    # parent changing.
+    up_to_date = {}
+    if incremental:
+        manifest['signature'] = _build_signature(state, config_signature)
+        compound_signatures = {id: _compound_signature(compound) for id, compound in state.compounds.items()}
+
+        if manifest['signature'] == previous_manifest['signature']:
+            for file in xml_files:
+                name = os.path.basename(file)
+                previous = previous_manifest['files'].get(name)
+                if (name == 'index.xml' or not previous or
+                    not hasattr(previous, 'dependencies') or
+                    previous.hash != manifest['files'][name].hash or
+                    (previous.url and not os.path.exists(os.path.join(html_output, previous.url)))):
+                    continue
+                for id, signature in previous.dependencies.items():
+                    if compound_signatures.get(id) != signature: break
+                else: up_to_date[file] = previous
+
+        logging.debug("{} out of {} compounds up-to-date".format(len(up_to_date), len(xml_files)))
+
+    # With more than one job, parse and render all compounds except for the
+    # index in a pool of worker processes. The workers are forked after the
+    # pre-pass, so they inherit the fully populated state and the template
+    # environment, neither of which is picklable. The results are consumed in
+    # the original file order in the loop below.
+    pool = None
+    if jobs > 1:
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            logging.warning("parallel rendering requires the fork start method, which is not available on this platform, using a single job")
         else:
-            parsed = parse_xml(state, file)
-            if not parsed: continue
-
-            template = env.get_template('{}.html'.format(parsed.compound.kind))
-            rendered = template.render(compound=parsed.compound,
-                DOXYGEN_VERSION=parsed.version,
-                FILENAME=parsed.compound.url,
-                SEARCHDATA_FORMAT_VERSION=searchdata_format_version,
-                # TODO: whitelist only what matters from doxyfile
-                **state.doxyfile, **state.config)
-
-            output = os.path.join(html_output, parsed.compound.url)
-            with open(output, 'wb') as f:
-                f.write(rendered.encode('utf-8'))
-                # Add back a trailing newline so we don't need to bother with
-                # patching test files to include a trailing newline to make Git
-                # happy. Can't use keep_trailing_newline because that'd add it
-                # also for nested templates :( The rendered file should never
-                # contain a trailing newline on its own.
-                assert not rendered.endswith('\n')
-                f.write(b'\n')
+            logging.debug("rendering compounds using {} jobs".format(jobs))
+
+            # The background writer thread is stopped for the lifetime of the
+            # pool, forking while it holds a lock could deadlock the workers
+            global _parallel_context
+            _parallel_context = (state, env, html_output)
+            state.writer.pause()
+            pool = multiprocessing.get_context('fork').Pool(jobs)
+            parallel_results = pool.imap(_render_compound_in_worker, [file for file in xml_files if os.path.basename(file) != 'index.xml' and file not in up_to_date])
+
+    # If anything fails, the workers are terminated instead of being left
+    # behind
+    try:
+        for file in xml_files:
+            if os.path.basename(file) == 'index.xml':
+                with phase(state.telemetry, 'parse'):
+                    parsed = parse_index_xml(state, file)
+
+                for i in index_pages:
+                    file = '{}.html'.format(i)
+
+                    with phase(state.telemetry, 'template render'):
+                        template = env.get_template(file)
+                        rendered = template.render(index=parsed.index,
+                            DOXYGEN_VERSION=parsed.version,
+                            FILENAME=file,
+                            SEARCHDATA_FORMAT_VERSION=searchdata_format_version,
+                            # TODO: whitelist only what matters from doxyfile
+                            **state.doxyfile, **state.config)
+
+                    with phase(state.telemetry, 'file write'):
+                        output = os.path.join(html_output, file)
+                        # Add back a trailing newline so we don't need to bother
+                        # with patching test files to include a trailing newline
+                        # to make Git happy. Can't use keep_trailing_newline
+                        # because that'd add it also for nested templates :( The
+                        # rendered file should never contain a trailing newline on
+                        # its own.
+                        assert not rendered.endswith('\n')
+                        state.writer.write(output, rendered.encode('utf-8') + b'\n')
+                continue
+
+            # Compound that doesn't need to be rendered again, add what it
+            # contributed to the state last time. This is done in the same order
+            # as if it was rendered, so the search data are the same as in a
+            # full build.
+            if file in up_to_date:
+                recorded = up_to_date[file]
+                # The tree parsed for metadata isn't needed
+                state.parsed_xml.pop(file, None)
+                state.search += recorded.search
+                state.images += recorded.images
+                merge_cache_updates(recorded.cache_updates)
+
+            elif pool:
+                # Merge back everything the worker added to the state in the same
+                # order as it would be added in the serial case, so the output is
+                # the same regardless of the job count
+                recorded = next(parallel_results)
+                # The tree was consumed by the worker, drop the parent copy
+                state.parsed_xml.pop(file, None)
+                state.search += recorded.search
+                state.images += recorded.images
+                merge_cache_updates(recorded.cache_updates)
+                if state.telemetry:
+                    state.telemetry.merge(recorded.telemetry)
+
+            elif incremental:
+                recorded = render_compound_recorded(state, env, html_output, file)
+
+            else:
+                render_compound(state, env, html_output, file)
+                continue
+
+            # Save the signatures of all compounds the output depends on
+            if incremental:
+                entry = manifest['files'][os.path.basename(file)]
+                entry.url = recorded.url
+                entry.search = recorded.search
+                entry.images = recorded.images
+                entry.cache_updates = recorded.cache_updates
+                if file in up_to_date:
+                    entry.dependencies = recorded.dependencies
+                else:
+                    entry.dependencies = {id: compound_signatures.get(id) for id in recorded.dependencies}
+    except BaseException:
+        if pool: pool.terminate()
+        raise
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+            _parallel_context = None
+            state.writer.resume()
+
+    # Remove output of compounds whose XML files disappeared or that are no
+    # longer rendered since the last incremental build. Files excluded by the
+    # wildcard are left untouched.
+    if incremental:
+        urls = {entry.url for entry in manifest['files'].values() if hasattr(entry, 'url')}
+        for name, entry in previous_manifest['files'].items():
+            if not getattr(entry, 'url', None) or entry.url in urls: continue
+            if name in manifest['files'] and not hasattr(manifest['files'][name], 'url'): continue
+            output = os.path.join(html_output, entry.url)
+            if os.path.exists(output):
+                logging.debug("removing stale {}".format(entry.url))
+                os.remove(output)
 
     # Empty index page in case no mainpage documentation was provided so
     # there's at least some entrypoint. Doxygen version is not set in this
@@ -4205,27 +4692,33 @@ def run(state: State, *, templates=default_templates, wildcard=default_wildcard,
             # TODO: whitelist only what matters from doxyfile
             **state.doxyfile, **state.config)
         output = os.path.join(html_output, 'index.html')
-        with open(output, 'wb') as f:
-            f.write(rendered.encode('utf-8'))
-            # Add back a trailing newline so we don't need to bother with
-            # patching test files to include a trailing newline to make Git
-            # happy. Can't use keep_trailing_newline because that'd add it
-            # also for nested templates :( The rendered file should never
-            # contain a trailing newline on its own.
-            assert not rendered.endswith('\n')
-            f.write(b'\n')
+        # Add back a trailing newline so we don't need to bother with patching
+        # test files to include a trailing newline to make Git happy. Can't
+        # use keep_trailing_newline because that'd add it also for nested
+        # templates :( The rendered file should never contain a trailing
+        # newline on its own.
+        assert not rendered.endswith('\n')
+        state.writer.write(output, rendered.encode('utf-8') + b'\n')
 
     if not state.config['SEARCH_DISABLED']:
         logging.debug("building search data for {} symbols".format(len(state.search)))
 
-        data = build_search_data(state, add_lookahead_barriers=search_add_lookahead_barriers, merge_subtrees=search_merge_subtrees, merge_prefixes=search_merge_prefixes)
+        with phase(state.telemetry, 'search data build'):
+            data = build_search_data(state, add_lookahead_barriers=search_add_lookahead_barriers, merge_subtrees=search_merge_subtrees, merge_prefixes=search_merge_prefixes)
+        if state.config['SEARCH_SHARD_PREFIX_LENGTH']:
+            data, shards = data
+            logging.debug("writing {} search data shards".format(len(shards)))
+        else:
+            shards = []
 
         if state.config['SEARCH_DOWNLOAD_BINARY']:
-            with open(os.path.join(html_output, searchdata_filename.format(search_filename_prefix=state.config['SEARCH_FILENAME_PREFIX'])), 'wb') as f:
-                f.write(data)
+            state.writer.write(os.path.join(html_output, searchdata_filename.format(search_filename_prefix=state.config['SEARCH_FILENAME_PREFIX'])), data)
+            for prefix, shard in shards:
+                state.writer.write(os.path.join(html_output, searchdata_shard_filename.format(search_filename_prefix=state.config['SEARCH_FILENAME_PREFIX'], shard=prefix.hex())), shard)
         else:
-            with open(os.path.join(html_output, searchdata_filename_b85.format(search_filename_prefix=state.config['SEARCH_FILENAME_PREFIX'])), 'wb') as f:
-                f.write(base85encode_search_data(data))
+            state.writer.write(os.path.join(html_output, searchdata_filename_b85.format(search_filename_prefix=state.config['SEARCH_FILENAME_PREFIX'])), base85encode_search_data(data))
+            for prefix, shard in shards:
+                state.writer.write(os.path.join(html_output, searchdata_shard_filename_b85.format(search_filename_prefix=state.config['SEARCH_FILENAME_PREFIX'], shard=prefix.hex())), base85encode_search_data(shard, shard=prefix.hex()))
 
         # OpenSearch metadata, in case we have the base URL
         if state.config['SEARCH_BASE_URL']:
@@ -4235,39 +4728,46 @@ def run(state: State, *, templates=default_templates, wildcard=default_wildcard,
             # TODO: whitelist only what matters from doxyfile
             rendered = template.render(**state.doxyfile, **state.config)
             output = os.path.join(html_output, 'opensearch.xml')
-            with open(output, 'wb') as f:
-                f.write(rendered.encode('utf-8'))
-                # Add back a trailing newline so we don't need to bother with
-                # patching test files to include a trailing newline to make Git
-                # happy. Can't use keep_trailing_newline because that'd add it
-                # also for nested templates :( The rendered file should never
-                # contain a trailing newline on its own.
-                assert not rendered.endswith('\n')
-                f.write(b'\n')
+            # Add back a trailing newline so we don't need to bother with
+            # patching test files to include a trailing newline to make Git
+            # happy. Can't use keep_trailing_newline because that'd add it
+            # also for nested templates :( The rendered file should never
+            # contain a trailing newline on its own.
+            assert not rendered.endswith('\n')
+            state.writer.write(output, rendered.encode('utf-8') + b'\n')
 
     # Copy all referenced files
-    for i in state.images + state.config['STYLESHEETS'] + state.config['EXTRA_FILES'] + ([state.doxyfile['PROJECT_LOGO']] if state.doxyfile['PROJECT_LOGO'] else []) + ([state.config['FAVICON'][0]] if state.config['FAVICON'] else []) + ([] if state.config['SEARCH_DISABLED'] else ['search.js']):
-        # Skip absolute URLs
-        if urllib.parse.urlparse(i).netloc: continue
+    with phase(state.telemetry, 'file copy'):
+        for i in state.images + state.config['STYLESHEETS'] + state.config['EXTRA_FILES'] + ([state.doxyfile['PROJECT_LOGO']] if state.doxyfile['PROJECT_LOGO'] else []) + ([state.config['FAVICON'][0]] if state.config['FAVICON'] else []) + ([] if state.config['SEARCH_DISABLED'] else ['search.js']):
+            # Skip absolute URLs
+            if urllib.parse.urlparse(i).netloc: continue
 
-        # The search.js is special, we encode the version information into its
-        # filename
-        file_out = search_filename if i == 'search.js' else i
+            # The search.js is special, we encode the version information into
+            # its filename
+            file_out = search_filename if i == 'search.js' else i
 
-        # If file is found relative to the Doxyfile, use that
-        if os.path.exists(os.path.join(state.basedir, i)):
-            i = os.path.join(state.basedir, i)
+            # If file is found relative to the Doxyfile, use that
+            if os.path.exists(os.path.join(state.basedir, i)):
+                i = os.path.join(state.basedir, i)
 
-        # Otherwise use path relative to script directory
-        else:
-            i = os.path.join(os.path.dirname(os.path.realpath(__file__)), i)
+            # Otherwise use path relative to script directory
+            else:
+                i = os.path.join(os.path.dirname(os.path.realpath(__file__)), i)
 
-        logging.debug("copying {} to output".format(i))
-        shutil.copy(i, os.path.join(html_output, os.path.basename(file_out)))
+            logging.debug("copying {} to output".format(i))
+            state.writer.copy(i, os.path.join(html_output, os.path.basename(file_out)))
 
-    # Save updated math cache file
-    if state.config['M_MATH_CACHE_FILE']:
-        latex2svgextra.pickle_cache(math_cache_file)
+    # Wait until everything is written, propagating any errors
+    with phase(state.telemetry, 'file write'):
+        state.writer.finish()
+
+    # Save updated math, graph and code cache files
+    for renderer in _cached_renderers: renderer.save_cache()
+
+    # Save the manifest for the next incremental build
+    if incremental:
+        with open(manifest_file, 'wb') as f:
+            pickle.dump(manifest, f)
 
 if __name__ == '__main__': # pragma: no cover
     parser = argparse.ArgumentParser()
@@ -4280,6 +4780,12 @@ if __name__ == '__main__': # pragma: no cover
     parser.add_argument('--search-no-lookahead-barriers', help="don't insert search lookahead barriers", action='store_true')
     parser.add_argument('--search-no-prefix-merging', help="don't merge search result prefixes", action='store_true')
     parser.add_argument('--sort-globbed-files', help="sort globbed files for better reproducibility", action='store_true')
+    parser.add_argument('-j', '--jobs', type=int, help="number of processes to parse and render compounds with", default=1)
+    parser.add_argument('--incremental', help="render again only compounds that changed since the previous incremental build", action='store_true')
+    parser.add_argument('--xml-cache-size', type=int, help="how many megabytes of parsed XML files to keep in memory between the metadata and rendering pass", default=default_xml_cache_size//(1024*1024))
+    parser.add_argument('--xml-stream-threshold', type=int, help="parse XML files larger than this many megabytes in a streaming fashion to reduce memory use", default=default_xml_stream_threshold//(1024*1024))
+    parser.add_argument('--profile', metavar='FILE', help="save build statistics as JSON to FILE and print a summary")
+    parser.add_argument('--profile-slowest', metavar='N', type=int, help="how many slowest compounds to include in build statistics", default=10)
     parser.add_argument('--debug', help="verbose debug output", action='store_true')
     args = parser.parse_args()
 
@@ -4288,6 +4794,8 @@ if __name__ == '__main__': # pragma: no cover
     else:
         logging.basicConfig(level=logging.INFO)
 
+    telemetry = Telemetry(_telemetry_counters) if args.profile else None
+
     config = copy.deepcopy(default_config)
 
     if args.config.endswith('.py'):
@@ -4311,6 +4819,10 @@ if __name__ == '__main__': # pragma: no cover
 
     if not args.no_doxygen:
         logging.debug("running Doxygen on {}".format(doxyfile))
-        subprocess.run(["doxygen", doxyfile], cwd=os.path.dirname(doxyfile), check=True)
+        with phase(telemetry, 'doxygen'):
+            subprocess.run(["doxygen", doxyfile], cwd=os.path.dirname(doxyfile), check=True)
+
+    run(state, templates=os.path.abspath(args.templates), wildcard=args.wildcard, index_pages=args.index_pages, search_merge_subtrees=not args.search_no_subtree_merging, search_add_lookahead_barriers=not args.search_no_lookahead_barriers, search_merge_prefixes=not args.search_no_prefix_merging, jobs=args.jobs, xml_cache_size=args.xml_cache_size*1024*1024, xml_stream_threshold=args.xml_stream_threshold*1024*1024, incremental=args.incremental, telemetry=telemetry)
 
-    run(state, templates=os.path.abspath(args.templates), wildcard=args.wildcard, index_pages=args.index_pages, search_merge_subtrees=not args.search_no_subtree_merging, search_add_lookahead_barriers=not args.search_no_lookahead_barriers, search_merge_prefixes=not args.search_no_prefix_merging)
+    if telemetry:
+        logging.info("build statistics saved to {}\n{}".format(args.profile, telemetry.save(args.profile, args.profile_slowest)))
@@ -27,6 +27,8 @@
 #
 
 import argparse
+import collections
+import contextlib
 import copy
 import docutils
 import docutils.core
@@ -36,13 +38,15 @@ import urllib.parse
 import hashlib
 import html
 import importlib
+import importlib.util
 import inspect
 import logging
 import mimetypes
+import multiprocessing
 import os
 import re
 import sys
-import shutil
+import time
 import typing
 
 from enum import Enum
@@ -54,10 +58,14 @@ from docutils.transforms import Transform
 
 import jinja2
 
-from _search import CssClass, ResultFlag, ResultMap, Trie, Serializer, serialize_search_data, base85encode_search_data, searchdata_format_version, search_filename, searchdata_filename, searchdata_filename_b85
+from _output import OutputWriter
+from _telemetry import Telemetry, phase
+from _static import StaticImporter
+from _search import CssClass, ResultFlag, ResultMap, SearchResult, Trie, Serializer, serialize_search_data, base85encode_search_data, searchdata_format_version, search_filename, searchdata_filename, searchdata_filename_b85
 
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../plugins'))
 import m.htmlsanity
+import rendercache
 
 default_templates = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'templates/python/')
 
@@ -168,6 +176,7 @@ default_config = {
 
     'NAME_MAPPING': {},
     'PYBIND11_COMPATIBILITY': False,
+    'STATIC_CRAWL': False,
     'ATTRS_COMPATIBILITY': False,
 
     'SEARCH_DISABLED': False,
@@ -195,21 +204,54 @@ default_config = {
     'URL_FORMATTER': default_url_formatter,
     'ID_FORMATTER': default_id_formatter,
 
+    'DOCSTRING_CACHE': None,
+    'CRAWL_CACHE': None,
+
     'STUB_EXTENSION': '.pyi',
     'STUB_HEADER': "# This file is a stub generated by m.css out of actual Python code. Don't edit\n# directly, modify the original code and regenerate.",
 }
 
+# Entry in State.name_map, there's one for every crawled module, class,
+# function, property, enum, enum value, data and page, so it uses __slots__
+# instead of a SimpleNamespace to not have a __dict__ for each. Attributes
+# that don't apply to given entry type aren't set at all -- in particular, the
+# object is not set for pages. Note that plugins such as m.sphinx can add
+# their own entries, which don't need to be instances of this class.
+class NameMapEntry:
+    __slots__ = ['type', 'object', 'path', 'url', 'css_classes', 'members', 'values', 'filename', 'summary', 'name']
+
+# Dict of external docs, such as State.function_docs. While touched is not
+# None, it records which entries got added or modified through setdefault()
+# or replaced, together with a copy of their previous contents, so the
+# docstring cache can later replay what the docstring hooks did.
+class DocContents(dict):
+    __slots__ = ['touched']
+
+    def __init__(self):
+        dict.__init__(self)
+        self.touched = None
+
+    def setdefault(self, key, default=None):
+        if self.touched is not None and key not in self.touched:
+            self.touched[key] = dict(self[key]) if key in self else {}
+        return dict.setdefault(self, key, default)
+
+    def __setitem__(self, key, value):
+        # None means the entry was replaced and not just updated
+        if self.touched is not None: self.touched[key] = None
+        dict.__setitem__(self, key, value)
+
 class State:
     def __init__(self, config):
         self.config = config
         self.name_mapping: Dict[str, str] = copy.deepcopy(config['NAME_MAPPING'])
-        self.module_docs: Dict[str, Dict[str, str]] = {}
-        self.class_docs: Dict[str, Dict[str, str]] = {}
-        self.enum_docs: Dict[str, Dict[str, str]] = {}
-        self.enum_value_docs: Dict[str, Dict[str, str]] = {}
-        self.function_docs: Dict[str, Dict[str, str]] = {}
-        self.property_docs: Dict[str, Dict[str, str]] = {}
-        self.data_docs: Dict[str, Dict[str, str]] = {}
+        self.module_docs: Dict[str, Dict[str, str]] = DocContents()
+        self.class_docs: Dict[str, Dict[str, str]] = DocContents()
+        self.enum_docs: Dict[str, Dict[str, str]] = DocContents()
+        self.enum_value_docs: Dict[str, Dict[str, str]] = DocContents()
+        self.function_docs: Dict[str, Dict[str, str]] = DocContents()
+        self.property_docs: Dict[str, Dict[str, str]] = DocContents()
+        self.data_docs: Dict[str, Dict[str, str]] = DocContents()
         self.external_data: Set[str] = set()
 
         self.hooks_post_crawl: List = []
@@ -219,11 +261,22 @@ class State:
         self.hooks_pre_page: List = []
         self.hooks_post_run: List = []
 
-        self.name_map: Dict[str, Empty] = {}
-        self.search: List[Any] = []
+        self.name_map: Dict[str, NameMapEntry] = {}
+        self.search: List[SearchResult] = []
 
         self.crawled: Set[object] = set()
 
+        # Build statistics, if enabled
+        self.telemetry: Telemetry = None
+        # Writer for all generated and copied output files, set up in run()
+        self.writer: OutputWriter = None
+        # Persistent cache of processed docstrings, if enabled
+        self.docstring_cache: DocstringCache = None
+        # Persistent cache of crawled packages, if enabled
+        self.crawl_cache: CrawlCache = None
+        # Used instead of importing the packages, if STATIC_CRAWL is enabled
+        self.static_importer: StaticImporter = None
+
         # For collecting module dependencies (i.e., what to import to have all
         # used types known). The `current_module` gets set to the module name
         # at start of render_module() and render_class(), is cleared again when
@@ -414,7 +467,7 @@ _filtered_attrs_functions = set([
 ])
 
 def crawl_enum(state: State, path: List[str], enum_, parent_url):
-    enum_entry = Empty()
+    enum_entry = NameMapEntry()
     enum_entry.type = EntryType.ENUM
     enum_entry.object = enum_
     enum_entry.path = path
@@ -425,7 +478,7 @@ def crawl_enum(state: State, path: List[str], enum_, parent_url):
     if issubclass(enum_, enum.Enum):
         for i in enum_:
             subpath = path + [i.name]
-            entry = Empty()
+            entry = NameMapEntry()
             entry.type = EntryType.ENUM_VALUE
             entry.path = subpath
             entry.url = '{}#{}'.format(parent_url, state.config['ID_FORMATTER'](EntryType.ENUM_VALUE, subpath[-2:]))
@@ -437,7 +490,7 @@ def crawl_enum(state: State, path: List[str], enum_, parent_url):
 
         for name in enum_.__members__:
             subpath = path + [name]
-            entry = Empty()
+            entry = NameMapEntry()
             entry.type = EntryType.ENUM_VALUE
             entry.path = subpath
             entry.url = '{}#{}'.format(parent_url, state.config['ID_FORMATTER'](EntryType.ENUM_VALUE, subpath[-2:]))
@@ -468,7 +521,7 @@ def crawl_class(state: State, path: List[str], class_):
 
     state.crawled.add(id(class_))
 
-    class_entry = Empty()
+    class_entry = NameMapEntry()
     class_entry.type = EntryType.CLASS
     class_entry.object = class_
     class_entry.path = path
@@ -571,7 +624,7 @@ def crawl_class(state: State, path: List[str], class_):
             else: # pragma: no cover
                 assert type_ is None; continue # ignore unknown object types
 
-            entry = Empty()
+            entry = NameMapEntry()
             entry.type = type_
             entry.object = object
             entry.path = subpath
@@ -597,7 +650,7 @@ def crawl_class(state: State, path: List[str], class_):
             # have at least an object to point to (and a value)
             if name in class_entry.members: continue
 
-            entry = Empty()
+            entry = NameMapEntry()
             entry.type = EntryType.DATA
             entry.object = None # TODO will this break things?
             entry.path = subpath
@@ -622,7 +675,7 @@ def crawl_class(state: State, path: List[str], class_):
             if attrib.name not in class_entry.members:
                 class_entry.members += [attrib.name]
 
-            entry = Empty()
+            entry = NameMapEntry()
             entry.type = EntryType.PROPERTY # TODO: or data?
             entry.object = attrib
             entry.path = subpath
@@ -653,7 +706,7 @@ def crawl_module(state: State, path: List[str], module) -> List[Tuple[List[str],
         assert parent_path_str in state.name_map, "%s listed in INPUT_MODULES without %s being known yet, add the parent explicitly earlier" % ('.'.join(path), parent_path_str)
         state.name_map[parent_path_str].members += [path[-1]]
 
-    module_entry = Empty()
+    module_entry = NameMapEntry()
     module_entry.type = EntryType.MODULE
     module_entry.object = module
     module_entry.path = path
@@ -726,7 +779,7 @@ def crawl_module(state: State, path: List[str], module) -> List[Tuple[List[str],
                 crawl_enum(state, subpath, object, module_entry.url)
             else:
                 assert type_ in [EntryType.FUNCTION, EntryType.OVERLOADED_FUNCTION, EntryType.DATA]
-                entry = Empty()
+                entry = NameMapEntry()
                 entry.type = type_
                 entry.object = object
                 entry.path = subpath
@@ -804,7 +857,7 @@ def crawl_module(state: State, path: List[str], module) -> List[Tuple[List[str],
                 crawl_enum(state, subpath, object, module_entry.url)
             else:
                 assert type_ in [EntryType.FUNCTION, EntryType.OVERLOADED_FUNCTION, EntryType.DATA]
-                entry = Empty()
+                entry = NameMapEntry()
                 entry.type = type_
                 entry.object = object
                 entry.path = subpath
@@ -1255,6 +1308,422 @@ def format_value(state: State, referrer_path: List[str], value) -> Optional[Tupl
 def prettify_multiline_error(error: str) -> str:
     return ' | {}\n'.format(error.replace('\n', '\n | '))
 
+# Version of the docstring cache format, bump when the stored data change
+_docstring_cache_version = 0
+
+# Docs dicts in State that docstring hooks can write to
+_doc_contents = ['module', 'class', 'enum', 'enum_value', 'function', 'property', 'data']
+
+# Single backticks, i.e. roles or interpreted text, which could resolve
+# differently depending on the current scope and the name map
+_interpreted_text_re = re.compile(r'(?<!`)`(?!`)')
+
+class _WarningCounter(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self, logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+# Config values such as URL_FORMATTER are functions, which don't have a
+# stable repr(). Use their name and bytecode instead.
+def _config_fingerprint(value) -> str:
+    if isinstance(value, dict):
+        return '{' + ', '.join('{!r}: {}'.format(key, _config_fingerprint(item)) for key, item in value.items()) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(_config_fingerprint(item) for item in value) + ']'
+    if callable(value) and hasattr(value, '__code__'):
+        return '{}.{}:{}'.format(value.__module__, value.__qualname__, hashlib.sha1(value.__code__.co_code).hexdigest())
+    return repr(value)
+
+# Everything except the docstring itself that affects what the docstring
+# hooks do and how the docs get rendered -- the config, sources of
+# python.py and all plugins and the Sphinx inventories used for resolving
+# :ref:. A change in any of those makes the whole cache stale.
+_docstring_cache_helpers = ['ansilexer', 'dot2svg', 'latex2svg', 'latex2svgextra', 'pygmentsextra', 'rendercache']
+
+def docstring_cache_fingerprint(config) -> str:
+    fingerprint = hashlib.sha1()
+    fingerprint.update(repr((_docstring_cache_version, docutils.__version__)).encode('utf-8'))
+    fingerprint.update(_config_fingerprint(config).encode('utf-8'))
+    for name in [__name__, 'm.htmlsanity'] + config['PLUGINS']:
+        with open(sys.modules[name].__file__, 'rb') as f:
+            fingerprint.update(f.read())
+    # Helpers the plugins do the actual rendering with. Looked up without
+    # importing as not all plugins that use them may be enabled.
+    for name in _docstring_cache_helpers:
+        with open(importlib.util.find_spec(name).origin, 'rb') as f:
+            fingerprint.update(f.read())
+    for file in [inventory[0] for inventory in config.get('M_SPHINX_INVENTORIES', [])] + [tagfile[0] for tagfile in config.get('M_DOX_TAGFILES', [])]:
+        filename = os.path.join(config['INPUT'], file)
+        if os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                fingerprint.update(f.read())
+    return fingerprint.hexdigest()
+
+# Persistent cache for docstring processing, enabled with DOCSTRING_CACHE.
+# For each docstring it remembers what the docstring hooks added to the docs
+# dicts, so they don't need to be called again, and for each reST fragment
+# the HTML it rendered to. Fragments with roles are additionally keyed by the
+# current scope and the whole name map, as :ref: and such resolve against
+# those.
+class DocstringCache:
+    def __init__(self, cache, fingerprint: str):
+        # Has to implement get(key) returning a tuple or None, put(key,
+        # *value) and save(), which rendercache.PickleCache and
+        # rendercache.DirectoryCache do
+        self.cache = cache
+        self.fingerprint = fingerprint
+        # Set in run() once the name map is complete
+        self.name_map_fingerprint = ''
+        # Updated through the scope enter and exit hooks
+        self.scope = []
+        self.stats = collections.Counter()
+        # Warnings logged during processing, fragments that caused any aren't
+        # cached so the warnings are reported again next time
+        self.warnings = _WarningCounter()
+        # If not None, every entry that gets fetched or added is recorded
+        # here as well. Used to propagate cache updates from worker processes
+        # back to the parent process, see merge_updates().
+        self.updates = None
+
+    def key(self, *args) -> str:
+        return self.fingerprint + repr(args)
+
+    def get(self, key: str):
+        entry = self.cache.get(key)
+        if entry is None:
+            self.stats['cache misses'] += 1
+            return None
+        self.stats['cache hits'] += 1
+        if self.updates is not None:
+            self.updates[key] = entry
+        return entry
+
+    def put(self, key: str, *value):
+        self.cache.put(key, *value)
+        if self.updates is not None:
+            self.updates[key] = value
+
+    def merge_updates(self, updates):
+        # Entries not present yet get added, existing ones get marked as used
+        for key, value in updates.items():
+            if self.cache.get(key) is None:
+                self.cache.put(key, *value)
+
+    def scope_enter(self, type, path, param_names=None, **kwargs):
+        self.scope += [(type.name, path, param_names)]
+
+    def scope_exit(self, **kwargs):
+        self.scope = self.scope[:-1]
+
+    def begin_recording(self, state: State):
+        for docs in _doc_contents:
+            getattr(state, f'{docs}_docs').touched = {}
+
+    # Returns a list of (docs, key, replace, fields), where fields are either
+    # new contents of the entry if replace is True or fields that got added
+    # or changed
+    def end_recording(self, state: State):
+        writes = []
+        for docs in _doc_contents:
+            contents = getattr(state, f'{docs}_docs')
+            for key, previous in contents.touched.items():
+                entry = contents[key]
+                if previous is None:
+                    writes += [(docs, key, True, dict(entry))]
+                    continue
+                fields = {field: value for field, value in entry.items() if field not in previous or previous[field] is not value}
+                if fields:
+                    writes += [(docs, key, False, fields)]
+            contents.touched = None
+        return writes
+
+    def replay(self, state: State, writes):
+        for docs, key, replace, fields in writes:
+            contents = getattr(state, f'{docs}_docs')
+            # The cached values are shared by all uses, don't let anybody
+            # modify them
+            fields = copy.deepcopy(fields)
+            if replace:
+                contents[key] = fields
+            else:
+                contents.setdefault(key, {}).update(fields)
+
+    def render(self, state: State, source: str, translator_class) -> str:
+        if _interpreted_text_re.search(source):
+            key = self.key('render', translator_class.__name__, source, self.scope[-1:], self.name_map_fingerprint)
+        else:
+            key = self.key('render', translator_class.__name__, source)
+        entry = self.get(key)
+        if entry is not None: return entry[0]
+
+        warnings = self.warnings.count
+        pub = publish_rst(state, source, translator_class=translator_class)
+        out = pub.writer.parts.get('body').rstrip()
+        # Besides fragments that caused warnings, fragments referencing
+        # images aren't cached as those need to be copied to the output and
+        # could change, and neither are fragments with inline SVGs such as
+        # math, as IDs in those need to be unique on each page. Fragments
+        # that read other files, such as includes or :filesize:, aren't
+        # cached either as the files aren't part of the key.
+        if self.warnings.count == warnings and not ExtractImages._external_data and not pub.settings.record_dependencies.list and '<svg' not in out:
+            self.put(key, out)
+        return out
+
+# Version of the crawl cache format, bump when the stored data change
+_crawl_cache_version = 0
+
+# Everything besides the documented packages themselves that affects the
+# crawl and the rendered module and class pages -- the same as for the
+# docstring cache plus the Python interpreter, the static importer, the
+# templates and the doc input files
+def crawl_cache_fingerprint(config, templates: str, input_docs: List[str]) -> str:
+    fingerprint = hashlib.sha1()
+    fingerprint.update(repr((_crawl_cache_version, sys.version, sys.executable, docstring_cache_fingerprint(config))).encode('utf-8'))
+    if config['STATIC_CRAWL']:
+        with open(sys.modules['_static'].__file__, 'rb') as f:
+            fingerprint.update(f.read())
+    files = []
+    for dirpath, dirnames, filenames in os.walk(templates):
+        files += [os.path.join(dirpath, filename) for filename in filenames]
+    for file in sorted(files) + input_docs:
+        fingerprint.update(os.path.relpath(file, templates).encode('utf-8'))
+        with open(file, 'rb') as f:
+            fingerprint.update(f.read())
+    return fingerprint.hexdigest()
+
+# Modification time, size and a content hash of a source file. The content
+# hash covers the build ID of extension modules as well. If there's a
+# previous fingerprint of the same file with matching modification time and
+# size, it's reused instead of reading the file again.
+def _source_fingerprint(file: str, previous: Dict[str, Tuple[int, int, str]]) -> Tuple[int, int, str]:
+    stat = os.stat(file)
+    if file in previous and previous[file][:2] == (stat.st_mtime_ns, stat.st_size):
+        return previous[file]
+    with open(file, 'rb') as f:
+        return stat.st_mtime_ns, stat.st_size, hashlib.sha1(f.read()).hexdigest()
+
+def _is_in_package(name: str, package: str) -> bool:
+    return name == package or name.startswith(package + '.')
+
+# Persistent cache of crawled packages, enabled with CRAWL_CACHE. For each
+# top-level package listed in INPUT_MODULES it remembers its name map
+# entries, together with fingerprints of all source files the package was
+# imported from and what rendering its module and class pages produced. If
+# none of the files changed and the pages are still in the output, the
+# package is restored from the cache without being imported. The restored
+# entries have no object, so their pages aren't rendered again.
+class CrawlCache:
+    def __init__(self, cache, fingerprint: str, input_modules):
+        # Has to implement get(key) returning a tuple or None, put(key,
+        # *value) and save(), which rendercache.PickleCache and
+        # rendercache.DirectoryCache do
+        self.cache = cache
+        self.fingerprint = fingerprint
+        self.stats = collections.Counter()
+        # Warnings logged during the crawl and rendering. Packages that
+        # caused any aren't cached so the warnings are reported again next
+        # time.
+        self.warnings = _WarningCounter()
+        self.crawl_warnings = 0
+
+        # Modules listed in INPUT_MODULES, grouped by the top-level package.
+        # Packages listed as module objects are never cached, as importing
+        # them isn't under our control.
+        self.roots: Dict[str, List[str]] = {}
+        self.uncacheable: Set[str] = set()
+        for module in input_modules:
+            if isinstance(module, str):
+                self.roots.setdefault(module.split('.')[0], []).append(module)
+            else:
+                self.uncacheable.add(module.__name__.split('.')[0])
+
+        # Cleared in discard() if the restored packages don't fit together
+        # with the rest of the name map
+        self.restoring = True
+        # Records of packages restored from the cache and of packages for
+        # which the cached record is stale or not present at all
+        self.restored: Dict[str, Dict[str, Any]] = {}
+        self.stale: Dict[str, Optional[Dict[str, Any]]] = {}
+        # Names of modules that got imported when importing given package
+        self.imported: Dict[str, Set[str]] = {}
+        # Set in crawl_done() -- name map order, its fingerprint, and names
+        # belonging to each package that got crawled
+        self.order: List[str] = []
+        self.name_map_fingerprint = ''
+        self.names: Dict[str, List[str]] = {}
+        # Name -> (search results, external data, whether any warnings were
+        # logged) for every rendered module, class and page
+        self.rendered: Dict[str, Tuple[List[SearchResult], Set[str], bool]] = {}
+
+    def key(self, *args) -> str:
+        return self.fingerprint + repr(args)
+
+    def is_fresh(self, state: State, package: str, record) -> bool:
+        try:
+            spec = importlib.util.find_spec(package)
+        except (ImportError, ValueError):
+            return False
+        if not spec or spec.origin != record['origin']:
+            return False
+        for file, fingerprint in record['sources'].items():
+            try:
+                if _source_fingerprint(file, record['sources'])[2] != fingerprint[2]:
+                    return False
+            except OSError:
+                return False
+        for filename in record['outputs']:
+            if not os.path.exists(os.path.join(state.config['OUTPUT'], filename)):
+                return False
+        return True
+
+    # Adds name map entries of given package from the cache, returns False
+    # if it has to be imported and crawled instead
+    def restore(self, state: State, package: str) -> bool:
+        if package in self.restored: return True
+        if not self.restoring or package in self.uncacheable or package in self.stale:
+            return False
+
+        record = self.cache.get(self.key('package', package))
+        if record is None or not self.is_fresh(state, package, record[0]):
+            self.stats['cache misses'] += 1
+            self.stale[package] = record[0] if record else None
+            return False
+
+        self.stats['cache hits'] += 1
+        record = record[0]
+        self.restored[package] = record
+        # The cached record is shared by all uses, don't let anybody modify
+        # it
+        state.name_map.update(copy.deepcopy(record['entries']))
+        state.name_mapping.update(record['name_mapping'])
+        return True
+
+    # Import given package while remembering what modules got imported
+    # together with it
+    @contextlib.contextmanager
+    def importing(self, state: State, package: str):
+        modules = set(sys.modules)
+        static_modules = set(state.static_importer.modules) if state.static_importer else set()
+        yield
+        self.imported.setdefault(package, set()).update(set(sys.modules) - modules)
+        if state.static_importer:
+            self.imported[package].update(set(state.static_importer.modules) - static_modules)
+
+    # Called once everything is crawled and pages are added. If any package
+    # was restored, the name map has to be the same as when it got cached,
+    # as otherwise the kept pages could link to names that no longer exist
+    # or miss links to new ones. Returns False in that case, and the crawl
+    # has to be done again after calling discard().
+    def crawl_done(self, state: State) -> bool:
+        fingerprint = hashlib.sha1()
+        for name in sorted(state.name_map):
+            entry = state.name_map[name]
+            fingerprint.update(repr((name, entry.type.name, entry.path, entry.url, getattr(entry, 'css_classes', None), getattr(entry, 'members', None), getattr(entry, 'values', None))).encode('utf-8'))
+        fingerprint.update(repr(sorted(state.name_mapping.items())).encode('utf-8'))
+        self.name_map_fingerprint = fingerprint.hexdigest()
+
+        if self.restored:
+            previous = self.cache.get(self.key('name map'))
+            if previous is None or previous[0] != self.name_map_fingerprint:
+                return False
+            # Restored entries got added in a different order than they
+            # would be crawled in, put them back so the search data are the
+            # same
+            state.name_map = {name: state.name_map[name] for name in previous[1]}
+
+        self.order = list(state.name_map)
+        for package in self.roots:
+            if package in self.restored or package in self.uncacheable: continue
+            self.names[package] = [name for name, entry in state.name_map.items() if entry.type not in [EntryType.PAGE, EntryType.SPECIAL] and _is_in_package(name, package)]
+        return True
+
+    def discard(self):
+        self.restoring = False
+        self.stats['cache hits'] -= len(self.restored)
+        self.stats['cache misses'] += len(self.restored)
+        self.stale.update(self.restored)
+        self.restored = {}
+
+    # Called once everything is rendered. Puts together search data from
+    # what got rendered now and what was restored and marks docs used by the
+    # restored packages as used.
+    def render_done(self, state: State):
+        rendered = dict(self.rendered)
+        for record in self.restored.values():
+            rendered.update(record['rendered'])
+            for search, external_data, warned in record['rendered'].values():
+                state.external_data.update(external_data)
+            for docs, keys in record['used_docs'].items():
+                contents = getattr(state, f'{docs}_docs')
+                for key in keys:
+                    if key in contents: contents[key]['used'] = True
+        state.search = [result for name in state.name_map if name in rendered for result in rendered[name][0]]
+
+    def record(self, state: State, package: str, names: List[str]) -> Dict[str, Any]:
+        # Source files are of all modules that got imported together with
+        # the package and of all modules the crawled objects come from, as
+        # the package could expose things from elsewhere
+        modules = set(self.imported.get(package, []))
+        entries = {}
+        copies = {}
+        outputs = []
+        for name in names:
+            entry = state.name_map[name]
+            if entry.type == EntryType.MODULE:
+                modules.add(entry.object.__name__)
+            elif hasattr(entry, 'object'):
+                module = getattr(entry.object, '__module__', None)
+                if isinstance(module, str): modules.add(module)
+            if entry.type in [EntryType.MODULE, EntryType.CLASS] and state.config['OUTPUT'] is not None:
+                outputs += [state.config['URL_FORMATTER'](entry.type, entry.path)[0]]
+
+            # Detach the entry from the object, keeping entries that are
+            # shared among several names shared
+            if id(entry) not in copies:
+                copies[id(entry)] = NameMapEntry()
+                for slot in NameMapEntry.__slots__:
+                    if hasattr(entry, slot):
+                        setattr(copies[id(entry)], slot, None if slot == 'object' else getattr(entry, slot))
+            entries[name] = copies[id(entry)]
+
+        previous = (self.stale.get(package) or {}).get('sources', {})
+        sources = {}
+        for module in sorted(modules):
+            if state.static_importer and module in state.static_importer.modules:
+                file = state.static_importer.modules[module].__file__
+            else:
+                file = getattr(sys.modules.get(module), '__file__', None)
+            if file and file not in sources and os.path.isfile(file):
+                sources[file] = _source_fingerprint(file, previous)
+
+        used_docs = {}
+        for docs in ['module', 'class', 'enum', 'function', 'property', 'data']:
+            used_docs[docs] = [key for key, value in getattr(state, f'{docs}_docs').items() if 'used' in value and _is_in_package(key, package)]
+
+        return {
+            'origin': getattr(importlib.util.find_spec(package), 'origin', None),
+            'sources': sources,
+            'entries': entries,
+            'name_mapping': {key: value for key, value in state.name_mapping.items() if key not in state.config['NAME_MAPPING'] and _is_in_package(value, package)},
+            'outputs': outputs,
+            'rendered': {name: self.rendered[name] for name in names if name in self.rendered},
+            'used_docs': used_docs}
+
+    def save(self, state: State):
+        # Packages for which any warnings got logged aren't saved, so the
+        # warnings are shown again next time. Those restored from the cache
+        # got marked as used on restore and stay as they are.
+        if not self.crawl_warnings:
+            for package, names in self.names.items():
+                if any(self.rendered[name][2] for name in names if name in self.rendered):
+                    continue
+                self.cache.put(self.key('package', package), self.record(state, package, names))
+        self.cache.put(self.key('name map'), self.name_map_fingerprint, self.order)
+        self.cache.save()
+
 def extract_docs(state: State, external_docs, type: EntryType, path: List[str], doc: str, *, signature=None, summary_only=False) -> Tuple[str, str]:
     path_str = '.'.join(path)
     # If function signature is supplied, try that first
@@ -1281,41 +1750,62 @@ def extract_docs(state: State, external_docs, type: EntryType, path: List[str],
         doc = inspect.cleandoc(doc or '').strip()
 
         if doc:
-            # Do the same as in render_doc() to support directives with
-            # multi-word field names and duplicate fields, restore the original
-            # implementations again after.
-            prev_extract_options = docutils.utils.extract_options
-            prev_assemble_option_dict = docutils.utils.assemble_option_dict
-            docutils.utils.extract_options = _docutils_extract_options
-            docutils.utils.assemble_option_dict = _docutils_assemble_option_dict
-
-            # Go through all registered docstring hooks and let them process
-            # this one after another; stopping once there's nothing left. If
-            # nothing left, the populated entries should be non-None.
-            for hook in state.hooks_docstring:
-                try:
-                    doc = hook(
-                        type=type,
-                        path=path,
-                        signature=signature,
-                        doc=doc)
-
-                    # The hook could have replaced the entry with a new dict
-                    # instance, fetch it again to avoid looking at stale data
-                    # below
-                    external_doc_entry = external_docs[path_signature_str]
-
-                    # Once there's nothing left to parse, stop executing the
-                    # hooks.
-                    if not doc: break
+            # If the docstring hooks already processed the same docstring in a
+            # previous run, replay what they did instead of calling them again
+            hooks_key = None
+            cached = None
+            if state.docstring_cache and state.hooks_docstring:
+                hooks_key = state.docstring_cache.key('hooks', type.name, path, signature, doc)
+                cached = state.docstring_cache.get(hooks_key)
+            if cached:
+                doc, writes = cached
+                state.docstring_cache.replay(state, writes)
+                external_doc_entry = external_docs[path_signature_str]
+
+            elif state.hooks_docstring:
+                if hooks_key:
+                    warnings = state.docstring_cache.warnings.count
+                    state.docstring_cache.begin_recording(state)
+
+                # Do the same as in render_doc() to support directives with
+                # multi-word field names and duplicate fields
+                with _docutils_extended_options():
+                    # Go through all registered docstring hooks and let them
+                    # process this one after another; stopping once there's
+                    # nothing left. If nothing left, the populated entries
+                    # should be non-None.
+                    for hook in state.hooks_docstring:
+                        try:
+                            doc = hook(
+                                type=type,
+                                path=path,
+                                signature=signature,
+                                doc=doc)
+
+                            # The hook could have replaced the entry with a
+                            # new dict instance, fetch it again to avoid
+                            # looking at stale data below
+                            external_doc_entry = external_docs[path_signature_str]
+
+                            # Once there's nothing left to parse, stop
+                            # executing the hooks.
+                            if not doc: break
+
+                        except docutils.utils.SystemMessage:
+                            logging.error("Failed to process a docstring for %s, ignoring:\n%s", path_signature_str, prettify_multiline_error(doc))
+                            doc = ''
+                            break
 
-                except docutils.utils.SystemMessage:
-                    logging.error("Failed to process a docstring for %s, ignoring:\n%s", path_signature_str, prettify_multiline_error(doc))
-                    break
+                if hooks_key:
+                    writes = state.docstring_cache.end_recording(state)
+                    # Docstrings that caused warnings aren't cached so the
+                    # warnings are reported again next time
+                    if state.docstring_cache.warnings.count == warnings:
+                        state.docstring_cache.put(hooks_key, doc, writes)
 
             # If there's still something left after the hooks (or there are no
             # hooks), process it as a plain unformatted text.
-            else:
+            if doc:
                 summary, _, content = doc.partition('\n\n')
 
                 # Turn both into a raw HTML block so it doesn't get further
@@ -1333,10 +1823,6 @@ def extract_docs(state: State, external_docs, type: EntryType, path: List[str],
                 if external_doc_entry.get('content') is None:
                     external_doc_entry['content'] = content
 
-            # Restore original implementations again
-            docutils.utils.extract_options = prev_extract_options
-            docutils.utils.assemble_option_dict = prev_assemble_option_dict
-
         # If there isn't anything supplied for summary / content even after all
         # the processing above, set it to an empty string so this branch isn't
         # entered again next time.
@@ -1345,8 +1831,9 @@ def extract_docs(state: State, external_docs, type: EntryType, path: List[str],
         if external_doc_entry.get('content') is None:
             external_doc_entry['content'] = ''
 
-    # Render. This can't be done just once and then cached because e.g. math
-    # rendering needs to ensure each SVG formula has unique IDs on each page.
+    # Render. This can't be done just once and then reused for all pages
+    # because e.g. math rendering needs to ensure each SVG formula has unique
+    # IDs on each page. The docstring cache skips such fragments.
     try:
         summary = render_inline_rst(state, external_doc_entry['summary'])
     except docutils.utils.SystemMessage:
@@ -1372,8 +1859,12 @@ def get_type_hints_or_nothing(state: State, path: List[str], object) -> Dict:
     if state.config['PYBIND11_COMPATIBILITY'] and isinstance(object, type) and 'pybind11_builtins' in [a.__module__ for a in object.__mro__]:
         return {}
 
+    # When crawling statically, string annotations are resolved without
+    # evaluating them as code
+    get_type_hints = state.static_importer.type_hints if state.static_importer else typing.get_type_hints
+
     try:
-        return typing.get_type_hints(object)
+        return get_type_hints(object)
     except Exception as e:
         # Gracefully handle an invalid name or a missing attribute, give up on
         # everything else (syntax error and so)
@@ -1419,21 +1910,13 @@ def extract_annotation(state: State, referrer_path: List[str], annotation) -> Tu
 
         # Optional or Union, handle those first
         if hasattr(annotation, '__origin__') and annotation.__origin__ is typing.Union:
-            # FOR SOME REASON `annotation.__args__[1] is None` is always False,
-            # so we have to use isinstance(). HOWEVER, we *can't* use
-            # isinstance if:
-            #   - it's a "bracketed" type, having __args__
-            #     (see the `annotation_union_second_bracketed()` test)
-            #   - it's a ForwardRef because get_type_hints_or_nothing() failed
-            #     due to a type error (see the `annotation_union_of_undefined()`
-            #     test)
-            # because it'll die. So check that first.
-            if (len(annotation.__args__) == 2 and
-                not hasattr(annotation.__args__[1], '__args__') and
-                # Same 3.6 ForwardRef workaround as above
-                not isinstance(annotation.__args__[1], typing.ForwardRef if sys.version_info >= (3, 7) else typing._ForwardRef) and
-                isinstance(None, annotation.__args__[1])
-            ):
+            # The None in Optional is stored as NoneType, so compare against
+            # that. Using isinstance(None, ...) instead would die on a
+            # "bracketed" type (see the `annotation_union_second_bracketed()`
+            # test), a ForwardRef left over from a failed
+            # get_type_hints_or_nothing() (see the
+            # `annotation_union_of_undefined()` test), a TypeVar or Any.
+            if len(annotation.__args__) == 2 and annotation.__args__[1] is type(None):
                 name = 'typing.Optional'
                 args = annotation.__args__[:1]
             else:
@@ -1531,7 +2014,7 @@ def extract_annotation(state: State, referrer_path: List[str], annotation) -> Tu
     # TODO Python 3.8+ supports `a, *b`, switch to that once 3.7 is dropped
     return (name, ) + make_name_relative_link(state, referrer_path, name)
 
-def extract_module_doc(state: State, entry: Empty):
+def extract_module_doc(state: State, entry: NameMapEntry):
     assert inspect.ismodule(entry.object)
 
     # Call all scope enter hooks first
@@ -1549,7 +2032,7 @@ def extract_module_doc(state: State, entry: Empty):
 
     return out
 
-def extract_class_doc(state: State, entry: Empty):
+def extract_class_doc(state: State, entry: NameMapEntry):
     assert inspect.isclass(entry.object)
 
     # Call all scope enter hooks first
@@ -1567,7 +2050,7 @@ def extract_class_doc(state: State, entry: Empty):
 
     return out
 
-def extract_enum_doc(state: State, entry: Empty):
+def extract_enum_doc(state: State, entry: NameMapEntry):
     assert state.current_module
 
     out = Empty()
@@ -1656,7 +2139,7 @@ def extract_enum_doc(state: State, entry: Empty):
     if not state.config['SEARCH_DISABLED']:
         page_url = state.name_map['.'.join(entry.path[:-1])].url
 
-        result = Empty()
+        result = SearchResult()
         result.flags = ResultFlag.from_type(ResultFlag.NONE, EntryType.ENUM)
         result.url = '{}#{}'.format(page_url, out.id)
         result.prefix = entry.path[:-1]
@@ -1664,7 +2147,7 @@ def extract_enum_doc(state: State, entry: Empty):
         state.search += [result]
 
         for value in out.values:
-            result = Empty()
+            result = SearchResult()
             result.flags = ResultFlag.from_type(ResultFlag.NONE, EntryType.ENUM_VALUE)
             result.url = '{}#{}'.format(page_url, value.id)
             result.prefix = entry.path
@@ -1673,7 +2156,7 @@ def extract_enum_doc(state: State, entry: Empty):
 
     return out
 
-def extract_function_doc(state: State, parent, entry: Empty) -> List[Any]:
+def extract_function_doc(state: State, parent, entry: NameMapEntry) -> List[Any]:
     assert state.current_module
     assert inspect.isfunction(entry.object) or inspect.ismethod(entry.object) or inspect.isroutine(entry.object)
 
@@ -1997,7 +2480,7 @@ def extract_function_doc(state: State, parent, entry: Empty) -> List[Any]:
             hook(type=entry.type, path=entry.path, param_names=param_names)
 
         if not state.config['SEARCH_DISABLED']:
-            result = Empty()
+            result = SearchResult()
             result.flags = ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNCTION)
             result.url = '{}#{}'.format(page_url, out.id)
             result.prefix = entry.path[:-1]
@@ -2023,7 +2506,7 @@ def extract_function_doc(state: State, parent, entry: Empty) -> List[Any]:
 
     return overloads
 
-def extract_property_doc(state: State, parent, entry: Empty):
+def extract_property_doc(state: State, parent, entry: NameMapEntry):
     assert state.current_module
 
     out = Empty()
@@ -2072,6 +2555,23 @@ def extract_property_doc(state: State, parent, entry: Empty):
         else:
             out.type, out.type_quoted, out.type_link = None, None, None
 
+    # Fields of a namedtuple or typing.NamedTuple. Those are read-only, with
+    # the type taken from class annotations in the latter case. The default
+    # docstring just says which index it is, which isn't useful.
+    elif entry.object.__class__.__name__ == '_tuplegetter' and entry.object.__class__.__module__ == '_collections':
+        assert inspect.isdatadescriptor(entry.object)
+        docstring = '' if not entry.object.__doc__ or entry.object.__doc__.startswith('Alias for field number ') else entry.object.__doc__
+
+        out.is_gettable = True
+        out.is_settable = False
+        out.is_deletable = False
+
+        type_hints = get_type_hints_or_nothing(state, entry.path, parent)
+        if out.name in type_hints:
+            out.type, out.type_quoted, out.type_link = extract_annotation(state, entry.path, type_hints[out.name])
+        else:
+            out.type, out.type_quoted, out.type_link = None, None, None
+
     # The properties can be defined using the low-level descriptor protocol
     # instead of the higher-level property() decorator. That means there's no
     # fget / fset / fdel, instead we need to look into __get__ / __set__ /
@@ -2184,7 +2684,7 @@ def extract_property_doc(state: State, parent, entry: Empty):
         out.has_details = True
 
     if not state.config['SEARCH_DISABLED']:
-        result = Empty()
+        result = SearchResult()
         result.flags = ResultFlag.from_type(ResultFlag.NONE, EntryType.PROPERTY)
         result.url = '{}#{}'.format(state.name_map['.'.join(entry.path[:-1])].url, out.id)
         result.prefix = entry.path[:-1]
@@ -2193,7 +2693,7 @@ def extract_property_doc(state: State, parent, entry: Empty):
 
     return out
 
-def extract_data_doc(state: State, parent, entry: Empty):
+def extract_data_doc(state: State, parent, entry: NameMapEntry):
     assert state.current_module
     assert not inspect.ismodule(entry.object) and not inspect.isclass(entry.object) and not inspect.isroutine(entry.object) and not inspect.isframe(entry.object) and not inspect.istraceback(entry.object) and not inspect.iscode(entry.object)
 
@@ -2205,7 +2705,10 @@ def extract_data_doc(state: State, parent, entry: Empty):
     out.name = entry.path[-1]
     out.id = state.config['ID_FORMATTER'](EntryType.DATA, entry.path[-1:])
     # Welp. https://stackoverflow.com/questions/8820276/docstring-for-variable
-    out.summary, out.content = extract_docs(state, state.data_docs, entry.type, entry.path, '')
+    # When crawling statically, string literals after the assignment are
+    # available, which is what Sphinx autodoc picks up as well.
+    docstring = state.static_importer.docstrings.get((parent, out.name), '') if state.static_importer else ''
+    out.summary, out.content = extract_docs(state, state.data_docs, entry.type, entry.path, docstring)
     out.has_details = bool(out.content)
 
     # Call all scope exit hooks after rendering the docs
@@ -2227,7 +2730,7 @@ def extract_data_doc(state: State, parent, entry: Empty):
     out.value, out.value_relative, out.value_link = format_value(state, entry.path, entry.object) or (None, None, None)
 
     if not state.config['SEARCH_DISABLED']:
-        result = Empty()
+        result = SearchResult()
         result.flags = ResultFlag.from_type(ResultFlag.NONE, EntryType.DATA)
         result.url = '{}#{}'.format(state.name_map['.'.join(entry.path[:-1])].url, out.id)
         result.prefix = entry.path[:-1]
@@ -2236,26 +2739,23 @@ def extract_data_doc(state: State, parent, entry: Empty):
 
     return out
 
-def render(*, config, template: str, url: str, filename: str, env: jinja2.Environment, **kwargs):
+def render(*, config, writer: OutputWriter, template: str, url: str, filename: str, env: jinja2.Environment, **kwargs):
     template = env.get_template(template)
     rendered = template.render(URL=url,
         SEARCHDATA_FORMAT_VERSION=searchdata_format_version,
         **config, **kwargs)
-    output_dir = os.path.dirname(filename)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    with open(filename, 'wb') as f:
-        f.write(rendered.encode('utf-8'))
-        # Add back a trailing newline so we don't need to bother with
-        # patching test files to include a trailing newline to make Git
-        # happy. Can't use keep_trailing_newline because that'd add it
-        # also for nested templates :( The rendered file should never contain a
-        # trailing newline on its own. Also add it only in case the file isn't
-        # empty, which can happen with generated stubs. If non-empty, it should
-        # never contain a trailing newline on its own.
-        if rendered:
-            assert not rendered.endswith('\n')
-            f.write(b'\n')
+    # Add back a trailing newline so we don't need to bother with patching
+    # test files to include a trailing newline to make Git happy. Can't use
+    # keep_trailing_newline because that'd add it also for nested templates :(
+    # The rendered file should never contain a trailing newline on its own.
+    # Also add it only in case the file isn't empty, which can happen with
+    # generated stubs. If non-empty, it should never contain a trailing
+    # newline on its own.
+    data = rendered.encode('utf-8')
+    if rendered:
+        assert not rendered.endswith('\n')
+        data += b'\n'
+    writer.write(filename, data)
 
 def render_module(state: State, path, module, env):
     # Save name of current module for populating module dependencies and
@@ -2372,7 +2872,7 @@ def render_module(state: State, path, module, env):
     del state.module_dependencies[path_str]
 
     if not state.config['SEARCH_DISABLED']:
-        result = Empty()
+        result = SearchResult()
         result.flags = ResultFlag.from_type(ResultFlag.NONE, EntryType.MODULE)
         result.url = page.url
         result.prefix = path[:-1]
@@ -2390,12 +2890,13 @@ def render_module(state: State, path, module, env):
         else:
             stub_filename = os.path.join(*path[:-1], path[-1] + state.config['STUB_EXTENSION'])
 
-        render(config=state.config,
-            template='stub.pyi',
-            filename=os.path.join(state.config['OUTPUT_STUBS'], stub_filename),
-            url=url,
-            env=env,
-            page=page)
+        with phase(state.telemetry, 'stubs'):
+            render(config=state.config, writer=state.writer,
+                template='stub.pyi',
+                filename=os.path.join(state.config['OUTPUT_STUBS'], stub_filename),
+                url=url,
+                env=env,
+                page=page)
 
     # Render the regular HTML output, unless disabled
     if state.config['OUTPUT'] is not None:
@@ -2419,7 +2920,7 @@ def render_module(state: State, path, module, env):
                 # data.value_link may contain HTML and thus had to be escaped
                 # early
 
-        render(config=state.config,
+        render(config=state.config, writer=state.writer,
             template='module.html',
             filename=os.path.join(state.config['OUTPUT'], filename),
             url=url,
@@ -2547,7 +3048,7 @@ def render_class(state: State, path, class_, env):
             assert False
 
     if not state.config['SEARCH_DISABLED']:
-        result = Empty()
+        result = SearchResult()
         result.flags = ResultFlag.from_type(ResultFlag.NONE, EntryType.CLASS)
         result.url = page.url
         result.prefix = path[:-1]
@@ -2586,7 +3087,7 @@ def render_class(state: State, path, class_, env):
                 # data.value_link may contain HTML and thus had to be escaped
                 # early
 
-        render(config=state.config,
+        render(config=state.config, writer=state.writer,
             template='class.html',
             filename=os.path.join(state.config['OUTPUT'], filename),
             url=url,
@@ -2635,18 +3136,56 @@ class DocumentationWriter(m.htmlsanity.SaneHtmlWriter):
     def get_transforms(self):
         return m.htmlsanity.SaneHtmlWriter.get_transforms(self) + [ExtractImages]
 
+def _publish_rst_publisher(**kwargs):
+    pub = docutils.core.Publisher(
+        writer=DocumentationWriter(),
+        source_class=docutils.io.StringInput,
+        destination_class=docutils.io.StringOutput,
+        **kwargs)
+    pub.set_components('standalone', 'restructuredtext', 'html')
+    return pub
+
+# Processed docutils settings for publish_rst() and the docutils settings they
+# were made from. Going through the docutils option parser is the most
+# expensive part of rendering a short docstring, so it's done just once and
+# then again only if m.htmlsanity.docutils_settings change.
+_publish_rst_settings = None
+_publish_rst_settings_source = None
+
+# Reader and parser instances for publish_rst(). Those are reusable across
+# documents, a pair is taken out of the pool for the duration of a single
+# publish_rst() call so it's safe to call it recursively from a directive.
+_publish_rst_components: List[Tuple[Any, Any]] = []
+
 def publish_rst(state: State, source, *, source_path=None, translator_class=m.htmlsanity.SaneHtmlTranslator):
+    global _publish_rst_settings, _publish_rst_settings_source
+
     # Make the URL formatter known to the image extractor so it can use it for
     # patching the URLs
     ExtractImages._url_formatter = state.config['URL_FORMATTER']
 
-    pub = docutils.core.Publisher(
-        writer=DocumentationWriter(),
-        source_class=docutils.io.StringInput,
-        destination_class=docutils.io.StringOutput)
-    pub.set_components('standalone', 'restructuredtext', 'html')
+    if _publish_rst_settings is None or _publish_rst_settings_source != m.htmlsanity.docutils_settings:
+        pub = _publish_rst_publisher()
+        pub.process_programmatic_settings(None, m.htmlsanity.docutils_settings, None)
+        _publish_rst_settings = pub.settings
+        _publish_rst_settings_source = copy.deepcopy(m.htmlsanity.docutils_settings)
+
+    # Docutils stores per-document state such as the source path or the
+    # recorded dependencies in the settings, so each document gets its own
+    # copy
+    settings = copy.copy(_publish_rst_settings)
+    settings.record_dependencies = docutils.utils.DependencyList()
+
+    if _publish_rst_components:
+        reader, parser = _publish_rst_components.pop()
+    else:
+        pub = _publish_rst_publisher()
+        reader, parser = pub.reader, pub.parser
+
+    # The writer is cheap to create and the callers access its output parts
+    # afterwards, so it's not reused
+    pub = _publish_rst_publisher(reader=reader, parser=parser, settings=settings)
     pub.writer.translator_class = translator_class
-    pub.process_programmatic_settings(None, m.htmlsanity.docutils_settings, None)
     # Docutils uses a deprecated U mode for opening files, so instead of
     # monkey-patching docutils.io.FileInput to not do that (like Pelican does),
     # I just read the thing myself.
@@ -2658,12 +3197,18 @@ def publish_rst(state: State, source, *, source_path=None, translator_class=m.ht
     pub.set_source(source=source, source_path=source_path)
     pub.publish()
 
+    # Put the reader and parser back only if everything went fine, after an
+    # error they might be in an inconsistent state
+    _publish_rst_components.append((reader, parser))
+
     # External images to pull later
     state.external_data = state.external_data.union(ExtractImages._external_data)
 
     return pub
 
 def render_rst(state: State, source):
+    if state.docstring_cache:
+        return state.docstring_cache.render(state, source, m.htmlsanity.SaneHtmlTranslator)
     return publish_rst(state, source).writer.parts.get('body').rstrip()
 
 class _SaneInlineHtmlTranslator(m.htmlsanity.SaneHtmlTranslator):
@@ -2673,6 +3218,8 @@ class _SaneInlineHtmlTranslator(m.htmlsanity.SaneHtmlTranslator):
         return True
 
 def render_inline_rst(state: State, source):
+    if state.docstring_cache:
+        return state.docstring_cache.render(state, source, _SaneInlineHtmlTranslator)
     return publish_rst(state, source, translator_class=_SaneInlineHtmlTranslator).writer.parts.get('body').rstrip()
 
 # Copy of docutils.utils.extract_options which doesn't throw BadOptionError on
@@ -2731,6 +3278,22 @@ def _docutils_assemble_option_dict(option_list, options_spec):
             options[name] = converted
     return options
 
+# Temporarily replaces the docutils option extractor with the two above for
+# directives that have multi-word field names and can be duplicated, such as
+# py:function. The previous implementations are restored even if rendering
+# fails, nesting is fine.
+@contextlib.contextmanager
+def _docutils_extended_options():
+    prev_extract_options = docutils.utils.extract_options
+    prev_assemble_option_dict = docutils.utils.assemble_option_dict
+    docutils.utils.extract_options = _docutils_extract_options
+    docutils.utils.assemble_option_dict = _docutils_assemble_option_dict
+    try:
+        yield
+    finally:
+        docutils.utils.extract_options = prev_extract_options
+        docutils.utils.assemble_option_dict = prev_assemble_option_dict
+
 def render_doc(state: State, filename):
     logging.debug("parsing docs from %s", filename)
 
@@ -2740,19 +3303,11 @@ def render_doc(state: State, filename):
     # Render the file. The directives should take care of everything, so just
     # discard the output afterwards. Some directives (such as py:function) have
     # multi-word field names and can be duplicated, so we have to patch the
-    # option extractor to allow that. See _docutils_extract_options and
-    # _docutils_assemble_option_dict above for details.
-    with open(filename, 'r') as f:
-        prev_extract_options = docutils.utils.extract_options
-        prev_assemble_option_dict = docutils.utils.assemble_option_dict
-        docutils.utils.extract_options = _docutils_extract_options
-        docutils.utils.assemble_option_dict = _docutils_assemble_option_dict
-
+    # option extractor to allow that. See _docutils_extended_options above for
+    # details.
+    with open(filename, 'r') as f, _docutils_extended_options():
         publish_rst(state, f.read(), source_path=filename)
 
-        docutils.utils.extract_options = prev_extract_options
-        docutils.utils.assemble_option_dict = prev_assemble_option_dict
-
 def render_page(state: State, path, input_filename, env):
     # If not generating the regular HTML output, we shouldn't even be here
     assert state.config['OUTPUT'] is not None
@@ -2788,7 +3343,7 @@ def render_page(state: State, path, input_filename, env):
             entry = state.name_map['.'.join(path)]
             entry.summary = page.summary
             entry.name = page.breadcrumb[-1][0]
-            render(config=state.config,
+            render(config=state.config, writer=state.writer,
                 template='page.html',
                 filename=os.path.join(state.config['OUTPUT'], filename),
                 url=url,
@@ -2837,14 +3392,14 @@ def render_page(state: State, path, input_filename, env):
     entry.name = page.breadcrumb[-1][0]
 
     if not state.config['SEARCH_DISABLED']:
-        result = Empty()
+        result = SearchResult()
         result.flags = ResultFlag.from_type(ResultFlag.NONE, EntryType.PAGE)
         result.url = page.url
         result.prefix = path[:-1]
         result.name = path[-1]
         state.search += [result]
 
-    render(config=state.config,
+    render(config=state.config, writer=state.writer,
         template='page.html',
         filename=os.path.join(state.config['OUTPUT'], filename),
         url=url,
@@ -2923,13 +3478,125 @@ def build_search_data(state: State, merge_subtrees=True, add_lookahead_barriers=
         # Add this symbol to total symbol count
         symbol_count += 1
 
-    # For each node in the trie sort the results so the found items have sane
-    # order by default
-    trie.sort(map)
-
     return serialize_search_data(Serializer(file_offset_bytes=state.config['SEARCH_FILE_OFFSET_BYTES'], result_id_bytes=state.config['SEARCH_RESULT_ID_BYTES'], name_size_bytes=state.config['SEARCH_NAME_SIZE_BYTES']), trie, map, search_type_map, symbol_count, merge_subtrees=merge_subtrees, merge_prefixes=merge_prefixes)
 
-def run(basedir, config, *, templates=default_templates, search_add_lookahead_barriers=True, search_merge_subtrees=True, search_merge_prefixes=True):
+# Plugin helper modules that have a persistent cache or counters for build
+# statistics. Imported by plugins only when needed, so looked up in
+# sys.modules.
+_cached_renderers = ['latex2svgextra', 'dot2svg', 'pygmentsextra']
+
+def _telemetry_counters() -> Dict[str, Any]:
+    return {name: sys.modules[name].stats for name in ['latex2svg', 'latex2svgextra', 'dot2svg', 'pygmentsextra'] if name in sys.modules}
+
+def render_entry(state: State, name: str, env):
+    entry = state.name_map[name]
+    begin = time.perf_counter()
+    # Remember what the render produced so it can be reused once the entry
+    # is restored from the crawl cache
+    if state.crawl_cache:
+        search = len(state.search)
+        external_data = set(state.external_data)
+        warnings = state.crawl_cache.warnings.count
+    if entry.type == EntryType.MODULE:
+        with phase(state.telemetry, 'module render'):
+            render_module(state, entry.path, entry.object, env)
+    elif entry.type == EntryType.CLASS:
+        with phase(state.telemetry, 'class render'):
+            render_class(state, entry.path, entry.object, env)
+    elif entry.type == EntryType.PAGE:
+        with phase(state.telemetry, 'page render'):
+            render_page(state, entry.path, entry.filename, env)
+    else: # pragma: no cover
+        assert False
+    if state.crawl_cache:
+        state.crawl_cache.rendered[name] = (state.search[search:], state.external_data - external_data, state.crawl_cache.warnings.count != warnings)
+    if state.telemetry:
+        state.telemetry.item(entry.type.name.lower(), '.'.join(entry.path), time.perf_counter() - begin)
+
+# Set by run() before forking the worker processes, consumed by
+# _render_in_worker(). A global to avoid pickling the state for each chunk.
+_parallel_context = None
+
+# Renders given name map entries and returns everything the parent process
+# needs to merge back in merge_recorded()
+def _render_in_worker(names: List[str]):
+    state, env = _parallel_context
+
+    # Each worker has its own copy of the state, reset what got added for
+    # previously processed chunks as the parent process has it already
+    state.search = []
+    state.external_data = set()
+
+    # The background thread of the parent writer doesn't exist in the forked
+    # worker, write synchronously instead. The workers run in parallel anyway.
+    state.writer = OutputWriter(background=False)
+
+    # Record everything that got fetched from or added to the math, graph and
+    # code caches so the parent can merge it into its own caches
+    renderers = [name for name in _cached_renderers if name in sys.modules]
+    for name in renderers:
+        sys.modules[name].cache_updates = {}
+    if state.docstring_cache:
+        state.docstring_cache.updates = {}
+    if state.crawl_cache:
+        state.crawl_cache.rendered = {}
+
+    if state.telemetry:
+        state.telemetry = Telemetry(_telemetry_counters())
+        state.telemetry.track('output', state.writer.stats)
+        if state.docstring_cache:
+            state.telemetry.track('docstrings', state.docstring_cache.stats)
+
+    for name in names:
+        render_entry(state, name, env)
+
+    out = Empty()
+    out.search = state.search
+    out.external_data = state.external_data
+    # The summary (and name for pages) is needed for the index pages
+    out.entries = []
+    for name in names:
+        entry = state.name_map[name]
+        out.entries += [(name, entry.summary, entry.name if entry.type == EntryType.PAGE else None)]
+    # Docs that were used by this chunk. The marker is removed so the next
+    # chunk processed by this worker reports only what it used on its own.
+    out.used_docs = {}
+    for docs in ['module', 'class', 'enum', 'function', 'property', 'data']:
+        out.used_docs[docs] = [key for key, value in getattr(state, f'{docs}_docs').items() if value.pop('used', False)]
+    out.cache_updates = {name: sys.modules[name].cache_updates for name in renderers}
+    for name in renderers:
+        sys.modules[name].cache_updates = None
+    out.docstring_cache_updates = None
+    if state.docstring_cache:
+        out.docstring_cache_updates = state.docstring_cache.updates
+        state.docstring_cache.updates = None
+    out.crawl_cache_rendered = state.crawl_cache.rendered if state.crawl_cache else None
+    out.telemetry = state.telemetry.snapshot() if state.telemetry else None
+    return out
+
+def merge_recorded(state: State, recorded):
+    state.search += recorded.search
+    state.external_data.update(recorded.external_data)
+    for name, summary, page_name in recorded.entries:
+        entry = state.name_map[name]
+        entry.summary = summary
+        if page_name is not None: entry.name = page_name
+    for docs, used in recorded.used_docs.items():
+        docs = getattr(state, f'{docs}_docs')
+        for key in used:
+            # Docstring hooks in the worker might have added entries that
+            # the parent doesn't know about
+            if key in docs: docs[key]['used'] = True
+    for name, updates in recorded.cache_updates.items():
+        if updates: sys.modules[name].merge_cache_updates(updates)
+    if recorded.docstring_cache_updates:
+        state.docstring_cache.merge_updates(recorded.docstring_cache_updates)
+    if recorded.crawl_cache_rendered:
+        state.crawl_cache.rendered.update(recorded.crawl_cache_rendered)
+    if state.telemetry:
+        state.telemetry.merge(recorded.telemetry)
+
+def run(basedir, config, *, templates=default_templates, search_add_lookahead_barriers=True, search_merge_subtrees=True, search_merge_prefixes=True, jobs=1, telemetry: Telemetry = None):
     # Populate the INPUT, if not specified, make it absolute
     if config['INPUT'] is None: config['INPUT'] = basedir
     else: config['INPUT'] = os.path.join(basedir, config['INPUT'])
@@ -2949,6 +3616,10 @@ def run(basedir, config, *, templates=default_templates, search_add_lookahead_ba
         config['FAVICON'] = (config['FAVICON'], mimetypes.guess_type(config['FAVICON'])[0])
 
     state = State(config)
+    state.telemetry = telemetry
+    state.writer = OutputWriter()
+    if state.telemetry:
+        state.telemetry.track('output', state.writer.stats)
 
     # Prepare Jinja environment
     env = jinja2.Environment(
@@ -3006,83 +3677,204 @@ def run(basedir, config, *, templates=default_templates, search_add_lookahead_ba
             hooks_pre_page=state.hooks_pre_page,
             hooks_post_run=state.hooks_post_run)
 
+    # Set up the docstring cache, if enabled. Done only after plugins are
+    # registered, as its fingerprint includes their sources.
+    if config['DOCSTRING_CACHE'] is not None:
+        state.docstring_cache = DocstringCache(
+            rendercache.load(os.path.join(config['INPUT'], config['DOCSTRING_CACHE']), _docstring_cache_version, lambda: ''),
+            docstring_cache_fingerprint(config))
+        state.hooks_pre_scope += [state.docstring_cache.scope_enter]
+        state.hooks_post_scope += [state.docstring_cache.scope_exit]
+        logging.getLogger().addHandler(state.docstring_cache.warnings)
+
+    # Parse the input packages instead of importing them, if enabled. Modules
+    # passed as objects are crawled as-is.
+    if config['STATIC_CRAWL']:
+        state.static_importer = StaticImporter([module.split('.')[0] for module in config['INPUT_MODULES'] if isinstance(module, str)])
+
+    # Set up the crawl cache, if enabled. With stubs, render_module() needs
+    # parsed classes of the whole module, which can't be restored.
+    if config['CRAWL_CACHE'] is not None:
+        if config['OUTPUT_STUBS'] is not None:
+            logging.warning("CRAWL_CACHE is not supported together with OUTPUT_STUBS, crawling everything")
+        else:
+            state.crawl_cache = CrawlCache(
+                rendercache.load(os.path.join(config['INPUT'], config['CRAWL_CACHE']), _crawl_cache_version, lambda: ''),
+                crawl_cache_fingerprint(config, templates, [os.path.join(basedir, file) for file in config['INPUT_DOCS']]),
+                config['INPUT_MODULES'])
+            logging.getLogger().addHandler(state.crawl_cache.warnings)
+
+    # Include invocation counts of external tools and cache hits of plugins
+    # that provide them in build statistics
+    if state.telemetry:
+        for name, counter in _telemetry_counters().items():
+            state.telemetry.track(name, counter)
+        if state.docstring_cache:
+            state.telemetry.track('docstrings', state.docstring_cache.stats)
+        if state.crawl_cache:
+            state.telemetry.track('crawl', state.crawl_cache.stats)
+
     # First process the doc input files so we have all data for rendering
     # module/class pages. This needs to be done first so the crawl after can
     # have a look at the external data and include documented underscored
     # members as well. On the other hand, this means nothing in render_doc()
     # has access to the module hierarchy -- all actual content rendering has to
     # happen later.
-    for file in config['INPUT_DOCS']:
-        render_doc(state, os.path.join(basedir, file))
+    with phase(state.telemetry, 'doc render'):
+        for file in config['INPUT_DOCS']:
+            render_doc(state, os.path.join(basedir, file))
 
     # Crawl all input modules to gather the name tree, put their names into a
     # list for the index. The crawl is done breadth-first, so the function
-    # returns a list of submodules to be crawled next.
-    class_index = []
-    modules_to_crawl = []
-    for module in config['INPUT_MODULES']:
-        if isinstance(module, str):
-            module_name = module
-            module = importlib.import_module(module)
-        else:
-            module_name = module.__name__
-        module_path = module_name.split('.')
-        modules_to_crawl += [(module_path, module)]
-        # Add the module to the class index only if it's a top-level one,
-        # otherwise expect that it'll appear somewhere deeper on its own
-        if len(module_path) == 1:
-            class_index += [module_name]
-    while modules_to_crawl:
-        path, object = modules_to_crawl.pop(0)
-        if id(object) in state.crawled: continue
-        modules_to_crawl += crawl_module(state, path, object)
-
-    # Add special pages to the name map. The pages are done after so they can
-    # override these.
-    for page in special_pages:
-        entry = Empty()
-        entry.type = EntryType.SPECIAL
-        entry.path = [page]
-        entry.url = config['URL_FORMATTER'](EntryType.SPECIAL, entry.path)[1]
-        state.name_map[page] = entry
-
-    # Do the same for pages
-    # TODO: turn also into some crawl_page() function? once we have subpages?
-    page_index = []
-    for page in config['INPUT_PAGES']:
-        page_name = os.path.splitext(os.path.basename(page))[0]
-
-        entry = Empty()
-        entry.type = EntryType.PAGE
-        entry.path = [page_name]
-        entry.url = config['URL_FORMATTER'](EntryType.PAGE, entry.path)[1]
-        entry.filename = os.path.join(config['INPUT'], page)
-        state.name_map[page_name] = entry
-
-        # The index page doesn't go to the index
-        if page_name != 'index': page_index += [page_name]
+    # returns a list of submodules to be crawled next. With the crawl cache,
+    # packages that didn't change are restored from it instead of being
+    # imported and crawled.
+    def crawl():
+        import_module = state.static_importer.import_module if state.static_importer else importlib.import_module
+        class_index = []
+        modules_to_crawl = []
+        for module in config['INPUT_MODULES']:
+            if isinstance(module, str):
+                module_name = module
+                package = module_name.split('.')[0]
+                if state.crawl_cache and state.crawl_cache.restore(state, package):
+                    module = None
+                elif state.crawl_cache:
+                    with state.crawl_cache.importing(state, package):
+                        module = import_module(module)
+                else:
+                    module = import_module(module)
+            else:
+                module_name = module.__name__
+            module_path = module_name.split('.')
+            if module is not None:
+                modules_to_crawl += [(module_path, module)]
+            # Add the module to the class index only if it's a top-level one,
+            # otherwise expect that it'll appear somewhere deeper on its own
+            if len(module_path) == 1:
+                class_index += [module_name]
+        with phase(state.telemetry, 'crawl'):
+            while modules_to_crawl:
+                path, object = modules_to_crawl.pop(0)
+                if id(object) in state.crawled: continue
+                modules_to_crawl += crawl_module(state, path, object)
+
+        # Add special pages to the name map. The pages are done after so they
+        # can override these.
+        for page in special_pages:
+            entry = NameMapEntry()
+            entry.type = EntryType.SPECIAL
+            entry.path = [page]
+            entry.url = config['URL_FORMATTER'](EntryType.SPECIAL, entry.path)[1]
+            state.name_map[page] = entry
+
+        # Do the same for pages
+        # TODO: turn also into some crawl_page() function? once we have
+        #   subpages?
+        page_index = []
+        for page in config['INPUT_PAGES']:
+            page_name = os.path.splitext(os.path.basename(page))[0]
+
+            entry = NameMapEntry()
+            entry.type = EntryType.PAGE
+            entry.path = [page_name]
+            entry.url = config['URL_FORMATTER'](EntryType.PAGE, entry.path)[1]
+            entry.filename = os.path.join(config['INPUT'], page)
+            state.name_map[page_name] = entry
+
+            # The index page doesn't go to the index
+            if page_name != 'index': page_index += [page_name]
+
+        return class_index, page_index
+
+    if state.crawl_cache:
+        crawl_warnings = state.crawl_cache.warnings.count
+    class_index, page_index = crawl()
+
+    # If the restored packages don't fit together with the rest, crawl
+    # everything again
+    if state.crawl_cache:
+        if not state.crawl_cache.crawl_done(state):
+            logging.debug("name map changed since packages %s were cached, crawling everything again", list(state.crawl_cache.restored))
+            state.crawl_cache.discard()
+            state.name_map = {}
+            state.name_mapping = copy.deepcopy(config['NAME_MAPPING'])
+            state.crawled = set()
+            class_index, page_index = crawl()
+            state.crawl_cache.crawl_done(state)
+        state.crawl_cache.crawl_warnings = state.crawl_cache.warnings.count - crawl_warnings
 
     # Call all registered post-crawl hooks
     for hook in state.hooks_post_crawl:
         hook(name_map=state.name_map)
 
+    # Roles in cached docs are resolved against the name map, so the cache
+    # entries are valid only as long as the name map stays the same
+    if state.docstring_cache:
+        fingerprint = hashlib.sha1()
+        for name, entry in state.name_map.items():
+            fingerprint.update(repr((name, entry.type.name, getattr(entry, 'url', None), getattr(entry, 'css_classes', None))).encode('utf-8'))
+        state.docstring_cache.name_map_fingerprint = fingerprint.hexdigest()
+
     # Go through all crawled names and render modules, classes and pages. A
     # side effect of the render is entry.summary (and entry.name for pages)
     # being filled.
     # TODO: page name need to be added earlier for intersphinx!
-    for entry in state.name_map.values():
+    to_render = []
+    for name, entry in state.name_map.items():
         # If there is no object, the entry is an external reference. Skip
         # those. Can't do `not entry.object` because that gives ValueError
         # for numpy ("use a.any() or a.all()")
         if hasattr(entry, 'object') and entry.object is None:
             continue
+        if entry.type in [EntryType.MODULE, EntryType.CLASS, EntryType.PAGE]:
+            to_render += [name]
+
+    # With stubs, classes get parsed into state.parsed_classes and module
+    # dependencies collected in render_class() and then used in
+    # render_module() of the enclosing module, so the render has to happen
+    # in a single process.
+    if jobs > 1 and state.config['OUTPUT_STUBS'] is not None:
+        logging.warning("parallel rendering is not supported together with OUTPUT_STUBS, using a single job")
+        jobs = 1
+    if jobs > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        logging.warning("parallel rendering requires the fork start method, which is not available on this platform, using a single job")
+        jobs = 1
+
+    if jobs > 1:
+        logging.debug("rendering {} modules, classes and pages using {} jobs".format(len(to_render), jobs))
+
+        # Split into contiguous chunks, several per job for better load
+        # balancing. The workers get forked with a copy of the fully crawled
+        # state, imap() then returns the results in the original order so
+        # the search data are the same as with a single job.
+        chunk_size = max(1, -(-len(to_render)//(jobs*8)))
+        chunks = [to_render[i:i + chunk_size] for i in range(0, len(to_render), chunk_size)]
+
+        # The background writer thread is stopped for the lifetime of the
+        # pool, forking while it holds a lock could deadlock the workers
+        global _parallel_context
+        _parallel_context = (state, env)
+        state.writer.pause()
+        try:
+            with multiprocessing.get_context('fork').Pool(jobs) as pool:
+                for recorded in pool.imap(_render_in_worker, chunks):
+                    merge_recorded(state, recorded)
+        finally:
+            state.writer.resume()
+        _parallel_context = None
 
-        if entry.type == EntryType.MODULE:
-            render_module(state, entry.path, entry.object, env)
-        elif entry.type == EntryType.CLASS:
-            render_class(state, entry.path, entry.object, env)
-        elif entry.type == EntryType.PAGE:
-            render_page(state, entry.path, entry.filename, env)
+    else:
+        for name in to_render:
+            render_entry(state, name, env)
+
+    if state.docstring_cache:
+        logging.getLogger().removeHandler(state.docstring_cache.warnings)
+        state.docstring_cache.cache.save()
+    if state.crawl_cache:
+        state.crawl_cache.render_done(state)
+        logging.getLogger().removeHandler(state.crawl_cache.warnings)
+        state.crawl_cache.save(state)
 
     # Warn if there are any unused contents left after processing everything
     for docs in ['module', 'class', 'enum', 'function', 'property', 'data']:
@@ -3149,7 +3941,7 @@ def run(basedir, config, *, templates=default_templates, search_add_lookahead_ba
         index.pages = page_index
         for file in special_pages[1:]: # exclude index
             filename, url = config['URL_FORMATTER'](EntryType.SPECIAL, [file])
-            render(config=config,
+            render(config=config, writer=state.writer,
                 template=file + '.html',
                 filename=os.path.join(config['OUTPUT'], filename),
                 url=url,
@@ -3166,7 +3958,7 @@ def run(basedir, config, *, templates=default_templates, search_add_lookahead_ba
             page.filename = filename
             page.url = url
             page.breadcrumb = [(config['PROJECT_TITLE'], url)]
-            render(config=config,
+            render(config=config, writer=state.writer,
                 template='page.html',
                 filename=os.path.join(config['OUTPUT'], filename),
                 url=url,
@@ -3176,7 +3968,8 @@ def run(basedir, config, *, templates=default_templates, search_add_lookahead_ba
         if not state.config['SEARCH_DISABLED']:
             logging.debug("building search data for {} symbols".format(len(state.search)))
 
-            data = build_search_data(state, add_lookahead_barriers=search_add_lookahead_barriers, merge_subtrees=search_merge_subtrees, merge_prefixes=search_merge_prefixes)
+            with phase(state.telemetry, 'search data build'):
+                data = build_search_data(state, add_lookahead_barriers=search_add_lookahead_barriers, merge_subtrees=search_merge_subtrees, merge_prefixes=search_merge_prefixes)
 
             # Joining twice, first before passing those to the URL formatter
             # and second after. If SEARCH_DOWNLOAD_BINARY is a string, use that
@@ -3185,11 +3978,9 @@ def run(basedir, config, *, templates=default_templates, search_add_lookahead_ba
             # passed to URL formatters so we can add cache buster hashes to its
             # URL?
             if state.config['SEARCH_DOWNLOAD_BINARY']:
-                with open(os.path.join(config['OUTPUT'], config['URL_FORMATTER'](EntryType.STATIC, [os.path.join(config['OUTPUT'], state.config['SEARCH_DOWNLOAD_BINARY'] if isinstance(state.config['SEARCH_DOWNLOAD_BINARY'], str) else searchdata_filename.format(search_filename_prefix=state.config['SEARCH_FILENAME_PREFIX']))])[0]), 'wb') as f:
-                    f.write(data)
+                state.writer.write(os.path.join(config['OUTPUT'], config['URL_FORMATTER'](EntryType.STATIC, [os.path.join(config['OUTPUT'], state.config['SEARCH_DOWNLOAD_BINARY'] if isinstance(state.config['SEARCH_DOWNLOAD_BINARY'], str) else searchdata_filename.format(search_filename_prefix=state.config['SEARCH_FILENAME_PREFIX']))])[0]), data)
             else:
-                with open(os.path.join(config['OUTPUT'], config['URL_FORMATTER'](EntryType.STATIC, [os.path.join(config['OUTPUT'], searchdata_filename_b85.format(search_filename_prefix=state.config['SEARCH_FILENAME_PREFIX']))])[0]), 'wb') as f:
-                    f.write(base85encode_search_data(data))
+                state.writer.write(os.path.join(config['OUTPUT'], config['URL_FORMATTER'](EntryType.STATIC, [os.path.join(config['OUTPUT'], searchdata_filename_b85.format(search_filename_prefix=state.config['SEARCH_FILENAME_PREFIX']))])[0]), base85encode_search_data(data))
 
             # OpenSearch metadata, in case we have the base URL
             if state.config['SEARCH_BASE_URL']:
@@ -3198,34 +3989,35 @@ def run(basedir, config, *, templates=default_templates, search_add_lookahead_ba
                 template = env.get_template('opensearch.xml')
                 rendered = template.render(**state.config)
                 output = os.path.join(config['OUTPUT'], 'opensearch.xml')
-                with open(output, 'wb') as f:
-                    f.write(rendered.encode('utf-8'))
-                    # Add back a trailing newline so we don't need to bother
-                    # with patching test files to include a trailing newline to
-                    # make Git happy. Can't use keep_trailing_newline because
-                    # that'd add it also for nested templates :( The rendered
-                    # file should never contain a trailing newline on its own.
-                    assert not rendered.endswith('\n')
-                    f.write(b'\n')
+                # Add back a trailing newline so we don't need to bother with
+                # patching test files to include a trailing newline to make
+                # Git happy. Can't use keep_trailing_newline because that'd add
+                # it also for nested templates :( The rendered file should
+                # never contain a trailing newline on its own.
+                assert not rendered.endswith('\n')
+                state.writer.write(output, rendered.encode('utf-8') + b'\n')
 
         # Copy referenced files
-        for i in config['STYLESHEETS'] + config['EXTRA_FILES'] + ([config['PROJECT_LOGO']] if config['PROJECT_LOGO'] else []) + ([config['FAVICON'][0]] if config['FAVICON'] else []) + list(state.external_data) + ([] if config['SEARCH_DISABLED'] else ['search.js']):
-            # Skip absolute URLs
-            if urllib.parse.urlparse(i).netloc: continue
+        with phase(state.telemetry, 'file copy'):
+            for i in config['STYLESHEETS'] + config['EXTRA_FILES'] + ([config['PROJECT_LOGO']] if config['PROJECT_LOGO'] else []) + ([config['FAVICON'][0]] if config['FAVICON'] else []) + list(state.external_data) + ([] if config['SEARCH_DISABLED'] else ['search.js']):
+                # Skip absolute URLs
+                if urllib.parse.urlparse(i).netloc: continue
 
-            # If file is found relative to the conf file, use that
-            if os.path.exists(os.path.join(config['INPUT'], i)):
-                i = os.path.join(config['INPUT'], i)
+                # If file is found relative to the conf file, use that
+                if os.path.exists(os.path.join(config['INPUT'], i)):
+                    i = os.path.join(config['INPUT'], i)
 
-            # Otherwise use path relative to script directory
-            else:
-                i = os.path.join(os.path.dirname(os.path.realpath(__file__)), i)
+                # Otherwise use path relative to script directory
+                else:
+                    i = os.path.join(os.path.dirname(os.path.realpath(__file__)), i)
 
-            output = os.path.join(config['OUTPUT'], config['URL_FORMATTER'](EntryType.STATIC, [i])[0])
-            output_dir = os.path.dirname(output)
-            if not os.path.exists(output_dir): os.makedirs(output_dir)
-            logging.debug("copying %s to output", i)
-            shutil.copy(i, output)
+                output = os.path.join(config['OUTPUT'], config['URL_FORMATTER'](EntryType.STATIC, [i])[0])
+                logging.debug("copying %s to output", i)
+                state.writer.copy(i, output)
+
+    # Wait until everything is written, propagating any errors
+    with phase(state.telemetry, 'file write'):
+        state.writer.finish()
 
     # Call all registered finalization hooks
     for hook in state.hooks_post_run: hook()
@@ -3234,6 +4026,9 @@ if __name__ == '__main__': # pragma: no cover
     parser = argparse.ArgumentParser()
     parser.add_argument('conf', help="configuration file")
     parser.add_argument('--templates', help="template directory", default=default_templates)
+    parser.add_argument('-j', '--jobs', type=int, help="number of processes to render modules, classes and pages with", default=1)
+    parser.add_argument('--profile', metavar='FILE', help="save build statistics as JSON to FILE and print a summary")
+    parser.add_argument('--profile-slowest', metavar='N', type=int, help="how many slowest modules, classes and pages to include in build statistics", default=10)
     parser.add_argument('--debug', help="verbose debug output", action='store_true')
     args = parser.parse_args()
 
@@ -3257,4 +4052,9 @@ if __name__ == '__main__': # pragma: no cover
     else:
         logging.basicConfig(level=logging.INFO)
 
-    run(os.path.dirname(os.path.abspath(args.conf)), config, templates=os.path.abspath(args.templates))
+    telemetry = Telemetry() if args.profile else None
+
+    run(os.path.dirname(os.path.abspath(args.conf)), config, templates=os.path.abspath(args.templates), jobs=args.jobs, telemetry=telemetry)
+
+    if telemetry:
+        logging.info("build statistics saved to {}\n{}".format(args.profile, telemetry.save(args.profile, args.profile_slowest)))
@@ -27,7 +27,7 @@
 "use strict"; /* it summons the Cthulhu in a proper way, they say */
 
 var Search = {
-    formatVersion: 2, /* the data filename contains this number too */
+    formatVersion: 3, /* the data filename contains this number too */
 
     dataSize: 0, /* used mainly by tests, not here */
     symbolCount: '&hellip;',
@@ -46,7 +46,6 @@ var Search = {
     resultIdMask: null,
     fileOffsetBytes: null,
     fileOffsetMask: null,
-    lookaheadBarrierMask: null,
 
     /* Always contains at least the root node offset and then one node offset
        per entered character */
@@ -66,26 +65,36 @@ var Search = {
        onkeypress event and reset after each oninput event. */
     autocompleteNextInputEvent: false,
 
-    init: function(buffer, maxResults) {
+    /* Sharded search data. If not null, contains a (hex) shard prefix ->
+       parsed shard data mapping, with null values for shards that weren't
+       loaded yet. */
+    shards: null,
+    shardPrefixLength: 0,
+    currentShard: null,
+    requestedShards: {},
+    dataUrl: null,
+
+    /* Checks the header and fetches type sizes. Returns a DataView on success,
+       null otherwise. */
+    parseHeader: function(buffer) {
         let view = new DataView(buffer);
 
-        /* The file is too short to contain at least the headers and empty
-           sections */
-        if(view.byteLength < 31) {
+        /* The file is too short to contain at least the header */
+        if(view.byteLength < 20) {
             console.error("Search data too short");
-            return false;
+            return null;
         }
 
         if(view.getUint8(0) != 'M'.charCodeAt(0) ||
            view.getUint8(1) != 'C'.charCodeAt(0) ||
            view.getUint8(2) != 'S'.charCodeAt(0)) {
             console.error("Invalid search data signature");
-            return false;
+            return null;
         }
 
         if(view.getUint8(3) != this.formatVersion) {
             console.error("Invalid search data version");
-            return false;
+            return null;
         }
 
         /* Fetch type sizes. The only value that can fail is result ID byte
@@ -94,11 +103,9 @@ var Search = {
         if((typeSizes & 0x01) >> 0 == 0) {
             this.fileOffsetBytes = 3;
             this.fileOffsetMask = 0x00ffffff;
-            this.lookaheadBarrierMask = 0x00800000;
         } else /* (typeSizes & 0x01) >> 0 == 1 */ {
             this.fileOffsetBytes = 4;
             this.fileOffsetMask = 0xffffffff;
-            this.lookaheadBarrierMask = 0x80000000;
         }
         if((typeSizes & 0x06) >> 1 == 0) {
             this.resultIdBytes = 2;
@@ -111,7 +118,7 @@ var Search = {
             this.resultIdMask = 0xffffffff;
         } else /* (typeSizes & 0x06) >> 1 == 3 */ {
             console.error("Invalid search data result ID byte value");
-            return false;
+            return null;
         }
         if((typeSizes & 0x08) >> 3 == 0) {
             this.nameSizeBytes = 1;
@@ -121,31 +128,110 @@ var Search = {
             this.nameSizeMask = 0xffff;
         }
 
-        /* Separate the data into the trie and the result / type map. Because
-           we're reading larger values than there might be and then masking out
-           the high bytes, keep extra 1/2 byte padding at the end to avoid
-           OOB errors. */
+        return view;
+    },
+
+    /* Separates the data into the trie and the result / type map. Returns
+       null if the file is too short. */
+    parseData: function(view) {
+        /* The file is too short to contain at least the headers and empty
+           sections */
+        if(view.byteLength < 30) {
+            console.error("Search data too short");
+            return null;
+        }
+
+        /* Because we're reading larger values than there might be and then
+           masking out the high bytes, keep extra 1/2 byte padding at the end
+           to avoid OOB errors. */
         let mapOffset = view.getUint32(12, true);
         let typeMapOffset = view.getUint32(16, true);
-        /* There may be a 3-byte file offset at the end of the trie which we'll
-           read as 32-bit, add one safety byte in that case */
-        this.trie = new DataView(buffer, 20, mapOffset - 20 + (4 - this.fileOffsetBytes));
-        /* There may be a 3-byte file size (for zero results) which we'll read
-           as 32-bit, add one safety byte in that case */
-        this.map = new DataView(buffer, mapOffset, typeMapOffset - mapOffset + (4 - this.fileOffsetBytes));
-        /* No variable-size types in the type map at the moment */
-        this.typeMap = new DataView(buffer, typeMapOffset);
+        let data = {
+            trie: new DataView(view.buffer, 20, mapOffset - 20),
+            /* There may be a 3-byte file size (for zero results) which we'll
+               read as 32-bit, add one safety byte in that case */
+            map: new DataView(view.buffer, mapOffset, typeMapOffset - mapOffset + (4 - this.fileOffsetBytes)),
+            /* No variable-size types in the type map at the moment */
+            typeMap: new DataView(view.buffer, typeMapOffset)
+        };
 
         /* Offset of the first result map item is after N + 1 offsets and N
            flags, calculate flag offset from that */
-        this.mapFlagsOffset = this.fileOffsetBytes*(((this.map.getUint32(0, true) & this.fileOffsetMask) - this.fileOffsetBytes)/(this.fileOffsetBytes + 1) + 1);
+        data.mapFlagsOffset = this.fileOffsetBytes*(((data.map.getUint32(0, true) & this.fileOffsetMask) - this.fileOffsetBytes)/(this.fileOffsetBytes + 1) + 1);
+        return data;
+    },
 
-        /* Set initial properties */
-        this.dataSize = buffer.byteLength;
-        this.symbolCount = view.getUint32(8, true) + " symbols (" + Math.round(this.dataSize/102.4)/10 + " kB)";
-        this.maxResults = maxResults ? maxResults : 100;
+    /* Makes given search data the current one */
+    useData: function(data) {
+        this.trie = data.trie;
+        this.map = data.map;
+        this.typeMap = data.typeMap;
+        this.mapFlagsOffset = data.mapFlagsOffset;
         this.searchString = '';
         this.searchStack = [this.trie.getUint32(0, true)];
+    },
+
+    init: function(buffer, maxResults) {
+        let view = this.parseHeader(buffer);
+        if(!view) return false;
+
+        /* A manifest of sharded search data, remember what shards are there
+           and load them on demand */
+        if(view.getUint8(4, true) & 0x10) {
+            let shardPrefixLength = view.getUint32(12, true);
+            let shardCount = view.getUint32(16, true);
+            if(view.byteLength < 24 + shardCount*shardPrefixLength) {
+                console.error("Search data too short");
+                return false;
+            }
+
+            this.shardPrefixLength = shardPrefixLength;
+            this.shards = {};
+            this.requestedShards = {};
+            for(let i = 0; i != shardCount; ++i) {
+                let prefix = '';
+                for(let j = 0; j != shardPrefixLength; ++j) {
+                    let c = view.getUint8(24 + i*shardPrefixLength + j);
+                    if(!c) break;
+                    prefix += ('0' + c.toString(16)).substr(-2);
+                }
+                this.shards[prefix] = null;
+            }
+            this.currentShard = null;
+            this.trie = null;
+            this.map = null;
+            this.typeMap = null;
+            this.searchString = '';
+            this.searchStack = [];
+
+            this.dataSize = buffer.byteLength;
+            this.symbolCount = view.getUint32(8, true) + " symbols";
+
+            /* Shards for short search strings contain only as many results as
+               the data were generated with, showing more for longer search
+               strings would be inconsistent */
+            let shardMaxResults = view.getUint32(20, true);
+            if(!maxResults) maxResults = shardMaxResults;
+            else if(maxResults > shardMaxResults) {
+                console.warn("Sharded search data have at most", shardMaxResults, "results, limiting to that");
+                maxResults = shardMaxResults;
+            }
+
+        /* Otherwise everything is in a single file */
+        } else {
+            let data = this.parseData(view);
+            if(!data) return false;
+
+            this.shardPrefixLength = 0;
+            this.shards = null;
+            this.useData(data);
+
+            this.dataSize = buffer.byteLength;
+            this.symbolCount = view.getUint32(8, true) + " symbols (" + Math.round(this.dataSize/102.4)/10 + " kB)";
+        }
+
+        /* Set initial properties */
+        this.maxResults = maxResults ? maxResults : 100;
 
         /* istanbul ignore if */
         if(typeof document !== 'undefined') {
@@ -176,10 +262,90 @@ var Search = {
         return true;
     },
 
+    /* Adds a shard of sharded search data. The prefix is in hex, as in the
+       shard filename. */
+    initShard: function(prefix, buffer) {
+        if(!this.shards || !(prefix in this.shards)) {
+            console.error("Unexpected search data shard");
+            return false;
+        }
+
+        let view = this.parseHeader(buffer);
+        if(!view) return false;
+        let data = this.parseData(view);
+        if(!data) return false;
+
+        this.shards[prefix] = data;
+
+        /* Repeat the search which waited for this shard */
+        /* istanbul ignore if */
+        if(typeof document !== 'undefined') {
+            let value = document.getElementById('search-input').value;
+            if(value.length) Search.searchAndRender(value);
+        }
+
+        return true;
+    },
+
+    /* Returns a (hex) prefix of a shard containing given (UTF-8) search
+       string or null if there's no such shard. If there's nothing for the
+       string, tries again with spaces at the end trimmed, same as search()
+       does. */
+    shardPrefix: function(searchString) {
+        let strings = [searchString, searchString.replace(/\s+$/, '')];
+        for(let i = 0; i != strings.length; ++i) {
+            let prefix = '';
+            for(let j = 0; j != Math.min(strings[i].length, this.shardPrefixLength); ++j)
+                prefix += ('0' + strings[i].charCodeAt(j).toString(16)).substr(-2);
+            if(prefix.length && prefix in this.shards) return prefix;
+        }
+        return null;
+    },
+
+    requestShard: /* istanbul ignore next */ function(prefix) {
+        if(this.requestedShards[prefix] || !this.dataUrl) return;
+        this.requestedShards[prefix] = true;
+
+        /* Shard filenames have the prefix appended before the extension */
+        let url = this.dataUrl.replace(/(\.[a-z]+)$/, '-' + prefix + '$1');
+        if(url.substr(-4) == '.bin') {
+            let req = window.XDomainRequest ? new XDomainRequest() : new XMLHttpRequest();
+            if(!req) return;
+
+            req.open("GET", url, true);
+            req.responseType = 'arraybuffer';
+            req.onreadystatechange = function() {
+                if(req.readyState != 4) return;
+
+                /* Status is 0 for local files */
+                if((req.status && req.status != 200) || !req.response || !Search.initShard(prefix, req.response))
+                    Search.shardFailed(prefix);
+            }
+            req.send();
+        } else {
+            let script = document.createElement('script');
+            script.src = url;
+            script.async = true;
+            script.onerror = function() { Search.shardFailed(prefix); };
+            document.body.appendChild(script);
+        }
+    },
+
+    /* Called if a shard failed to load, instead of showing "Loading" forever.
+       The shard is requested again next time it's needed. */
+    shardFailed: /* istanbul ignore next */ function(prefix) {
+        delete this.requestedShards[prefix];
+        document.getElementById('search-symbolcount').innerHTML = "Can't load search data";
+    },
+
     download: /* istanbul ignore next */ function(url) {
         var req = window.XDomainRequest ? new XDomainRequest() : new XMLHttpRequest();
         if(!req) return;
 
+        /* Remember where the data came from to know where to load shards
+           from */
+        this.dataUrl = url;
+
         req.open("GET", url, true);
         req.responseType = 'arraybuffer';
         req.onreadystatechange = function() {
@@ -246,9 +412,19 @@ var Search = {
     },
 
     load: function(base85string) {
+        /* Remember where the data came from to know where to load shards
+           from */
+        /* istanbul ignore if */
+        if(typeof document !== 'undefined' && document.currentScript)
+            this.dataUrl = document.currentScript.src;
+
         return this.init(this.base85decode(base85string));
     },
 
+    loadShard: function(prefix, base85string) {
+        return this.initShard(prefix, this.base85decode(base85string));
+    },
+
     /* http://ecmanaut.blogspot.com/2006/07/encoding-decoding-utf8-in-javascript.html */
     toUtf8: function(string) { return unescape(encodeURIComponent(string)); },
     fromUtf8: function(string) { return decodeURIComponent(escape(string)); },
@@ -288,6 +464,23 @@ var Search = {
         return suggestedTabAutocompletionString;
     },
 
+    /* Reads a variable-length integer from the trie, the offset after it is
+       saved into trieVarintEnd. Not using bit operations as those would
+       overflow for offsets larger than 31 bits. */
+    trieVarintEnd: 0,
+    trieVarint: function(offset) {
+        let value = 0;
+        let multiplier = 1;
+        for(;;) {
+            let byte = this.trie.getUint8(offset++);
+            value += (byte & 0x7f)*multiplier;
+            if(!(byte & 0x80)) break;
+            multiplier *= 128;
+        }
+        this.trieVarintEnd = offset;
+        return value;
+    },
+
     /* Returns the values in UTF-8, but input is in whatever shitty 16bit
        encoding JS has */
     search: function(searchString) {
@@ -296,6 +489,33 @@ var Search = {
            found, see below. */
         searchString = this.toUtf8(searchString.toLowerCase().replace(/^\s+/,''));
 
+        /* With sharded data, switch to the shard containing the search string
+           first. If it's not loaded yet, request it and return null, the
+           search is repeated once it arrives. */
+        if(this.shards) {
+            let prefix = this.shardPrefix(searchString);
+            if(prefix === null) {
+                this.searchString = '';
+                /* istanbul ignore if */
+                if(searchString.length && typeof document !== 'undefined') {
+                    let link = document.getElementById('search-external');
+                    if(link)
+                        link.href = link.dataset.searchEngine.replace('{query}', encodeURIComponent(searchString));
+                }
+                return [[], ''];
+            }
+
+            if(prefix !== this.currentShard) {
+                if(!this.shards[prefix]) {
+                    this.requestShard(prefix);
+                    return null;
+                }
+
+                this.useData(this.shards[prefix]);
+                this.currentShard = prefix;
+            }
+        }
+
         /* TODO: maybe i could make use of InputEvent.data and others here */
 
         /* Find longest common prefix of previous and current value so we don't
@@ -313,28 +533,27 @@ var Search = {
         /* Add new characters from the search string */
         let foundPrefix = commonPrefix;
         for(; foundPrefix != searchString.length; ++foundPrefix) {
-            /* Calculate offset and count of children */
+            /* Calculate offset and count of children. If there's 15 or
+               more, the rest of the count is stored separately. */
             let offset = this.searchStack[this.searchStack.length - 1];
-
-            /* If there's a lot of results, the result count is a 16bit BE value
-               instead */
-            let resultCount = this.trie.getUint8(offset);
-            let resultCountSize = 1;
-            if(resultCount & 0x80) {
-                resultCount = this.trie.getUint16(offset, false) & ~0x8000;
-                ++resultCountSize;
-            }
-
-            let childCount = this.trie.getUint8(offset + resultCountSize);
-
-            /* Go through all children and find the next offset */
-            let childOffset = offset + resultCountSize + 1 + resultCount*this.resultIdBytes;
+            let childCount = this.trieVarint(offset) & 0x0f;
+            if(childCount == 15)
+                childCount += this.trieVarint(this.trieVarintEnd);
+
+            /* Go through all children and find the next offset. The child
+               offsets are variable-length, so all before the found one have to
+               be skipped. */
+            let childOffset = this.trieVarintEnd;
             let found = false;
             for(let j = 0; j != childCount; ++j) {
                 if(String.fromCharCode(this.trie.getUint8(childOffset + j)) != searchString[foundPrefix])
                     continue;
 
-                this.searchStack.push(this.trie.getUint32(childOffset + childCount + j*this.fileOffsetBytes, true) & this.fileOffsetMask & ~this.lookaheadBarrierMask);
+                let distanceBarrier = 0;
+                this.trieVarintEnd = childOffset + childCount;
+                for(let k = 0; k <= j; ++k)
+                    distanceBarrier = this.trieVarint(this.trieVarintEnd);
+                this.searchStack.push(offset - Math.floor(distanceBarrier/2));
                 found = true;
                 break;
             }
@@ -378,22 +597,37 @@ var Search = {
             let offset = current[0];
             let suffixLength = current[1];
 
-            /* Calculate child count. If there's a lot of results, the count
-               "leaks over" to the child count storage. */
-            /* TODO: hmmm. this is helluvalot duplicated code. hmm. */
-            let resultCount = this.trie.getUint8(offset);
-            let resultCountSize = 1;
-            if(resultCount & 0x80) {
-                resultCount = this.trie.getUint16(offset, false) & ~0x8000;
-                ++resultCountSize;
-            }
-
-            let childCount = this.trie.getUint8(offset + resultCountSize);
-
-            /* Populate the results with all values associated with this node */
+            /* Calculate result and child count, and whether the results have
+               a shorter suffix flag */
+            let header = this.trieVarint(offset);
+            let resultCount = Math.floor(header/32);
+            let hasShorterSuffix = header & 0x10;
+            let childCount = header & 0x0f;
+            if(childCount == 15)
+                childCount += this.trieVarint(this.trieVarintEnd);
+
+            /* Children are first, then results */
+            let childOffset = this.trieVarintEnd;
+            this.trieVarintEnd = childOffset + childCount;
+            let children = [];
+            for(let j = 0; j != childCount; ++j)
+                children.push(this.trieVarint(this.trieVarintEnd));
+
+            /* Populate the results with all values associated with this node.
+               The IDs are sorted, each except the first is stored as a
+               difference to the previous. Results that were added with () at
+               the end reference the entry without, with the suffix two chars
+               shorter. */
+            let index = 0;
             for(let i = 0; i != resultCount; ++i) {
-                let index = this.trie.getUint32(offset + resultCountSize + 1 + i*this.resultIdBytes, true) & this.resultIdMask;
-                results.push(this.gatherResult(index, suffixLength, 0xffffff)); /* should be enough haha */
+                let delta = this.trieVarint(this.trieVarintEnd);
+                let resultSuffixLength = suffixLength;
+                if(hasShorterSuffix) {
+                    if(delta % 2) resultSuffixLength -= 2;
+                    delta = Math.floor(delta/2);
+                }
+                index += delta;
+                results.push(this.gatherResult(index, resultSuffixLength, 0xffffff)); /* should be enough haha */
 
                 /* 'nuff said. */
                 if(results.length >= this.maxResults)
@@ -401,21 +635,16 @@ var Search = {
             }
 
             /* Dig deeper */
-            let childOffset = offset + resultCountSize + 1 + resultCount*this.resultIdBytes;
             for(let j = 0; j != childCount; ++j) {
-                let offsetBarrier = this.trie.getUint32(childOffset + childCount + j*this.fileOffsetBytes, true) & this.fileOffsetMask;
-
                 /* Lookahead barrier, don't dig deeper */
-                if(offsetBarrier & this.lookaheadBarrierMask) continue;
+                if(children[j] % 2) continue;
 
                 /* Append to the queue */
-                leaves.push([offsetBarrier & ~this.lookaheadBarrierMask, suffixLength + 1]);
+                leaves.push([offset - children[j]/2, suffixLength + 1]);
 
                 /* We don't have anything yet and this is the only path
-                   forward, add the char to suggested Tab autocompletion. Can't
-                   extract it from the leftmost 8 bits of offsetBarrier because
-                   that would make it negative, have to load as Uint8 instead.
-                   Also can't use String.fromCharCode(), because later doing
+                   forward, add the char to suggested Tab autocompletion.
+                   Can't use String.fromCharCode(), because later doing
                    str.charCodeAt() would give me back UTF-16 values, which is
                    absolutely unwanted when all I want is check for truncated
                    UTF-8. */
@@ -492,10 +721,20 @@ var Search = {
                     suffixLength: suffixLength + resultSuffixLength};
         }
 
-        /* Otherwise extract URL from here */
-        let max = Math.min(j + maxUrlPrefix - url.length, nextResultOffset);
-        for(; j != max; ++j) {
-            url += String.fromCharCode(this.map.getUint8(j));
+        /* Otherwise extract URL from here, up to the max prefix length.
+           Runs of hexadecimal digits are packed two digits per byte, with a
+           0x01 byte and digit count in front. */
+        while(j != nextResultOffset && url.length < maxUrlPrefix) {
+            let c = this.map.getUint8(j);
+            if(c == 0x01) {
+                let digitCount = this.map.getUint8(j + 1);
+                for(let k = 0; k != digitCount && url.length < maxUrlPrefix; ++k)
+                    url += ((this.map.getUint8(j + 2 + (k >> 1)) >> (k % 2 ? 0 : 4)) & 0x0f).toString(16);
+                j += 2 + digitCount/2;
+            } else {
+                url += String.fromCharCode(c);
+                ++j;
+            }
         }
 
         /* This is an alias, return what we have, without parsed CSS class and
@@ -620,6 +859,14 @@ var Search = {
         let prev = performance.now();
         let results = this.search(value);
         let after = performance.now();
+
+        /* Waiting for a search data shard, keep the previous results until
+           it arrives */
+        if(!results) {
+            document.getElementById('search-symbolcount').innerHTML = "Loading &hellip;";
+            return;
+        }
+
         this.renderResults(results);
         if(this.searchString.length) {
             document.getElementById('search-symbolcount').innerHTML =
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+
+#
+#   This file is part of m.css.
+#
+#   Copyright © 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025
+#             Vladimír Vondruš <mosra@centrum.cz>
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a
+#   copy of this software and associated documentation files (the "Software"),
+#   to deal in the Software without restriction, including without limitation
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,
+#   and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included
+#   in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#   THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#   DEALINGS IN THE SOFTWARE.
+#
+
+# Measures how search data generation scales with the project size, on
+# synthetic C++ and Python symbol lists passed through build_search_data() of
+# doxygen.py and python.py. Not run as part of the test suite, run directly:
+#
+#   ./benchmark-search.py [--corpus cpp python] [--sizes 10000 100000 1000000]
+#
+# Every combination of subtree merging, prefix merging and lookahead barriers
+# is run in a separate process, reporting wall time, peak RSS of that process
+# and size of the output. The results can be saved with --save and compared
+# against in subsequent runs with --compare, which lists everything that got
+# slower, bigger or more memory-hungry than given threshold and exits with a
+# non-zero code in that case. Timing and memory baselines are
+# machine-specific, so they're not stored in the repository.
+#
+# Output sizes on the other hand are deterministic, and the ones for the
+# default sizes are stored in benchmark-search.json next to this file. Every
+# run compares against them, listing every size that changed and exiting with
+# a non-zero code if any got bigger. After an intentional change, update them
+# with --update-sizes.
+#
+# Next to those, the file records sizes of the same cases in the version 2
+# search data format, which are fixed. Every run prints how much smaller the
+# output is compared to them and exits with a non-zero code if it's less than
+# 30% in any case.
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from types import SimpleNamespace as Empty
+from typing import List
+
+from _search_test_metadata import EntryType
+from _search import ResultMap, ResultFlag, Serializer
+
+import doxygen
+import python
+
+cpp_param_types = ['int', 'float', 'std::size_t', 'const Vector&amp;', 'Containers::ArrayView&lt;const char&gt;', 'T', 'Float', 'UnsignedInt', 'const std::string&amp;']
+python_param_types = ['self', 'a: int', 'b: float', 'other: Vector', 'name: str', 'flags: Flags = Flags.NONE', 'data: typing.List[int]', '*args', '**kwargs']
+identifier_words = ['vector', 'matrix', 'range', 'array', 'view', 'data', 'size', 'resize', 'transform', 'rotation', 'scaling', 'translation', 'normalized', 'length', 'dot', 'cross', 'min', 'max', 'clamp', 'lerp', 'buffer', 'texture', 'mesh', 'shader', 'image', 'format', 'flags', 'state', 'set', 'get', 'is', 'has', 'add', 'remove', 'begin', 'end', 'count']
+
+def identifier(words, capitalize=False) -> str:
+    parts = random.sample(identifier_words, words)
+    if capitalize: return ''.join(part.capitalize() for part in parts)
+    return parts[0] + ''.join(part.capitalize() for part in parts[1:])
+
+# Generates what doxygen.py puts into state.search for a C++ project with
+# roughly `size` entries: nested namespaces with classes, overloaded and const
+# functions, enums, typedefs, variables, plus defines, files and pages, some
+# of them with keyword aliases
+def generate_cpp_corpus(size, seed=0) -> List[Empty]:
+    random.seed(seed)
+    Type = doxygen.EntryType
+    out = []
+
+    def add(type, prefix, name, url, **kwargs):
+        result = Empty()
+        result.flags = ResultFlag.from_type(ResultFlag.DEPRECATED if random.randint(0, 50) == 0 else ResultFlag(0), type)
+        result.url = url
+        result.prefix = prefix
+        result.name = name
+        result.keywords = []
+        if random.randint(0, 30) == 0:
+            keyword = identifier(2)
+            result.keywords += [(keyword, '', 0), (keyword + '()', keyword, 2)]
+        for key, value in kwargs.items():
+            setattr(result, key, value)
+        out.append(result)
+
+    namespace = 0
+    while len(out) < size:
+        # Namespaces nested one to three levels deep
+        namespace_path = ['Project'] + [identifier(1, True) + str(namespace + i) for i in range(random.randint(1, 3))]
+        namespace_url = 'namespace{}.html'.format('_1_1'.join(namespace_path))
+        add(Type.NAMESPACE, namespace_path[:-1], namespace_path[-1], namespace_url)
+
+        add(Type.FILE, ['Project', namespace_path[-1]], identifier(1, True) + '.h', '{}_8h.html'.format(namespace_path[-1]))
+        if random.randint(0, 5) == 0:
+            add(Type.PAGE, [], identifier(3, True), 'page{}.html'.format(namespace))
+        for define in range(random.randint(0, 3)):
+            add(Type.DEFINE, [], 'PROJECT_' + identifier(2).upper(), namespace_url + '#a{:032x}'.format(random.getrandbits(128)), params=['x'] if random.randint(0, 1) else None)
+
+        for class_ in range(random.randint(1, 20)):
+            class_path = namespace_path + [identifier(2, True)]
+            class_url = 'class{}.html'.format('_1_1'.join(class_path))
+            add(Type.STRUCT if random.randint(0, 3) == 0 else Type.CLASS, namespace_path, class_path[-1], class_url)
+
+            for function in range(random.randint(1, 30)):
+                name = identifier(random.randint(1, 2))
+                # A lot of overloads for some functions
+                for overload in range(random.choice([1, 1, 1, 2, 3, 20])):
+                    params = [random.choice(cpp_param_types) for _ in range(random.randint(0, 4))]
+                    add(Type.FUNC, class_path, name, class_url + '#a{:032x}'.format(random.getrandbits(128)), params=params, suffix=random.choice(['', '', ' const', ' &amp;&amp;']))
+
+            for typedef in range(random.randint(0, 3)):
+                add(Type.TYPEDEF, class_path, identifier(1, True) + 'Type', class_url + '#a{:032x}'.format(random.getrandbits(128)))
+            for var in range(random.randint(0, 3)):
+                add(Type.VAR, class_path, identifier(2), class_url + '#a{:032x}'.format(random.getrandbits(128)))
+
+        for enum in range(random.randint(0, 3)):
+            enum_name = identifier(1, True) + 'Flag'
+            enum_url = namespace_url + '#a{:032x}'.format(random.getrandbits(128))
+            add(Type.ENUM, namespace_path, enum_name, enum_url)
+            for value in range(random.randint(2, 16)):
+                add(Type.ENUM_VALUE, namespace_path + [enum_name], identifier(1, True) + str(value), namespace_url + '#a{:032x}'.format(random.getrandbits(128)))
+
+        namespace += 1
+    return out
+
+# Generates what python.py puts into state.search for a Python project with
+# roughly `size` entries: nested modules with classes, functions, properties,
+# enums and data, plus pages
+def generate_python_corpus(size, seed=0) -> List[Empty]:
+    random.seed(seed)
+    Type = python.EntryType
+    out = []
+
+    def add(type, prefix, name, url, **kwargs):
+        result = Empty()
+        result.flags = ResultFlag.from_type(ResultFlag.NONE, type)
+        result.url = url
+        result.prefix = prefix
+        result.name = name
+        for key, value in kwargs.items():
+            setattr(result, key, value)
+        out.append(result)
+
+    module = 0
+    while len(out) < size:
+        # Modules nested one to three levels deep
+        module_path = ['project'] + [identifier(1) + str(module + i) for i in range(random.randint(1, 3))]
+        module_url = '{}.html'.format('.'.join(module_path))
+        add(Type.MODULE, module_path[:-1], module_path[-1], module_url)
+        if random.randint(0, 5) == 0:
+            add(Type.PAGE, [], identifier(3, True), 'page{}.html'.format(module))
+
+        for function in range(random.randint(0, 10)):
+            add(Type.FUNCTION, module_path, identifier(2).lower(), module_url + '#' + identifier(2).lower(), params=[random.choice(python_param_types[1:]) for _ in range(random.randint(0, 4))])
+        for data in range(random.randint(0, 5)):
+            add(Type.DATA, module_path, identifier(2).upper(), module_url + '#' + identifier(2).lower())
+
+        for class_ in range(random.randint(1, 15)):
+            class_path = module_path + [identifier(2, True)]
+            class_url = '{}.html'.format('.'.join(class_path))
+            add(Type.CLASS, module_path, class_path[-1], class_url)
+
+            for function in range(random.randint(1, 25)):
+                name = random.choice(['__init__', '__eq__', '__len__']) if random.randint(0, 4) == 0 else identifier(random.randint(1, 2)).lower()
+                # pybind11 overloads
+                for overload in range(random.choice([1, 1, 1, 1, 2, 5])):
+                    add(Type.FUNCTION, class_path, name, class_url + '#{}-{:x}'.format(name, random.getrandbits(32)), params=['self'] + [random.choice(python_param_types[1:]) for _ in range(random.randint(0, 3))])
+            for property in range(random.randint(0, 5)):
+                name = identifier(1)
+                add(Type.PROPERTY, class_path, name, class_url + '#' + name)
+
+        for enum in range(random.randint(0, 2)):
+            enum_path = module_path + [identifier(1, True) + 'Flag']
+            enum_url = module_url + '#' + enum_path[-1]
+            add(Type.ENUM, module_path, enum_path[-1], enum_url)
+            for value in range(random.randint(2, 10)):
+                add(Type.ENUM_VALUE, enum_path, identifier(1).upper() + str(value), enum_url + '-' + str(value))
+
+        module += 1
+    return out
+
+corpora = {
+    'cpp': (generate_cpp_corpus, doxygen.build_search_data),
+    'python': (generate_python_corpus, python.build_search_data)
+}
+
+# (merge_subtrees, merge_prefixes, add_lookahead_barriers)
+options = list(itertools.product([True, False], repeat=3))
+
+def case_name(corpus, size, merge_subtrees, merge_prefixes, add_lookahead_barriers) -> str:
+    return '{} {} {}subtrees {}prefixes {}barriers'.format(corpus, size,
+        '' if merge_subtrees else 'no-',
+        '' if merge_prefixes else 'no-',
+        '' if add_lookahead_barriers else 'no-')
+
+# Executed in a separate process, so the peak RSS is just for given case.
+# It includes the generated corpus, which is the same for all cases of given
+# size.
+def run_case(corpus, size, merge_subtrees, merge_prefixes, add_lookahead_barriers, queue):
+    generate, build_search_data = corpora[corpus]
+    state = Empty()
+    state.search = generate(size)
+    state.config = {
+        'SEARCH_FILE_OFFSET_BYTES': 4,
+        'SEARCH_RESULT_ID_BYTES': 4,
+        'SEARCH_NAME_SIZE_BYTES': 2,
+        'SEARCH_SHARD_PREFIX_LENGTH': 0
+    }
+
+    begin = time.perf_counter()
+    serialized = build_search_data(state, merge_subtrees=merge_subtrees, merge_prefixes=merge_prefixes, add_lookahead_barriers=add_lookahead_barriers)
+    end = time.perf_counter()
+
+    # ru_maxrss is in kB on Linux, but in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin': rss //= 1024
+    queue.put({'time': end - begin, 'rss': rss, 'bytes': len(serialized)})
+
+def benchmark(corpus, sizes) -> dict:
+    results = {}
+    for size in sizes:
+        print("{} corpus, {} entries:".format(corpus, size))
+        for merge_subtrees, merge_prefixes, add_lookahead_barriers in options:
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=run_case, args=(corpus, size, merge_subtrees, merge_prefixes, add_lookahead_barriers, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+
+            name = case_name(corpus, size, merge_subtrees, merge_prefixes, add_lookahead_barriers)
+            results[name] = result
+            print("  {:<40} {:8.3f} s {:8.1f} MB {:>10} bytes".format(name.partition(' {} '.format(size))[2], result['time'], result['rss']/1024, result['bytes']))
+    return results
+
+# Returns a list of human-readable regressions against the baseline. Output
+# sizes are deterministic so any increase is reported, time and memory use
+# only if above given relative threshold.
+def compare(results, baseline, threshold) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline: continue
+        base = baseline[name]
+        if result['bytes'] > base['bytes']:
+            regressions += ["{}: output {} bytes, was {}".format(name, result['bytes'], base['bytes'])]
+        if result['time'] > base['time']*(1.0 + threshold):
+            regressions += ["{}: {:.3f} s, was {:.3f} s (+{:.0f}%)".format(name, result['time'], base['time'], (result['time']/base['time'] - 1.0)*100)]
+        if result['rss'] > base['rss']*(1.0 + threshold):
+            regressions += ["{}: {:.1f} MB peak RSS, was {:.1f} MB (+{:.0f}%)".format(name, result['rss']/1024, base['rss']/1024, (result['rss']/base['rss'] - 1.0)*100)]
+    return regressions
+
+# Output sizes of all cases for the default corpus sizes, stored in the
+# repository
+stored_sizes_file = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'benchmark-search.json')
+
+# Returns a list of human-readable size changes against the stored sizes and
+# whether any of them is an increase
+def compare_sizes(results, stored_sizes):
+    changes = []
+    increased = False
+    for name, result in results.items():
+        if name not in stored_sizes or result['bytes'] == stored_sizes[name]['bytes']: continue
+        changes += ["{}: output {} bytes, stored {}".format(name, result['bytes'], stored_sizes[name]['bytes'])]
+        if result['bytes'] > stored_sizes[name]['bytes']: increased = True
+    return changes, increased
+
+# Minimal relative size reduction compared to the version 2 format
+min_v2_reduction = 0.3
+
+# Returns a list of human-readable size reductions against the stored version
+# 2 format sizes and whether any of them is below min_v2_reduction
+def compare_v2_sizes(results, stored_sizes):
+    reductions = []
+    insufficient = False
+    for name, result in results.items():
+        if name not in stored_sizes or 'v2 bytes' not in stored_sizes[name]: continue
+        reduction = 1.0 - result['bytes']/stored_sizes[name]['v2 bytes']
+        reductions += ["{}: output {} bytes, {} in v2 (-{:.1f}%)".format(name, result['bytes'], stored_sizes[name]['v2 bytes'], reduction*100)]
+        if reduction < min_v2_reduction: insufficient = True
+    return reductions, insufficient
+
+# Kept for measuring just the prefix merging in ResultMap.serialize(), which
+# was quadratic in the past. A single overloaded function is the worst case.
+def generate_overloaded_result_map(size, seed=0) -> ResultMap:
+    random.seed(seed)
+    map = ResultMap()
+    flags = ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC)
+    while len(map.entries) < size:
+        url = 'classClass.html#a{:032x}'.format(random.getrandbits(128))
+        map.add('Class::function(int)', url, suffix_length=5, flags=flags)
+        map.add('Class::function(int)', url, suffix_length=3, flags=flags)
+    return map
+
+def benchmark_prefix_merging(sizes):
+    print("Result map prefix merging, a single overloaded function:")
+    for size in sizes:
+        map = generate_overloaded_result_map(size)
+        count = len(map.entries)
+        begin = time.perf_counter()
+        serialized = map.serialize(Serializer(file_offset_bytes=4, result_id_bytes=4, name_size_bytes=2), merge_prefixes=True)
+        end = time.perf_counter()
+        print("  {:>8} entries: {:7.3f} s, {:>10} bytes".format(count, end - begin, len(serialized)))
+
+if __name__ == '__main__': # pragma: no cover
+    parser = argparse.ArgumentParser(description="search data generation benchmark")
+    parser.add_argument('--corpus', nargs='+', choices=list(corpora.keys()), default=list(corpora.keys()), help="symbol corpora to benchmark with")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000], help="approximate entry counts to benchmark with")
+    parser.add_argument('--save', metavar='FILE', help="save the results as a baseline")
+    parser.add_argument('--compare', metavar='FILE', help="compare the results against a baseline")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative time and memory increase to consider a regression")
+    parser.add_argument('--update-sizes', action='store_true', help="update the output sizes stored in {}".format(os.path.basename(stored_sizes_file)))
+    parser.add_argument('--prefix-merging', action='store_true', help="benchmark only prefix merging in the result map")
+    args = parser.parse_args()
+
+    if args.prefix_merging:
+        benchmark_prefix_merging(args.sizes)
+        sys.exit(0)
+
+    results = {}
+    for corpus in args.corpus:
+        results.update(benchmark(corpus, args.sizes))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    with open(stored_sizes_file, 'r') as f:
+        stored_sizes = json.load(f)
+    if args.update_sizes:
+        for name, result in results.items():
+            stored_sizes.setdefault(name, {})['bytes'] = result['bytes']
+        with open(stored_sizes_file, 'w') as f:
+            json.dump(stored_sizes, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    failed = False
+    changes, increased = compare_sizes(results, stored_sizes)
+    if changes:
+        print("Output sizes different from {}:".format(os.path.basename(stored_sizes_file)))
+        for change in changes:
+            print("  " + change)
+        failed = increased
+    else:
+        print("Output sizes match {}".format(os.path.basename(stored_sizes_file)))
+
+    reductions, insufficient = compare_v2_sizes(results, stored_sizes)
+    if reductions:
+        print("Output sizes compared to the v2 format:")
+        for reduction in reductions:
+            print("  " + reduction)
+        if insufficient:
+            print("Less than {:.0f}% smaller than the v2 format".format(min_v2_reduction*100))
+            failed = True
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions against {}:".format(args.compare))
+            for regression in regressions:
+                print("  " + regression)
+            failed = True
+        else:
+            print("No regressions against {}".format(args.compare))
+
+    if failed: sys.exit(1)
@@ -33,7 +33,7 @@ sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__))))
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
 
 from _search_test_metadata import EntryType, search_type_map, type_sizes
-from _search import Trie, ResultMap, ResultFlag, serialize_search_data, Serializer
+from _search import Trie, ResultMap, ResultFlag, serialize_search_data, serialize_search_data_sharded, Serializer
 
 basedir = pathlib.Path(os.path.dirname(os.path.realpath(__file__)))/'js-test-data'
 
@@ -93,6 +93,15 @@ trie.insert("subpage", index)
 trie.insert("rectangle", map.add("Rectangle", "", alias=range_index))
 trie.insert("rect", map.add("Rectangle::Rect()", "", suffix_length=2, alias=range_index))
 
+# The same split into shards, nothing size-dependent here so just one variant.
+
+manifest, shards = serialize_search_data_sharded(Serializer(**type_sizes[0]), trie, map, search_type_map, 7, shard_prefix_length=2)
+with open(basedir/'sharded.bin', 'wb') as f:
+    f.write(manifest)
+for prefix, data in shards:
+    with open(basedir/'sharded-{}.bin'.format(prefix.hex()), 'wb') as f:
+        f.write(data)
+
 for i in type_sizes:
     with open(basedir/'searchdata-{}.bin'.format(type_size_suffix(**i)), 'wb') as f:
         f.write(serialize_search_data(Serializer(**i), trie, map, search_type_map, 7))
@@ -126,6 +135,22 @@ trie.insert("range", map.add("Magnum::Math::Range", "classMagnum_1_1Math_1_1Rang
 with open(basedir/'nested.bin', 'wb') as f:
     f.write(serialize_search_data(Serializer(**type_sizes[0]), trie, map, search_type_map, 4))
 
+# Doxygen-style URLs with long hexadecimal anchors, which get packed. The
+# const overload is prefixed with the first and shares a part of its URL that
+# ends in the middle of a hexadecimal run, the last has an odd digit count.
+# Nothing size-dependent here so just one variant.
+
+trie = Trie()
+map = ResultMap()
+
+trie.insert("foo", map.add("Foo", "classFoo.html", flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.CLASS)))
+trie.insert("bar", map.add("Foo::bar()", "classFoo.html#a0123456789abcdef0123456789abcdef", suffix_length=2, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC)))
+trie.insert("bar", map.add("Foo::bar() const", "classFoo.html#a0123456789abcdef0123456789abcd00", suffix_length=8, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC)))
+trie.insert("baz", map.add("Foo::baz()", "classFoo.html#a12345abcdef987", suffix_length=2, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC)))
+
+with open(basedir/'packedurls.bin', 'wb') as f:
+    f.write(serialize_search_data(Serializer(**type_sizes[0]), trie, map, search_type_map, 4))
+
 # Extreme amount of search results (Python's __init__, usually), in all
 # possible type size combinations
 
@@ -140,6 +165,18 @@ for i in range(128):
 for i in [3, 15, 67]:
     trie.insert("__init__subclass__", map.add(f"Foo{i}.__init__subclass__(self)", f"Foo{i}.html#__init__subclass__", suffix_length=6, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC)))
 
+# The same split into shards, with the shard for a single-character prefix
+# containing only the first 100 results, and then with a limit that's larger
+# than the result count
+
+for suffix, max_results in [('', 100), ('-200', 200)]:
+    manifest, shards = serialize_search_data_sharded(Serializer(**type_sizes[0]), trie, map, search_type_map, 128 + 3, shard_prefix_length=2, short_query_max_results=max_results)
+    with open(basedir/'manyresults-sharded{}.bin'.format(suffix), 'wb') as f:
+        f.write(manifest)
+    for prefix, data in shards:
+        with open(basedir/'manyresults-sharded{}-{}.bin'.format(suffix, prefix.hex()), 'wb') as f:
+            f.write(data)
+
 for i in type_sizes:
     with open(basedir/'manyresults-{}.bin'.format(type_size_suffix(**i)), 'wb') as f:
         f.write(serialize_search_data(Serializer(**i), trie, map, search_type_map, 128 + 3))
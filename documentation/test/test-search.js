@@ -97,7 +97,7 @@ let type_size_suffixes = [
    type-size-dependent in the decoder, so test just on the first variant. */
 {
     let binary = fs.readFileSync(path.join(__dirname, "js-test-data/searchdata-" + type_size_suffixes[0] + ".bin"));
-    assert.equal(binary.byteLength, 750);
+    assert.equal(binary.byteLength, 542);
     let b85 = fs.readFileSync(path.join(__dirname, "js-test-data/searchdata-" + type_size_suffixes[0] + ".b85"), {encoding: 'utf-8'});
     assert.deepEqual(new DataView(binary.buffer.slice(binary.byteOffset, binary.byteOffset + binary.byteLength)), new DataView(Search.base85decode(b85), 0, binary.byteLength));
 }
@@ -134,11 +134,11 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
     /* Test just the smallest and largest size, everything else should be in
        between */
     if(i == 0)
-        assert.equal(Search.dataSize, 31);
+        assert.equal(Search.dataSize, 30);
     else if(i == type_size_suffixes.length - 1)
-        assert.equal(Search.dataSize, 32);
+        assert.equal(Search.dataSize, 31);
     else {
-        assert.ok(Search.dataSize >= 31 && Search.dataSize <= 32);
+        assert.ok(Search.dataSize >= 30 && Search.dataSize <= 31);
     }
 
     assert.equal(Search.symbolCount, "0 symbols (0 kB)");
@@ -153,13 +153,13 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
     /* Test just the smallest and largest size, everything else should be in
        between */
     if(i == 0) {
-        assert.equal(Search.dataSize, 750);
-        assert.equal(Search.symbolCount, "7 symbols (0.7 kB)");
+        assert.equal(Search.dataSize, 542);
+        assert.equal(Search.symbolCount, "7 symbols (0.5 kB)");
     } else if(i == type_size_suffixes.length - 1) {
-        assert.equal(Search.dataSize, 883);
-        assert.equal(Search.symbolCount, "7 symbols (0.9 kB)");
+        assert.equal(Search.dataSize, 582);
+        assert.equal(Search.symbolCount, "7 symbols (0.6 kB)");
     } else {
-        assert.ok(Search.dataSize > 750 && Search.dataSize < 883);
+        assert.ok(Search.dataSize >= 542 && Search.dataSize <= 582);
     }
 
     assert.equal(Search.maxResults, 100);
@@ -172,18 +172,18 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
           cssClass: 'm-primary',
           typeName: 'namespace',
           suffixLength: 3 },
-        { name: 'Math::min(int, int)',
-          url: 'namespaceMath.html#min',
-          flags: 9, /* has prefix + suffix */
-          cssClass: 'm-info',
-          typeName: 'func',
-          suffixLength: 12 },
         { name: 'Math::Vector::min() const',
           url: 'classMath_1_1Vector.html#min',
           flags: 9, /* has prefix + suffix */
           cssClass: 'm-info',
           typeName: 'func',
           suffixLength: 10 },
+        { name: 'Math::min(int, int)',
+          url: 'namespaceMath.html#min',
+          flags: 9, /* has prefix + suffix */
+          cssClass: 'm-info',
+          typeName: 'func',
+          suffixLength: 12 },
         { name: 'Math::Range::min() const',
           url: 'classMath_1_1Range.html#min',
           flags: 13, /* has prefix + suffix, deleted */
@@ -194,18 +194,18 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
 
     /* Add more characters */
     assert.deepEqual(Search.search('min'), [[
-        { name: 'Math::min(int, int)',
-          url: 'namespaceMath.html#min',
-          flags: 9, /* has prefix + suffix */
-          cssClass: 'm-info',
-          typeName: 'func',
-          suffixLength: 10 },
         { name: 'Math::Vector::min() const',
           url: 'classMath_1_1Vector.html#min',
           flags: 9, /* has prefix + suffix */
           cssClass: 'm-info',
           typeName: 'func',
           suffixLength: 8 },
+        { name: 'Math::min(int, int)',
+          url: 'namespaceMath.html#min',
+          flags: 9, /* has prefix + suffix */
+          cssClass: 'm-info',
+          typeName: 'func',
+          suffixLength: 10 },
         { name: 'Math::Range::min() const',
           url: 'classMath_1_1Range.html#min',
           flags: 13, /* has prefix + suffix, deleted */
@@ -267,8 +267,8 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
 {
     let buffer = fs.readFileSync(path.join(__dirname, "js-test-data/searchdata-" + type_size_suffixes[0] + ".bin"));
     assert.ok(Search.init(buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength)));
-    assert.equal(Search.dataSize, 750);
-    assert.equal(Search.symbolCount, "7 symbols (0.7 kB)");
+    assert.equal(Search.dataSize, 542);
+    assert.equal(Search.symbolCount, "7 symbols (0.5 kB)");
     assert.equal(Search.maxResults, 100);
 
     /* No spaces */
@@ -320,8 +320,8 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
 {
     let buffer = fs.readFileSync(path.join(__dirname, "js-test-data/searchdata-" + type_size_suffixes[0] + ".bin"));
     assert.ok(Search.init(buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength), 3));
-    assert.equal(Search.dataSize, 750);
-    assert.equal(Search.symbolCount, "7 symbols (0.7 kB)");
+    assert.equal(Search.dataSize, 542);
+    assert.equal(Search.symbolCount, "7 symbols (0.5 kB)");
     assert.equal(Search.maxResults, 3);
     assert.deepEqual(Search.search('m'), [[
         { name: 'Math',
@@ -330,18 +330,18 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
           cssClass: 'm-primary',
           typeName: 'namespace',
           suffixLength: 3 },
-        { name: 'Math::min(int, int)',
-          url: 'namespaceMath.html#min',
+        { name: 'Math::Vector::min() const',
+          url: 'classMath_1_1Vector.html#min',
           flags: 9, /* has prefix + suffix */
           cssClass: 'm-info',
           typeName: 'func',
-          suffixLength: 12 },
-        { name: 'Math::Vector::min() const',
-          url: 'classMath_1_1Vector.html#min',
+          suffixLength: 10 },
+        { name: 'Math::min(int, int)',
+          url: 'namespaceMath.html#min',
           flags: 9, /* has prefix + suffix */
           cssClass: 'm-info',
           typeName: 'func',
-          suffixLength: 10 }], '']);
+          suffixLength: 12 }], '']);
 }
 
 /* Search loaded from a base85-encoded file should work properly. Nothing
@@ -349,22 +349,22 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
 {
     let b85 = fs.readFileSync(path.join(__dirname, "js-test-data/searchdata-" + type_size_suffixes[0] + ".b85"), {encoding: 'utf-8'});
     assert.ok(Search.load(b85));
-    assert.equal(Search.dataSize, 752); /* some padding on the end, that's okay */
-    assert.equal(Search.symbolCount, "7 symbols (0.7 kB)");
+    assert.equal(Search.dataSize, 544); /* some padding on the end, that's okay */
+    assert.equal(Search.symbolCount, "7 symbols (0.5 kB)");
     assert.equal(Search.maxResults, 100);
     assert.deepEqual(Search.search('min'), [[
-        { name: 'Math::min(int, int)',
-          url: 'namespaceMath.html#min',
-          flags: 9, /* has prefix + suffix */
-          cssClass: 'm-info',
-          typeName: 'func',
-          suffixLength: 10 },
         { name: 'Math::Vector::min() const',
           url: 'classMath_1_1Vector.html#min',
           flags: 9, /* has prefix + suffix */
           cssClass: 'm-info',
           typeName: 'func',
           suffixLength: 8 },
+        { name: 'Math::min(int, int)',
+          url: 'namespaceMath.html#min',
+          flags: 9, /* has prefix + suffix */
+          cssClass: 'm-info',
+          typeName: 'func',
+          suffixLength: 10 },
         { name: 'Math::Range::min() const',
           url: 'classMath_1_1Range.html#min',
           flags: 13, /* has prefix + suffix, deleted */
@@ -377,8 +377,8 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
 {
     let buffer = fs.readFileSync(path.join(__dirname, "js-test-data/unicode.bin"));
     assert.ok(Search.init(buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength)));
-    assert.equal(Search.dataSize, 165);
-    assert.equal(Search.symbolCount, "2 symbols (0.2 kB)");
+    assert.equal(Search.dataSize, 126);
+    assert.equal(Search.symbolCount, "2 symbols (0.1 kB)");
     /* Both "Hýždě" and "Hárá" have common autocompletion to "h\xA1", which is
        not valid UTF-8, so it has to get truncated */
     assert.deepEqual(Search.search('h'), [[
@@ -415,7 +415,7 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
 {
     let buffer = fs.readFileSync(path.join(__dirname, "js-test-data/nested.bin"));
     assert.ok(Search.init(buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength)));
-    assert.equal(Search.dataSize, 336);
+    assert.equal(Search.dataSize, 268);
     assert.equal(Search.symbolCount, "4 symbols (0.3 kB)");
     assert.deepEqual(Search.search('geo'), [[
         { name: 'Magnum::Math::Geometry',
@@ -434,6 +434,33 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
           suffixLength: 3 }], 'nge']);
 }
 
+/* Packed hexadecimal runs in URLs. Nothing type-size-dependent here. */
+{
+    let buffer = fs.readFileSync(path.join(__dirname, "js-test-data/packedurls.bin"));
+    assert.ok(Search.init(buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength)));
+    assert.equal(Search.dataSize, 186);
+    assert.equal(Search.symbolCount, "4 symbols (0.2 kB)");
+    assert.deepEqual(Search.search('ba'), [[
+        { name: 'Foo::bar()',
+          url: 'classFoo.html#a0123456789abcdef0123456789abcdef',
+          flags: 9, /* has prefix + suffix */
+          cssClass: 'm-info',
+          typeName: 'func',
+          suffixLength: 3 },
+        { name: 'Foo::bar() const',
+          url: 'classFoo.html#a0123456789abcdef0123456789abcd00',
+          flags: 9, /* has prefix + suffix */
+          cssClass: 'm-info',
+          typeName: 'func',
+          suffixLength: 9 },
+        { name: 'Foo::baz()',
+          url: 'classFoo.html#a12345abcdef987',
+          flags: 9, /* has prefix + suffix */
+          cssClass: 'm-info',
+          typeName: 'func',
+          suffixLength: 3 }], '']);
+}
+
 /* Extreme amount of search results, in all type size variants to ensure no
    size assumptions were left there */
 for(let i = 0; i != type_size_suffixes.length; ++i) {
@@ -443,13 +470,13 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
     /* Test just the smallest and largest size, everything else should be in
        between */
     if(i == 0) {
-        assert.equal(Search.dataSize, 6421);
-        assert.equal(Search.symbolCount, "131 symbols (6.3 kB)");
+        assert.equal(Search.dataSize, 6237);
+        assert.equal(Search.symbolCount, "131 symbols (6.1 kB)");
     } else if(i == type_size_suffixes.length - 1) {
-        assert.equal(Search.dataSize, 6964);
-        assert.equal(Search.symbolCount, "131 symbols (6.8 kB)");
+        assert.equal(Search.dataSize, 6500);
+        assert.equal(Search.symbolCount, "131 symbols (6.3 kB)");
     } else {
-        assert.ok(Search.dataSize > 6421 && Search.dataSize < 6964);
+        assert.ok(Search.dataSize >= 6237 && Search.dataSize <= 6500);
     }
 
     assert.equal(Search.maxResults, 10000);
@@ -508,4 +535,83 @@ for(let i = 0; i != type_size_suffixes.length; ++i) {
           suffixLength: 15 }], 'ubclass__']);
 }
 
+/* Sharded search data give the same results as the monolithic file. Except
+   for the "has prefix" flag, as whether a name can be stored with a prefix
+   depends on what other names are in the same shard. */
+function withoutPrefixFlag(resultsSuggestedTabAutocompletion) {
+    for(let result of resultsSuggestedTabAutocompletion[0])
+        result.flags &= ~8;
+    return resultsSuggestedTabAutocompletion;
+}
+for(let name of [['searchdata-' + type_size_suffixes[0], 'sharded', 100],
+                 ['manyresults-' + type_size_suffixes[0], 'manyresults-sharded', 100],
+                 ['manyresults-' + type_size_suffixes[0], 'manyresults-sharded-200', 200]]) {
+    let buffer = fs.readFileSync(path.join(__dirname, "js-test-data/" + name[0] + ".bin"));
+    let manifest = fs.readFileSync(path.join(__dirname, "js-test-data/" + name[1] + ".bin"));
+
+    for(let query of ['m', 'ma', 'math', 'math::', 'min', 'min( ', 'r', 're', 'rect', 'vec', 'page', 'p ', 'su', 'x', 'xy', '_', '__', '__init__', '__init__s']) {
+        assert.ok(Search.init(buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength), name[2]));
+        let expected = withoutPrefixFlag(Search.search(query));
+
+        /* The max result count is taken from the manifest */
+        assert.ok(Search.init(manifest.buffer.slice(manifest.byteOffset, manifest.byteOffset + manifest.byteLength)));
+        assert.equal(Search.maxResults, name[2]);
+        assert.equal(Search.symbolCount, name[1] == 'sharded' ? "7 symbols" : "131 symbols");
+        for(let prefix in Search.shards) {
+            let shard = fs.readFileSync(path.join(__dirname, "js-test-data/" + name[1] + "-" + prefix + ".bin"));
+            assert.ok(Search.initShard(prefix, shard.buffer.slice(shard.byteOffset, shard.byteOffset + shard.byteLength)));
+        }
+        assert.deepEqual(withoutPrefixFlag(Search.search(query)), expected);
+    }
+}
+
+/* More than 100 results for a single-character prefix are returned if the
+   sharded data were generated with a larger limit */
+{
+    let buffer = fs.readFileSync(path.join(__dirname, "js-test-data/manyresults-sharded-200.bin"));
+    assert.ok(Search.init(buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength)));
+    for(let prefix in Search.shards) {
+        let shard = fs.readFileSync(path.join(__dirname, "js-test-data/manyresults-sharded-200-" + prefix + ".bin"));
+        assert.ok(Search.initShard(prefix, shard.buffer.slice(shard.byteOffset, shard.byteOffset + shard.byteLength)));
+    }
+    assert.equal(Search.search('_')[0].length, 131);
+}
+
+/* Requesting more results than the sharded data were generated with is
+   limited to what's in the manifest, requesting less is fine */
+{
+    let buffer = fs.readFileSync(path.join(__dirname, "js-test-data/manyresults-sharded.bin"));
+    assert.ok(Search.init(buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength), 10000));
+    assert.equal(Search.maxResults, 100);
+    assert.ok(Search.init(buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength), 3));
+    assert.equal(Search.maxResults, 3);
+}
+
+/* Searching in sharded data loads only what's needed */
+{
+    let buffer = fs.readFileSync(path.join(__dirname, "js-test-data/sharded.bin"));
+    assert.ok(Search.init(buffer.buffer.slice(buffer.byteOffset, buffer.byteOffset + buffer.byteLength)));
+    assert.equal(Search.dataSize, 48);
+    assert.deepEqual(Object.keys(Search.shards).sort(), ['6d', '6d61', '6d69', '70', '7061', '72', '7261', '7265', '73', '7375', '76', '7665']);
+
+    /* Shard not loaded yet */
+    assert.equal(Search.search('vec'), null);
+
+    /* Nothing for this prefix, no need to load anything */
+    assert.deepEqual(Search.search('xy'), [[], '']);
+
+    /* A shard that's not in the manifest is rejected */
+    let shard = fs.readFileSync(path.join(__dirname, "js-test-data/sharded-7665.bin"));
+    assert.ok(!Search.initShard('7878', shard.buffer.slice(shard.byteOffset, shard.byteOffset + shard.byteLength)));
+
+    assert.ok(Search.initShard('7665', shard.buffer.slice(shard.byteOffset, shard.byteOffset + shard.byteLength)));
+    assert.deepEqual(Search.search('vec'), [[
+        { name: 'Math::Vector',
+          url: 'classMath_1_1Vector.html',
+          flags: 2, /* deprecated */
+          cssClass: 'm-primary',
+          typeName: 'class',
+          suffixLength: 3 }], 'tor']);
+}
+
 /* Not testing Search.download() because the xmlhttprequest npm package is *crap* */
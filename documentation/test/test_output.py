@@ -0,0 +1,138 @@
+#
+#   This file is part of m.css.
+#
+#   Copyright © 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025
+#             Vladimír Vondruš <mosra@centrum.cz>
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a
+#   copy of this software and associated documentation files (the "Software"),
+#   to deal in the Software without restriction, including without limitation
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,
+#   and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included
+#   in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#   THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#   DEALINGS IN THE SOFTWARE.
+#
+
+import os
+import tempfile
+import threading
+import unittest
+
+from _output import OutputWriter
+
+class Output(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write(self):
+        filename = os.path.join(self.path, 'sub/dir/file.html')
+
+        writer = OutputWriter()
+        writer.write(filename, b'hello')
+        writer.finish()
+        self.assertEqual(writer.stats, {'written': 1})
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'hello')
+        inode = os.stat(filename).st_ino
+
+        # Same contents, the file isn't touched at all
+        writer = OutputWriter()
+        writer.write(filename, b'hello')
+        writer.finish()
+        self.assertEqual(writer.stats, {'unchanged': 1})
+        self.assertEqual(os.stat(filename).st_ino, inode)
+
+        # Different contents of the same size, replaced
+        writer = OutputWriter(background=False)
+        writer.write(filename, b'howdy')
+        self.assertEqual(writer.stats, {'written': 1})
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'howdy')
+
+        # No temporary files left behind
+        self.assertEqual(os.listdir(os.path.dirname(filename)), ['file.html'])
+
+    def test_copy(self):
+        source = os.path.join(self.path, 'style.css')
+        with open(source, 'wb') as f:
+            f.write(b'body {}')
+        filename = os.path.join(self.path, 'output/style.css')
+
+        writer = OutputWriter()
+        writer.copy(source, filename)
+        writer.finish()
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'body {}')
+        # Hard link if the filesystem supports it
+        if writer.stats['linked']:
+            self.assertTrue(os.path.samefile(source, filename))
+        else:
+            self.assertEqual(writer.stats, {'copied': 1})
+
+        # A copy with the same contents is treated as unchanged as well
+        writer = OutputWriter(link_static=False)
+        writer.copy(source, filename)
+        writer.finish()
+        self.assertEqual(writer.stats, {'unchanged': 1})
+
+        # Changed source gets copied again. Doing it via a rename, as that's
+        # what editors do and what doesn't propagate through the link.
+        with open(source + '.new', 'wb') as f:
+            f.write(b'body { color: red; }')
+        os.replace(source + '.new', source)
+        writer = OutputWriter(link_static=False)
+        writer.copy(source, filename)
+        writer.finish()
+        self.assertEqual(writer.stats, {'copied': 1})
+        self.assertFalse(os.path.samefile(source, filename))
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'body { color: red; }')
+
+    def test_error(self):
+        # A directory in place of the file
+        filename = os.path.join(self.path, 'file.html')
+        os.makedirs(filename)
+
+        writer = OutputWriter()
+        writer.write(filename, b'hello')
+        with self.assertRaises(OSError):
+            writer.finish()
+
+    def test_pause(self):
+        first = os.path.join(self.path, 'first.html')
+        second = os.path.join(self.path, 'second.html')
+        third = os.path.join(self.path, 'third.html')
+
+        writer = OutputWriter()
+        writer.write(first, b'hello')
+
+        # Everything queued so far is written and there's no writer thread
+        # running that a fork could copy in a locked state
+        writer.pause()
+        self.assertTrue(os.path.exists(first))
+        self.assertNotIn(writer._thread, threading.enumerate())
+
+        # While paused, files are written directly
+        writer.write(second, b'hello')
+        self.assertTrue(os.path.exists(second))
+
+        # After resume, the thread is back
+        writer.resume()
+        self.assertIn(writer._thread, threading.enumerate())
+        writer.write(third, b'hello')
+        writer.finish()
+        self.assertEqual(writer.stats, {'written': 3})
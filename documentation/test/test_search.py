@@ -24,12 +24,15 @@
 #
 
 import os
+import re
+import subprocess
 import sys
+import tempfile
 import unittest
 from types import SimpleNamespace as Empty
 
 from ._search_test_metadata import EntryType, search_type_map, trie_type_sizes, type_sizes
-from _search import Trie, ResultMap, ResultFlag, Serializer, Deserializer, serialize_search_data, pretty_print_trie, pretty_print_map, pretty_print
+from _search import Trie, ResultMap, ResultFlag, Serializer, Deserializer, serialize_search_data, serialize_search_data_sharded, pretty_print_trie, pretty_print_map, pretty_print, SearchIndex
 
 from test_doxygen import IntegrationTestCase
 
@@ -50,7 +53,7 @@ class TrieSerialization(unittest.TestCase):
             with self.subTest(**i):
                 serialized = trie.serialize(Serializer(**i))
                 self.compare(Deserializer(**i), serialized, "")
-                self.assertEqual(len(serialized), 6)
+                self.assertEqual(len(serialized), 5)
 
     def test_single(self):
         trie = Trie()
@@ -61,17 +64,11 @@ class TrieSerialization(unittest.TestCase):
             with self.subTest(**i):
                 serialized = trie.serialize(Serializer(**i))
                 self.compare(Deserializer(**i), serialized, """
-magnum [1337, 21]
+magnum [21, 1337]
 """)
-                # Verify just the smallest and largest size, everything else
-                # should fit in between
-                if i['file_offset_bytes'] == 3 and i['result_id_bytes'] == 2:
-                    self.assertEqual(len(serialized), 46)
-                elif i['file_offset_bytes'] == 4 and i['result_id_bytes'] == 4:
-                    self.assertEqual(len(serialized), 56)
-                else:
-                    self.assertGreater(len(serialized), 46)
-                    self.assertLess(len(serialized), 56)
+                # Result IDs and offsets are variable-length, so the type
+                # sizes don't affect the trie size
+                self.assertEqual(len(serialized), 26)
 
     def test_multiple(self):
         trie = Trie()
@@ -138,15 +135,7 @@ range [2]
 |     :min [9]
 |       ax [10]
 """)
-                # Verify just the smallest and largest size, everything else
-                # should fit in between
-                if i['file_offset_bytes'] == 3 and i['result_id_bytes'] == 2:
-                    self.assertEqual(len(serialized), 340)
-                elif i['file_offset_bytes'] == 4 and i['result_id_bytes'] == 4:
-                    self.assertEqual(len(serialized), 428)
-                else:
-                    self.assertGreater(len(serialized), 340)
-                    self.assertLess(len(serialized), 428)
+                self.assertEqual(len(serialized), 175)
 
     def test_unicode(self):
         trie = Trie()
@@ -168,7 +157,7 @@ h0xc3
   |  0xa1
   |    [1]
 """)
-        self.assertEqual(len(serialized), 82)
+        self.assertEqual(len(serialized), 43)
 
     def test_16bit_result_count(self):
         trie = Trie()
@@ -188,51 +177,62 @@ h0xc3
 __init__ [{}]
         subclass__ [203, 215, 267]
 """.format(', '.join([str(i) for i in range(128)])))
-                # Verify just the smallest and largest size, everything else
-                # should fit in between
-                if i['file_offset_bytes'] == 3 and i['result_id_bytes'] == 2:
-                    self.assertEqual(len(serialized), 377)
-                elif i['file_offset_bytes'] == 4 and i['result_id_bytes'] == 4:
-                    self.assertEqual(len(serialized), 657)
-                else:
-                    self.assertGreater(len(serialized), 377)
-                    self.assertLess(len(serialized), 657)
+                self.assertEqual(len(serialized), 193)
 
-    def test_16bit_result_id_too_small(self):
+    def test_many_children(self):
         trie = Trie()
-        trie.insert("a", 65536)
-        with self.assertRaisesRegex(OverflowError, "Trie result ID too large to store in 16 bits, set SEARCH_RESULT_ID_BYTES = 3 in your conf.py."):
-            trie.serialize(Serializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1))
 
-        # This should work
-        trie.serialize(Serializer(file_offset_bytes=3, result_id_bytes=3, name_size_bytes=1))
-
-    def test_24bit_result_id_too_small(self):
-        trie = Trie()
-        trie.insert("a", 16*1024*1024)
-        with self.assertRaisesRegex(OverflowError, "Trie result ID too large to store in 24 bits, set SEARCH_RESULT_ID_BYTES = 4 in your conf.py."):
-            trie.serialize(Serializer(file_offset_bytes=3, result_id_bytes=3, name_size_bytes=1))
+        # More than 15 children, the child count doesn't fit into the header
+        for i, char in enumerate('abcdefghijklmnopqrst'):
+            trie.insert(char, i)
 
-        # This should work
-        trie.serialize(Serializer(file_offset_bytes=3, result_id_bytes=4, name_size_bytes=1))
+        serialized = trie.serialize(Serializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1))
+        self.compare(Deserializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1), serialized, """
+a [0]
+b [1]
+c [2]
+d [3]
+e [4]
+f [5]
+g [6]
+h [7]
+i [8]
+j [9]
+k [10]
+l [11]
+m [12]
+n [13]
+o [14]
+p [15]
+q [16]
+r [17]
+s [18]
+t [19]
+""")
 
-    def test_23bit_file_offset_too_small(self):
+    def test_large_result_ids(self):
         trie = Trie()
+        trie.insert("a", 65535)
+        trie.insert("a", 65536)
+        trie.insert("b", 16*1024*1024)
 
-        # The high bit of the child offset stores a lookahead barrier, so the
-        # file has to be smaller than 8M, not 16. Python has a recursion limit
-        # of 1000, so we can't really insert a 8M character long string.
-        # Instead, insert one 130-character string where each char has 32k
-        # 16bit result IDs. 129 isn't enough to overflow the offsets.
-        results_32k = [j for j in range(32767)]
-        for i in range(130):
-            trie.insert('a'*i, results_32k)
+        # Result IDs are variable-length, so the result ID type size doesn't
+        # affect the trie and there's no overflow
+        serialized = trie.serialize(Serializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1))
+        self.compare(Deserializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1), serialized, """
+a [65535, 65536]
+b [16777216]
+""")
+        self.assertEqual(len(serialized), 19)
 
-        with self.assertRaisesRegex(OverflowError, "Trie child offset too large to store in 23 bits, set SEARCH_FILE_OFFSET_BYTES = 4 in your conf.py."):
-            trie.serialize(Serializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1))
+    def test_deeper_than_recursion_limit(self):
+        trie = Trie()
+        trie.insert('a'*5000, 1)
 
-        # This should work
-        trie.serialize(Serializer(file_offset_bytes=4, result_id_bytes=2, name_size_bytes=1))
+        # Each node is a 1-byte header, 1-byte char and a 1-byte offset, the
+        # leaf has a 1-byte header and one 1-byte result
+        serialized = trie.serialize(Serializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1))
+        self.assertEqual(len(serialized), 4 + 5000*3 + 2)
 
 class MapSerialization(unittest.TestCase):
     def __init__(self, *args, **kwargs):
@@ -301,12 +301,35 @@ class MapSerialization(unittest.TestCase):
                 # Verify just the smallest and largest size, everything else
                 # should fit in between
                 if i['file_offset_bytes'] == 3 and i['result_id_bytes'] == 2 and i['name_size_bytes'] == 1:
-                    self.assertEqual(len(serialized), 202)
+                    self.assertEqual(len(serialized), 196)
                 elif i['file_offset_bytes'] == 4 and i['result_id_bytes'] == 4 and i['name_size_bytes'] == 2:
-                    self.assertEqual(len(serialized), 231)
+                    self.assertEqual(len(serialized), 225)
                 else:
-                    self.assertGreater(len(serialized), 202)
-                    self.assertLess(len(serialized), 231)
+                    self.assertGreater(len(serialized), 196)
+                    self.assertLess(len(serialized), 225)
+
+    def test_overloads(self):
+        map = ResultMap()
+
+        # Overloads with the same name, with and without () appended, a
+        # self-reference is only allowed to a result with a longer suffix.
+        # If more URLs share the longest prefix, the first is picked.
+        self.assertEqual(map.add("Foo", "classFoo.html", flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.CLASS)), 0)
+        self.assertEqual(map.add("Foo::bar(int)", "classFoo.html#aaa", suffix_length=5, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC)), 1)
+        self.assertEqual(map.add("Foo::bar(int)", "classFoo.html#aaa", suffix_length=3, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC)), 2)
+        self.assertEqual(map.add("Foo::bar(int)", "classFoo.html#abb", suffix_length=5, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC)), 3)
+        self.assertEqual(map.add("Foo::bar(int)", "classFoo.html#abb", suffix_length=3, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC)), 4)
+        self.assertEqual(map.add("Foo::bar(int) const", "classFoo.html#acc", suffix_length=11, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC)), 5)
+
+        serialized = map.serialize(Serializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1))
+        self.compare(Deserializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1), serialized, """
+0: Foo [type=CLASS] -> classFoo.html
+1: ::bar(int) [prefix=0[:13], suffix_length=5, type=FUNC] -> #aaa
+2:  [prefix=1[:17], suffix_length=3, type=FUNC] ->
+3: ::bar(int) [prefix=0[:13], suffix_length=5, type=FUNC] -> #abb
+4:  [prefix=3[:17], suffix_length=3, type=FUNC] ->
+5:  const [prefix=1[:15], suffix_length=11, type=FUNC] -> cc
+""")
 
     def test_24bit_file_offset_too_small(self):
         map = ResultMap()
@@ -418,13 +441,13 @@ class Serialization(unittest.TestCase):
                 self.compare(serialized, """
 3 symbols
 math [0]
-|   ::vector [1]
-|     range [2]
-vector [1]
-range [2]
+|   ::vector [2]
+|     range [1]
+vector [2]
+range [1]
 0: Math [type=NAMESPACE] -> namespaceMath.html
-1: ::Vector [prefix=0[:0], type=CLASS] -> classMath_1_1Vector.html
-2: ::Range [prefix=0[:0], type=CLASS] -> classMath_1_1Range.html
+1: ::Range [prefix=0[:0], type=CLASS] -> classMath_1_1Range.html
+2: ::Vector [prefix=0[:0], type=CLASS] -> classMath_1_1Vector.html
 (EntryType.PAGE, CssClass.SUCCESS, 'page'),
 (EntryType.NAMESPACE, CssClass.PRIMARY, 'namespace'),
 (EntryType.CLASS, CssClass.PRIMARY, 'class'),
@@ -433,9 +456,322 @@ range [2]
                 # Verify just the smallest and largest size, everything else
                 # should fit in between
                 if i['file_offset_bytes'] == 3 and i['result_id_bytes'] == 2 and i['name_size_bytes'] == 1:
-                    self.assertEqual(len(serialized), 282)
+                    self.assertEqual(len(serialized), 223)
                 elif i['file_offset_bytes'] == 4 and i['result_id_bytes'] == 4 and i['name_size_bytes'] == 2:
-                    self.assertEqual(len(serialized), 317)
+                    self.assertEqual(len(serialized), 233)
                 else:
-                    self.assertGreater(len(serialized), 282)
-                    self.assertLess(len(serialized), 317)
+                    self.assertGreater(len(serialized), 223)
+                    self.assertLess(len(serialized), 233)
+
+    def test_shorter_suffix_variants(self):
+        trie = Trie()
+        map = ResultMap()
+
+        # Functions are added twice, the second time with a suffix shorter by
+        # the () that's a part of the search string. Such entries don't get
+        # stored in the map, the trie references the original instead. The
+        # Math::Vector::min() variant is aliased so it has to stay.
+        trie.insert("math", map.add("Math", "namespaceMath.html", flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.NAMESPACE)))
+        index = map.add("Math::min(int, int)", "namespaceMath.html#min", suffix_length=10, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC))
+        trie.insert("math::min", index)
+        trie.insert("min", index)
+        index = map.add("Math::min(int, int)", "namespaceMath.html#min", suffix_length=8, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC))
+        trie.insert("math::min()", index)
+        trie.insert("min()", index)
+        index = map.add("Math::Vector::min()", "classMath_1_1Vector.html#min", suffix_length=2, flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC))
+        trie.insert("min", index)
+        index = map.add("Math::Vector::min()", "classMath_1_1Vector.html#min", flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC))
+        trie.insert("min()", index)
+        trie.insert("minimum()", map.add("Minimum", "", alias=index))
+
+        serialized = serialize_search_data(Serializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1), trie, map, search_type_map, 5)
+        self.compare(serialized, """
+5 symbols
+math [1]
+ |  ::min [4]
+ |       () [4()]
+ in [3, 4]
+ | () [3(), 4()]
+ | imum() [0]
+0: Minimum [alias=2] ->
+1: Math [type=NAMESPACE] -> namespaceMath.html
+2:  [prefix=3[:28], type=FUNC] ->
+3: ::Vector::min() [prefix=1[:0], suffix_length=2, type=FUNC] -> classMath_1_1Vector.html#min
+4: ::min(int, int) [prefix=1[:18], suffix_length=10, type=FUNC] -> #min
+(EntryType.PAGE, CssClass.SUCCESS, 'page'),
+(EntryType.NAMESPACE, CssClass.PRIMARY, 'namespace'),
+(EntryType.CLASS, CssClass.PRIMARY, 'class'),
+(EntryType.FUNC, CssClass.INFO, 'func')
+""")
+        self.assertEqual(len(serialized), 258)
+
+        # The results are the same as if the variants were stored in the map
+        index = SearchIndex(serialized)
+        self.assertEqual([(result.name, result.suffix_length) for result in index.search('min(')[0]], [
+            ('Math::Vector::min()', 1),
+            ('Math::min(int, int)', 9)
+        ])
+        self.assertEqual([(result.name, result.suffix_length) for result in index.search('math::min(')[0]], [
+            ('Math::min(int, int)', 9)
+        ])
+
+class ShardedSerialization(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.maxDiff = None
+
+    def compare(self, serialized: bytes, expected: str):
+        pretty = pretty_print(serialized, entryTypeClass=EntryType)[0]
+        #print(pretty)
+        self.assertEqual(pretty, expected.strip())
+
+    def populate(self):
+        trie = Trie()
+        map = ResultMap()
+
+        trie.insert("math", map.add("Math", "namespaceMath.html", flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.NAMESPACE)))
+        index = map.add("Math::Vector", "classMath_1_1Vector.html", flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.CLASS))
+        trie.insert("math::vector", index, lookahead_barriers=[4])
+        trie.insert("vector", index)
+        index = map.add("Math::Range", "classMath_1_1Range.html", flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.CLASS))
+        trie.insert("math::range", index, lookahead_barriers=[4])
+        trie.insert("range", index)
+        trie.insert("rect", map.add("Rect", "", alias=index))
+        trie.insert("matrix", map.add("Math::Matrix", "classMath_1_1Matrix.html", flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.CLASS)))
+        return trie, map
+
+    def test_one_byte(self):
+        trie, map = self.populate()
+
+        manifest, shards = serialize_search_data_sharded(Serializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1), trie, map, search_type_map, 5, shard_prefix_length=1)
+        self.compare(manifest, """
+5 symbols, max 100 results
+b'm'
+b'r'
+b'v'
+""")
+        self.assertEqual([prefix for prefix, _ in shards], [b'm', b'r', b'v'])
+        self.compare(shards[1][1], """
+2 symbols
+range [1]
+ ect [0]
+0: Rect [alias=1] ->
+1: Math::Range [type=CLASS] -> classMath_1_1Range.html
+(EntryType.PAGE, CssClass.SUCCESS, 'page'),
+(EntryType.NAMESPACE, CssClass.PRIMARY, 'namespace'),
+(EntryType.CLASS, CssClass.PRIMARY, 'class'),
+(EntryType.FUNC, CssClass.INFO, 'func')
+""")
+
+    def test_two_bytes(self):
+        trie, map = self.populate()
+
+        manifest, shards = serialize_search_data_sharded(Serializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1), trie, map, search_type_map, 5, shard_prefix_length=2, short_query_max_results=1)
+        self.compare(manifest, """
+5 symbols, max 1 results
+b'm'
+b'ma'
+b'r'
+b'ra'
+b're'
+b'v'
+b've'
+""")
+        self.assertEqual([prefix for prefix, _ in shards], [b'm', b'ma', b'r', b'ra', b're', b'v', b've'])
+
+        # The whole subtree is in the two-byte shard
+        self.compare(shards[1][1], """
+4 symbols
+math [0]
+   |:$
+   | :vector [2]
+   |  range [1]
+   rix [3]
+0: Math [type=NAMESPACE] -> namespaceMath.html
+1: ::Range [prefix=0[:0], type=CLASS] -> classMath_1_1Range.html
+2: ::Vector [prefix=0[:0], type=CLASS] -> classMath_1_1Vector.html
+3: ::Matrix [prefix=0[:0], type=CLASS] -> classMath_1_1Matrix.html
+(EntryType.PAGE, CssClass.SUCCESS, 'page'),
+(EntryType.NAMESPACE, CssClass.PRIMARY, 'namespace'),
+(EntryType.CLASS, CssClass.PRIMARY, 'class'),
+(EntryType.FUNC, CssClass.INFO, 'func')
+""")
+
+        # The one-byte shard has only what's needed to gather the first
+        # result, with the remaining nodes that got enqueued being empty
+        self.compare(shards[0][1], """
+1 symbols
+math [0]
+   |:$
+   | 
+   r
+0: Math [type=NAMESPACE] -> namespaceMath.html
+(EntryType.PAGE, CssClass.SUCCESS, 'page'),
+(EntryType.NAMESPACE, CssClass.PRIMARY, 'namespace'),
+(EntryType.CLASS, CssClass.PRIMARY, 'class'),
+(EntryType.FUNC, CssClass.INFO, 'func')
+""")
+
+class Query(unittest.TestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'js-test-data')
+
+    def results(self, index: SearchIndex, search: str):
+        results, autocompletion = index.search(search)
+        return [(result.name, result.url, result.alias, result.type_name, result.suffix_length) for result in results], autocompletion
+
+    def check(self, index: SearchIndex):
+        self.assertEqual(index.symbol_count, 7)
+
+        # Results are in the order of relevance, alias resolved
+        self.assertEqual(self.results(index, 'min'), ([
+            ('Math::Vector::min() const', 'classMath_1_1Vector.html#min', None, 'func', 8),
+            ('Math::min(int, int)', 'namespaceMath.html#min', None, 'func', 10),
+            ('Math::Range::min() const', 'classMath_1_1Range.html#min', None, 'func', 8)
+        ], '()'))
+        self.assertEqual(self.results(index, 'vec'), ([
+            ('Math::Vector', 'classMath_1_1Vector.html', None, 'class', 3)
+        ], 'tor'))
+        self.assertEqual(self.results(index, 'rect'), ([
+            ('Rectangle::Rect()', 'classMath_1_1Range.html', 'Math::Range', 'class', 2),
+            ('Rectangle', 'classMath_1_1Range.html', 'Math::Range', 'class', 5)
+        ], ''))
+
+        # Spaces at the end are trimmed only if nothing is found with them,
+        # the page is behind a lookahead barrier
+        self.assertEqual(self.results(index, ' Su '), ([
+            ('Page » Subpage', 'subpage.html', None, 'page', 5)
+        ], 'bpage'))
+        self.assertEqual(self.results(index, 'pizza'), ([], ''))
+
+    def test(self):
+        with SearchIndex(os.path.join(self.path, 'searchdata-ns1-ri2-fo3.bin')) as index:
+            self.check(index)
+
+        # The flags are available as well
+        with SearchIndex(os.path.join(self.path, 'searchdata-ns2-ri4-fo4.bin')) as index:
+            self.check(index)
+            results, _ = index.search('vector')
+            self.assertEqual(results[0].flags, ResultFlag.HAS_PREFIX|ResultFlag.DEPRECATED)
+            self.assertEqual(results[0].css_class, 'm-primary')
+
+    def test_base85(self):
+        with SearchIndex(os.path.join(self.path, 'searchdata-ns1-ri2-fo3.b85')) as index:
+            self.check(index)
+
+    def test_data(self):
+        with open(os.path.join(self.path, 'searchdata-ns1-ri2-fo3.bin'), 'rb') as f:
+            self.check(SearchIndex(f.read()))
+
+    def test_sharded(self):
+        with SearchIndex(os.path.join(self.path, 'sharded.bin')) as index:
+            self.check(index)
+
+    def test_sharded_data(self):
+        trie = Trie()
+        map = ResultMap()
+        trie.insert("math", map.add("Math", "namespaceMath.html", flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.NAMESPACE)))
+        trie.insert("range", map.add("Range", "classRange.html", flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.CLASS)))
+        manifest, shards = serialize_search_data_sharded(Serializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1), trie, map, search_type_map, 2, shard_prefix_length=1)
+
+        index = SearchIndex(manifest, shards={prefix.hex(): data for prefix, data in shards})
+        self.assertEqual(self.results(index, 'ra'), ([
+            ('Range', 'classRange.html', None, 'class', 3)
+        ], 'nge'))
+        self.assertEqual(self.results(index, 'x'), ([], ''))
+
+        # Without a path, shards can't be loaded on demand
+        with self.assertRaisesRegex(KeyError, "shard 6d not available"):
+            SearchIndex(manifest).search('m')
+
+    def test_limit(self):
+        with SearchIndex(os.path.join(self.path, 'manyresults-ns1-ri2-fo3.bin')) as index:
+            self.assertEqual(len(index.search('__')[0]), 100)
+        with SearchIndex(os.path.join(self.path, 'searchdata-ns1-ri2-fo3.bin'), max_results=3) as index:
+            self.assertEqual([result.name for result in index.search('m')[0]], [
+                'Math',
+                'Math::Vector::min() const',
+                'Math::min(int, int)'])
+
+    def test_limit_sharded(self):
+        # More than a hundred results sharing a single-character prefix are
+        # all returned if the data were generated with a larger limit, the
+        # same as with the monolithic file
+        trie = Trie()
+        map = ResultMap()
+        for i in range(150):
+            trie.insert("f{:03}".format(i), map.add("F{:03}".format(i), "f{:03}.html".format(i), flags=ResultFlag.from_type(ResultFlag.NONE, EntryType.FUNC)))
+        serializer = Serializer(file_offset_bytes=3, result_id_bytes=2, name_size_bytes=1)
+        data = serialize_search_data(serializer, trie, map, search_type_map, 150)
+        manifest, shards = serialize_search_data_sharded(serializer, trie, map, search_type_map, 150, shard_prefix_length=2, short_query_max_results=200)
+        shards = {prefix.hex(): data for prefix, data in shards}
+
+        expected = SearchIndex(data, max_results=200).search('f')[0]
+        self.assertEqual(len(expected), 150)
+        index = SearchIndex(manifest, shards=shards)
+        self.assertEqual(index.max_results, 200)
+        self.assertEqual(index.search('f')[0], expected)
+
+        # Asking for more than the data were generated with is limited to that
+        manifest, shards = serialize_search_data_sharded(serializer, trie, map, search_type_map, 150, shard_prefix_length=2)
+        shards = {prefix.hex(): data for prefix, data in shards}
+        with self.assertLogs() as cm:
+            index = SearchIndex(manifest, shards=shards, max_results=200)
+        self.assertEqual(cm.output, ["WARNING:root:sharded search data have at most 100 results, limiting to that"])
+        self.assertEqual(index.max_results, 100)
+        self.assertEqual(len(index.search('f')[0]), 100)
+
+    def test_packed_urls(self):
+        with SearchIndex(os.path.join(self.path, 'packedurls.bin')) as index:
+            self.assertEqual([result.url for result in index.search('ba')[0]], [
+                'classFoo.html#a0123456789abcdef0123456789abcdef',
+                'classFoo.html#a0123456789abcdef0123456789abcd00',
+                'classFoo.html#a12345abcdef987'])
+
+    def test_unicode(self):
+        with SearchIndex(os.path.join(self.path, 'unicode.bin')) as index:
+            self.assertEqual(self.results(index, 'h'), ([
+                ('Hárá', '#b', None, 'page', 5),
+                ('Hýždě', '#a', None, 'page', 7)
+            ], ''))
+
+    def test_invalid(self):
+        with self.assertRaisesRegex(ValueError, "invalid search data signature"):
+            SearchIndex(b'MCX\x03' + b'\0'*16)
+        with self.assertRaisesRegex(ValueError, "unsupported search data version 2, expected 3"):
+            SearchIndex(b'MCS\x02' + b'\0'*16)
+
+    def test_invalid_file(self):
+        with open(os.path.join(self.path, 'searchdata-ns1-ri2-fo3.bin'), 'rb') as f:
+            data = f.read()
+        # The type map after the result map isn't covered by the header, so
+        # truncate the file in the result map
+        type_map_offset = Deserializer.from_serialized(data).type_map_offset
+        with open(os.path.join(self.path, 'sharded.bin'), 'rb') as f:
+            manifest = f.read()
+
+        with tempfile.TemporaryDirectory() as path:
+            # Checked before the file gets mapped, mmap() would fail on its
+            # own for the empty file
+            for name, contents, message in [
+                ('empty.bin', b'', "search data too short, expected at least 20 bytes but got 0"),
+                ('header.bin', b'MCX\x03' + b'\0'*16, "invalid search data signature"),
+                ('version.bin', b'MCS\x02' + b'\0'*16, "unsupported search data version 2, expected 3"),
+                ('truncated.bin', data[:type_map_offset - 1], "truncated search data, expected at least {} bytes but got {}".format(type_map_offset, type_map_offset - 1)),
+                ('manifest.bin', manifest[:-1], "truncated search data, expected at least {} bytes but got {}".format(len(manifest), len(manifest) - 1))
+            ]:
+                with self.subTest(name=name):
+                    with open(os.path.join(path, name), 'wb') as f:
+                        f.write(contents)
+                    with self.assertRaisesRegex(ValueError, "^{}: {}$".format(re.escape(os.path.join(path, name)), message)):
+                        SearchIndex(os.path.join(path, name))
+
+    def test_invalid_file_cli(self):
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, 'empty.bin'), 'wb') as f:
+                pass
+            result = subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.realpath(__file__)), '../_search.py'), os.path.join(path, 'empty.bin'), 'min'], capture_output=True, text=True)
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(result.stdout, '')
+        self.assertEqual(result.stderr, "CRITICAL:root:{}: search data too short, expected at least 20 bytes but got 0\n".format(os.path.join(path, 'empty.bin')))
@@ -0,0 +1,99 @@
+#
+#   This file is part of m.css.
+#
+#   Copyright © 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025
+#             Vladimír Vondruš <mosra@centrum.cz>
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a
+#   copy of this software and associated documentation files (the "Software"),
+#   to deal in the Software without restriction, including without limitation
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,
+#   and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included
+#   in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#   THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#   DEALINGS IN THE SOFTWARE.
+#
+
+import collections
+import json
+import os
+import tempfile
+import unittest
+
+from _telemetry import Telemetry, phase
+
+class TelemetryTest(unittest.TestCase):
+    def test(self):
+        counter = collections.Counter({'dot': 3})
+        telemetry = Telemetry({'dot2svg': counter})
+
+        with telemetry.phase('parse'): pass
+        with telemetry.phase('render'): pass
+        with telemetry.phase('parse'): pass
+        telemetry.item('class', 'Foo', 0.5)
+        telemetry.item('file', 'foo.h', 1.5)
+        telemetry.item('page', 'bar', 0.1)
+        # Only the changes since the counter was tracked are reported
+        counter['dot'] += 2
+        counter['cache hits'] += 1
+
+        report = telemetry.report(slowest=2)
+        self.assertEqual([(i['name'], i['count']) for i in report['phases']], [
+            ('parse', 2),
+            ('render', 1)
+        ])
+        self.assertEqual([(i['kind'], i['name']) for i in report['slowest']], [
+            ('file', 'foo.h'),
+            ('class', 'Foo')
+        ])
+        self.assertEqual(report['counts'], {
+            'dot2svg cache hits': 1,
+            'dot2svg dot': 2
+        })
+        self.assertGreaterEqual(report['time'], 0.0)
+
+    def test_merge(self):
+        worker = Telemetry()
+        with worker.phase('parse'): pass
+        worker.item('class', 'Foo', 0.5)
+        worker.track('dot2svg', collections.Counter())
+        worker.counters['dot2svg']['dot'] += 4
+
+        telemetry = Telemetry()
+        with telemetry.phase('parse'): pass
+        telemetry.merge(worker.snapshot())
+        telemetry.merge(worker.snapshot())
+
+        report = telemetry.report()
+        self.assertEqual([(i['name'], i['count']) for i in report['phases']], [
+            ('parse', 3)
+        ])
+        self.assertEqual(len(report['slowest']), 2)
+        self.assertEqual(report['counts'], {'dot2svg dot': 8})
+
+    def test_save(self):
+        telemetry = Telemetry()
+        with telemetry.phase('file copy'): pass
+        telemetry.item('module', 'foo.bar', 0.25)
+
+        with tempfile.TemporaryDirectory() as path:
+            summary = telemetry.save(os.path.join(path, 'profile.json'))
+            with open(os.path.join(path, 'profile.json')) as f:
+                report = json.load(f)
+        self.assertEqual(report['phases'][0]['name'], 'file copy')
+        self.assertEqual(report['slowest'], [{'kind': 'module', 'name': 'foo.bar', 'time': 0.25}])
+        self.assertIn('file copy', summary)
+        self.assertIn('module foo.bar', summary)
+
+    def test_disabled(self):
+        # No telemetry means the phase is a no-op
+        with phase(None, 'parse'): pass
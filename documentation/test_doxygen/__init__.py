@@ -81,12 +81,12 @@ class BaseTestCase(unittest.TestCase):
     def setUp(self):
         if os.path.exists(os.path.join(self.path, 'html')): shutil.rmtree(os.path.join(self.path, 'html'))
 
-    def run_doxygen(self, templates=default_templates, wildcard=default_wildcard, index_pages=default_index_pages, config={}):
+    def run_doxygen(self, templates=default_templates, wildcard=default_wildcard, index_pages=default_index_pages, config={}, jobs=1, incremental=False, xml_stream_threshold=None):
         state = State(copy.deepcopy(default_config))
         parse_doxyfile(state, os.path.join(self.path, self.doxyfile))
         # Make the supplied config values overwrite what's in the Doxyfile
         state.config = {**state.config, **config}
-        run(state, templates=templates, wildcard=wildcard, index_pages=index_pages, sort_globbed_files=True)
+        run(state, templates=templates, wildcard=wildcard, index_pages=index_pages, sort_globbed_files=True, jobs=jobs, incremental=incremental, xml_stream_threshold=xml_stream_threshold)
 
     def actual_expected_contents(self, actual, expected = None):
         if not expected: expected = actual
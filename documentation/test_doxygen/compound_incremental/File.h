@@ -0,0 +1,18 @@
+/** @file
+ * @brief A file
+ */
+
+/** @brief A namespace */
+namespace Foo {
+
+/** @brief The Bar class */
+class Bar {};
+
+/**
+ * @brief The Baz class
+ *
+ * @since 2.0
+ */
+class Baz {};
+
+}
@@ -0,0 +1,131 @@
+/** @file
+ * @brief A file
+ */
+
+/**
+@brief A namespace small enough to not be streamed
+
+@f[ a^2 + b^2 = c^2 @f]
+*/
+namespace Small {
+
+/**
+@brief A function
+
+Has a formula, @f$ \pi @f$, and a graph:
+
+@dot
+digraph "Small" { a -> b }
+@enddot
+*/
+void foo();
+
+}
+
+/**
+@brief A namespace large enough to be streamed
+
+@f[ e^{i \pi} + 1 = 0 @f]
+
+@dot
+digraph "Big" { a -> c }
+@enddot
+*/
+namespace Big {
+
+/**
+@brief Function 0
+
+A formula @f$ x_0 @f$ and a graph:
+
+@dot
+digraph "Function 0" { a -> f0 }
+@enddot
+*/
+void function0();
+
+/**
+@brief Function 1
+
+A formula @f$ x_1 @f$ and a graph:
+
+@dot
+digraph "Function 1" { a -> f1 }
+@enddot
+*/
+void function1();
+
+/**
+@brief Function 2
+
+A formula @f$ x_2 @f$ and a graph:
+
+@dot
+digraph "Function 2" { a -> f2 }
+@enddot
+*/
+void function2();
+
+/**
+@brief Function 3
+
+A formula @f$ x_3 @f$ and a graph:
+
+@dot
+digraph "Function 3" { a -> f3 }
+@enddot
+*/
+void function3();
+
+/**
+@brief Function 4
+
+A formula @f$ x_4 @f$ and a graph:
+
+@dot
+digraph "Function 4" { a -> f4 }
+@enddot
+*/
+void function4();
+
+/**
+@brief Function 5
+
+A formula @f$ x_5 @f$ and a graph:
+
+@dot
+digraph "Function 5" { a -> f5 }
+@enddot
+*/
+void function5();
+
+/**
+@brief Function 6
+
+A formula @f$ x_6 @f$ and a graph:
+
+@dot
+digraph "Function 6" { a -> f6 }
+@enddot
+*/
+void function6();
+
+/**
+@brief Function 7
+
+A formula @f$ x_7 @f$ and a graph:
+
+@dot
+digraph "Function 7" { a -> f7 }
+@enddot
+*/
+void function7();
+
+/**
+@brief A variable
+
+The same formula as in another function, @f$ x_0 @f$
+*/
+constexpr int variable = 3;
+
+}
@@ -28,6 +28,8 @@
 import os
 import unittest
 
+from _search import searchdata_filename_b85
+
 from . import IntegrationTestCase, doxygen_version, parse_version
 
 class Listing(IntegrationTestCase):
@@ -86,6 +88,55 @@ class ListingStripFromPath(Listing):
     def __init__(self, *args, **kwargs):
         Listing.__init__(self, *args, dir='listing', doxyfile='Doxyfile-strip-from-path', **kwargs)
 
+class Incremental(IntegrationTestCase):
+    def test(self):
+        manifest = os.path.join(self.path, 'm.doxygen.manifest')
+        if os.path.exists(manifest): os.remove(manifest)
+
+        self.run_doxygen(wildcard='*.xml', incremental=True)
+        self.assertTrue(os.path.exists(manifest))
+        with open(os.path.join(self.path, 'html', searchdata_filename_b85.format(search_filename_prefix='searchdata')), 'rb') as f:
+            search_data = f.read()
+
+        # Overwrite the output to be able to check what got rendered again
+        files = ['File_8h.html', 'namespaceFoo.html', 'classFoo_1_1Bar.html', 'classFoo_1_1Baz.html']
+        for file in files:
+            with open(os.path.join(self.path, 'html', file), 'w') as f:
+                f.write('stale')
+
+        # Nothing changed, so nothing should get rendered again
+        self.run_doxygen(wildcard='*.xml', incremental=True)
+        for file in files:
+            with self.subTest(file=file):
+                with open(os.path.join(self.path, 'html', file)) as f:
+                    self.assertEqual(f.read(), 'stale')
+
+        # Changing brief of one class renders again the class and everything
+        # that lists it, but not the other class
+        with open(os.path.join(self.path, 'xml', 'classFoo_1_1Bar.xml')) as f:
+            contents = f.read()
+        with open(os.path.join(self.path, 'xml', 'classFoo_1_1Bar.xml'), 'w') as f:
+            f.write(contents.replace('The Bar class', 'The updated Bar class'))
+        self.run_doxygen(wildcard='*.xml', incremental=True)
+        for file in ['File_8h.html', 'namespaceFoo.html', 'classFoo_1_1Bar.html']:
+            with self.subTest(file=file):
+                with open(os.path.join(self.path, 'html', file)) as f:
+                    self.assertIn('The updated Bar class', f.read())
+        with open(os.path.join(self.path, 'html', 'classFoo_1_1Baz.html')) as f:
+            self.assertEqual(f.read(), 'stale')
+
+        # The search data are complete even though most compounds weren't
+        # parsed again
+        with open(os.path.join(self.path, 'html', searchdata_filename_b85.format(search_filename_prefix='searchdata')), 'rb') as f:
+            self.assertEqual(f.read(), search_data)
+
+        # Enabling version labels changes the metadata extracted from the
+        # unchanged XML files, so they shouldn't be reused from the previous
+        # run. The version label of the class then appears in the listing.
+        self.run_doxygen(wildcard='*.xml', incremental=True, config={'VERSION_LABELS': True})
+        with open(os.path.join(self.path, 'html', 'namespaceFoo.html')) as f:
+            self.assertIn('class="m-doc">Baz</a> 2.0', f.read())
+
 class Detailed(IntegrationTestCase):
     def test_namespace(self):
         self.run_doxygen(wildcard='namespaceNamee.xml')
@@ -140,6 +191,83 @@ class Detailed(IntegrationTestCase):
         self.run_doxygen(wildcard='File_8h.xml')
         self.assertEqual(*self.actual_expected_contents('File_8h.html'))
 
+# Same as above, but with all files parsed in a streaming fashion, which
+# should result in exactly the same output
+class DetailedStreamed(Detailed):
+    def __init__(self, *args, **kwargs):
+        Detailed.__init__(self, *args, dir='detailed', **kwargs)
+
+    def run_doxygen(self, *args, **kwargs):
+        Detailed.run_doxygen(self, *args, xml_stream_threshold=0, **kwargs)
+
+# Output of the tools, stripped down to what gets patched
+fake_math_output = """<?xml version='1.0' encoding='UTF-8'?>
+<!-- This file was generated by dvisvgm 2.6.3 -->
+<svg version='1.1' xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink' width='12.0pt' height='8.0pt' viewBox='0 -6 12 8'>
+<g id='page1'>
+<!-- {} -->
+</g>
+</svg>"""
+
+fake_dot_output = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN"
+ "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">
+<svg width="62pt" height="116pt"
+ viewBox="0.00 0.00 62.00 116.00" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">
+<g id="graph0" class="graph" transform="scale(1 1) rotate(0) translate(4 112)">
+<title>{}</title>
+</g>
+</svg>
+"""
+
+class Streamed(IntegrationTestCase):
+    # Only some files are above the threshold and get streamed. Math and
+    # graphs in streamed members have to be rendered upfront the same as in
+    # the others, so the prefetch is replaced with one that records the
+    # sources and provides fake output. Anything that wasn't prefetched would
+    # need LaTeX or Graphviz, which is checked for as well.
+    def test(self):
+        import dot2svg
+        import latex2svg
+        import latex2svgextra
+
+        prefetched = []
+        def math_prefetch(formulas):
+            for formula in formulas:
+                prefetched.append(formula)
+                latex2svgextra._prefetched[formula] = (0.0, fake_math_output.format(formula))
+        def dot_prefetch(sources):
+            for source in sources:
+                prefetched.append(source)
+                dot2svg._prefetched[source] = fake_dot_output.format(source)
+
+        small = os.path.getsize(os.path.join(self.path, 'xml/namespaceSmall.xml'))
+        self.assertGreater(os.path.getsize(os.path.join(self.path, 'xml/namespaceBig.xml')), small)
+
+        original_prefetch = latex2svgextra.prefetch, dot2svg.prefetch
+        latex2svgextra.prefetch, dot2svg.prefetch = math_prefetch, dot_prefetch
+        try:
+            outputs = []
+            for threshold in [None, small]:
+                prefetched.clear()
+                latex_count, dot_count = latex2svg.stats['latex'], dot2svg.stats['dot']
+                self.run_doxygen(wildcard='*.xml', xml_stream_threshold=threshold)
+                self.assertEqual(latex2svg.stats['latex'], latex_count)
+                self.assertEqual(dot2svg.stats['dot'], dot_count)
+
+                output = {}
+                for file in ['namespaceSmall.html', 'namespaceBig.html']:
+                    with open(os.path.join(self.path, 'html', file)) as f:
+                        output[file] = f.read()
+                outputs += [(sorted(prefetched), output)]
+        finally:
+            latex2svgextra.prefetch, dot2svg.prefetch = original_prefetch
+
+        # The members of the big namespace are what gets streamed
+        self.assertIn('$ x_7 $', outputs[0][0])
+        self.assertTrue([i for i in outputs[0][0] if 'Function 7' in i])
+        self.assertEqual(outputs[1], outputs[0])
+
 class Ignored(IntegrationTestCase):
     def test(self):
         self.run_doxygen(index_pages=[], wildcard='*.xml')
@@ -31,8 +31,6 @@ import shutil
 import subprocess
 import unittest
 
-from hashlib import sha1
-
 from doxygen import EntryType
 from _search import pretty_print, searchdata_filename
 
@@ -202,7 +200,7 @@ class MathCached(IntegrationTestCase):
         super().__init__(*args, **kwargs)
 
         # Actually generated from $ \frac{\tau}{2} $ tho
-        self.tau_half_hash = sha1(r"""$ \pi $""".encode('utf-8')).digest()
+        self.tau_half_formula = r"""$ \pi $"""
         self.tau_half = """<?xml version='1.0' encoding='UTF-8'?>
 <!-- This file was generated by dvisvgm 2.6.3 -->
 <svg version='1.1' xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink' width='5.847936pt' height='15.326665pt' viewBox='1.195514 -8.1387 4.678349 12.261332'>
@@ -218,11 +216,11 @@ class MathCached(IntegrationTestCase):
 </svg>"""
         # Actually generated from \[ a^3 + b^3 \neq c^3 \] tho
         # Doxygen 1.9.8+ (or maybe earlier? 1.9.1 not yet) changes the spacing,
-        # so have to calculate the hash differently
+        # so the formula is different
         if parse_version(doxygen_version()) >= parse_version("1.9.8"):
-            self.fermat_hash = sha1("""\\[\n    a^2 + b^2 = c^2\n\\]""".encode('utf-8')).digest()
+            self.fermat_formula = """\\[\n    a^2 + b^2 = c^2\n\\]"""
         else:
-            self.fermat_hash = sha1(r"""\[ a^2 + b^2 = c^2 \]""".encode('utf-8')).digest()
+            self.fermat_formula = r"""\[ a^2 + b^2 = c^2 \]"""
         self.fermat = """<?xml version='1.0' encoding='UTF-8'?>
 <!-- This file was generated by dvisvgm 2.6.3 -->
 <svg version='1.1' xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink' width='75.028924pt' height='15.496355pt' viewBox='164.01086 -12.397084 60.023139 12.397084'>
@@ -250,12 +248,24 @@ class MathCached(IntegrationTestCase):
 
     # This is using the cache, so doesn't matter if LaTeX is found or not
     def test(self):
-        math_cache = (0, 5, {
-            self.tau_half_hash: (5, 0.344841, self.tau_half),
-            self.fermat_hash: (5, 0.0, self.fermat),
-            b'does not exist': (5, 0.0, 'something')})
-        with open(os.path.join(self.path, 'xml/math.cache'), 'wb') as f:
-            pickle.dump(math_cache, f)
+        import latex2svgextra
+
+        cache_file = os.path.join(self.path, 'xml/math.cache')
+        latex2svgextra.load_cache(cache_file)
+        cache = latex2svgextra._cache
+        cache.put(self.tau_half_formula, 0.344841, self.tau_half)
+        cache.put(self.fermat_formula, 0.0, self.fermat)
+        cache.put('$ does not exist $', 0.0, 'something')
+        cache.save()
+
+        # Make the unused entry older than the max age. Saving would evict it
+        # already, so patch the file directly.
+        with open(cache_file, 'rb') as f:
+            version, entries = pickle.load(f)
+        used_time = entries[cache._hash(self.tau_half_formula)][0]
+        entries[cache._hash('$ does not exist $')] = (0, 0.0, 'something')
+        with open(cache_file, 'wb') as f:
+            pickle.dump((version, entries), f)
 
         self.run_doxygen(wildcard='math.xml')
         # Same as done above, there's different spacing in 1.9.8+
@@ -264,14 +274,15 @@ class MathCached(IntegrationTestCase):
         else:
             self.assertEqual(*self.actual_expected_contents('math.html', 'math-197.html'))
 
-        # Expect that after the operation the global cache age is bumped,
-        # unused entries removed and used entries age bumped as well
-        with open(os.path.join(self.path, 'xml/math.cache'), 'rb') as f:
-            math_cache_actual = pickle.load(f)
-        math_cache_expected = (0, 6, {
-            self.tau_half_hash: (6, 0.344841, self.tau_half),
-            self.fermat_hash: (6, 0.0, self.fermat)})
-        self.assertEqual(math_cache_actual, math_cache_expected)
+        # Expect that after the operation the used entries are marked as used
+        # and the unused one evicted
+        with open(cache_file, 'rb') as f:
+            version, entries = pickle.load(f)
+        self.assertEqual(version, latex2svgextra._cache_version)
+        self.assertEqual({hash: entry[1:] for hash, entry in entries.items()}, {
+            cache._hash(self.tau_half_formula): (0.344841, self.tau_half),
+            cache._hash(self.fermat_formula): (0.0, self.fermat)})
+        self.assertGreater(entries[cache._hash(self.tau_half_formula)][0], used_time)
 
     @unittest.skipUnless(shutil.which('latex'),
                          "Math rendering requires LaTeX installed")
@@ -292,14 +303,13 @@ class MathCached(IntegrationTestCase):
         self.assertEqual(actual_contents, expected_contents)
 
         # Expect that after the operation the global cache is filled
+        import latex2svgextra
         with open(os.path.join(self.path, 'xml/math.cache'), 'rb') as f:
-            math_cache_actual = pickle.load(f)
-        math_cache_expected = (0, 0, {
-            sha1('$ \frac{\tau}{2} $'.encode('utf-8')).digest():
-                (0, 0.344841, self.tau_half),
-            sha1(r'\[ a^3 + b^3 \neq c^3 \]'.encode('utf-8')).digest():
-                (0, 0.0, self.fermat)})
-        self.assertEqual(math_cache_actual, math_cache_expected)
+            version, entries = pickle.load(f)
+        self.assertEqual(version, latex2svgextra._cache_version)
+        self.assertEqual({hash: entry[1:] for hash, entry in entries.items()}, {
+            latex2svgextra._cache._hash('$ \frac{\tau}{2} $'): (0.344841, self.tau_half),
+            latex2svgextra._cache._hash(r'\[ a^3 + b^3 \neq c^3 \]'): (0.0, self.fermat)})
 
     def test_noop(self):
         if os.path.exists(os.path.join(self.path, 'xml/math.cache')):
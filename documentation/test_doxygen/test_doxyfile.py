@@ -76,8 +76,11 @@ class Doxyfile(unittest.TestCase):
 
         'M_CODE_FILTERS_PRE': {},
         'M_CODE_FILTERS_POST': {},
+        'M_CODE_CACHE_FILE': None,
         'M_MATH_CACHE_FILE': 'm.math.cache',
         'M_MATH_RENDER_AS_CODE': False,
+        'M_MATH_PRECOMPILE_PREAMBLE': False,
+        'M_DOT_CACHE_FILE': None,
 
         'SEARCH_DISABLED': False,
         'SEARCH_DOWNLOAD_BINARY': False,
@@ -85,6 +88,8 @@ class Doxyfile(unittest.TestCase):
         'SEARCH_RESULT_ID_BYTES': 2,
         'SEARCH_FILE_OFFSET_BYTES': 3,
         'SEARCH_NAME_SIZE_BYTES': 1,
+        'SEARCH_SHARD_PREFIX_LENGTH': 0,
+        'SEARCH_SHARD_MAX_RESULTS': 100,
         'SEARCH_BASE_URL': None,
         'SEARCH_EXTERNAL_URL': None,
         'SEARCH_HELP':
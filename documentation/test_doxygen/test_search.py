@@ -28,6 +28,7 @@
 
 import argparse
 import os
+import shutil
 import sys
 
 from doxygen import EntryType
@@ -43,174 +44,166 @@ class Search(IntegrationTestCase):
             serialized = f.read()
             search_data_pretty = pretty_print(serialized, entryTypeClass=EntryType)[0]
         #print(search_data_pretty)
-        self.assertEqual(len(serialized), 4841)
+        self.assertEqual(len(serialized), 3272)
         self.assertEqual(search_data_pretty, """
 53 symbols
-deprecated_macro [0]
+deprecated_macro [49]
 ||        |     ($
-||        |      ) [1]
-||        dir [23]
+||        |      ) [49()]
+||        dir [46]
 ||        |  /$
-||        |   deprecatedfile.h [2]
-||        file.h [2]
-||        |oo [37]
+||        |   deprecatedfile.h [47]
+||        file.h [47]
+||        |oo [48]
 ||        || ($
-||        ||  ) [38]
-||         list [22]
-||        namespace [39]
+||        ||  ) [48()]
+||         list [17]
+||        namespace [40]
 ||        |        :$
-||        |         :deprecatedenum [32]
+||        |         :deprecatedenum [50]
 ||        |          |         |   :$
-||        |          |         |    :value [31]
-||        |          |         typedef [35]
-||        |          |         variable [36]
-||        |          |         foo [37]
+||        |          |         |    :value [37]
+||        |          |         typedef [45]
+||        |          |         variable [52]
+||        |          |         foo [48]
 ||        |          |         |  ($
-||        |          |         |   ) [38]
-||        |          |         class [53]
-||        |          |         struct [54]
-||        |          |         union [58]
+||        |          |         |   ) [48()]
+||        |          |         class [42]
+||        |          |         struct [43]
+||        |          |         union [44]
 ||        |          enum [34]
 ||        |          |   :$
-||        |          |    :deprecatedvalue [33]
-||        enum [32]
+||        |          |    :deprecatedvalue [51]
+||        enum [50]
 ||        |   :$
-||        |    :value [31]
-||        value [33]
-||        | riable [36]
-||        typedef [35]
-||        class [53]
-||        struct [54]
-||        union [58]
-|ir [24]
+||        |    :value [37]
+||        value [51]
+||        | riable [52]
+||        typedef [45]
+||        class [42]
+||        struct [43]
+||        union [44]
+|ir [25]
 || /$
-||  file.h [9]
-macro [3]
-||   _function [5]
+||  file.h [26]
+macro [30]
+||   _function [31]
 ||            ($
-||             ) [6]
-||            _with_params [7]
+||             ) [31()]
+||            _with_params [32]
 ||            |           ($
-||            |            ) [8]
-|in() [49]
-glmacro() [4]
-| file() [10]
-| |oo() [13]
-| class() [21]
-| directory() [25]
-| |  () [26]
-| _dir [27]
-| |group [30]
-| |enum [45]
-| ||   _value [43]
-| ||         _ext [42]
-| |typedef [47]
-| namespace() [51]
-| struct() [56]
-| union() [60]
-file.h [9]
-|oo [11, 14, 18, 16]
+||            |            ) [32()]
+|in() [15]
+glmacro() [6]
+| file() [4]
+| |oo() [1]
+| class() [7]
+| directory() [11]
+| |  () [2]
+| _dir [0]
+| |group [5]
+| |enum [3]
+| ||   _value [12]
+| ||         _ext [14]
+| |typedef [9]
+| namespace() [13]
+| struct() [10]
+| union() [8]
+file.h [26]
+|oo [27, 28, 29, 39]
 || ($
-||  ) [12, 15, 19, 17]
-namespace [50]
+||  ) [27(), 28(), 29(), 39()]
+namespace [19]
 |        :$
-|         :class [20]
+|         :class [21]
 |          |    :$
-|          |     :foo [11, 14, 18, 16]
+|          |     :foo [27, 28, 29, 39]
 |          |         ($
-|          |          ) [12, 15, 19, 17]
-|          enum [44]
+|          |          ) [27(), 28(), 29(), 39()]
+|          enum [33]
 |          |   :$
-|          |    :onlyabrief [40]
-|          |     value [41]
-|          typedef [46]
-|          variable [48]
-|          struct [55]
-|          union [59]
-class [20]
+|          |    :onlyabrief [36]
+|          |     value [35]
+|          typedef [24]
+|          variable [38]
+|          struct [22]
+|          union [23]
+class [21]
 |    :$
-|     :foo [11, 14, 18, 16]
+|     :foo [27, 28, 29, 39]
 |         ($
-|          ) [12, 15, 19, 17]
-a group [29, 28]
-| page [52]
+|          ) [27(), 28(), 29(), 39()]
+a group [20, 41]
+| page [16]
 | |    $
 | |    0xc2
 | |     0xbb
-| |       subpage [57]
-value [41, 31]
-| riable [48]
-enum [44, 34]
+| |       subpage [18]
+value [35, 37]
+| riable [38]
+enum [33, 34]
 |   :$
-|    :deprecatedvalue [33]
-|     onlyabrief [40]
-|     value [41]
-onlyabrief [40]
-typedef [46]
-struct [55]
-|ubpage [57]
-union [59]
-0: DEPRECATED_MACRO(a, b, c) [suffix_length=9, deprecated, type=DEFINE] -> DeprecatedFile_8h.html#a7f8376730349fef9ff7d103b0245a13e
-1:  [prefix=0[:56], suffix_length=7, deprecated, type=DEFINE] ->
-2: /DeprecatedFile.h [prefix=23[:0], deprecated, type=FILE] -> DeprecatedFile_8h.html
-3: MACRO [type=DEFINE] -> File_8h.html#a824c99cb152a3c2e9111a2cb9c34891e
-4: glMacro() [alias=3] ->
-5: _FUNCTION() [prefix=3[:14], suffix_length=2, type=DEFINE] -> 025158d6007b306645a8eb7c7a9237c1
-6:  [prefix=5[:46], type=DEFINE] ->
-7: _FUNCTION_WITH_PARAMS(params) [prefix=3[:15], suffix_length=8, type=DEFINE] -> 8602bba5a72becb4f2dc544ce12c420
-8:  [prefix=7[:46], suffix_length=6, type=DEFINE] ->
-9: /File.h [prefix=24[:0], type=FILE] -> File_8h.html
-10: glFile() [alias=9] ->
-11: ::foo() [prefix=20[:28], suffix_length=2, type=FUNC] -> #aaeba4096356215868370d6ea476bf5d9
-12:  [prefix=11[:62], type=FUNC] ->
-13: glFoo() [alias=11] ->
-14:  const [prefix=11[:30], suffix_length=8, type=FUNC] -> c03c5b93907dda16763eabd26b25500a
-15:  [prefix=14[:62], suffix_length=6, type=FUNC] ->
-16:  && [prefix=11[:30], suffix_length=5, deleted, type=FUNC] -> 77803233441965cad057a6619e9a75fd
-17:  [prefix=16[:62], suffix_length=3, deleted, type=FUNC] ->
-18: ::foo(const Enum&, Typedef) [prefix=20[:28], suffix_length=22, type=FUNC] -> #aba8d57a830d4d79f86d58d92298677fa
-19:  [prefix=18[:62], suffix_length=20, type=FUNC] ->
-20: ::Class [prefix=50[:0], type=CLASS] -> classNamespace_1_1Class.html
-21: glClass() [alias=20] ->
-22: Deprecated List [type=PAGE] -> deprecated.html
-23: DeprecatedDir [deprecated, type=DIR] -> dir_c6c97faf5a6cbd0f62c27843ce3af4d0.html
-24: Dir [type=DIR] -> dir_da5033def2d0db76e9883b31b76b3d0c.html
-25: glDirectory() [alias=24] ->
-26: glDir() [alias=24] ->
-27: GL_DIR [alias=24] ->
-28: A group [deprecated, type=GROUP] -> group__deprecated-group.html
-29: A group [type=GROUP] -> group__group.html
-30: GL_GROUP [alias=29] ->
-31: ::Value [prefix=32[:67], type=ENUM_VALUE] -> a689202409e48743b914713f96d93947c
-32: ::DeprecatedEnum [prefix=39[:33], deprecated, type=ENUM] -> #ab1e37ddc1d65765f2a48485df4af7b47
-33: ::DeprecatedValue [prefix=34[:67], deprecated, type=ENUM_VALUE] -> a4b5b0e9709902228c33df7e5e377e596
-34: ::Enum [prefix=39[:33], type=ENUM] -> #ac59010e983270c330b8625b5433961b9
-35: ::DeprecatedTypedef [prefix=39[:33], deprecated, type=TYPEDEF] -> #af503ad3ff194a4c2512aff16df771164
-36: ::DeprecatedVariable [prefix=39[:33], deprecated, type=VAR] -> #ae934297fc39624409333eefbfeabf5e5
-37: ::deprecatedFoo(int, bool, double) [prefix=39[:33], suffix_length=19, deprecated, type=FUNC] -> #a9a1b3fc71d294b548095985acc0d5092
-38:  [prefix=37[:67], suffix_length=17, deprecated, type=FUNC] ->
-39: DeprecatedNamespace [deprecated, type=NAMESPACE] -> namespaceDeprecatedNamespace.html
-40: ::OnlyABrief [prefix=44[:57], type=ENUM_VALUE] -> a9b0246417d89d650ed429f1b784805eb
-41: ::Value [prefix=44[:57], type=ENUM_VALUE] -> a689202409e48743b914713f96d93947c
-42: _EXT [alias=41, prefix=43[:0]] ->
-43: _VALUE [alias=41, prefix=45[:0]] ->
-44: ::Enum [prefix=50[:23], type=ENUM] -> #add172b93283b1ab7612c3ca6cc5dcfea
-45: GL_ENUM [alias=44] ->
-46: ::Typedef [prefix=50[:23], type=TYPEDEF] -> #abe2a245304bc2234927ef33175646e08
-47: GL_TYPEDEF [alias=46] ->
-48: ::Variable [prefix=50[:23], type=VAR] -> #ad3121960d8665ab045ca1bfa1480a86d
-49: GLSL: min() [alias=48, suffix_length=2] ->
-50: Namespace [type=NAMESPACE] -> namespaceNamespace.html
-51: glNamespace() [alias=50] ->
-52: A page [type=PAGE] -> page.html
-53: ::DeprecatedClass [prefix=39[:0], deprecated, type=STRUCT] -> structDeprecatedNamespace_1_1DeprecatedClass.html
-54: ::DeprecatedStruct [prefix=39[:0], deprecated, type=STRUCT] -> structDeprecatedNamespace_1_1DeprecatedStruct.html
-55: ::Struct [prefix=50[:0], type=STRUCT] -> structNamespace_1_1Struct.html
-56: glStruct() [alias=55] ->
-57:  » Subpage [prefix=52[:0], type=PAGE] -> subpage.html
-58: ::DeprecatedUnion [prefix=39[:0], deprecated, type=UNION] -> unionDeprecatedNamespace_1_1DeprecatedUnion.html
-59: ::Union [prefix=50[:0], type=UNION] -> unionNamespace_1_1Union.html
-60: glUnion() [alias=59] ->
+|    :deprecatedvalue [51]
+|     onlyabrief [36]
+|     value [35]
+onlyabrief [36]
+typedef [24]
+struct [22]
+|ubpage [18]
+union [23]
+0: GL_DIR [alias=25] ->
+1: glFoo() [alias=27] ->
+2: glDir() [alias=25] ->
+3: GL_ENUM [alias=33] ->
+4: glFile() [alias=26] ->
+5: GL_GROUP [alias=20] ->
+6: glMacro() [alias=30] ->
+7: glClass() [alias=21] ->
+8: glUnion() [alias=23] ->
+9: GL_TYPEDEF [alias=24] ->
+10: glStruct() [alias=22] ->
+11: glDirectory() [alias=25] ->
+12: _VALUE [alias=35, prefix=3[:0]] ->
+13: glNamespace() [alias=19] ->
+14: _EXT [alias=35, prefix=12[:0]] ->
+15: GLSL: min() [alias=38, suffix_length=2] ->
+16: A page [type=PAGE] -> page.html
+17: Deprecated List [type=PAGE] -> deprecated.html
+18:  » Subpage [prefix=16[:0], type=PAGE] -> subpage.html
+19: Namespace [type=NAMESPACE] -> namespaceNamespace.html
+20: A group [type=GROUP] -> group__group.html
+21: ::Class [prefix=19[:0], type=CLASS] -> classNamespace_1_1Class.html
+22: ::Struct [prefix=19[:0], type=STRUCT] -> structNamespace_1_1Struct.html
+23: ::Union [prefix=19[:0], type=UNION] -> unionNamespace_1_1Union.html
+24: ::Typedef [prefix=19[:23], type=TYPEDEF] -> #abe2a245304bc2234927ef33175646e08
+25: Dir [type=DIR] -> dir_da5033def2d0db76e9883b31b76b3d0c.html
+26: /File.h [prefix=25[:0], type=FILE] -> File_8h.html
+27: ::foo() [prefix=21[:28], suffix_length=2, type=FUNC] -> #aaeba4096356215868370d6ea476bf5d9
+28:  const [prefix=27[:30], suffix_length=8, type=FUNC] -> c03c5b93907dda16763eabd26b25500a
+29: ::foo(const Enum&, Typedef) [prefix=21[:28], suffix_length=22, type=FUNC] -> #aba8d57a830d4d79f86d58d92298677fa
+30: MACRO [type=DEFINE] -> File_8h.html#a824c99cb152a3c2e9111a2cb9c34891e
+31: _FUNCTION() [prefix=30[:14], suffix_length=2, type=DEFINE] -> 025158d6007b306645a8eb7c7a9237c1
+32: _FUNCTION_WITH_PARAMS(params) [prefix=30[:15], suffix_length=8, type=DEFINE] -> 8602bba5a72becb4f2dc544ce12c420
+33: ::Enum [prefix=19[:23], type=ENUM] -> #add172b93283b1ab7612c3ca6cc5dcfea
+34: ::Enum [prefix=40[:33], type=ENUM] -> #ac59010e983270c330b8625b5433961b9
+35: ::Value [prefix=33[:57], type=ENUM_VALUE] -> a689202409e48743b914713f96d93947c
+36: ::OnlyABrief [prefix=33[:57], type=ENUM_VALUE] -> a9b0246417d89d650ed429f1b784805eb
+37: ::Value [prefix=50[:67], type=ENUM_VALUE] -> a689202409e48743b914713f96d93947c
+38: ::Variable [prefix=19[:23], type=VAR] -> #ad3121960d8665ab045ca1bfa1480a86d
+39:  && [prefix=27[:30], suffix_length=5, deleted, type=FUNC] -> 77803233441965cad057a6619e9a75fd
+40: DeprecatedNamespace [deprecated, type=NAMESPACE] -> namespaceDeprecatedNamespace.html
+41: A group [deprecated, type=GROUP] -> group__deprecated-group.html
+42: ::DeprecatedClass [prefix=40[:0], deprecated, type=STRUCT] -> structDeprecatedNamespace_1_1DeprecatedClass.html
+43: ::DeprecatedStruct [prefix=40[:0], deprecated, type=STRUCT] -> structDeprecatedNamespace_1_1DeprecatedStruct.html
+44: ::DeprecatedUnion [prefix=40[:0], deprecated, type=UNION] -> unionDeprecatedNamespace_1_1DeprecatedUnion.html
+45: ::DeprecatedTypedef [prefix=40[:33], deprecated, type=TYPEDEF] -> #af503ad3ff194a4c2512aff16df771164
+46: DeprecatedDir [deprecated, type=DIR] -> dir_c6c97faf5a6cbd0f62c27843ce3af4d0.html
+47: /DeprecatedFile.h [prefix=46[:0], deprecated, type=FILE] -> DeprecatedFile_8h.html
+48: ::deprecatedFoo(int, bool, double) [prefix=40[:33], suffix_length=19, deprecated, type=FUNC] -> #a9a1b3fc71d294b548095985acc0d5092
+49: DEPRECATED_MACRO(a, b, c) [suffix_length=9, deprecated, type=DEFINE] -> DeprecatedFile_8h.html#a7f8376730349fef9ff7d103b0245a13e
+50: ::DeprecatedEnum [prefix=40[:33], deprecated, type=ENUM] -> #ab1e37ddc1d65765f2a48485df4af7b47
+51: ::DeprecatedValue [prefix=34[:67], deprecated, type=ENUM_VALUE] -> a4b5b0e9709902228c33df7e5e377e596
+52: ::DeprecatedVariable [prefix=40[:33], deprecated, type=VAR] -> #ae934297fc39624409333eefbfeabf5e5
 (EntryType.PAGE, CssClass.SUCCESS, 'page'),
 (EntryType.NAMESPACE, CssClass.PRIMARY, 'namespace'),
 (EntryType.GROUP, CssClass.SUCCESS, 'group'),
@@ -229,10 +222,10 @@ union [59]
 
     def test_byte_sizes(self):
         for config, bytes, size in [
-            ('SEARCH_RESULT_ID_BYTES', 3, 4959),
-            ('SEARCH_RESULT_ID_BYTES', 4, 5077),
-            ('SEARCH_FILE_OFFSET_BYTES', 4, 5302),
-            ('SEARCH_NAME_SIZE_BYTES', 2, 4893)
+            ('SEARCH_RESULT_ID_BYTES', 3, 3317),
+            ('SEARCH_RESULT_ID_BYTES', 4, 3362),
+            ('SEARCH_FILE_OFFSET_BYTES', 4, 3326),
+            ('SEARCH_NAME_SIZE_BYTES', 2, 3310)
         ]:
             with self.subTest(config=config, bytes=bytes, size=size):
                 self.run_doxygen(index_pages=[], wildcard='*.xml', config={
@@ -243,6 +236,32 @@ union [59]
                     serialized = f.read()
                 self.assertEqual(len(serialized), size)
 
+class Jobs(IntegrationTestCase):
+    def __init__(self, *args, **kwargs):
+        IntegrationTestCase.__init__(self, *args, dir='search', **kwargs)
+
+    def test(self):
+        files = ['namespaceNamespace.html', 'classNamespace_1_1Class.html', 'File_8h.html', 'dir_da5033def2d0db76e9883b31b76b3d0c.html', 'group__group.html', 'page.html']
+
+        self.run_doxygen(wildcard='*.xml')
+        with open(os.path.join(self.path, 'html', searchdata_filename.format(search_filename_prefix='secretblob')), 'rb') as f:
+            serialized = f.read()
+        expected = {}
+        for file in files:
+            with open(os.path.join(self.path, 'html', file)) as f:
+                expected[file] = f.read()
+
+        # The output should be exactly the same, including the search data
+        # order, when rendered in parallel
+        shutil.rmtree(os.path.join(self.path, 'html'))
+        self.run_doxygen(wildcard='*.xml', jobs=4)
+        with open(os.path.join(self.path, 'html', searchdata_filename.format(search_filename_prefix='secretblob')), 'rb') as f:
+            self.assertEqual(f.read(), serialized)
+        for file in files:
+            with self.subTest(file=file):
+                with open(os.path.join(self.path, 'html', file)) as f:
+                    self.assertEqual(f.read(), expected[file])
+
 class LongSuffixLength(IntegrationTestCase):
     def test(self):
         self.run_doxygen(index_pages=[], wildcard='*.xml')
@@ -251,21 +270,20 @@ class LongSuffixLength(IntegrationTestCase):
             serialized = f.read()
             search_data_pretty = pretty_print(serialized, entryTypeClass=EntryType)[0]
         #print(search_data_pretty)
-        self.assertEqual(len(serialized), 478)
+        self.assertEqual(len(serialized), 357)
         # The parameters get cut off with an ellipsis
         self.assertEqual(search_data_pretty, """
 2 symbols
-file.h [2]
+file.h [0]
 |     :$
-|      :averylongfunctionname [0]
+|      :averylongfunctionname [1]
 |                            ($
-|                             ) [1]
-averylongfunctionname [0]
+|                             ) [1()]
+averylongfunctionname [1]
 |                    ($
-|                     ) [1]
-0: ::aVeryLongFunctionName(ThisIsALongTypeForWhichIWantDoxygenToCalculateTh…) [prefix=2[:12], suffix_length=53, type=FUNC] -> #a59c56fdef398e152efce8bc46793d455
-1:  [prefix=0[:46], suffix_length=51, type=FUNC] ->
-2: File.h [type=FILE] -> File_8h.html
+|                     ) [1()]
+0: File.h [type=FILE] -> File_8h.html
+1: ::aVeryLongFunctionName(ThisIsALongTypeForWhichIWantDoxygenToCalculateTh…) [prefix=0[:12], suffix_length=53, type=FUNC] -> #a59c56fdef398e152efce8bc46793d455
 (EntryType.PAGE, CssClass.SUCCESS, 'page'),
 (EntryType.NAMESPACE, CssClass.PRIMARY, 'namespace'),
 (EntryType.GROUP, CssClass.SUCCESS, 'group'),
@@ -76,7 +76,7 @@ class BaseTestCase(unittest.TestCase):
     def setUp(self):
         if os.path.exists(os.path.join(self.path, 'output')): shutil.rmtree(os.path.join(self.path, 'output'))
 
-    def run_python(self, config_overrides={}, templates=default_templates):
+    def run_python(self, config_overrides={}, templates=default_templates, jobs=1, telemetry=None):
         # Defaults that make sense for the tests
         config = copy.deepcopy(default_config)
         config.update({
@@ -92,7 +92,7 @@ class BaseTestCase(unittest.TestCase):
         # Update it with config overrides
         config.update(config_overrides)
 
-        run(self.path, config, templates=templates)
+        run(self.path, config, templates=templates, jobs=jobs, telemetry=telemetry)
 
     def actual_expected_contents(self, actual, expected = None):
         if not expected: expected = actual
@@ -106,7 +106,7 @@ class BaseTestCase(unittest.TestCase):
 # On top of the automagic of BaseTestCase this automatically sets INPUT_MODULES
 # to detected `dirname`, if not set already.
 class BaseInspectTestCase(BaseTestCase):
-    def run_python(self, config_overrides={}, templates=default_templates):
+    def run_python(self, config_overrides={}, templates=default_templates, jobs=1, telemetry=None):
         if 'INPUT_MODULES' not in config_overrides:
             sys.path.append(self.path)
 
@@ -116,7 +116,7 @@ class BaseInspectTestCase(BaseTestCase):
             config['INPUT_MODULES'] = [self.dirname]
             config_overrides = config
 
-        BaseTestCase.run_python(self, config_overrides, templates)
+        BaseTestCase.run_python(self, config_overrides, templates, jobs, telemetry)
 
     def run_python_stubs(self, config_overrides={}, templates=default_templates):
         # Defaults that make sense for stub-only tests
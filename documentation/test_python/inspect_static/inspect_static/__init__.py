@@ -0,0 +1,59 @@
+"""A package that's never imported
+
+Importing it would fail, as one of its dependencies is not available and the
+module raises an exception on import.
+"""
+
+from __future__ import annotations
+
+import enum
+import sys
+from typing import List, Optional
+
+from some_unavailable_package import Tensor
+
+from . import stub
+
+raise RuntimeError("this module should never be imported")
+
+VERSION = (1, 2)
+"""Version as a tuple"""
+
+if sys.version_info >= (3, 0):
+    CONDITIONAL = 'py3'
+    """Defined on Python 3"""
+else:
+    CONDITIONAL = 'py2'
+    """Defined on Python 2"""
+
+ZEROS = Tensor.zeros(3)
+"""A value that can't be evaluated statically"""
+
+class Flags(enum.IntFlag):
+    """Flags"""
+
+    A = 1
+    """Flag A"""
+
+    B = 2
+
+class Base:
+    """A base class"""
+
+    data: int = 3
+    """Class data"""
+
+    def __init__(self, tensor: Tensor, flags: Flags = Flags.A):
+        """Constructor"""
+        self.tensor = tensor
+
+    @property
+    def tensor_property(self) -> Tensor:
+        """A property"""
+
+    @staticmethod
+    def create(size: Optional[int] = None) -> Base:
+        """Postponed annotation referencing the class itself"""
+
+def function(a: Base, b: List[Tensor] = []) -> Flags:
+    """A function"""
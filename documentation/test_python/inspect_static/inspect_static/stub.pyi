@@ -0,0 +1,13 @@
+"""A module that has just a stub"""
+
+def function(a: int) -> Unknown:
+    """A function with an annotation that can't be resolved"""
+
+def overloaded(a: int) -> str:
+    """First overload"""
+
+def overloaded(a: str) -> int:
+    """Second overload, which wins"""
+
+VALUE: int
+"""Data declared without a value"""
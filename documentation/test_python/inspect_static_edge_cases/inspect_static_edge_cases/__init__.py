@@ -0,0 +1,39 @@
+"""A package that's tricky to import statically
+
+It has a module-level __getattr__(), modules importing each other and
+annotations that can't be checked for None with isinstance().
+"""
+
+import typing
+
+from .first import First
+from .second import Second
+
+T = typing.TypeVar('T')
+
+class Sentinel:
+    """A class with special methods that can't be called statically"""
+
+    def __repr__(self):
+        return 'SENTINEL'
+
+SENTINEL = Sentinel()
+"""An instance with a custom repr"""
+
+def callback():
+    """A function"""
+
+def optional(a: typing.Optional[First], b: typing.Optional['Second'] = None) -> typing.Optional[int]:
+    """Optional arguments and return type"""
+
+def union(a: typing.Union[int, T], b: typing.Union[str, typing.Any]) -> typing.Union[First, T]:
+    """Union of a TypeVar and of Any"""
+
+def union_of_function(a: typing.Union[int, callback]):
+    """Union with a function, which isn't a valid annotation"""
+
+def __getattr__(name):
+    raise AttributeError(name)
+
+def __dir__():
+    return []
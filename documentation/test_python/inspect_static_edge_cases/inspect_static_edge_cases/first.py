@@ -0,0 +1,11 @@
+"""First module, importing the second one, which imports this one back"""
+
+import typing
+
+from .second import Second
+
+class First:
+    """First class"""
+
+    def second(self) -> typing.Optional[Second]:
+        """Returns the second class"""
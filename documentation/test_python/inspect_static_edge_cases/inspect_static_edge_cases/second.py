@@ -0,0 +1,21 @@
+"""Second module"""
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from .first import First
+
+class Second:
+    """Second class"""
+
+    attribute: typing.Optional['First'] = None
+    """An attribute annotated with a class from the first module"""
+
+    def first(self, a: typing.Optional['First'] = None) -> 'First':
+        """Takes and returns the first class"""
+
+class Token(typing.NamedTuple):
+    """A named tuple"""
+
+    type: str
+    value: typing.Optional['First']
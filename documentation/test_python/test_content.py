@@ -23,13 +23,19 @@
 #   DEALINGS IN THE SOFTWARE.
 #
 
+import copy
+import multiprocessing
 import os
+import tempfile
 import unittest
 
 from . import BaseInspectTestCase
 
 from _search import pretty_print, searchdata_filename
-from python import EntryType
+from _telemetry import Telemetry
+import python
+import rendercache
+from python import EntryType, State, DocstringCache, default_config, docstring_cache_fingerprint
 
 class Content(BaseInspectTestCase):
     def test(self):
@@ -48,6 +54,26 @@ class Content(BaseInspectTestCase):
 
         self.assertEqual(*self.actual_expected_contents('page.html'))
 
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), "parallel rendering requires the fork start method")
+    def test_parallel(self):
+        # External docs are used from worker processes, the parent should warn
+        # only about those that are unused in a single-job run as well
+        unused = []
+        for jobs in [1, 3]:
+            with self.assertLogs() as logs:
+                self.run_python({
+                    'PLUGINS': ['m.sphinx'],
+                    'INPUT_DOCS': ['docs.rst'],
+                    'INPUT_PAGES': ['page.rst']
+                }, jobs=jobs)
+            unused += [[i for i in logs.output if 'doc contents were unused' in i]]
+        self.assertEqual(unused[0], unused[1])
+        self.assertEqual(*self.actual_expected_contents('classes.html'))
+        self.assertEqual(*self.actual_expected_contents('content.html'))
+        self.assertEqual(*self.actual_expected_contents('content.Class.html'))
+        self.assertEqual(*self.actual_expected_contents('content.ClassDocumentingItsMembers.html'))
+        self.assertEqual(*self.actual_expected_contents('page.html'))
+
 class ParseDocstrings(BaseInspectTestCase):
     def test(self):
         self.run_python({
@@ -57,6 +83,79 @@ class ParseDocstrings(BaseInspectTestCase):
         self.assertEqual(*self.actual_expected_contents('content_parse_docstrings.html'))
         self.assertEqual(*self.actual_expected_contents('content_parse_docstrings.Class.html'))
 
+    def test_docstring_cache(self):
+        # The first run populates the cache, the second should take
+        # everything from there without calling the docstring hooks and
+        # produce the same output
+        counts = []
+        for i in range(2):
+            telemetry = Telemetry()
+            with self.assertLogs() as logs:
+                self.run_python({
+                    'PLUGINS': ['m.sphinx'],
+                    'M_SPHINX_PARSE_DOCSTRINGS': True,
+                    'DOCSTRING_CACHE': os.path.join(self.path, 'output', 'docstrings.cache')
+                }, telemetry=telemetry)
+            counts += [telemetry.counts()]
+            self.assertEqual(*self.actual_expected_contents('content_parse_docstrings.html'))
+            self.assertEqual(*self.actual_expected_contents('content_parse_docstrings.Class.html'))
+
+            # The docstring that fails to parse isn't cached, so the error is
+            # reported again
+            self.assertEqual(len([i for i in logs.output if 'Failed to process a docstring' in i]), 1)
+
+        # Repeated fragments such as empty docs are cache hits even in the
+        # first run
+        self.assertEqual(counts[1]['docstrings cache misses'], 1)
+        self.assertEqual(counts[1]['docstrings cache hits'], counts[0]['docstrings cache hits'] + counts[0]['docstrings cache misses'] - 1)
+
+class DocstringCacheExternalFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config = copy.deepcopy(default_config)
+        self.config['INPUT'] = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_tagfiles(self):
+        with open(os.path.join(self.tmp.name, 'corrade.tag'), 'w') as f:
+            f.write('<tagfile></tagfile>')
+        self.config['M_DOX_TAGFILES'] = [('corrade.tag', 'https://doc.magnum.graphics/corrade/', [])]
+        fingerprint = docstring_cache_fingerprint(self.config)
+
+        # A changed tagfile changes the links, so the cache can't be reused
+        with open(os.path.join(self.tmp.name, 'corrade.tag'), 'w') as f:
+            f.write('<tagfile><compound/></tagfile>')
+        self.assertNotEqual(docstring_cache_fingerprint(self.config), fingerprint)
+
+    def test_file_dependencies_not_cached(self):
+        import jinja2
+        import m.filesize
+        import m.htmlsanity
+        m.htmlsanity.register_mcss(mcss_settings=self.config, jinja_environment=jinja2.Environment())
+        m.filesize.register_mcss(mcss_settings=self.config)
+
+        with open(os.path.join(self.tmp.name, 'file.bin'), 'wb') as f:
+            f.write(b'a'*1000)
+
+        state = State(self.config)
+        state.docstring_cache = DocstringCache(rendercache.PickleCache(), 'fingerprint')
+        state.docstring_cache.scope = [('MODULE', ['module'], None)]
+
+        # A plain fragment is taken from the cache the second time
+        self.assertEqual(python.render_rst(state, 'Hello.'), '<p>Hello.</p>')
+        self.assertEqual(python.render_rst(state, 'Hello.'), '<p>Hello.</p>')
+        self.assertEqual(state.docstring_cache.stats['cache hits'], 1)
+
+        # A fragment reading a file isn't, as it may change without the
+        # fragment changing
+        self.assertEqual(python.render_rst(state, 'Size: :filesize:`{filename}/file.bin`'), '<p>Size: <span>1000.0 B</span></p>')
+        with open(os.path.join(self.tmp.name, 'file.bin'), 'wb') as f:
+            f.write(b'a'*2000)
+        self.assertEqual(python.render_rst(state, 'Size: :filesize:`{filename}/file.bin`'), '<p>Size: <span>2.0 kB</span></p>')
+        self.assertEqual(state.docstring_cache.stats['cache hits'], 1)
+
 class HtmlEscape(BaseInspectTestCase):
     def test(self):
         self.run_python({
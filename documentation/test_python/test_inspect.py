@@ -25,10 +25,13 @@
 
 import copy
 import math
+import multiprocessing
 import os
 import sys
 import unittest
 
+from _search import searchdata_filename
+from _telemetry import Telemetry
 from python import default_templates
 from . import BaseInspectTestCase, parse_version
 
@@ -75,6 +78,90 @@ class String(BaseInspectTestCase):
         self.assertEqual(*self.actual_expected_contents('inspect_string/subpackage/inner.pyi'))
         self.assertEqual(*self.actual_expected_contents('inspect_string/another_module.pyi'))
 
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), "parallel rendering requires the fork start method")
+    def test_parallel(self):
+        sys.path.append(self.path)
+        self.run_python({
+            'LINKS_NAVBAR1': [
+                ('Modules', 'modules', []),
+                ('Classes', 'classes', [])],
+            'INPUT_MODULES': ['inspect_string', 'inspect_string.subpackage', 'inspect_string.subpackage.inner']
+        }, jobs=3)
+        self.assertEqual(*self.actual_expected_contents('inspect_string.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_string.subpackage.inner.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_string.Foo.html'))
+        # Summaries of modules and classes rendered in the workers are
+        # propagated back for the index pages
+        self.assertEqual(*self.actual_expected_contents('classes.html'))
+        self.assertEqual(*self.actual_expected_contents('modules.html'))
+
+        # The search data are exactly the same as with a single job
+        serialized = []
+        for jobs in [1, 3]:
+            self.run_python({
+                'INPUT_MODULES': ['inspect_string', 'inspect_string.subpackage', 'inspect_string.subpackage.inner'],
+                'SEARCH_DISABLED': False,
+                'SEARCH_DOWNLOAD_BINARY': True
+            }, jobs=jobs)
+            with open(os.path.join(self.path, 'output', searchdata_filename.format(search_filename_prefix='searchdata')), 'rb') as f:
+                serialized += [f.read()]
+        self.assertEqual(serialized[0], serialized[1])
+
+    def test_crawl_cache(self):
+        sys.path.append(self.path)
+
+        # The first run crawls and caches the package, the second restores it
+        # from the cache and keeps the pages from the first run, with
+        # everything else including search data being the same
+        counts = []
+        phases = []
+        outputs = []
+        for i in range(2):
+            telemetry = Telemetry()
+            self.run_python({
+                'INPUT_MODULES': ['inspect_string', 'inspect_string.subpackage', 'inspect_string.subpackage.inner'],
+                'SEARCH_DISABLED': False,
+                'SEARCH_DOWNLOAD_BINARY': True,
+                'CRAWL_CACHE': os.path.join(self.path, 'output', 'crawl.cache')
+            }, telemetry=telemetry)
+            counts += [telemetry.counts()]
+            phases += [telemetry.phases]
+            output = {}
+            for file in os.listdir(os.path.join(self.path, 'output')):
+                if file == 'crawl.cache': continue
+                with open(os.path.join(self.path, 'output', file), 'rb') as f:
+                    output[file] = f.read()
+            outputs += [output]
+
+        self.assertEqual(counts[0]['crawl cache misses'], 1)
+        self.assertEqual(counts[1]['crawl cache hits'], 1)
+        self.assertNotIn('crawl cache misses', counts[1])
+        # Nothing from the package got rendered again
+        self.assertIn('module render', phases[0])
+        self.assertNotIn('module render', phases[1])
+        self.assertNotIn('class render', phases[1])
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_static(self):
+        sys.path.append(self.path)
+        self.run_python({
+            'LINKS_NAVBAR1': [
+                ('Modules', 'modules', []),
+                ('Classes', 'classes', [])],
+            'INPUT_MODULES': ['inspect_string', 'inspect_string.subpackage', 'inspect_string.subpackage.inner'],
+            'STATIC_CRAWL': True
+        })
+        # The output is the same as when importing the module
+        self.assertEqual(*self.actual_expected_contents('inspect_string.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_string.subpackage.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_string.subpackage.inner.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_string.another_module.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_string.Foo.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_string.FooSlots.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_string.Specials.html'))
+        self.assertEqual(*self.actual_expected_contents('classes.html'))
+        self.assertEqual(*self.actual_expected_contents('modules.html'))
+
 class Object(BaseInspectTestCase):
     def test(self):
         # Reuse the stuff from inspect_string, but this time reference it via
@@ -351,3 +438,30 @@ class DuplicateClass(BaseInspectTestCase):
         self.assertEqual(*self.actual_expected_contents('inspect_duplicate_class.html'))
         self.assertEqual(*self.actual_expected_contents('inspect_duplicate_class.sub.html'))
         self.assertEqual(*self.actual_expected_contents('inspect_duplicate_class.Bar.html'))
+
+class Static(BaseInspectTestCase):
+    def test(self):
+        self.run_python({
+            'STATIC_CRAWL': True
+        })
+        # The module raises an exception on import and depends on a module
+        # that doesn't exist, neither of which matters
+        self.assertNotIn('inspect_static', sys.modules)
+        self.assertNotIn('some_unavailable_package', sys.modules)
+        self.assertEqual(*self.actual_expected_contents('inspect_static.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_static.Base.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_static.stub.html'))
+
+class StaticEdgeCases(BaseInspectTestCase):
+    def test(self):
+        with self.assertLogs() as logs:
+            self.run_python({
+                'STATIC_CRAWL': True
+            })
+        # The circular import gets resolved once the first module is done
+        self.assertEqual([i for i in logs.output if "can't statically import" in i], [])
+        self.assertNotIn('inspect_static_edge_cases', sys.modules)
+        self.assertEqual(*self.actual_expected_contents('inspect_static_edge_cases.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_static_edge_cases.first.First.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_static_edge_cases.second.Second.html'))
+        self.assertEqual(*self.actual_expected_contents('inspect_static_edge_cases.second.Token.html'))
@@ -77,6 +77,7 @@ class Plugins(BaseTestCase):
             'INPUT_PAGES': ['index.rst', 'dot.rst', 'plots.rst'],
             'M_HTMLSANITY_SMART_QUOTES': True,
             'M_DOT_FONT': 'DejaVu Sans',
+            'M_DOT_CACHE_FILE': None,
             'M_PLOTS_FONT': 'DejaVu Sans',
             'M_DOX_TAGFILES': [
                 (os.path.join(self.path, '../../../doc/documentation/corrade.tag'), 'https://doc.magnum.graphics/corrade/')
@@ -45,137 +45,129 @@ class Search(BaseInspectTestCase):
             serialized = f.read()
             search_data_pretty = pretty_print(serialized, entryTypeClass=EntryType)[0]
         #print(search_data_pretty)
-        self.assertEqual(len(serialized), 2274)
+        self.assertEqual(len(serialized), 1564)
         self.assertEqual(search_data_pretty, """
 21 symbols
-search [14]
+search [0]
 ||    .$
-||     foo [7]
+||     foo [3]
 ||     || .$
-||     ||  enum [0]
+||     ||  enum [16]
 ||     || ||   .$
-||     || ||    a_value [1]
-||     || ||     nother [2]
-||     || |a_method [3]
+||     || ||    a_value [17]
+||     || ||     nother [18]
+||     || |a_method [7]
 ||     || || |     ($
-||     || || |      ) [4]
-||     || || property [5]
-||     || |data_declaration [6]
-||     || withslots [9]
+||     || || |      ) [7()]
+||     || || property [14]
+||     || |data_declaration [19]
+||     || withslots [5]
 ||     || |        .$
-||     || |         im_a_sloth [8]
-||     |unc_with_params [12]
+||     || |         im_a_sloth [15]
+||     |unc_with_params [9]
 ||     ||              ($
-||     ||               ) [13]
-||     a_function [10]
+||     ||               ) [9()]
+||     a_function [6]
 ||     |         ($
-||     |          ) [11]
-||     pybind [26]
+||     |          ) [6()]
+||     pybind [2]
 ||     |     .$
-||     |      foo [21]
+||     |      foo [4]
 ||     |       | .$
-||     |       |  overloaded_method [17, 19, 15]
+||     |       |  overloaded_method [11, 12, 13]
 ||     |       |                   ($
-||     |       |                    ) [18, 20, 16]
-||     |       unction [22]
+||     |       |                    ) [11(), 12(), 13()]
+||     |       unction [8]
 ||     |       |      ($
-||     |       |       ) [23]
-||     |       |      _with_params [24]
+||     |       |       ) [8()]
+||     |       |      _with_params [10]
 ||     |       |      |           ($
-||     |       |      |            ) [25]
-||     sub [28]
+||     |       |      |            ) [10()]
+||     sub [1]
 ||     |  .$
-||     |   data_in_a_submodule [27]
-|ub [28]
+||     |   data_in_a_submodule [20]
+|ub [1]
 || .$
-||  data_in_a_submodule [27]
-foo [7, 21]
+||  data_in_a_submodule [20]
+foo [3, 4]
 || .$
-||  enum [0]
+||  enum [16]
 || ||   .$
-|| ||    a_value [1]
-|| ||     nother [2]
-|| |a_method [3]
+|| ||    a_value [17]
+|| ||     nother [18]
+|| |a_method [7]
 || || |     ($
-|| || |      ) [4]
-|| || property [5]
-|| |data_declaration [6]
-|| |overloaded_method [17, 19, 15]
+|| || |      ) [7()]
+|| || property [14]
+|| |data_declaration [19]
+|| |overloaded_method [11, 12, 13]
 || ||                ($
-|| ||                 ) [18, 20, 16]
-|| withslots [9]
+|| ||                 ) [11(), 12(), 13()]
+|| withslots [5]
 || |        .$
-|| |         im_a_sloth [8]
-|unc_with_params [12]
+|| |         im_a_sloth [15]
+|unc_with_params [9]
 ||  |           ($
-||  |            ) [13]
-||  tion [22]
+||  |            ) [9()]
+||  tion [8]
 ||  |   ($
-||  |    ) [23]
-||  |   _with_params [24]
+||  |    ) [8()]
+||  |   _with_params [10]
 ||  |   |           ($
-||  |   |            ) [25]
-enum [0]
+||  |   |            ) [10()]
+enum [16]
 |   .$
-|    a_value [1]
-|     nother [2]
-a_value [1]
-||method [3]
+|    a_value [17]
+|     nother [18]
+a_value [17]
+||method [7]
 |||     ($
-|||      ) [4]
-||property [5]
-||function [10]
+|||      ) [7()]
+||property [14]
+||function [6]
 |||       ($
-|||        ) [11]
-|nother [2]
-data_declaration [6]
-|    in_a_submodule [27]
-im_a_sloth [8]
-pybind [26]
+|||        ) [6()]
+|nother [18]
+data_declaration [19]
+|    in_a_submodule [20]
+im_a_sloth [15]
+pybind [2]
 |     .$
-|      foo [21]
+|      foo [4]
 |       | .$
-|       |  overloaded_method [17, 19, 15]
+|       |  overloaded_method [11, 12, 13]
 |       |                   ($
-|       |                    ) [18, 20, 16]
-|       unction [22]
+|       |                    ) [11(), 12(), 13()]
+|       unction [8]
 |       |      ($
-|       |       ) [23]
-|       |      _with_params [24]
+|       |       ) [8()]
+|       |      _with_params [10]
 |       |      |           ($
-|       |      |            ) [25]
-overloaded_method [17, 19, 15]
+|       |      |            ) [10()]
+overloaded_method [11, 12, 13]
 |                ($
-|                 ) [18, 20, 16]
-0: .Enum [prefix=7[:15], type=ENUM] -> #Enum
-1: .A_VALUE [prefix=0[:20], type=ENUM_VALUE] -> -A_VALUE
-2: .ANOTHER [prefix=0[:20], type=ENUM_VALUE] -> -ANOTHER
-3: .a_method() [prefix=7[:15], suffix_length=2, type=FUNCTION] -> #a_method
-4:  [prefix=3[:24], type=FUNCTION] ->
-5: .a_property [prefix=7[:15], type=PROPERTY] -> #a_property
-6: .DATA_DECLARATION [prefix=7[:15], type=DATA] -> #DATA_DECLARATION
-7: .Foo [prefix=14[:7], type=CLASS] -> Foo.html
-8: .im_a_sloth [prefix=9[:24], type=PROPERTY] -> #im_a_sloth
-9: WithSlots [prefix=7[:10], type=CLASS] -> WithSlots.html
-10: .a_function() [prefix=14[:11], suffix_length=2, type=FUNCTION] -> #a_function
-11:  [prefix=10[:22], type=FUNCTION] ->
-12: .func_with_params() [prefix=14[:11], suffix_length=2, type=FUNCTION] -> #func_with_params
-13:  [prefix=12[:28], type=FUNCTION] ->
-14: search [type=MODULE] -> search.html
-15: .overloaded_method(self, first: int, second: float) [prefix=21[:22], suffix_length=33, type=FUNCTION] -> #overloaded_method-27269
-16:  [prefix=15[:46], suffix_length=31, type=FUNCTION] ->
-17: .overloaded_method(self, arg0: int) [prefix=21[:22], suffix_length=17, type=FUNCTION] -> #overloaded_method-745a3
-18:  [prefix=17[:46], suffix_length=15, type=FUNCTION] ->
-19: .overloaded_method(self, arg0: int, arg1: Foo) [prefix=21[:22], suffix_length=28, type=FUNCTION] -> #overloaded_method-41cfb
-20:  [prefix=19[:46], suffix_length=26, type=FUNCTION] ->
-21: .Foo [prefix=26[:14], type=CLASS] -> Foo.html
-22: .function() [prefix=26[:18], suffix_length=2, type=FUNCTION] -> #function
-23:  [prefix=22[:27], type=FUNCTION] ->
-24: .function_with_params() [prefix=26[:18], suffix_length=2, type=FUNCTION] -> #function_with_params
-25:  [prefix=24[:39], type=FUNCTION] ->
-26: .pybind [prefix=14[:7], type=MODULE] -> pybind.html
-27: .DATA_IN_A_SUBMODULE [prefix=28[:15], type=DATA] -> #DATA_IN_A_SUBMODULE
-28: .sub [prefix=14[:7], type=MODULE] -> sub.html
+|                 ) [11(), 12(), 13()]
+0: search [type=MODULE] -> search.html
+1: .sub [prefix=0[:7], type=MODULE] -> sub.html
+2: .pybind [prefix=0[:7], type=MODULE] -> pybind.html
+3: .Foo [prefix=0[:7], type=CLASS] -> Foo.html
+4: .Foo [prefix=2[:14], type=CLASS] -> Foo.html
+5: WithSlots [prefix=3[:10], type=CLASS] -> WithSlots.html
+6: .a_function() [prefix=0[:11], suffix_length=2, type=FUNCTION] -> #a_function
+7: .a_method() [prefix=3[:15], suffix_length=2, type=FUNCTION] -> #a_method
+8: .function() [prefix=2[:18], suffix_length=2, type=FUNCTION] -> #function
+9: .func_with_params() [prefix=0[:11], suffix_length=2, type=FUNCTION] -> #func_with_params
+10: .function_with_params() [prefix=2[:18], suffix_length=2, type=FUNCTION] -> #function_with_params
+11: .overloaded_method(self, arg0: int) [prefix=4[:22], suffix_length=17, type=FUNCTION] -> #overloaded_method-745a3
+12: .overloaded_method(self, arg0: int, arg1: Foo) [prefix=4[:22], suffix_length=28, type=FUNCTION] -> #overloaded_method-41cfb
+13: .overloaded_method(self, first: int, second: float) [prefix=4[:22], suffix_length=33, type=FUNCTION] -> #overloaded_method-27269
+14: .a_property [prefix=3[:15], type=PROPERTY] -> #a_property
+15: .im_a_sloth [prefix=5[:24], type=PROPERTY] -> #im_a_sloth
+16: .Enum [prefix=3[:15], type=ENUM] -> #Enum
+17: .A_VALUE [prefix=16[:20], type=ENUM_VALUE] -> -A_VALUE
+18: .ANOTHER [prefix=16[:20], type=ENUM_VALUE] -> -ANOTHER
+19: .DATA_DECLARATION [prefix=3[:15], type=DATA] -> #DATA_DECLARATION
+20: .DATA_IN_A_SUBMODULE [prefix=1[:15], type=DATA] -> #DATA_IN_A_SUBMODULE
 (EntryType.PAGE, CssClass.SUCCESS, 'page'),
 (EntryType.MODULE, CssClass.PRIMARY, 'module'),
 (EntryType.CLASS, CssClass.PRIMARY, 'class'),
@@ -188,10 +180,10 @@ overloaded_method [17, 19, 15]
 
     def test_byte_sizes(self):
         for config, bytes, size in [
-            ('SEARCH_RESULT_ID_BYTES', 3, 2333),
-            ('SEARCH_RESULT_ID_BYTES', 4, 2392),
-            ('SEARCH_FILE_OFFSET_BYTES', 4, 2525),
-            ('SEARCH_NAME_SIZE_BYTES', 2, 2313)
+            ('SEARCH_RESULT_ID_BYTES', 3, 1584),
+            ('SEARCH_RESULT_ID_BYTES', 4, 1604),
+            ('SEARCH_FILE_OFFSET_BYTES', 4, 1586),
+            ('SEARCH_NAME_SIZE_BYTES', 2, 1592)
         ]:
             with self.subTest(config=config, bytes=bytes, size=size):
                 self.run_python({
@@ -217,23 +209,21 @@ class LongSuffixLength(BaseInspectTestCase):
             serialized = f.read()
             search_data_pretty = pretty_print(serialized, entryTypeClass=EntryType)[0]
         #print(search_data_pretty)
-        self.assertEqual(len(serialized), 638)
+        self.assertEqual(len(serialized), 486)
         # The parameters get cut off with an ellipsis
         self.assertEqual(search_data_pretty, """
 3 symbols
-search_long_suffix_length [4]
+search_long_suffix_length [0]
 |                        .$
-|                         many_parameters [0, 2]
+|                         many_parameters [1, 2]
 |                                        ($
-|                                         ) [1, 3]
-many_parameters [0, 2]
+|                                         ) [1(), 2()]
+many_parameters [1, 2]
 |              ($
-|               ) [1, 3]
-0: .many_parameters(arg0: tuple[float, int, str, list[tuple[int, int…) [prefix=4[:30], suffix_length=53, type=FUNCTION] -> #many_parameters-a4d3e
-1:  [prefix=0[:52], suffix_length=51, type=FUNCTION] ->
-2: .many_parameters(arg0: tuple[int, float, str, list[tuple[int, int…) [prefix=4[:30], suffix_length=53, type=FUNCTION] -> #many_parameters-99883
-3:  [prefix=2[:52], suffix_length=51, type=FUNCTION] ->
-4: search_long_suffix_length [type=MODULE] -> search_long_suffix_length.html
+|               ) [1(), 2()]
+0: search_long_suffix_length [type=MODULE] -> search_long_suffix_length.html
+1: .many_parameters(arg0: tuple[float, int, str, list[tuple[int, int…) [prefix=0[:30], suffix_length=53, type=FUNCTION] -> #many_parameters-a4d3e
+2: .many_parameters(arg0: tuple[int, float, str, list[tuple[int, int…) [prefix=0[:30], suffix_length=53, type=FUNCTION] -> #many_parameters-99883
 (EntryType.PAGE, CssClass.SUCCESS, 'page'),
 (EntryType.MODULE, CssClass.PRIMARY, 'module'),
 (EntryType.CLASS, CssClass.PRIMARY, 'class'),
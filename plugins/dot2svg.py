@@ -23,8 +23,13 @@
 #   DEALINGS IN THE SOFTWARE.
 #
 
+import collections
 import re
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import rendercache
 
 _patch_src = re.compile(r"""<\?xml version="1\.0" encoding="UTF-8" standalone="no"\?>
 <!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1\.1//EN"
@@ -65,7 +70,38 @@ _font_size = 0.0
 # converting to rem here
 def _pt2em(pt): return pt/_font_size
 
-def dot2svg(source, size=None, attribs=''):
+# How many times dot was invoked to render a graph and how many graphs were
+# fetched from the cache, for build statistics. Rendering may happen from
+# multiple threads, so it's guarded by a lock.
+stats = collections.Counter()
+_stats_lock = threading.Lock()
+
+# Version of the cache format, bump when the stored data change
+_cache_version = 0
+
+_cache = None
+
+# If not None, every graph that gets fetched or rendered is recorded here as
+# well (cache key -> (dot output,)). Used by doxygen.py to propagate cache
+# updates from worker processes back to the parent process, see
+# merge_cache_updates().
+cache_updates = None
+
+# Queried on first use
+_version = None
+def _dot_version():
+    global _version
+    if _version is None:
+        try:
+            ret = subprocess.run(['dot', '-V'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            # Printed to stderr, at least in 2.40 to 12.x
+            _version = (ret.stdout + ret.stderr).decode('utf-8').strip()
+        except FileNotFoundError:
+            _version = ''
+    return _version
+
+def _render(source):
+    with _stats_lock: stats['dot'] += 1
     try:
         ret = subprocess.run(['dot', '-Tsvg',
             '-Gfontname={}'.format(_font),
@@ -80,9 +116,68 @@ def dot2svg(source, size=None, attribs=''):
         ret.check_returncode()
     except FileNotFoundError: # pragma: no cover
         raise RuntimeError("dot not found")
+    return ret.stdout.decode('utf-8')
+
+# Everything that affects the dot output
+def _cache_key(source):
+    return repr((_cache_version, _dot_version(), _font, _font_size, source))
+
+# Graphs rendered by prefetch() (source -> dot output). If the cache is used,
+# _fetch_cached_or_render() moves them there.
+_prefetched = {}
+
+# How many dot processes to run in parallel in prefetch() at most. None means
+# CPU count.
+jobs = None
+
+# Render all graphs that aren't in the cache yet in parallel, so subsequent
+# dot2svg() calls don't need to wait for each dot process separately. Call
+# with all graphs on a page before processing it.
+def prefetch(sources):
+    to_render = []
+    for source in sources:
+        if source in _prefetched or source in to_render or (_cache and _cache_key(source) in _cache): continue
+        to_render += [source]
+    if not to_render: return
+
+    if len(to_render) == 1:
+        rendered = [_render(to_render[0])]
+    else:
+        # The heavy lifting is done by external processes, so threads are
+        # enough. The results are in the same order as the sources.
+        with ThreadPoolExecutor(jobs) as executor:
+            rendered = list(executor.map(_render, to_render))
+
+    for source, out in zip(to_render, rendered):
+        _prefetched[source] = out
+
+# Fetch cached dot output or render it and add to the cache. Only the raw
+# output is cached, as the size and attributes affect just the patching done
+# afterwards.
+def _fetch_cached_or_render(source):
+    # Cache not used, pass through
+    if not _cache:
+        if source in _prefetched: return _prefetched[source]
+        return _render(source)
+
+    key = _cache_key(source)
+    entry = _cache.get(key)
+    if entry is None:
+        stats['cache misses'] += 1
+        if source in _prefetched:
+            entry = (_prefetched.pop(source),)
+        else:
+            entry = (_render(source),)
+        _cache.put(key, *entry)
+    else:
+        stats['cache hits'] += 1
+    if cache_updates is not None:
+        cache_updates[key] = entry
+    return entry[0]
 
+def dot2svg(source, size=None, attribs=''):
     # First remove comments
-    svg = _comment_src.sub('', ret.stdout.decode('utf-8'))
+    svg = _comment_src.sub('', _fetch_cached_or_render(source))
 
     # Remove preamble and fixed size
     if size:
@@ -128,3 +223,30 @@ def configure(font, font_size):
     _font = font
     _font_size = font_size
     _text_src = re.compile(_text_src_src.format(font=_font))
+    # Rendered with different font settings
+    _prefetched.clear()
+
+# Loads the graph cache. If the file is None, the cache is only in memory for
+# the duration of the run, if it's a directory (or ends with a path
+# separator), a rendercache.DirectoryCache shareable among projects is used,
+# otherwise a rendercache.PickleCache. Use set_cache() to supply a custom
+# implementation.
+def load_cache(file):
+    # The key contains everything already
+    set_cache(rendercache.load(file, _cache_version, lambda: ''))
+
+# The cache needs to implement `key in cache`, get(key) returning a
+# (dot output,) tuple or None, put(key, dot output) and save()
+def set_cache(cache):
+    global _cache
+    _cache = cache
+    _prefetched.clear()
+
+def merge_cache_updates(updates):
+    # Same as latex2svgextra.merge_cache_updates()
+    for key, entry in updates.items():
+        if _cache.get(key) is None:
+            _cache.put(key, *entry)
+
+def save_cache():
+    if _cache: _cache.save()
@@ -25,11 +25,14 @@
 #   DEALINGS IN THE SOFTWARE.
 #
 
+import collections
 import os
 import sys
 import subprocess
+import threading
 import shlex
 import re
+from hashlib import sha1
 from tempfile import TemporaryDirectory
 from ctypes.util import find_library
 
@@ -62,6 +65,9 @@ default_params = {
     'latex_cmd': latex_cmd,
     'dvisvgm_cmd': dvisvgm_cmd,
     'libgs': None,
+    # If set, the preamble is compiled into a LaTeX format file once and put
+    # into this directory, and all formulas are then compiled against it
+    'format_dir': None,
 }
 
 libgs = find_library('gs')
@@ -109,6 +115,99 @@ elif '.so.10' in str(libgs):
         else:
             raise RuntimeError('libgs found by linker magic, but is not in {}'.format(' or '.join(prefixes)))
 
+# TeX version string, used to invalidate precompiled formats on upgrade.
+# Queried only once.
+_tex_version = None
+
+# Formats that failed to compile, to not try again for every formula
+_failed_formats = set()
+
+# How many times each tool was invoked to render something, for build
+# statistics. Rendering may happen from multiple threads, so it's guarded by
+# a lock.
+stats = collections.Counter()
+_stats_lock = threading.Lock()
+
+def _count(tool):
+    with _stats_lock: stats[tool] += 1
+
+def precompile_preamble(params=default_params):
+    """Compile the preamble into a LaTeX format file.
+
+    The format is put into ``params['format_dir']``, named after a hash of the
+    document preamble and TeX version, and reused if it's already there. Uses
+    the `mylatexformat` package, which makes documents compiled against the
+    format skip their own preamble.
+
+    Parameters
+    ----------
+    params : dict
+        Conversion parameters.
+
+    Returns
+    -------
+    str or None
+        Name of the format to pass to ``latex -fmt``, or None if
+        ``params['format_dir']`` is not set or the compilation failed.
+    """
+    if not params['format_dir']:
+        return None
+
+    global _tex_version
+    if _tex_version is None:
+        try:
+            ret = subprocess.run(shlex.split(params['latex_cmd'])[:1] + ['--version'],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            raise RuntimeError('latex not found')
+        _tex_version = ret.stdout.decode('utf-8').partition('\n')[0]
+
+    # Everything before \begin{document} goes into the format
+    preamble = (params['template']
+                .replace('{{ preamble }}', params['preamble'])
+                .replace('{{ fontsize }}', str(params['fontsize'])))
+    preamble = preamble[:preamble.find(r'\begin{document}')]
+    name = 'latex2svg-' + sha1((_tex_version + '\n' + params['latex_cmd'] + '\n' + preamble).encode('utf-8')).hexdigest()
+
+    if os.path.exists(os.path.join(params['format_dir'], name + '.fmt')):
+        return name
+    if name in _failed_formats:
+        return None
+
+    with TemporaryDirectory() as tmpdir:
+        with open(os.path.join(tmpdir, 'preamble.tex'), 'w') as f:
+            f.write(preamble + '\\begin{document}\n\\end{document}\n')
+
+        _count('latex')
+        ret = subprocess.run(shlex.split(params['latex_cmd']) +
+                             ['-ini', '-jobname=' + name, '&latex', 'mylatexformat.ltx', 'preamble.tex'],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             cwd=tmpdir)
+        if ret.returncode or not os.path.exists(os.path.join(tmpdir, name + '.fmt')):
+            print(ret.stdout.decode('utf-8'))
+            print('Warning: preamble precompilation failed, is the mylatexformat package installed?')
+            _failed_formats.add(name)
+            return None
+
+        # Move the file into place atomically so parallel runs don't see a
+        # partially written format
+        os.makedirs(params['format_dir'], exist_ok=True)
+        os.replace(os.path.join(tmpdir, name + '.fmt'), os.path.join(params['format_dir'], name + '.fmt'))
+    return name
+
+# Returns the LaTeX command and environment, using a precompiled format if
+# enabled
+def _latex_cmd(params):
+    cmd = shlex.split(params['latex_cmd'])
+    env = None
+    format = precompile_preamble(params)
+    if format:
+        cmd += ['-fmt=' + format]
+        env = os.environ.copy()
+        # The trailing separator makes the default paths searched as well
+        env['TEXFORMATS'] = os.path.abspath(params['format_dir']) + os.pathsep
+    return cmd + ['code.tex'], env
+
 def latex2svg(code, params=default_params, working_directory=None):
     """Convert LaTeX to SVG using dvisvgm.
 
@@ -146,9 +245,11 @@ def latex2svg(code, params=default_params, working_directory=None):
 
     # Run LaTeX and create DVI file
     try:
-        ret = subprocess.run(shlex.split(params['latex_cmd']+' code.tex'),
+        cmd, env = _latex_cmd(params)
+        _count('latex')
+        ret = subprocess.run(cmd,
                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             cwd=working_directory)
+                             cwd=working_directory, env=env)
         # LaTeX prints errors on stdout instead of stderr (stderr is empty),
         # so print stdout instead
         if ret.returncode: print(ret.stdout.decode('utf-8'))
@@ -163,6 +264,7 @@ def latex2svg(code, params=default_params, working_directory=None):
 
     # Convert DVI to SVG
     try:
+        _count('dvisvgm')
         ret = subprocess.run(shlex.split(params['dvisvgm_cmd']+' code.dvi'),
                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                              cwd=working_directory, env=env)
@@ -204,6 +306,101 @@ def latex2svg(code, params=default_params, working_directory=None):
     depth = get_measure(output, 'depth')
     return {'svg': svg, 'depth': depth, 'width': width, 'height': height}
 
+def latex2svg_batch(codes, params=default_params, working_directory=None):
+    """Convert multiple LaTeX snippets to SVG using a single LaTeX and dvisvgm
+    invocation.
+
+    Each snippet is put into its own ``preview`` environment, resulting in a
+    multi-page DVI file that's then converted page-by-page. If the template
+    doesn't have a ``preview`` environment or the batch fails to compile, the
+    snippets are rendered one by one with `latex2svg()` instead, so an error
+    is reported for the offending snippet only.
+
+    Parameters
+    ----------
+    codes : list of str
+        LaTeX code snippets to render.
+    params : dict
+        Conversion parameters.
+    working_directory : str or None
+        Working directory for external commands and place for temporary files.
+
+    Returns
+    -------
+    list of dict
+        Output of `latex2svg()` for each snippet, in the same order.
+    """
+    if len(codes) < 2 or r'\begin{preview}' not in params['template']:
+        return [latex2svg(code, params, working_directory) for code in codes]
+
+    if working_directory is None:
+        with TemporaryDirectory() as tmpdir:
+            return latex2svg_batch(codes, params, working_directory=tmpdir)
+
+    # Close the preview environment after each snippet and open a new one,
+    # making each a separate page
+    fontsize = params['fontsize']
+    document = (params['template']
+                .replace('{{ preamble }}', params['preamble'])
+                .replace('{{ fontsize }}', str(fontsize))
+                .replace('{{ code }}', '\n\\end{preview}\n\\begin{preview}\n'.join(codes)))
+
+    with open(os.path.join(working_directory, 'code.tex'), 'w') as f:
+        f.write(document)
+
+    # Run LaTeX and create DVI file. If that fails, fall back to rendering
+    # each snippet separately to know which one was the culprit.
+    try:
+        cmd, env = _latex_cmd(params)
+        _count('latex')
+        ret = subprocess.run(cmd,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             cwd=working_directory, env=env)
+    except FileNotFoundError:
+        raise RuntimeError('latex not found')
+    if ret.returncode:
+        return [latex2svg(code, params) for code in codes]
+
+    # Add LIBGS to environment if supplied
+    env = os.environ.copy()
+    if params['libgs']:
+        env['LIBGS'] = params['libgs']
+
+    # Convert all pages of the DVI to SVG
+    try:
+        _count('dvisvgm')
+        ret = subprocess.run(shlex.split(params['dvisvgm_cmd']+' --page=1- code.dvi'),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             cwd=working_directory, env=env)
+        if ret.returncode: print(ret.stderr.decode('utf-8'))
+        ret.check_returncode()
+    except FileNotFoundError:
+        raise RuntimeError('dvisvgm not found')
+
+    output = ret.stderr.decode('utf-8')
+    if 'Ghostscript not found' in output:
+        raise RuntimeError('libgs not detected by dvisvgm, point the LIBGS environment variable to its location')
+
+    # The output is split into a section for every page, each with its own
+    # size, alignment and output filename
+    pages = re.split(r'^processing page \d+', output, flags=re.MULTILINE)[1:]
+    if len(pages) != len(codes):
+        raise RuntimeError('dvisvgm produced {} pages for {} formulas'.format(len(pages), len(codes)))
+
+    out = []
+    for page in pages:
+        match = re.search(r'output written to (\S+\.svg)', page)
+        with open(os.path.join(working_directory, match.group(1)), 'r') as f:
+            # Make the page ID the same as if the snippet was rendered alone
+            svg = re.sub(r"id='page\d+'", "id='page1'", f.read())
+
+        match = re.search(r'\b([0-9.]+)pt x ([0-9.]+)pt', page)
+        width, height = (float(match.group(1))/fontsize, float(match.group(2))/fontsize) if match else (None, None)
+        match = re.search(r'\bdepth=([0-9.e-]+)pt', page)
+        depth = float(match.group(1))/fontsize if match else None
+        out += [{'svg': svg, 'depth': depth, 'width': width, 'height': height}]
+    return out
+
 
 def main():
     """Simple command line interface to latex2svg.
@@ -24,12 +24,15 @@
 #   DEALINGS IN THE SOFTWARE.
 #
 
+import collections
 import html
-import pickle
 import re
-from hashlib import sha1
+import shlex
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 import latex2svg
+import rendercache
 
 # Extracted common code used by both doxygen.py and the m.math plugin to
 # avoid dependency of doxygen.py on Pelican
@@ -119,59 +122,116 @@ _unique_dst = r"""\g<name>='\g<ref>eq{counter}-\g<id>'"""
 # Reset back to zero on start of a new page for reproducible behavior.
 counter = 0
 
-# Cache for rendered formulas (source formula sha1 -> (depth, svg data)). The
-# counter is not included
-_cache_version = 0
+# How many formulas were fetched from the cache and how many had to be
+# rendered, for build statistics. Invocations of LaTeX itself are counted in
+# latex2svg.stats.
+stats = collections.Counter()
+
+# Version of the cache format, bump when the stored data change
+_cache_version = 1
+
+# Queried only once, when the cache is loaded
+def _dvisvgm_version():
+    try:
+        ret = subprocess.run(shlex.split(params['dvisvgm_cmd'])[:1] + ['--version'],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        return ''
+    return ret.stdout.decode('utf-8').strip()
+
 _cache = None
 
+# If not None, every formula that gets fetched or rendered is recorded here
+# as well (formula -> (depth, svg data)). Used by doxygen.py to propagate cache
+# updates from worker processes back to the parent process, see
+# merge_cache_updates().
+cache_updates = None
+
+# Formulas rendered by prefetch() (formula -> (depth, svg data)). If the cache
+# is used, fetch_cached_or_render() moves them there.
+_prefetched = {}
+
+# How many formulas to render in a single LaTeX document in prefetch() and
+# how many such batches to render in parallel at most. None means CPU count.
+batch_size = 100
+batch_jobs = None
+
+# Render all formulas that aren't in the cache yet in batches, so subsequent
+# fetch_cached_or_render() calls don't need to invoke LaTeX for each formula
+# separately. Call with all formulas on a page before processing it. The
+# formulas have to be already wrapped in $, $$ etc. environment.
+def prefetch(formulas):
+    to_render = []
+    for formula in formulas:
+        if (_cache and formula in _cache) or formula in _prefetched or formula in to_render: continue
+        to_render += [formula]
+    if not to_render: return
+
+    batches = [to_render[i:i + batch_size] for i in range(0, len(to_render), batch_size)]
+    if len(batches) == 1:
+        rendered = latex2svg.latex2svg_batch(batches[0], params=params)
+    else:
+        # The heavy lifting is done by external processes, so threads are
+        # enough
+        with ThreadPoolExecutor(batch_jobs) as executor:
+            rendered = [out for batch in executor.map(lambda batch: latex2svg.latex2svg_batch(batch, params=params), batches) for out in batch]
+
+    for formula, out in zip(to_render, rendered):
+        _prefetched[formula] = (out['depth'], out['svg'])
+
 # Fetch cached formula or render it and add to the cache. The formula has to
 # be already wrapped in $, $$ etc. environment.
 def fetch_cached_or_render(formula):
-    global _cache
-
     # Cache not used, pass through
     if not _cache:
+        if formula in _prefetched: return _prefetched[formula]
         out = latex2svg.latex2svg(formula, params=params)
         return out['depth'], out['svg']
 
-    hash = sha1(formula.encode('utf-8')).digest()
-    if not hash in _cache[2]:
-        out = latex2svg.latex2svg(formula, params=params)
-        _cache[2][hash] = (_cache[1], out['depth'], out['svg'])
+    entry = _cache.get(formula)
+    if entry is None:
+        stats['cache misses'] += 1
+        if formula in _prefetched:
+            entry = _prefetched.pop(formula)
+        else:
+            out = latex2svg.latex2svg(formula, params=params)
+            entry = out['depth'], out['svg']
+        _cache.put(formula, *entry)
     else:
-        _cache[2][hash] = (_cache[1], _cache[2][hash][1], _cache[2][hash][2])
-    return (_cache[2][hash][1], _cache[2][hash][2])
+        stats['cache hits'] += 1
+    if cache_updates is not None:
+        cache_updates[formula] = entry
+    return entry
 
-def unpickle_cache(file):
-    global _cache
+# Loads the math cache. If the file is None, the cache is only in memory for
+# the duration of the run, if it's a directory (or ends with a path
+# separator), a rendercache.DirectoryCache is used, otherwise a
+# rendercache.PickleCache. Use set_cache() to supply a custom implementation.
+def load_cache(file):
+    # Everything that affects the rendered output, except for the formula
+    # itself. LIBGS and location of the precompiled format don't.
+    def prefix():
+        return repr((_cache_version, _dvisvgm_version(), params['fontsize'], params['template'], params['preamble'], params['latex_cmd'], params['dvisvgm_cmd']))
+    set_cache(rendercache.load(file, _cache_version, prefix))
 
-    if file:
-        with open(file, 'rb') as f:
-            _cache = pickle.load(f)
-    else:
-        _cache = None
-
-    # Reset the cache if not valid or not expected version
-    if not _cache or _cache[0] != _cache_version:
-        _cache = (_cache_version, 0, {})
-
-    # Otherwise bump cache age
-    else: _cache = (_cache[0], _cache[1] + 1, _cache[2])
-
-def pickle_cache(file):
+# The cache needs to implement `formula in cache`, get(formula) returning a
+# (depth, svg data) tuple or None, put(formula, depth, svg data) and save()
+def set_cache(cache):
     global _cache
+    _cache = cache
+    _prefetched.clear()
 
-    # Don't save any file if there is nothing
-    if not _cache or not _cache[2]: return
-
-    # Prune entries that were not used
-    cache_to_save = (_cache_version, _cache[1], {})
-    for hash, entry in _cache[2].items():
-        if entry[0] != _cache[1]: continue
-        cache_to_save[2][hash] = entry
+def merge_cache_updates(updates):
+    # Entries not present yet get added in the same order as if they were
+    # rendered in this process, existing entries get marked as used. The
+    # updates may also come from a previous run, so they're marked as used in
+    # this one.
+    for formula, entry in updates.items():
+        if _cache.get(formula) is None:
+            _cache.put(formula, *entry)
 
-    with open(file, 'wb') as f:
-        pickle.dump(cache_to_save, f)
+def save_cache():
+    if _cache: _cache.save()
 
 # Patches the output from dvisvgm
 def patch(formula, svg, depth, attribs):
@@ -36,9 +36,8 @@ from docutils.parsers.rst import Directive, directives
 import docutils.parsers.rst.directives.misc
 from docutils import io, nodes, utils, statemachine
 
-from pygments import highlight
 from pygments.formatters import HtmlFormatter
-from pygments.lexers import TextLexer, BashSessionLexer, get_lexer_by_name
+from pygments.lexers import BashSessionLexer
 
 import logging
 
@@ -46,6 +45,7 @@ logger = logging.getLogger(__name__)
 
 try:
     import ansilexer
+    import pygmentsextra
 except ImportError:
     # The above worked well on Pelican 4.2 and before, and also works with
     # other m.css tools like the Python doc generator. Pelican 4.5.0 changed to
@@ -67,20 +67,18 @@ except ImportError:
     import sys
     sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
     import ansilexer
+    import pygmentsextra
 
 filters_pre = None
 filters_post = None
 
 def _highlight(code, language, options, *, is_block, filters=[]):
-    # Use our own lexer for ANSI
-    if language == 'ansi':
-        lexer = ansilexer.AnsiLexer()
-    else:
-        try:
-            lexer = get_lexer_by_name(language)
-        except ValueError:
-            logger.warning("No lexer found for language '{}', code highlighting disabled".format(language))
-            lexer = TextLexer()
+    # Includes our own lexer for ANSI
+    try:
+        lexer = pygmentsextra.lexer_by_name(language)
+    except ValueError:
+        logger.warning("No lexer found for language '{}', code highlighting disabled".format(language))
+        lexer = pygmentsextra.lexer_by_name('text')
 
     if (isinstance(lexer, BashSessionLexer) or
         isinstance(lexer, ansilexer.AnsiLexer)):
@@ -94,9 +92,9 @@ def _highlight(code, language, options, *, is_block, filters=[]):
         del options['hl-lines']
 
     if isinstance(lexer, ansilexer.AnsiLexer):
-        formatter = ansilexer.HtmlAnsiFormatter(nowrap=True, **options)
+        formatter = pygmentsextra.formatter(ansilexer.HtmlAnsiFormatter, nowrap=True, **options)
     else:
-        formatter = HtmlFormatter(nowrap=True, **options)
+        formatter = pygmentsextra.formatter(HtmlFormatter, nowrap=True, **options)
 
     global filters_pre
     # First apply local pre filters, if any
@@ -107,7 +105,7 @@ def _highlight(code, language, options, *, is_block, filters=[]):
     f = filters_pre.get(lexer.name)
     if f: code = f(code)
 
-    highlighted = highlight(code, lexer, formatter).rstrip()
+    highlighted = pygmentsextra.highlight(code, lexer, formatter).rstrip()
     # Pygments < 2.14 leave useless empty spans in the output. Filter them out
     # to have the markup consistent across versions for easier testing.
     # TODO same is in doxygen.py, remove once support for < 2.14 is dropped
@@ -334,7 +332,10 @@ code.options = {'class': directives.class_option,
                 'language': directives.unchanged,
                 'filters': directives.unchanged}
 
-def register_mcss(mcss_settings, **kwargs):
+def save_cache(*args, **kwargs):
+    pygmentsextra.save_cache()
+
+def register_mcss(mcss_settings, hooks_post_run, **kwargs):
     rst.directives.register_directive('code', Code)
     rst.directives.register_directive('include', Include)
     rst.roles.register_canonical_role('code', code)
@@ -351,17 +352,24 @@ def register_mcss(mcss_settings, **kwargs):
     filters_pre = mcss_settings.get('M_CODE_FILTERS_PRE', {})
     filters_post = mcss_settings.get('M_CODE_FILTERS_POST', {})
 
+    # Load the cache again even if M_CODE_CACHE_FILE is not set, to not have
+    # anything left from previous runs
+    cache_file = mcss_settings.get('M_CODE_CACHE_FILE')
+    pygmentsextra.load_cache(os.path.join(mcss_settings.get('INPUT', ''), cache_file) if cache_file else None)
+    hooks_post_run += [save_cache]
+
 # Below is only Pelican-specific functionality. If Pelican is not found, these
 # do nothing.
 
 def _pelican_configure(pelicanobj):
     settings = {}
-    for key in ['M_CODE_FILTERS_PRE', 'M_CODE_FILTERS_POST']:
+    for key in ['M_CODE_FILTERS_PRE', 'M_CODE_FILTERS_POST', 'M_CODE_CACHE_FILE']:
         if key in pelicanobj.settings: settings[key] = pelicanobj.settings[key]
 
-    register_mcss(mcss_settings=settings)
+    register_mcss(mcss_settings=settings, hooks_post_run=[])
 
 def register(): # for Pelican
     from pelican import signals
 
     signals.initialized.connect(_pelican_configure)
+    signals.finalized.connect(save_cache)
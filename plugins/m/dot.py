@@ -25,6 +25,7 @@
 #   DEALINGS IN THE SOFTWARE.
 #
 
+import os
 import re
 import subprocess
 
@@ -32,6 +33,7 @@ from docutils import nodes
 from docutils.parsers import rst
 from docutils.parsers.rst import directives
 from docutils.parsers.rst.roles import set_classes
+from docutils.transforms import Transform
 
 try:
     import dot2svg
@@ -55,6 +57,27 @@ def _is_graph_figure(parent):
 
     return True
 
+# findall() is new in docutils 0.18, see m.htmlsanity for details
+_findall = nodes.Node.findall if hasattr(nodes.Node, 'findall') else nodes.Node.traverse
+
+# The directives only put an empty raw node into the document, with the graph
+# source remembered in it. This then renders all graphs in the document in
+# parallel and fills the SVGs in. The directives keep emitting a raw node so
+# m.components can put a graph figure caption after it. The transform is
+# added once for every graph, the first applied renders everything and the
+# remaining ones have nothing left to do.
+class DotTransform(Transform):
+    default_priority = 900
+
+    def apply(self):
+        graphs = [node for node in _findall(self.document, nodes.raw) if 'm-dot-source' in node]
+        dot2svg.prefetch([node['m-dot-source'] for node in graphs])
+
+        for node in graphs:
+            node.append(nodes.Text(dot2svg.dot2svg(node['m-dot-source'], attribs=node['m-dot-attribs'])))
+            del node['m-dot-source']
+            del node['m-dot-attribs']
+
 class Dot(rst.Directive):
     has_content = True
     optional_arguments = 1
@@ -64,20 +87,23 @@ class Dot(rst.Directive):
 
     def run(self, source):
         set_classes(self.options)
+        self.state.document.transformer.add_transform(DotTransform)
 
         # If this is the first real node inside a graph figure, put the SVG
         # directly inside
         parent = self.state.parent
         if _is_graph_figure(parent):
-            svg = dot2svg.dot2svg(source, attribs=' class="{}"'.format(' '.join(['m-graph'] + self.options.get('classes', []))))
-            node = nodes.raw('', svg, format='html')
+            node = nodes.raw('', '', format='html')
+            node['m-dot-source'] = source
+            node['m-dot-attribs'] = ' class="{}"'.format(' '.join(['m-graph'] + self.options.get('classes', [])))
             return [node]
 
         # Otherwise wrap it in a <div class="m-graph">
-        svg = dot2svg.dot2svg(source)
         container = nodes.container(**self.options)
         container['classes'] = ['m-graph'] + container['classes']
-        node = nodes.raw('', svg, format='html')
+        node = nodes.raw('', '', format='html')
+        node['m-dot-source'] = source
+        node['m-dot-attribs'] = ''
         container.append(node)
         return [container]
 
@@ -113,10 +139,20 @@ class StrictGraph(Dot):
             self.arguments[0] if self.arguments else '',
             '\n'.join(self.content)))
 
-def register_mcss(mcss_settings, **kwargs):
+def save_cache(*args, **kwargs):
+    dot2svg.save_cache()
+
+def register_mcss(mcss_settings, hooks_post_run, **kwargs):
     dot2svg.configure(
         mcss_settings.get('M_DOT_FONT', 'Source Sans Pro'),
         mcss_settings.get('M_DOT_FONT_SIZE', 16.0))
+
+    # Load the cache again even if M_DOT_CACHE_FILE is not set, to not have
+    # anything left from previous runs
+    cache_file = mcss_settings.get('M_DOT_CACHE_FILE')
+    dot2svg.load_cache(os.path.join(mcss_settings.get('INPUT', ''), cache_file) if cache_file else None)
+    hooks_post_run += [save_cache]
+
     rst.directives.register_directive('digraph', Digraph)
     rst.directives.register_directive('strict-digraph', StrictDigraph)
     rst.directives.register_directive('graph', Graph)
@@ -126,9 +162,10 @@ def register_mcss(mcss_settings, **kwargs):
 # do nothing.
 
 def _pelican_configure(pelicanobj):
-    register_mcss(mcss_settings=pelicanobj.settings)
+    register_mcss(mcss_settings=pelicanobj.settings, hooks_post_run=[])
 
 def register(): # for Pelican
     from pelican import signals
 
     signals.initialized.connect(_pelican_configure)
+    signals.finalized.connect(save_cache)
@@ -34,7 +34,11 @@ settings = {}
 
 def filesize(name, rawtext, text, lineno, inliner, options={}, content=[]):
     # Support both {filename} (3.7.1) and {static} (3.8) placeholders
-    size = os.path.getsize(text.format(filename=settings['INPUT'], static=settings['INPUT']))
+    path = text.format(filename=settings['INPUT'], static=settings['INPUT'])
+    # Recorded so the output isn't cached without taking the file into
+    # account
+    inliner.document.settings.record_dependencies.add(path)
+    size = os.path.getsize(path)
 
     for unit in ['','k','M','G','T']:
         if abs(size) < 1024.0:
@@ -48,7 +52,9 @@ def filesize(name, rawtext, text, lineno, inliner, options={}, content=[]):
 
 def filesize_gz(name, rawtext, text, lineno, inliner, options={}, content=[]):
     # Support both {filename} (3.7.1) and {static} (3.8) placeholders
-    with open(text.format(filename=settings['INPUT'], static=settings['INPUT']), mode='rb') as f:
+    path = text.format(filename=settings['INPUT'], static=settings['INPUT'])
+    inliner.document.settings.record_dependencies.add(path)
+    with open(path, mode='rb') as f:
         size = len(gzip.compress(f.read()))
 
     for unit in ['','k','M','G','T']:
@@ -114,6 +114,7 @@ class Image(Directive):
         if 'scale' in self.options:
             file = os.path.join(os.getcwd(), settings['INPUT'])
             absuri = os.path.join(file, reference.format(filename=file, static=file))
+            self.state.document.settings.record_dependencies.add(absuri)
             with PIL.Image.open(absuri) as im:
                 width = "{}px".format(int(im.width*self.options['scale']/100.0))
         elif 'width' in self.options:
@@ -231,6 +232,7 @@ class ImageGrid(rst.Directive):
             # also prepend the absolute path in case we're not Pelican
             file = os.path.join(os.getcwd(), settings['INPUT'])
             absuri = os.path.join(file, uri.format(filename=file, static=file))
+            self.state.document.settings.record_dependencies.add(absuri)
 
             # If no caption provided, get EXIF info, if it's there
             with PIL.Image.open(absuri) as im:
@@ -34,6 +34,7 @@ from docutils import nodes, utils
 from docutils.parsers import rst
 from docutils.parsers.rst import directives
 from docutils.parsers.rst.roles import set_classes
+from docutils.transforms import Transform
 
 try:
     import latex2svg
@@ -51,7 +52,8 @@ except ImportError:
 default_settings = {
     'INPUT': '',
     'M_MATH_RENDER_AS_CODE': False,
-    'M_MATH_CACHE_FILE': 'm.math.cache'
+    'M_MATH_CACHE_FILE': 'm.math.cache',
+    'M_MATH_PRECOMPILE_PREAMBLE': False
 }
 
 settings = None
@@ -67,6 +69,39 @@ def _is_math_figure(parent):
 
     return True
 
+# findall() is new in docutils 0.18, see m.htmlsanity for details
+_findall = nodes.Node.findall if hasattr(nodes.Node, 'findall') else nodes.Node.traverse
+
+# The directive and the role only put an empty raw node into the document,
+# with the formula remembered in it. This then renders all formulas in the
+# document in a single LaTeX run and fills the SVGs in, in the same order as
+# the formulas were rendered one by one before, so element IDs stay the same.
+# The transform is added once for every formula, the first applied renders
+# everything and the remaining ones have nothing left to do.
+class MathTransform(Transform):
+    default_priority = 900
+
+    def apply(self):
+        formulas = [node for node in _findall(self.document, nodes.raw) if 'm-math-source' in node]
+        latex2svgextra.prefetch([node['m-math-source'] for node in formulas])
+
+        for node in formulas:
+            depth, svg = latex2svgextra.fetch_cached_or_render(node['m-math-source'])
+            node.append(nodes.Text(latex2svgextra.patch(node['m-math-formula'], svg, depth if node['m-math-inline'] else None, node['m-math-attribs'])))
+            del node['m-math-source']
+            del node['m-math-formula']
+            del node['m-math-inline']
+            del node['m-math-attribs']
+
+def _math_node(rawsource, formula, inline, attribs, document, **options):
+    document.transformer.add_transform(MathTransform)
+    node = nodes.raw(rawsource, '', format='html', **options)
+    node['m-math-source'] = ('${}$' if inline else '$${}$$').format(formula)
+    node['m-math-formula'] = formula
+    node['m-math-inline'] = inline
+    node['m-math-attribs'] = attribs
+    return node
+
 class Math(rst.Directive):
     option_spec = {'class': directives.class_option,
                    'name': directives.unchanged}
@@ -97,18 +132,16 @@ class Math(rst.Directive):
 
         content = '\n'.join(self.content)
 
-        _, svg = latex2svgextra.fetch_cached_or_render("$$" + content + "$$")
-
         # If this is the first real node inside a math figure, put the SVG
         # directly inside
         if _is_math_figure(parent):
-            node = nodes.raw(self.block_text, latex2svgextra.patch(content, svg, None, ' class="{}"'.format(' '.join(['m-math'] + self.options.get('classes', [])))), format='html')
+            node = _math_node(self.block_text, content, False, ' class="{}"'.format(' '.join(['m-math'] + self.options.get('classes', []))), self.state.document)
             node.line = self.content_offset + 1
             self.add_name(node)
             return [node]
 
         # Otherwise wrap it in a <div class="m-math">
-        node = nodes.raw(self.block_text, latex2svgextra.patch(content, svg, None, ''), format='html')
+        node = _math_node(self.block_text, content, False, '', self.state.document)
         node.line = self.content_offset + 1
         self.add_name(node)
         container = nodes.container(classes=['m-math'] + classes, **self.options)
@@ -142,15 +175,11 @@ def math(role, rawtext, text, lineno, inliner, options={}, content=[]):
         classes += ' ' + ' '.join(options['classes'])
         del options['classes']
 
-    depth, svg = latex2svgextra.fetch_cached_or_render("$" + text + "$")
-
-    attribs = ' class="{}"'.format(classes)
-    node = nodes.raw(rawtext, latex2svgextra.patch(text, svg, depth, attribs), format='html', **options)
+    node = _math_node(rawtext, text, True, ' class="{}"'.format(classes), inliner.document, **options)
     return [node], []
 
 def save_cache(*args, **kwargs):
-    if settings['M_MATH_CACHE_FILE']:
-        latex2svgextra.pickle_cache(settings['M_MATH_CACHE_FILE'])
+    latex2svgextra.save_cache()
 
 def register_mcss(mcss_settings, hooks_pre_page, hooks_post_run, **kwargs):
     global default_settings, settings
@@ -161,12 +190,18 @@ def register_mcss(mcss_settings, hooks_pre_page, hooks_post_run, **kwargs):
     if settings['M_MATH_CACHE_FILE']:
         settings['M_MATH_CACHE_FILE'] = os.path.join(settings['INPUT'], settings['M_MATH_CACHE_FILE'])
 
-    # Ensure that cache is unpickled again if M_MATH_CACHE_FILE is *not* set --
+    # Ensure that cache is loaded again if M_MATH_CACHE_FILE is *not* set --
     # otherwise tests will sporadically fail.
-    if settings['M_MATH_CACHE_FILE'] and os.path.exists(settings['M_MATH_CACHE_FILE']):
-        latex2svgextra.unpickle_cache(settings['M_MATH_CACHE_FILE'])
+    latex2svgextra.load_cache(settings['M_MATH_CACHE_FILE'])
+
+    # The precompiled preamble is put next to the cache file, or into the
+    # input directory if caching is disabled. Under Pelican there's no INPUT,
+    # so the cache file is just a bare filename. Use the current directory in
+    # that case, as an empty directory would disable the precompilation.
+    if settings['M_MATH_PRECOMPILE_PREAMBLE']:
+        latex2svgextra.params['format_dir'] = (os.path.dirname(settings['M_MATH_CACHE_FILE']) if settings['M_MATH_CACHE_FILE'] else settings['INPUT']) or os.getcwd()
     else:
-        latex2svgextra.unpickle_cache(None)
+        latex2svgextra.params['format_dir'] = None
 
     hooks_pre_page += [new_page]
     hooks_post_run += [save_cache]
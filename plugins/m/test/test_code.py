@@ -23,6 +23,8 @@
 #   DEALINGS IN THE SOFTWARE.
 #
 
+import os
+import pickle
 import pygments
 import re
 
@@ -38,7 +40,7 @@ class Code(PelicanPluginTestCase):
     def __init__(self, *args, **kwargs):
         super().__init__(__file__, '', *args, **kwargs)
 
-    def test(self):
+    def run_pelican_code(self, settings={}):
         self.run_pelican({
             # Need Source Code Pro for code
             'M_CSS_FILES': ['https://fonts.googleapis.com/css?family=Source+Code+Pro:400,400i,600%7CSource+Sans+Pro:400,400i,600,600i',
@@ -53,8 +55,36 @@ class Code(PelicanPluginTestCase):
                 'CSS': _add_color_swatch,
                 ('CSS', 'replace_colors'): lambda str: str.replace('#c0ffee', '#3bd267')
             },
+            **settings
         })
 
+    def test(self):
+        self.run_pelican_code()
+        self.check_output()
+
+    def test_cached(self):
+        cache_file = os.path.join(self.path, 'code.cache')
+        if os.path.exists(cache_file): os.remove(cache_file)
+
+        self.run_pelican_code({'M_CODE_CACHE_FILE': cache_file})
+        self.check_output()
+
+        with open(cache_file, 'rb') as f:
+            code_cache = pickle.load(f)
+        self.assertTrue(code_cache[1])
+
+        # Second run should produce the same output from the cache, with the
+        # filters applied again and the entries marked as used
+        self.run_pelican_code({'M_CODE_CACHE_FILE': cache_file})
+        self.check_output()
+
+        with open(cache_file, 'rb') as f:
+            code_cache_actual = pickle.load(f)
+        self.assertEqual(code_cache_actual[1].keys(), code_cache[1].keys())
+        for hash, entry in code_cache_actual[1].items():
+            self.assertGreater(entry[0], code_cache[1][hash][0])
+
+    def check_output(self):
         # Pygments 2.10+ properly highlight Whitespace as such, and not as
         # Text. The whitespace classification is further improved in 2.11.
         if parse_version(pygments.__version__) >= parse_version("2.11"):
@@ -23,7 +23,10 @@
 #   DEALINGS IN THE SOFTWARE.
 #
 
+import os
+import pickle
 import re
+import shutil
 import subprocess
 import unittest
 
@@ -32,6 +35,17 @@ from . import PelicanPluginTestCase, parse_version
 def dot_version():
     return re.match(r'.*version (?P<version>\d+\.\d+\.\d+).*', subprocess.check_output(['dot', '-V'], stderr=subprocess.STDOUT).decode('utf-8').strip()).group('version')
 
+def expected_file():
+    # The damn thing adopted Chrome versioning apparently. No idea if the
+    # output changed in version 7, 8 or 9 already.
+    if parse_version(dot_version()) >= parse_version("10.0"):
+        return 'page.html'
+    # Used to be >= 2.44.0, but 2.42.2 appears to have the same output
+    elif parse_version(dot_version()) >= parse_version("2.42.2"):
+        return 'page-2.html'
+    else:
+        return 'page-240.html'
+
 class Dot(PelicanPluginTestCase):
     def __init__(self, *args, **kwargs):
         super().__init__(__file__, '', *args, **kwargs)
@@ -39,17 +53,81 @@ class Dot(PelicanPluginTestCase):
     def test(self):
         self.run_pelican({
             'PLUGINS': ['m.htmlsanity', 'm.components', 'm.dot'],
-            'M_DOT_FONT': 'DejaVu Sans'
+            'M_DOT_FONT': 'DejaVu Sans',
+            'M_DOT_CACHE_FILE': None
+        })
+
+        self.assertEqual(*self.actual_expected_contents('page.html', expected_file()))
+
+    @unittest.skipUnless(shutil.which('dot'),
+                         "The dot plugin requires Graphviz installed")
+    def test_cached(self):
+        cache_file = os.path.join(self.path, 'dot.cache')
+        if os.path.exists(cache_file): os.remove(cache_file)
+
+        self.run_pelican({
+            'PLUGINS': ['m.htmlsanity', 'm.components', 'm.dot'],
+            'M_DOT_FONT': 'DejaVu Sans',
+            'M_DOT_CACHE_FILE': cache_file
+        })
+        self.assertEqual(*self.actual_expected_contents('page.html', expected_file()))
+
+        with open(cache_file, 'rb') as f:
+            dot_cache = pickle.load(f)
+        self.assertEqual(dot_cache[1], 0)
+        self.assertTrue(dot_cache[2])
+
+        # Second run should produce the same output from the cache, with the
+        # cache age bumped and all entries still there
+        self.run_pelican({
+            'PLUGINS': ['m.htmlsanity', 'm.components', 'm.dot'],
+            'M_DOT_FONT': 'DejaVu Sans',
+            'M_DOT_CACHE_FILE': cache_file
+        })
+        self.assertEqual(*self.actual_expected_contents('page.html', expected_file()))
+
+        with open(cache_file, 'rb') as f:
+            dot_cache_actual = pickle.load(f)
+        self.assertEqual(dot_cache_actual[1], 1)
+        self.assertEqual(dot_cache_actual[2].keys(), dot_cache[2].keys())
+
+fake_dot_output = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN"
+ "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">
+<!-- Generated by graphviz -->
+<!-- Title: {title} -->
+<svg width="62pt" height="116pt"
+ viewBox="0.00 0.00 62.00 116.00" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">
+<g id="graph0" class="graph" transform="scale(1 1) rotate(0) translate(4 112)">
+<title>{title}</title>
+</g>
+</svg>
+"""
+
+class Figure(PelicanPluginTestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(__file__, 'figure', *args, **kwargs)
+
+    # The graphs are taken from a pre-filled cache, so this doesn't need
+    # Graphviz installed
+    def test(self):
+        import dot2svg
+        import rendercache
+
+        cache_file = os.path.join(self.path, 'dot.cache')
+        if os.path.exists(cache_file): os.remove(cache_file)
+
+        # The cache key depends on the font, which is set by the plugin
+        dot2svg.configure('DejaVu Sans', 16.0)
+        cache = rendercache.PickleCache(cache_file, dot2svg._cache_version)
+        cache.put(dot2svg._cache_key('digraph "A to B" {\na -> b}'), fake_dot_output.format(title='A to B'))
+        cache.put(dot2svg._cache_key('digraph "A to C" {\na -> c}'), fake_dot_output.format(title='A to C'))
+        cache.save()
+
+        self.run_pelican({
+            'PLUGINS': ['m.htmlsanity', 'm.components', 'm.dot'],
+            'M_DOT_FONT': 'DejaVu Sans',
+            'M_DOT_CACHE_FILE': cache_file
         })
 
-        # The damn thing adopted Chrome versioning apparently. No idea if the
-        # output changed in version 7, 8 or 9 already.
-        if parse_version(dot_version()) >= parse_version("10.0"):
-            file = 'page.html'
-        # Used to be >= 2.44.0, but 2.42.2 appears to have the same output
-        elif parse_version(dot_version()) >= parse_version("2.42.2"):
-            file = 'page-2.html'
-        else:
-            file = 'page-240.html'
-
-        self.assertEqual(*self.actual_expected_contents('page.html', file))
+        self.assertEqual(*self.actual_expected_contents('page.html'))
@@ -26,10 +26,13 @@
 import os
 import pickle
 import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
 
-from hashlib import sha1
-
 from . import PelicanPluginTestCase
 
 class Math(PelicanPluginTestCase):
@@ -61,7 +64,6 @@ class Math(PelicanPluginTestCase):
         self.assertFalse(os.path.exists(os.path.join(self.path, 'm.math.cache')))
 
 # Actually generated from $\frac{\tau}{2}$ tho
-tau_half_hash = sha1("""$\\pi$""".encode('utf-8')).digest()
 tau_half = """<?xml version='1.0' encoding='UTF-8'?>
 <!-- This file was generated by dvisvgm 2.6.3 -->
 <svg version='1.1' xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink' width='5.847936pt' height='15.326665pt' viewBox='1.195514 -8.1387 4.678349 12.261332'>
@@ -77,7 +79,6 @@ tau_half = """<?xml version='1.0' encoding='UTF-8'?>
 </svg>"""
 
 # Actually generated from $$a^3 + b^3 \neq c^3$$ tho
-fermat_hash = sha1("""$$a^2 + b^2 = c^2$$""".encode('utf-8')).digest()
 fermat = """<?xml version='1.0' encoding='UTF-8'?>
 <!-- This file was generated by dvisvgm 2.6.3 -->
 <svg version='1.1' xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink' width='75.028924pt' height='15.496355pt' viewBox='164.01086 -12.397084 60.023139 12.397084'>
@@ -109,14 +110,32 @@ class Cached(PelicanPluginTestCase):
 
     # This is using the cache, so doesn't matter if LaTeX is found or not
     def test(self):
+        import latex2svgextra
+
         cache_file = os.path.join(self.path, 'math.cache')
+        if os.path.exists(cache_file): os.remove(cache_file)
+
+        latex2svgextra.load_cache(cache_file)
+        cache = latex2svgextra._cache
+        cache.put("$\\pi$", 0.344841, tau_half)
+        cache.put("$$a^2 + b^2 = c^2$$", 0.0, fermat)
+        cache.put("$unused$", 0.0, 'something')
+        cache.put("$unused recently$", 0.0, 'something')
 
-        math_cache = (0, 5, {
-            tau_half_hash: (5, 0.344841, tau_half),
-            fermat_hash: (5, 0.0, fermat),
-            b'does not exist': (5, 0.0, 'something')})
+        # Make the two unused entries older, one of them too old. Saving
+        # evicts the latter already, so save first.
+        unused = cache._hash("$unused$")
+        unused_recently = cache._hash("$unused recently$")
+        used = cache._hash("$\\pi$")
+        used_time = time.time() - 60
+        cache.cache[unused_recently] = (used_time,) + cache.cache[unused_recently][1:]
+        cache.cache[used] = (used_time,) + cache.cache[used][1:]
+        cache.save()
+        with open(cache_file, 'rb') as f:
+            version, entries = pickle.load(f)
+        entries[unused] = (0, 0.0, 'something')
         with open(cache_file, 'wb') as f:
-            pickle.dump(math_cache, f)
+            pickle.dump((version, entries), f)
 
         self.run_pelican({
             'PLUGINS': ['m.htmlsanity', 'm.math'],
@@ -125,14 +144,108 @@ class Cached(PelicanPluginTestCase):
 
         self.assertEqual(*self.actual_expected_contents('page.html'))
 
-        # Expect that after the operation the global cache age is bumped,
-        # unused entries removed and used entries age bumped as well
+        # Entries that were used are kept and marked as used, only the one
+        # unused for longer than the max age got evicted
         with open(cache_file, 'rb') as f:
-            math_cache_actual = pickle.load(f)
-        math_cache_expected = (0, 6, {
-            tau_half_hash: (6, 0.344841, tau_half),
-            fermat_hash: (6, 0.0, fermat)})
-        self.assertEqual(math_cache_actual, math_cache_expected)
+            version, entries = pickle.load(f)
+        self.assertEqual(version, latex2svgextra._cache_version)
+        self.assertEqual(set(entries.keys()), {used, cache._hash("$$a^2 + b^2 = c^2$$"), unused_recently})
+        self.assertGreater(entries[used][0], used_time)
+        self.assertEqual(entries[used][1:], (0.344841, tau_half))
+
+        # The file is written through a temporary file, but has the same
+        # permissions as if it was created directly
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(stat.S_IMODE(os.stat(cache_file).st_mode), 0o666 & ~umask)
+
+    # The file can be shared by builds with different rendering parameters
+    def test_prefix(self):
+        import latex2svgextra
+
+        cache_file = os.path.join(self.path, 'math.cache')
+        if os.path.exists(cache_file): os.remove(cache_file)
+
+        latex2svgextra.load_cache(cache_file)
+        latex2svgextra._cache.put("$\\pi$", 0.344841, tau_half)
+        latex2svgextra.save_cache()
+
+        fontsize = latex2svgextra.params['fontsize']
+        try:
+            latex2svgextra.params['fontsize'] = fontsize*2
+            latex2svgextra.load_cache(cache_file)
+            self.assertNotIn("$\\pi$", latex2svgextra._cache)
+            latex2svgextra._cache.put("$\\pi$", 0.689682, 'twice as big')
+            latex2svgextra.save_cache()
+        finally:
+            latex2svgextra.params['fontsize'] = fontsize
+
+        # Both variants are kept
+        latex2svgextra.load_cache(cache_file)
+        self.assertEqual(latex2svgextra._cache.get("$\\pi$"), (0.344841, tau_half))
+        with open(cache_file, 'rb') as f:
+            self.assertEqual(len(pickle.load(f)[1]), 2)
+
+    # Builds running in parallel don't lose each other's entries
+    def test_parallel(self):
+        import rendercache
+
+        cache_file = os.path.join(self.path, 'math.cache')
+        if os.path.exists(cache_file): os.remove(cache_file)
+
+        a = rendercache.PickleCache(cache_file)
+        b = rendercache.PickleCache(cache_file)
+        a.put("$\\pi$", 0.344841, tau_half)
+        b.put("$$a^2 + b^2 = c^2$$", 0.0, fermat)
+        a.save()
+        b.save()
+
+        cache = rendercache.PickleCache(cache_file)
+        self.assertEqual(cache.get("$\\pi$"), (0.344841, tau_half))
+        self.assertEqual(cache.get("$$a^2 + b^2 = c^2$$"), (0.0, fermat))
+
+    # Same as above, but with a cache directory instead of a single file
+    def test_directory(self):
+        import latex2svgextra
+
+        cache_dir = os.path.join(self.path, 'math.cache.d')
+        if os.path.exists(cache_dir): shutil.rmtree(cache_dir)
+
+        latex2svgextra.load_cache(cache_dir + os.sep)
+        cache = latex2svgextra._cache
+        cache.put("$\\pi$", 0.344841, tau_half)
+        cache.put("$$a^2 + b^2 = c^2$$", 0.0, fermat)
+        cache.put("$unused$", 0.0, 'something')
+        cache.put("$unused recently$", 0.0, 'something')
+
+        # Make the two unused entries older, one of them too old
+        unused = cache._file("$unused$")
+        unused_recently = cache._file("$unused recently$")
+        os.utime(unused, (0, 0))
+        os.utime(unused_recently, (time.time() - 60, time.time() - 60))
+        used = cache._file("$\\pi$")
+        os.utime(used, (0, 0))
+
+        self.run_pelican({
+            'PLUGINS': ['m.htmlsanity', 'm.math'],
+            'M_MATH_CACHE_FILE': cache_dir + os.sep
+        })
+
+        self.assertEqual(*self.actual_expected_contents('page.html'))
+
+        # Entries that were used are kept and marked as used, only the one
+        # unused for longer than the max age got evicted
+        self.assertTrue(os.path.exists(used))
+        self.assertGreater(os.path.getmtime(used), 0)
+        self.assertTrue(os.path.exists(cache._file("$$a^2 + b^2 = c^2$$")))
+        self.assertTrue(os.path.exists(unused_recently))
+        self.assertFalse(os.path.exists(unused))
+
+        # Same as with the single-file cache, the entries aren't private to
+        # the user that created them
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(stat.S_IMODE(os.stat(used).st_mode), 0o666 & ~umask)
 
 class Uncached(PelicanPluginTestCase):
     def __init__(self, *args, **kwargs):
@@ -162,11 +275,239 @@ class Uncached(PelicanPluginTestCase):
         self.assertEqual(actual_contents, expected_contents)
 
         # Expect that after the operation the global cache is filled
+        import latex2svgextra
         with open(cache_file, 'rb') as f:
-            math_cache_actual = pickle.load(f)
-        math_cache_expected = (0, 0, {
-            sha1("$\\frac{\\tau}{2}$".encode('utf-8')).digest():
-                (0, 0.344841, tau_half),
-            sha1("$$a^3 + b^3 \\neq c^3$$".encode('utf-8')).digest():
-                (0, 0.0, fermat)})
-        self.assertEqual(math_cache_actual, math_cache_expected)
+            version, entries = pickle.load(f)
+        self.assertEqual(version, latex2svgextra._cache_version)
+        self.assertEqual({hash: entry[1:] for hash, entry in entries.items()}, {
+            latex2svgextra._cache._hash("$\\frac{\\tau}{2}$"): (0.344841, tau_half),
+            latex2svgextra._cache._hash("$$a^3 + b^3 \\neq c^3$$"): (0.0, fermat)})
+
+class PrecompiledPreamble(unittest.TestCase):
+    def tearDown(self):
+        import latex2svgextra
+        latex2svgextra.load_cache(None)
+        latex2svgextra.params['format_dir'] = None
+
+    # With Pelican there's no INPUT and the cache file is a bare filename,
+    # which used to result in an empty format directory, silently disabling
+    # the precompilation
+    def test_pelican_bare_cache_filename(self):
+        import latex2svgextra
+        from m import math
+
+        math.register_mcss(mcss_settings={
+            'M_MATH_CACHE_FILE': 'm.math.cache',
+            'M_MATH_PRECOMPILE_PREAMBLE': True
+        }, hooks_pre_page=[], hooks_post_run=[])
+        self.assertEqual(latex2svgextra.params['format_dir'], os.getcwd())
+
+        # With caching disabled as well
+        math.register_mcss(mcss_settings={
+            'M_MATH_CACHE_FILE': None,
+            'M_MATH_PRECOMPILE_PREAMBLE': True
+        }, hooks_pre_page=[], hooks_post_run=[])
+        self.assertEqual(latex2svgextra.params['format_dir'], os.getcwd())
+
+    # Doesn't need LaTeX, a fake LaTeX that only creates the format file is
+    # used instead
+    def test_format_reused_and_invalidated(self):
+        import latex2svg
+        import latex2svgextra
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fake = os.path.join(tmpdir, 'latex.py')
+            with open(fake, 'w') as f:
+                f.write("""import sys
+for arg in sys.argv[1:]:
+    if arg.startswith('-jobname='):
+        open(arg[9:] + '.fmt', 'w').close()
+""")
+
+            params = latex2svgextra.params.copy()
+            params['latex_cmd'] = '"{}" "{}" -interaction=nonstopmode'.format(sys.executable, fake)
+            params['format_dir'] = os.path.join(tmpdir, 'formats')
+
+            # The format gets compiled and then used by the LaTeX command
+            latex_count = latex2svg.stats['latex']
+            name = latex2svg.precompile_preamble(params)
+            self.assertIsNotNone(name)
+            self.assertTrue(os.path.exists(os.path.join(params['format_dir'], name + '.fmt')))
+            self.assertEqual(latex2svg.stats['latex'], latex_count + 1)
+            cmd, env = latex2svg._latex_cmd(params)
+            self.assertIn('-fmt=' + name, cmd)
+            self.assertEqual(env['TEXFORMATS'], params['format_dir'] + os.pathsep)
+            self.assertEqual(latex2svg.stats['latex'], latex_count + 1)
+
+            # A different preamble results in a different format, compiled
+            # again
+            params['preamble'] += '\\usepackage{xcolor}\n'
+            changed_name = latex2svg.precompile_preamble(params)
+            self.assertNotEqual(changed_name, name)
+            self.assertTrue(os.path.exists(os.path.join(params['format_dir'], changed_name + '.fmt')))
+            self.assertEqual(latex2svg.stats['latex'], latex_count + 2)
+
+        # With no directory, the format isn't used
+        params['format_dir'] = None
+        self.assertIsNone(latex2svg.precompile_preamble(params))
+        cmd, env = latex2svg._latex_cmd(params)
+        self.assertNotIn('-fmt', ' '.join(cmd))
+        self.assertIsNone(env)
+
+# Stand-ins for LaTeX and dvisvgm, so the batching logic can be tested without
+# either installed. The "DVI" is a list of preview environment contents, a
+# snippet containing \fail fails to compile. The SVG and dvisvgm output mimic
+# the real thing enough for latex2svg to parse them and latex2svgextra to
+# patch them.
+fake_latex = """import json, re, sys
+with open('code.tex') as f:
+    pages = re.findall(r'\\\\begin\\{preview\\}\\n(.*?)\\n\\\\end\\{preview\\}', f.read(), re.DOTALL)
+if any('\\\\fail' in page for page in pages):
+    print('! Undefined control sequence.')
+    sys.exit(1)
+with open('code.dvi', 'w') as f:
+    json.dump(pages, f)
+"""
+
+fake_dvisvgm = """import json, sys
+with open('code.dvi') as f:
+    pages = json.load(f)
+multiple = '--page=1-' in sys.argv
+for i, page in enumerate(pages):
+    output = 'code-{}.svg'.format(i + 1) if multiple else 'code.svg'
+    with open(output, 'w') as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\\n<!-- This file was generated by dvisvgm 2.6.3 -->\\n<svg version='1.1' xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink' width='{0}pt' height='6pt' viewBox='0 0 {0} 6'>\\n<g id='page{1}'>{2}</g>\\n</svg>".format(len(page), i + 1, page))
+    sys.stderr.write('processing page {}\\n'.format(i + 1))
+    sys.stderr.write('  width={}pt, height=6pt, depth={}pt\\n'.format(len(page), len(page) % 3))
+    sys.stderr.write('  graphic size: {}pt x 6pt\\n'.format(len(page)))
+    sys.stderr.write('  output written to {}\\n'.format(output))
+"""
+
+# Uses the above instead of LaTeX and dvisvgm for the duration of a test
+class FakeLatexMixin:
+    def setUp(self):
+        super().setUp()
+
+        import latex2svgextra
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        for name, contents in [('latex.py', fake_latex), ('dvisvgm.py', fake_dvisvgm)]:
+            with open(os.path.join(self.tmpdir.name, name), 'w') as f:
+                f.write(contents)
+
+        self.params = latex2svgextra.params.copy()
+        latex2svgextra.params['latex_cmd'] = '"{}" "{}"'.format(sys.executable, os.path.join(self.tmpdir.name, 'latex.py'))
+        latex2svgextra.params['dvisvgm_cmd'] = '"{}" "{}"'.format(sys.executable, os.path.join(self.tmpdir.name, 'dvisvgm.py'))
+        latex2svgextra.load_cache(None)
+        self.batch_size = latex2svgextra.batch_size
+
+    def tearDown(self):
+        import latex2svgextra
+
+        latex2svgextra.params.clear()
+        latex2svgextra.params.update(self.params)
+        latex2svgextra.load_cache(None)
+        latex2svgextra.batch_size = self.batch_size
+        self.tmpdir.cleanup()
+
+        super().tearDown()
+
+class Batch(FakeLatexMixin, unittest.TestCase):
+    def test_same_as_single(self):
+        import latex2svg
+        import latex2svgextra
+
+        codes = ['$a$', '$$b + c$$', '$\\frac{d}{e}$']
+        latex_count = latex2svg.stats['latex']
+        batched = latex2svg.latex2svg_batch(codes, params=latex2svgextra.params)
+        self.assertEqual(latex2svg.stats['latex'], latex_count + 1)
+
+        # Including the page IDs and the sizes parsed from the dvisvgm output
+        self.assertEqual(batched, [latex2svg.latex2svg(code, params=latex2svgextra.params) for code in codes])
+        self.assertEqual(batched[1], {
+            'svg': "<?xml version='1.0' encoding='UTF-8'?>\n<!-- This file was generated by dvisvgm 2.6.3 -->\n<svg version='1.1' xmlns='http://www.w3.org/2000/svg' xmlns:xlink='http://www.w3.org/1999/xlink' width='9pt' height='6pt' viewBox='0 0 9 6'>\n<g id='page1'>$$b + c$$</g>\n</svg>",
+            'width': 9/12,
+            'height': 6/12,
+            'depth': 0.0
+        })
+
+    def test_failing_formula(self):
+        import latex2svg
+        import latex2svgextra
+
+        # The batch fails to compile as a whole, so the formulas are rendered
+        # one by one and the error is reported for the culprit only, after
+        # the formulas before it got rendered
+        latex_count = latex2svg.stats['latex']
+        with self.assertRaises(subprocess.CalledProcessError):
+            latex2svg.latex2svg_batch(['$a$', '$\\fail$', '$c$'], params=latex2svgextra.params)
+        self.assertEqual(latex2svg.stats['latex'], latex_count + 3)
+
+    def test_prefetch(self):
+        import latex2svg
+        import latex2svgextra
+
+        # Five unique formulas in batches of two result in three LaTeX runs.
+        # The batches are rendered in parallel, but the results have to be
+        # matched to the formulas correctly.
+        latex2svgextra.batch_size = 2
+        formulas = ['$a$', '$bb$', '$a$', '$ccc$', '$dddd$', '$eeeee$']
+        latex_count = latex2svg.stats['latex']
+        latex2svgextra.prefetch(formulas)
+        self.assertEqual(latex2svg.stats['latex'], latex_count + 3)
+
+        # Fetching then doesn't need LaTeX anymore, and the result is the same
+        # as when rendering a single formula
+        for formula in formulas:
+            with self.subTest(formula=formula):
+                out = latex2svg.latex2svg(formula, params=latex2svgextra.params)
+                latex_count = latex2svg.stats['latex']
+                self.assertEqual(latex2svgextra.fetch_cached_or_render(formula), (out['depth'], out['svg']))
+                self.assertEqual(latex2svg.stats['latex'], latex_count)
+
+        # Formulas that were prefetched already aren't rendered again
+        latex2svgextra.prefetch(formulas[:3])
+        self.assertEqual(latex2svg.stats['latex'], latex_count)
+
+    @unittest.skipUnless(shutil.which('latex') and shutil.which('dvisvgm'),
+                         "Batched rendering requires LaTeX and dvisvgm installed")
+    def test_same_as_single_real(self):
+        import latex2svg
+
+        codes = ['$\\pi$', '$$a^2 + b^2 = c^2$$', '$\\frac{\\tau}{2}$']
+        self.assertEqual(latex2svg.latex2svg_batch(codes), [latex2svg.latex2svg(code) for code in codes])
+
+class BatchedPage(FakeLatexMixin, PelicanPluginTestCase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(__file__, '', *args, **kwargs)
+
+    # All formulas on a page are rendered in a single LaTeX run, and the
+    # output is the same as when rendering them one by one
+    def test(self):
+        import latex2svg
+        import latex2svgextra
+
+        latex_count = latex2svg.stats['latex']
+        self.run_pelican({
+            'PLUGINS': ['m.htmlsanity', 'm.components', 'm.math'],
+            'M_MATH_CACHE_FILE': None
+        })
+        self.assertEqual(latex2svg.stats['latex'], latex_count + 1)
+
+        with open(os.path.join(self.path, 'output', 'page.html')) as f:
+            batched = f.read()
+
+        # With prefetching disabled, every formula is rendered separately
+        prefetch = latex2svgextra.prefetch
+        try:
+            latex2svgextra.prefetch = lambda formulas: None
+            self.run_pelican({
+                'PLUGINS': ['m.htmlsanity', 'm.components', 'm.math'],
+                'M_MATH_CACHE_FILE': None
+            })
+        finally:
+            latex2svgextra.prefetch = prefetch
+        self.assertGreater(latex2svg.stats['latex'], latex_count + 2)
+
+        with open(os.path.join(self.path, 'output', 'page.html')) as f:
+            self.assertEqual(batched, f.read())
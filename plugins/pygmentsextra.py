@@ -0,0 +1,194 @@
+#
+#   This file is part of m.css.
+#
+#   Copyright © 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025
+#             Vladimír Vondruš <mosra@centrum.cz>
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a
+#   copy of this software and associated documentation files (the "Software"),
+#   to deal in the Software without restriction, including without limitation
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,
+#   and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included
+#   in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#   THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#   DEALINGS IN THE SOFTWARE.
+#
+
+import collections
+import os
+import pygments
+from pygments.lexers import find_lexer_class_by_name, find_lexer_class_for_filename
+from pygments.util import ClassNotFound
+
+import ansilexer
+import rendercache
+
+# Extracted common code used by both doxygen.py and the m.code plugin to
+# avoid dependency of doxygen.py on Pelican
+
+# Lexers in addition to what Pygments knows, by name
+custom_lexers = {
+    'ansi': ansilexer.AnsiLexer
+}
+
+# Custom mapping of filename suffixes to lexer names, checked before asking
+# Pygments. Used by doxygen.py.
+filename_mapping = [
+    ('.h', 'c++'),
+    ('.h.cmake', 'c++'),
+    # Pygments knows only .vert, .frag, .geo
+    ('.glsl', 'glsl'),
+    ('.conf', 'ini'),
+    ('.xml-jinja', 'xml+jinja'),
+    ('.html-jinja', 'html+jinja'),
+    ('.jinja', 'jinja'),
+    ('.ansi', 'ansi')
+]
+
+# The AnsiLexer keeps the current color state in the instance, so it can't be
+# shared between code snippets
+stateful_lexers = {ansilexer.AnsiLexer}
+
+# Looking up lexers scans all Pygments lexers and plugins, which is slow when
+# done for every code snippet. The results are remembered here and lexer
+# instances shared, as they don't have any state (except for the above). The
+# lexer class is None if there's no lexer for given name / filename.
+_lexer_classes_by_name = {}
+_lexer_classes_by_filename = {}
+_lexers = {}
+_formatters = {}
+
+def _lexer(class_):
+    if class_ in stateful_lexers: return class_()
+
+    lexer = _lexers.get(class_)
+    if lexer is None:
+        lexer = _lexers[class_] = class_()
+    return lexer
+
+# Equivalent to pygments.lexers.get_lexer_by_name(), including raising
+# pygments.util.ClassNotFound (a subclass of ValueError) if there's no such
+# lexer
+def lexer_by_name(name):
+    if name not in _lexer_classes_by_name:
+        class_ = custom_lexers.get(name)
+        if class_ is None:
+            try:
+                class_ = find_lexer_class_by_name(name)
+            except ClassNotFound:
+                pass
+        _lexer_classes_by_name[name] = class_
+
+    class_ = _lexer_classes_by_name[name]
+    if class_ is None: raise ClassNotFound("no lexer for alias {!r} found".format(name))
+    return _lexer(class_)
+
+# Lexer for a filename, first looked up in filename_mapping and then by
+# Pygments. Returns None if nothing is found.
+def lexer_for_filename(filename):
+    # Pygments looks only at the basename as well
+    filename = os.path.basename(filename)
+    if filename not in _lexer_classes_by_filename:
+        for suffix, name in filename_mapping:
+            if not filename.endswith(suffix): continue
+            lexer_by_name(name)
+            class_ = _lexer_classes_by_name[name]
+            break
+        else:
+            # Put some bogus prefix to the filename in case it is just `.ext`
+            class_ = find_lexer_class_for_filename("code" + filename)
+        _lexer_classes_by_filename[filename] = class_
+
+    class_ = _lexer_classes_by_filename[filename]
+    if class_ is None: return None
+    return _lexer(class_)
+
+# Formatter of given class with given options, shared for all snippets that
+# use the same options
+def formatter(class_, **options):
+    key = (class_, repr(sorted(options.items())))
+    formatter = _formatters.get(key)
+    if formatter is None:
+        formatter = _formatters[key] = class_(**options)
+    return formatter
+
+# How many snippets were fetched from the cache and how many had to be
+# highlighted, for build statistics
+stats = collections.Counter()
+
+# Version of the cache format, bump when the stored data change
+_cache_version = 0
+
+# Cache for highlighted code (key -> (highlighted code,)). Not used by
+# default, see load_cache().
+_cache = None
+
+# If not None, every snippet that gets fetched or highlighted is recorded here
+# as well (cache key -> (highlighted code,)). Used by doxygen.py to propagate
+# cache updates from worker processes back to the parent process, see
+# merge_cache_updates().
+cache_updates = None
+
+def _name(type_):
+    return '{}.{}'.format(type_.__module__, type_.__qualname__)
+
+# Same as pygments.highlight(), but the output is fetched from the cache if
+# possible. Pre filters are expected to be already applied on the code and
+# post filters applied on the output, so they don't need to be a part of the
+# key -- functions can't be reliably hashed anyway.
+def highlight(code, lexer, formatter):
+    if not _cache: return pygments.highlight(code, lexer, formatter)
+
+    # Everything that affects the output
+    key = repr((_cache_version, pygments.__version__,
+        _name(type(lexer)), sorted(lexer.options.items()),
+        _name(type(formatter)), sorted(formatter.options.items()),
+        code))
+    entry = _cache.get(key)
+    if entry is None:
+        stats['cache misses'] += 1
+        entry = (pygments.highlight(code, lexer, formatter),)
+        _cache.put(key, *entry)
+    else:
+        stats['cache hits'] += 1
+    if cache_updates is not None:
+        cache_updates[key] = entry
+    return entry[0]
+
+# Loads the highlighting cache. If the file is None, caching is disabled, if
+# it's a directory (or ends with a path separator), a
+# rendercache.DirectoryCache shareable among projects is used, otherwise a
+# rendercache.PickleCache. Use set_cache() to supply a custom implementation.
+def load_cache(file):
+    # Unlike with math and graphs, keeping the highlighted code in memory for
+    # the duration of the run isn't worth it
+    if not file:
+        set_cache(None)
+        return
+
+    # The key contains everything already
+    set_cache(rendercache.load(file, _cache_version, lambda: ''))
+
+# The cache needs to implement get(key) returning a (highlighted code,) tuple
+# or None, put(key, highlighted code) and save()
+def set_cache(cache):
+    global _cache
+    _cache = cache
+
+def merge_cache_updates(updates):
+    # Same as latex2svgextra.merge_cache_updates()
+    for key, entry in updates.items():
+        if _cache.get(key) is None:
+            _cache.put(key, *entry)
+
+def save_cache():
+    if _cache: _cache.save()
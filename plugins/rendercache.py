@@ -0,0 +1,215 @@
+#
+#   This file is part of m.css.
+#
+#   Copyright © 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025
+#             Vladimír Vondruš <mosra@centrum.cz>
+#
+#   Permission is hereby granted, free of charge, to any person obtaining a
+#   copy of this software and associated documentation files (the "Software"),
+#   to deal in the Software without restriction, including without limitation
+#   the rights to use, copy, modify, merge, publish, distribute, sublicense,
+#   and/or sell copies of the Software, and to permit persons to whom the
+#   Software is furnished to do so, subject to the following conditions:
+#
+#   The above copyright notice and this permission notice shall be included
+#   in all copies or substantial portions of the Software.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#   IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#   FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+#   THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#   LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+#   FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+#   DEALINGS IN THE SOFTWARE.
+#
+
+import os
+import pickle
+import tempfile
+import time
+from hashlib import sha1
+
+# Persistent caches for output of external tools, used by latex2svgextra and
+# dot2svg. Keys are strings, values are tuples of anything that can be
+# pickled.
+
+# Files created by tempfile.mkstemp() are accessible only by the owner. As
+# they get renamed to the final location, give them the permissions a file
+# created with open() would have instead, so a cache shared among several
+# users stays readable to all of them. The umask can be only queried by
+# setting it, so do that just once.
+_umask = os.umask(0)
+os.umask(_umask)
+
+def _mkstemp(dir):
+    fd, tmp = tempfile.mkstemp(dir=dir)
+    os.chmod(tmp, 0o666 & ~_umask)
+    return fd, tmp
+
+# Default eviction limits for PickleCache and DirectoryCache. Entries not used
+# for longer than the max age (in seconds) are removed, and if the total size
+# (in bytes) is still above the max size, least recently used entries are
+# removed until it's not. None means no limit.
+cache_max_age = 30*24*60*60
+cache_max_size = None
+
+# Removes entries that weren't used for too long, then the least recently used
+# ones until the size is under the limit. The entries are (last use time, size,
+# key) tuples, returns keys of the removed ones.
+def _evict(entries, max_age, max_size):
+    entries = sorted(entries)
+    now = time.time()
+    total_size = sum(entry[1] for entry in entries)
+    evicted = []
+    for mtime, size, key in entries:
+        if not ((max_age is not None and now - mtime > max_age) or
+                (max_size is not None and total_size > max_size)):
+            continue
+        evicted += [key]
+        total_size -= size
+    return evicted
+
+# Single-file cache (key sha1 -> (last use time, *value)). The prefix is
+# prepended to every key before hashing and entries are evicted the same way
+# as in DirectoryCache, so a file used by several projects keeps entries of
+# all of them. On save, entries written to the file by other builds in the
+# meantime are merged in. With no file specified it's kept just in memory. The
+# version is saved in the file and if it doesn't match, the cache is reset.
+class PickleCache:
+    def __init__(self, file=None, version=0, prefix='', max_age=None, max_size=None):
+        self.file = file
+        self.version = version
+        self.prefix = prefix.encode('utf-8')
+        self.max_age = cache_max_age if max_age is None else max_age
+        self.max_size = cache_max_size if max_size is None else max_size
+        # All entries used in this run are marked with the same time
+        self.time = time.time()
+        self.cache = self._load()
+
+    def _load(self):
+        if self.file and os.path.exists(self.file):
+            with open(self.file, 'rb') as f:
+                cache = pickle.load(f)
+
+            # Use the cache only if valid and of the expected version. Files
+            # from before the time-based eviction have three elements.
+            if isinstance(cache, tuple) and len(cache) == 2 and cache[0] == self.version:
+                return cache[1]
+        return {}
+
+    def _hash(self, key):
+        return sha1(self.prefix + key.encode('utf-8')).digest()
+
+    def __contains__(self, key):
+        return self._hash(key) in self.cache
+
+    def get(self, key):
+        hash = self._hash(key)
+        if hash not in self.cache: return None
+
+        # Mark the entry as used in this run
+        entry = self.cache[hash]
+        self.cache[hash] = (self.time,) + entry[1:]
+        return entry[1:]
+
+    def put(self, key, *value):
+        self.cache[self._hash(key)] = (self.time,) + value
+
+    def save(self):
+        # Don't save any file if there is nothing
+        if not self.file or not self.cache: return
+
+        # Merge in what other builds saved since this one loaded the file,
+        # keeping whichever entry was used more recently
+        cache = self._load()
+        for hash, entry in self.cache.items():
+            if hash not in cache or cache[hash][0] < entry[0]:
+                cache[hash] = entry
+
+        # The size is of the pickled entry, which is roughly what it takes in
+        # the file
+        for hash in _evict([(entry[0], len(pickle.dumps(entry)) if self.max_size is not None else 0, hash) for hash, entry in cache.items()], self.max_age, self.max_size):
+            del cache[hash]
+
+        # Write to a temporary file first and then move it over, so a build
+        # that's interrupted or running in parallel never sees a partially
+        # written file
+        fd, tmp = _mkstemp(os.path.dirname(os.path.abspath(self.file)))
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((self.version, cache), f)
+        os.replace(tmp, self.file)
+
+# Cache storing each entry in a separate file in a directory, named after a
+# hash of the key. The prefix is prepended to every key before hashing and is
+# meant to contain everything that affects the output but isn't in the key
+# itself, such as tool versions. Every file is written atomically, so the
+# directory can be shared by multiple projects and parallel builds. Each use
+# updates modification time of the file, which is then used for age- and
+# size-based eviction on save.
+class DirectoryCache:
+    def __init__(self, path, prefix='', max_age=None, max_size=None):
+        self.path = path
+        self.prefix = prefix.encode('utf-8')
+        self.max_age = cache_max_age if max_age is None else max_age
+        self.max_size = cache_max_size if max_size is None else max_size
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        hash = sha1(self.prefix + key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, hash[:2], hash[2:])
+
+    def __contains__(self, key):
+        return os.path.exists(self._file(key))
+
+    def get(self, key):
+        file = self._file(key)
+        try:
+            with open(file, 'rb') as f:
+                value = pickle.load(f)
+            # Mark the entry as recently used
+            os.utime(file)
+        # Evicted by another process in the meantime or a corrupted file
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        return value
+
+    def put(self, key, *value):
+        file = self._file(key)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        fd, tmp = _mkstemp(os.path.dirname(file))
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(value, f)
+        os.replace(tmp, file)
+
+    def save(self):
+        if self.max_age is None and self.max_size is None: return
+
+        entries = []
+        for dirname in os.listdir(self.path):
+            # There might be other files, such as the precompiled preamble
+            if len(dirname) != 2 or not os.path.isdir(os.path.join(self.path, dirname)): continue
+            for filename in os.listdir(os.path.join(self.path, dirname)):
+                file = os.path.join(self.path, dirname, filename)
+                try:
+                    stat = os.stat(file)
+                except FileNotFoundError:
+                    continue
+                entries += [(stat.st_mtime, stat.st_size, file)]
+
+        # Another process might be evicting at the same time, so ignore files
+        # that are gone already
+        for file in _evict(entries, self.max_age, self.max_size):
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+
+# If the file is None, the cache is only in memory for the duration of the
+# run, if it's a directory (or ends with a path separator), a DirectoryCache
+# is used, otherwise a PickleCache. The prefix is a function returning the
+# key prefix, called only if the cache is persistent as it may need to query
+# versions of external tools.
+def load(file, version, prefix):
+    if file and (os.path.isdir(file) or file.endswith(('/', os.sep))):
+        return DirectoryCache(file, prefix())
+    return PickleCache(file, version, prefix() if file else '')